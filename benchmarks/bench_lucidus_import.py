@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Import-time benchmark for the Lucidus RPG.
+
+Compares the dungeon-only startup path (`import game`) with a session that
+also opens the raid menu (`import game; game.load_raids()`), using
+`python -X importtime` in fresh interpreters so nothing is cached between runs.
+
+    python benchmarks/bench_lucidus_import.py [--runs 15] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+LUCIDUS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lucidusrpg")
+
+SCENARIOS = {
+    "dungeon_only": "import game",
+    "with_raids": "import game; game.load_raids()",
+}
+
+
+def import_times(code: str) -> dict:
+    """Runs one fresh interpreter and returns {module: cumulative_us} for the game modules."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=LUCIDUS_DIR,
+                          capture_output=True, text=True, check=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = [p.strip() for p in line[len("import time:"):].split("|")]
+        if parts[0].isdigit():
+            times[parts[2]] = int(parts[1])
+    return {"game": times.get("game", 0), "raids": times.get("raids", 0)}
+
+
+def run(runs: int) -> dict:
+    results = {}
+    for name, code in SCENARIOS.items():
+        samples = [import_times(code) for _ in range(runs)]
+        # raids is imported from inside game.load_raids(), after game finished importing
+        totals = [s["game"] + s["raids"] for s in samples]
+        results[name] = {
+            "median_us": int(statistics.median(totals)),
+            "min_us": min(totals),
+            "raids_loaded": any(s["raids"] for s in samples),
+        }
+    base = results["with_raids"]["median_us"]
+    results["dungeon_only"]["saving_pct"] = round(100.0 * (base - results["dungeon_only"]["median_us"]) / base, 1) if base else 0.0
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+    results = run(args.runs)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name, r in results.items():
+        print(f"{name:14s} median {r['median_us']:7d} us   min {r['min_us']:7d} us   raids loaded: {r['raids_loaded']}")
+    print(f"dungeon-only startup is {results['dungeon_only']['saving_pct']}% cheaper")
+    if results["dungeon_only"]["raids_loaded"]:
+        sys.exit("raids.py was imported on the dungeon-only path")
+
+
+if __name__ == "__main__":
+    main()
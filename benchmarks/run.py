@@ -0,0 +1,493 @@
+#!/usr/bin/env python3
+"""
+Hot-path benchmark suite for all three games.
+
+Every benchmark reseeds the global RNG with SEED before it runs, works in a
+scratch directory (save files never touch the real ones) and discards game
+output, so two runs on the same machine measure the same work.
+
+    python benchmarks/run.py                      # table
+    python benchmarks/run.py --json               # machine-readable results
+    python benchmarks/run.py --save-baseline      # store results in benchmarks/baseline.json
+    python benchmarks/run.py --compare            # diff against the stored baseline
+    python benchmarks/run.py -k save --rounds 20  # only benchmarks whose name contains "save"
+"""
+import argparse
+import builtins
+import contextlib
+import copy
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+SEED = 1337
+COMBAT_TURNS = 200
+SMALL_INVENTORY = 5
+HUGE_INVENTORY = 5000
+WORLD_SCALES = (12, 120, 1200)  # WORLD_ENCOUNTERS values; 12 is the shipped default
+HORDE_SIZE = 1000  # Lucidus horde fight; outlasts COMBAT_TURNS even when every hit kills
+LOOKAHEAD_WALKS = 100  # random walks from the root per lookahead benchmark call
+CONTENT_ROWS = 20000  # rows in the synthetic content table
+DEEP_FLOORS = 10**6  # floors in the deep dungeon benchmark
+LOOT_DROPS = 100000  # rolls per bulk loot benchmark call
+
+for sub in ("halorpg", "lucidusrpg", "sololevelingrpg"):
+    sys.path.insert(0, os.path.join(ROOT, sub))
+
+import halo_text_rpg as halo  # noqa: E402
+import game as lucidus  # noqa: E402  (raids.py imports it under this name)
+import sl  # noqa: E402
+from rpgcommon import aggregate  # noqa: E402
+from rpgcommon import content  # noqa: E402
+from rpgcommon import dungeongraph  # noqa: E402
+from rpgcommon import loot  # noqa: E402
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Registers a setup function returning (callable, operations per call)."""
+    def wrap(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return wrap
+
+
+# -------------------------
+# Headless helpers
+# -------------------------
+class _StopFight(Exception):
+    pass
+
+
+@contextlib.contextmanager
+def scripted_input(action: str, turns: int):
+    """Answers every prompt with `action`, then ends the fight after `turns` prompts."""
+    left = [turns]
+
+    def fake_input(prompt=""):
+        if left[0] <= 0:
+            raise _StopFight
+        left[0] -= 1
+        return action
+
+    real = builtins.input
+    builtins.input = fake_input
+    try:
+        yield
+    except _StopFight:
+        pass
+    finally:
+        builtins.input = real
+
+
+def tank_enemy(e):
+    e = dict(e)
+    e['health'] = 10 ** 9
+    return e
+
+
+def lucidus_player(inventory_size=SMALL_INVENTORY):
+    player = copy.deepcopy(lucidus.DEFAULT_PLAYER)
+    player['name'] = "Bench"
+    player['inventory'] = [f"Health Potion +{i % 50}" for i in range(inventory_size)]
+    return player
+
+
+def sl_player(inventory_size=SMALL_INVENTORY):
+    player = copy.deepcopy(sl.DEFAULT_PLAYER)
+    player['name'] = "Bench"
+    player['inventory'] = ["Health Potion +20" if i % 2 else "Shadow Stone" for i in range(inventory_size)]
+    return player
+
+
+def halo_save(inventory_size=SMALL_INVENTORY):
+    save = halo.SaveManager().new_game(1, "Bench")
+    save["player"]["inventory"] = {f"artifact_{i}": i for i in range(inventory_size)}
+    return save
+
+
+# -------------------------
+# Generation
+# -------------------------
+@benchmark("sl.generate_dungeon")
+def bench_generate_dungeon():
+    rng = random.Random(SEED)
+    return (lambda: [sl.generate_dungeon(rng) for _ in range(100)]), 100
+
+
+@benchmark("sl.deep_dungeon_floor")
+def bench_deep_dungeon_floor():
+    # every call lands on a floor the cache has never seen, as deep as the dungeon goes
+    graph = dungeongraph.DungeonGraph(SEED, sl.DEEP_ROOM_WEIGHTS, DEEP_FLOORS)
+    rng = random.Random(SEED)
+    return (lambda: [graph.room(rng.randrange(DEEP_FLOORS) * dungeongraph.FLOOR_SLOTS) for _ in range(100)]), 100
+
+
+def _world_generate(scale):
+    def setup():
+        halo.WORLD_ENCOUNTERS = scale
+        world = halo.World(seed=str(SEED))
+        return world.generate, 1
+    return setup
+
+
+for _scale in WORLD_SCALES:
+    benchmark(f"halo.World.generate[{_scale}]")(_world_generate(_scale))
+
+
+# -------------------------
+# Combat (one turn = one player action plus the enemy reply)
+# -------------------------
+@benchmark("lucidus.combat_turn")
+def bench_lucidus_combat():
+    def fight():
+        lucidus.player.clear()
+        lucidus.player.update(lucidus_player())
+        lucidus.player['current_hp'] = lucidus.player['max_hp'] = 10 ** 9
+        with scripted_input("attack", COMBAT_TURNS):
+            lucidus.combat([tank_enemy(e) for e in lucidus.ENEMIES[:3]])
+    return fight, COMBAT_TURNS
+
+
+@benchmark("lucidus.combat_turn[horde]")
+def bench_lucidus_horde():
+    wolves = next(e for e in lucidus.ENEMIES if e['name'] == "Wolf Pack")
+
+    def fight():
+        lucidus.player.clear()
+        lucidus.player.update(lucidus_player())
+        lucidus.player['current_hp'] = lucidus.player['max_hp'] = 10 ** 9
+        lucidus.player['stats']['STR'] = 100  # every hit kills, so the reserve keeps moving up
+        with scripted_input("attack", COMBAT_TURNS):
+            lucidus.combat([dict(wolves) for _ in range(HORDE_SIZE)])
+    return fight, COMBAT_TURNS
+
+
+@benchmark("sl.combat_turn")
+def bench_sl_combat():
+    def fight():
+        sl.player.clear()
+        sl.player.update(sl_player())
+        sl.player['current_hp'] = sl.player['max_hp'] = 10 ** 9
+        with scripted_input("attack", COMBAT_TURNS):
+            sl.combat(tank_enemy(sl.ENEMIES[0]))
+    return fight, COMBAT_TURNS
+
+
+@benchmark("halo.combat_turn")
+def bench_halo_combat():
+    halo.pause = lambda *a, **k: None
+    halo.clear_screen = lambda: None
+    halo.WORLD_ENCOUNTERS = 12
+    save = halo_save()
+    world = halo.World(seed=str(SEED))
+    template = next(e for kind, e in world.encounters if kind == "combat")
+
+    def fight():
+        g = halo.Game()
+        g.player = halo.Player.from_dict(copy.deepcopy(save["player"]))
+        g.player.hp = g.player.max_hp = 10 ** 9
+        g.world = world
+        enemy = copy.deepcopy(template)
+        enemy.hp = 10 ** 9
+        with scripted_input("a", COMBAT_TURNS):
+            g.run_combat(enemy)
+    return fight, COMBAT_TURNS
+
+
+# -------------------------
+# Lookahead (one op = fork a state and play one move on the copy)
+# -------------------------
+def _expand(root):
+    def walks():
+        n = 0
+        for branch in range(LOOKAHEAD_WALKS):
+            state = root
+            while not state.terminal and state.turn < COMBAT_TURNS:
+                moves = state.actions()
+                state = state.child(moves[(n + branch) % len(moves)], branch)
+                n += 1
+        return n
+    return walks, walks()
+
+
+@benchmark("lucidus.lookahead_expand")
+def bench_lucidus_lookahead():
+    lucidus.player.clear()
+    lucidus.player.update(lucidus_player())
+    return _expand(lucidus.lookahead_state([dict(e) for e in lucidus.ENEMIES[:3]], seed=SEED))
+
+
+@benchmark("sl.lookahead_expand")
+def bench_sl_lookahead():
+    sl.player.clear()
+    sl.player.update(sl_player())
+    return _expand(sl.lookahead_state(sl.ENEMIES[0], seed=SEED))
+
+
+@benchmark("halo.lookahead_expand")
+def bench_halo_lookahead():
+    halo.WORLD_ENCOUNTERS = 12
+    world = halo.World(seed=str(SEED))
+    enemy = next(e for kind, e in world.encounters if kind == "combat")
+    return _expand(halo.lookahead_state(halo.Player.from_dict(halo_save()["player"]), enemy, seed=SEED))
+
+
+# -------------------------
+# Save / load
+# -------------------------
+def _dict_save(module, make_player, size):
+    def setup():
+        module.player.clear()
+        module.player.update(make_player(size))
+        return module.save_player, 1
+    return setup
+
+
+def _halo_save_slot(size):
+    def setup():
+        data = halo_save(size)
+        mgr = halo.SaveManager()
+        return (lambda: mgr.save_slot(1, data)), 1
+    return setup
+
+
+for _label, _size in (("small", SMALL_INVENTORY), ("huge", HUGE_INVENTORY)):
+    benchmark(f"lucidus.save_player[{_label}]")(_dict_save(lucidus, lucidus_player, _size))
+    benchmark(f"sl.save_player[{_label}]")(_dict_save(sl, sl_player, _size))
+    benchmark(f"halo.SaveManager.save_slot[{_label}]")(_halo_save_slot(_size))
+
+
+@benchmark("halo.Player.from_dict")
+def bench_player_from_dict():
+    d = halo_save(HUGE_INVENTORY)["player"]
+    return (lambda: halo.Player.from_dict(d)), 1
+
+
+@benchmark("halo.World.from_dict")
+def bench_world_from_dict():
+    halo.WORLD_ENCOUNTERS = 12
+    d = halo_save()["world"]
+    return (lambda: halo.World.from_dict(d)), 1
+
+
+# -------------------------
+# Lore
+# -------------------------
+@benchmark("lucidus.load_raid_lore[cold]")
+def bench_lore_cold():
+    lucidus.load_raids()
+    raids = sys.modules["raids"]
+    path = os.path.join(ROOT, "lucidusrpg", raids.RAIDS[1]["lore_file"])
+
+    def load():
+        raids.load_raid_lore.cache_clear()
+        raids.load_raid_lore(path)
+    return load, 1
+
+
+@benchmark("lucidus.load_raid_lore[warm]")
+def bench_lore_warm():
+    lucidus.load_raids()
+    raids = sys.modules["raids"]
+    path = os.path.join(ROOT, "lucidusrpg", raids.RAIDS[1]["lore_file"])
+    raids.load_raid_lore(path)
+    return (lambda: raids.load_raid_lore(path)), 1
+
+
+# -------------------------
+# Content
+# -------------------------
+@benchmark("lucidus.content.load")
+def bench_content_shipped():
+    folder = os.path.join(ROOT, "lucidusrpg", "data")
+    content.load(folder)
+    return (lambda: content.load(folder)["enemies"][0]), 1
+
+
+@benchmark(f"content.load[{CONTENT_ROWS}]")
+def bench_content_large():
+    folder = os.path.abspath("content")
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, "enemies.json"), "w", encoding="utf-8") as f:
+        json.dump({f"Enemy {i}": {"hp": i, "shield": i % 50, "accuracy": 0.5, "class": f"class {i % 20}"}
+                   for i in range(CONTENT_ROWS)}, f)
+    content.load(folder)
+    key = f"Enemy {CONTENT_ROWS - 1}"
+    return (lambda: content.load(folder)["enemies"][key]), 1
+
+
+@benchmark("lucidus.content.load[published]")
+def bench_content_published():
+    # a copy, so publishing it leaves the shipped folder's load benchmark as it was
+    folder = os.path.abspath("content_published")
+    shutil.copytree(os.path.join(ROOT, "lucidusrpg", "data"), folder, dirs_exist_ok=True)
+    content.publish(folder)
+    return (lambda: content.load(folder)["enemies"][0]), 1
+
+
+# -------------------------
+# Loot
+# -------------------------
+@benchmark("halo.loot_table.roll")
+def bench_halo_loot():
+    rng = random.Random(SEED)
+    return (lambda: [halo.ENEMY_LOOT.roll(rng) for _ in range(1000)]), 1000
+
+
+@benchmark(f"lucidus.loot_table.roll_n[{LOOT_DROPS}]")
+def bench_lucidus_loot_bulk():
+    rng = random.Random(SEED)
+    return (lambda: lucidus.ENEMY_LOOT.roll_n(LOOT_DROPS, rng)), LOOT_DROPS
+
+
+# -------------------------
+# Adaptive difficulty
+# -------------------------
+@benchmark("lucidus.difficulty.solve")
+def bench_difficulty_solve():
+    # what the tuner's worker thread spends on one (build, enemy) key
+    lucidus.player.clear()
+    lucidus.player.update(lucidus_player())
+    build, hp = lucidus.combat_build_key(), lucidus.player['max_hp']
+    return (lambda: lucidus.tuner.solve(build, lucidus.enemy_key(lucidus.ENEMIES[0]), hp)), 1
+
+
+@benchmark("lucidus.difficulty.factors")
+def bench_difficulty_factors():
+    # what the game thread pays per fight once the key is solved
+    lucidus.player.clear()
+    lucidus.player.update(lucidus_player())
+    build, key, hp = lucidus.combat_build_key(), lucidus.enemy_key(lucidus.ENEMIES[0]), lucidus.player['max_hp']
+    lucidus.tuner.factors(build, key, hp)
+    lucidus.tuner.wait()
+    return (lambda: [lucidus.tuner.factors(build, key, hp) for _ in range(1000)]), 1000
+
+
+# -------------------------
+# Streaming aggregation
+# -------------------------
+@benchmark("aggregate.quantile.add")
+def bench_quantile_add():
+    # the economy simulator feeds one per quantile, per item, per run
+    rng = random.Random(SEED)
+    values = [rng.randint(0, 50) for _ in range(1000)]
+    q = aggregate.Quantile(0.9)
+    return (lambda: [q.add(v) for v in values]), 1000
+
+
+# -------------------------
+# Runner
+# -------------------------
+def measure(name, rounds: int, min_time: float) -> dict:
+    random.seed(SEED)
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn, ops = BENCHMARKS[name]()
+        fn()  # warm-up
+        samples = []
+        for _ in range(rounds):
+            calls = 0
+            t0 = time.perf_counter_ns()
+            while True:
+                fn()
+                calls += 1
+                elapsed = time.perf_counter_ns() - t0
+                if elapsed >= min_time * 1e9:
+                    break
+            samples.append(elapsed / (calls * ops))
+    return {"ns_per_op": round(statistics.median(samples), 1), "min_ns": round(min(samples), 1),
+            "stdev_ns": round(statistics.pstdev(samples), 1), "rounds": rounds}
+
+
+def run(selected, rounds: int, min_time: float) -> dict:
+    scratch = tempfile.mkdtemp(prefix="rpg-bench-")
+    cwd = os.getcwd()
+    os.chdir(scratch)
+    os.makedirs(halo.SAVE_DIR, exist_ok=True)
+    try:
+        results = {name: measure(name, rounds, min_time) for name in selected}
+    finally:
+        os.chdir(cwd)
+    return {"meta": {"python": platform.python_version(), "platform": platform.platform(), "seed": SEED,
+                     "rounds": rounds, "min_time": min_time, "time": int(time.time())},
+            "results": results}
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """Rows of (name, baseline ns, current ns, change %, verdict)."""
+    rows = []
+    for name, r in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            rows.append((name, None, r["ns_per_op"], None, "new"))
+            continue
+        change = 100.0 * (r["ns_per_op"] - base["ns_per_op"]) / base["ns_per_op"]
+        verdict = "slower" if change > threshold else "faster" if change < -threshold else "same"
+        rows.append((name, base["ns_per_op"], r["ns_per_op"], round(change, 1), verdict))
+    return rows
+
+
+def _fmt(ns) -> str:
+    if ns is None:
+        return "-"
+    if ns >= 1e6:
+        return f"{ns / 1e6:.2f}ms"
+    if ns >= 1e3:
+        return f"{ns / 1e3:.1f}us"
+    return f"{ns:.0f}ns"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.05, help="seconds per round")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, metavar="PATH")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, metavar="PATH")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent change counted as a difference")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    selected = [n for n in BENCHMARKS if args.filter in n]
+    if not selected:
+        sys.exit(f"no benchmark matches '{args.filter}'")
+    current = run(selected, args.rounds, args.min_time)
+
+    rows = None
+    if args.compare:
+        with open(args.compare) as f:
+            rows = compare(current, json.load(f), args.threshold)
+        current["compare"] = [dict(zip(("name", "baseline_ns", "current_ns", "change_pct", "verdict"), r)) for r in rows]
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(current, f, indent=2)
+
+    if args.json:
+        print(json.dumps(current, indent=2))
+    elif rows is not None:
+        print(f"{'benchmark':36s} {'baseline':>10s} {'current':>10s} {'change':>8s}")
+        for name, base, cur, change, verdict in rows:
+            change_str = f"{change:+.1f}%" if change is not None else "-"
+            print(f"{name:36s} {_fmt(base):>10s} {_fmt(cur):>10s} {change_str:>8s}  {verdict}")
+    else:
+        print(f"{'benchmark':36s} {'per op':>10s} {'min':>10s}")
+        for name, r in current["results"].items():
+            print(f"{name:36s} {_fmt(r['ns_per_op']):>10s} {_fmt(r['min_ns']):>10s}")
+
+    if args.fail_on_regression and rows and any(r[4] == "slower" for r in rows):
+        sys.exit("regression over threshold")
+
+
+if __name__ == "__main__":
+    main()
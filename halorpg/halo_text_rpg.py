@@ -1,14 +1,38 @@
 #!/usr/bin/env python3
 
 
+import glob
 import json
 import os
 import random
 import shutil
+import sys
 import tempfile
+import time
 import uuid
-from dataclasses import dataclass, asdict, field
-from typing import List, Dict, Any, Optional
+from dataclasses import dataclass, asdict, field, replace
+from typing import List, Dict, Any, Optional, Tuple
+
+# shared helpers live in rpgcommon/ at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rpgcommon import events
+from rpgcommon.events import EventType as EV
+from rpgcommon import commands
+from rpgcommon.commands import CommandQueue, CommandError
+from rpgcommon.profiling import profiled
+from rpgcommon import metrics
+from rpgcommon import replay
+from rpgcommon import content
+from rpgcommon import difficulty
+from rpgcommon import loot
+from rpgcommon import output
+from rpgcommon.turns import ThreatIndex, TurnScheduler
+from rpgcommon.migrate import Schema, SchemaError, require
+from rpgcommon.combatstate import CombatState, Rules, HEADER, STATUS, SIDE, TURN, ONGOING, WON, LOST, FLED, PLAYER, ENEMY
+from rpgcommon import mcts
+
+emit = events.emitter("halo")
+print = output.print  # a no-op in quiet mode (see rpgcommon.output)
 
 # -------------------------
 # Terminal colors (For Later)
@@ -31,7 +55,9 @@ def c(text, color):
 # Config
 # -------------------------
 SAVE_DIR = "saves"
-NUM_SLOTS = 3
+CATALOG_FILE = "catalog.jsonl"          # slot index inside SAVE_DIR; the saves live in its data file
+LEGACY_SLOT_GLOB = "save_slot_*.json"   # one-file-per-slot saves from before the catalog, imported once
+COMPACT_MIN_GARBAGE = 256 * 1024        # rewrite the data file once overwritten saves take this many bytes
 WORLD_ENCOUNTERS = 12  # number of encounters per generated run
 
 # Hunter unlock level
@@ -41,59 +67,64 @@ HUNTER_UNLOCK_LEVEL = 7
 FRAG_DAMAGE = 60
 FRAG_SHIELD_PENETRATION = 0.6  # fraction of grenade damage that bypasses shields
 FRAG_SELF_DAMAGE_ON_FAIL = 10   # small chance grenade toss harms thrower if fail (flavor)
+ENEMY_GRENADE_CHANCE = {"tactical": 0.45, "standard": 0.18, "berserk": 0.08, "coward": 0.05}
+HARD_MODE_GRENADES = 2  # frags a grenadier carries when a planner, not the ladder, decides when to throw
+
+# Player combat
+PLAYER_ACCURACY = 0.75
+MEDKIT_HEAL = 40
+
+# Squad encounters (rolled from their own RNG stream, so solo encounters stay where they were)
+SQUAD_CHANCE = 0.25     # share of combat encounters that become squads
+SQUAD_SIZE = (8, 36)    # members including the leader
+SQUAD_FRONT = 4         # members engaged at once; the rest wait in reserve
+SQUAD_STRENGTH = 2.0    # followers together are worth this many solo enemies (hp, shield, damage)
+PLAYER_SPEED = 10       # initiative: turns per time unit, relative to ENEMY_SPEED
+
+# Words that can be queued at the combat prompt ("attack x5", "grenade, attack*3")
+BATCH_VERBS = {"attack": "a", "a": "a", "grenade": "g", "g": "g", "medkit": "m", "m": "m", "flee": "f", "f": "f"}
 
 # -------------------------
 # Lore-ish weapon & enemy DB
-# (extended with enemy-class-specific weapons)
+# (data/weapons.json, data/enemies.json, data/enemy_weapon_pools.json; see rpgcommon.content)
 # -------------------------
-WEAPONS_DB = {
-    # UNSC weapons (player starters)
-    "MA5B Assault Rifle": {"type": "ballistic", "damage": 8, "mag": 32, "range": 15, "crit": 0.02},
-    "BR55 Battle Rifle": {"type": "ballistic", "damage": 28, "mag": 8, "range": 40, "crit": 0.03},
-    "M6D Magnum": {"type": "ballistic", "damage": 40, "mag": 8, "range": 35, "crit": 0.06},
-    "SRS99C Sniper": {"type": "ballistic", "damage": 110, "mag": 4, "range": 200, "crit": 0.12},
+CONTENT = content.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
 
-    # Covenant weapons (used by Elites, Jackals, Grunts depending on class)
-    "Needler": {"type": "exotic", "damage": 12, "mag": 32, "range": 12, "crit": 0.03},
-    "Plasma Pistol": {"type": "energy", "damage": 10, "mag": 100, "range": 20, "crit": 0.01},
-    "Plasma Rifle": {"type": "energy", "damage": 18, "mag": 60, "range": 25, "crit": 0.02},
-    "Energy Sword": {"type": "melee", "damage": 85, "mag": 0, "range": 1, "crit": 0.10},
+WEAPONS_DB = CONTENT["weapons"]
 
-    # Sentinel / Forerunner
-    "Sentinel Beam": {"type": "energy", "damage": 18, "mag": 1000, "range": 40, "crit": 0.02},
+# Weapons each enemy class may carry (Engineers carry none)
+ENEMY_WEAPON_POOLS = CONTENT["enemy_weapon_pools"]
 
-    # Heavy / vehicle-mounted (Hunter's fuel rod tuned)
-    # Base damage for Fuel Rod lowered to 40; crit logic will allow up to 90 on crit
-    "Fuel Rod Cannon": {"type": "explosive", "damage": 40, "mag": 1, "range": 60, "crit": 0.10},
+ENEMIES_DB = CONTENT["enemies"]
 
-    # Flood melee
-    "Claw": {"type": "melee", "damage": 10, "mag": 0, "range": 1, "crit": 0.02},
-
-    # Frag grenade as a 'weapon' possible to drop (kept)
-    "Frag Grenade": {"type": "explosive", "damage": FRAG_DAMAGE, "mag": 1, "range": 8, "crit": 0.0},
+ENEMY_SPEED = {
+    "Grunt": 9,
+    "Jackal": 10,
+    "Elite (Minor)": 12,
+    "Elite (Major)": 12,
+    "Hunter": 6,
+    "Sentinel": 8,
+    "Flood Infected": 13,
+    "Engineer": 7,
 }
 
-# Map some enemy classes to allowed weapons
-ENEMY_WEAPON_POOLS = {
-    "Elite": ["Needler", "Plasma Rifle", "Plasma Pistol", "Energy Sword"],
-    "Jackal": ["Plasma Rifle", "Needler", "Plasma Pistol"],
-    "Grunt": ["Plasma Pistol", "Needler"],
-    "Sentinel": ["Sentinel Beam"],
-    "Hunter": ["Fuel Rod Cannon"],
-    "Flood": ["Claw"],
-    # Engineers: no weapons
+# Squad members by leader class (repeats weight the draw)
+SQUAD_POOLS = {
+    "Flood Infected": ["Flood Infected"],
+    "Sentinel": ["Sentinel"],
+    "Covenant": ["Grunt"] * 5 + ["Jackal"] * 3 + ["Elite (Minor)"] * 2 + ["Elite (Major)"],
 }
 
-ENEMIES_DB = {
-    "Grunt": {"hp": 20, "shield": 0, "damage": 4, "accuracy": 0.7},
-    "Jackal": {"hp": 30, "shield": 10, "damage": 6, "accuracy": 0.65},
-    "Elite (Minor)": {"hp": 60, "shield": 50, "damage": 12, "accuracy": 0.75},
-    "Elite (Major)": {"hp": 120, "shield": 80, "damage": 20, "accuracy": 0.8},
-    "Hunter": {"hp": 300, "shield": 0, "damage": 45, "accuracy": 0.6},
-    "Sentinel": {"hp": 80, "shield": 80, "damage": 18, "accuracy": 0.6},
-    "Flood Infected": {"hp": 45, "shield": 0, "damage": 8, "accuracy": 0.6},
-    "Engineer": {"hp": 25, "shield": 0, "damage": 0, "accuracy": 0.1},
-}
+# What a defeated enemy leaves behind (see loot_enemy). OWN_WEAPON is the enemy's
+# weapon, recoverable 30% of the time unless a random weapon turns up instead.
+OWN_WEAPON = "own_weapon"
+ENEMY_LOOT = loot.LootTable([
+    (("medkit", OWN_WEAPON), 0.20),
+    (loot.LootTable.uniform(WEAPONS_DB), 0.08),  # legacy random weapon, kept but rare
+    (("frag_grenade", OWN_WEAPON), 0.02),
+    ("frag_grenade", 0.06),
+    (None, 0.64),
+])
 
 FRIENDLY_TYPES = [
     "Marine",
@@ -106,24 +137,21 @@ FRIENDLY_TYPES = [
 # -------------------------
 # Utilities
 # -------------------------
-def ensure_save_dir():
-    os.makedirs(SAVE_DIR, exist_ok=True)
+def catalog_path(save_dir: Optional[str] = None) -> str:
+    return os.path.join(save_dir or SAVE_DIR, CATALOG_FILE)
 
 
-def slot_filename(slot: int) -> str:
-    assert 1 <= slot <= NUM_SLOTS
-    return os.path.join(SAVE_DIR, f"save_slot_{slot}.json")
-
-
-def atomic_save(path: str, data: Dict[str, Any]):
-    # Write to a temp file and move to ensure atomic save
-    dirpath = os.path.dirname(path)
-    with tempfile.NamedTemporaryFile("w", dir=dirpath, delete=False) as tf:
-        json.dump(data, tf, indent=2)
-        tempname = tf.name
-    shutil.move(tempname, path)
+def save_files() -> List[str]:
+    # every file the saves live in, for replay recordings; reads the catalog without creating it
+    data = "slots-1.dat"
+    if os.path.exists(catalog_path()):
+        with open(catalog_path(), "r") as f:
+            data = json.loads(f.readline())["data"]
+    legacy = sorted(glob.glob(os.path.join(SAVE_DIR, LEGACY_SLOT_GLOB)))
+    return [catalog_path(), os.path.join(SAVE_DIR, data)] + legacy
 
 
+@profiled("save.load")
 def load_json(path: str) -> Optional[Dict[str, Any]]:
     if not os.path.exists(path):
         return None
@@ -149,9 +177,8 @@ class Weapon:
 
     @staticmethod
     def from_dict(d):
-        crit = d.get("crit_bonus", d.get("crit", 0.0))
         return Weapon(name=d["name"], damage=d["damage"], mag=d["mag"],
-                      ammo=d["ammo"], wtype=d["wtype"], range=d["range"], crit_bonus=crit)
+                      ammo=d["ammo"], wtype=d["wtype"], range=d["range"], crit_bonus=d["crit_bonus"])
 
 
 @dataclass
@@ -187,8 +214,8 @@ class Player:
 
     @staticmethod
     def from_dict(d):
-        # weapons field may exist as list of dicts
-        p = Player(
+        # expects a current-schema dict; older saves go through SAVE_SCHEMA first
+        return Player(
             name=d["name"],
             hp=d["hp"],
             max_hp=d["max_hp"],
@@ -196,22 +223,12 @@ class Player:
             max_shield=d["max_shield"],
             xp=d["xp"],
             level=d["level"],
-            inventory=d.get("inventory", {}),
-            weapons=[Weapon.from_dict(wd) for wd in d.get("weapons", [])],
-            current_weapon=d.get("current_weapon", 0),
-            pos=d.get("pos", 0),
-            seed=d.get("seed", "")
+            inventory=d["inventory"],
+            weapons=[Weapon.from_dict(wd) for wd in d["weapons"]],
+            current_weapon=d["current_weapon"],
+            pos=d["pos"],
+            seed=d["seed"]
         )
-        # Ensure weapons list is length 2 (pad with MA5B if necessary)
-        if len(p.weapons) < 2:
-            for _ in range(2 - len(p.weapons)):
-                wd = WEAPONS_DB["MA5B Assault Rifle"]
-                p.weapons.append(Weapon(name="MA5B Assault Rifle", damage=wd["damage"], mag=wd["mag"], ammo=wd["mag"], wtype=wd["type"], range=wd["range"], crit_bonus=wd.get("crit", 0.0)))
-        elif len(p.weapons) > 2:
-            p.weapons = p.weapons[:2]
-        if p.current_weapon not in (0, 1):
-            p.current_weapon = 0
-        return p
 
 
 @dataclass
@@ -242,10 +259,52 @@ def make_weapon_by_name(name: str) -> Weapon:
     wd = WEAPONS_DB[name]
     return Weapon(name=name, damage=wd["damage"], mag=wd["mag"], ammo=wd["mag"], wtype=wd["type"], range=wd["range"], crit_bonus=wd.get("crit", 0.0))
 
+# -------------------------
+# Save schema (see rpgcommon.migrate)
+# -------------------------
+WEAPON_FIELDS = {"name": str, "damage": int, "mag": int, "ammo": int, "wtype": str, "range": int, "crit_bonus": (int, float)}
+PLAYER_FIELDS = {"name": str, "hp": int, "max_hp": int, "shield": int, "max_shield": int, "xp": int, "level": int,
+                 "inventory": dict, "weapons": list, "current_weapon": int, "pos": int, "seed": str}
+
+
+def validate_save(data: Dict[str, Any]):
+    require(data, {"player": dict, "world": dict})
+    p = data["player"]
+    require(p, PLAYER_FIELDS, "player.")
+    if len(p["weapons"]) != 2:
+        raise SchemaError(f"player.weapons: expected 2 weapons, got {len(p['weapons'])}")
+    for i, w in enumerate(p["weapons"]):
+        require(w, WEAPON_FIELDS, f"player.weapons[{i}].")
+    if p["current_weapon"] not in (0, 1):
+        raise SchemaError(f"player.current_weapon: expected 0 or 1, got {p['current_weapon']}")
+    require(data["world"], {"seed": str}, "world.")
+
+
+SAVE_SCHEMA = Schema("halo", 2, validate_save)
+
+
+@SAVE_SCHEMA.step(1)
+def _fix_loadout(data: Dict[str, Any]):
+    # version 1 left this to Player.from_dict on every load: optional fields, the old
+    # "crit" key, exactly two weapons (padded with MA5Bs), a valid weapon index
+    p = data["player"]
+    p.setdefault("inventory", {})
+    p.setdefault("pos", 0)
+    p.setdefault("seed", "")
+    weapons = p.setdefault("weapons", [])
+    for w in weapons:
+        w["crit_bonus"] = w.pop("crit_bonus", w.pop("crit", 0.0))
+    while len(weapons) < 2:
+        weapons.append(make_weapon_by_name("MA5B Assault Rifle").to_dict())
+    del weapons[2:]
+    if p.get("current_weapon") not in (0, 1):
+        p["current_weapon"] = 0
+
+
 # -------------------------
 # Helper: choose enemy weapon based on enemy class/name
 # -------------------------
-def choose_weapon_for_enemy(enemy_name: str) -> Optional[Weapon]:
+def choose_weapon_for_enemy(enemy_name: str, rng=random) -> Optional[Weapon]:
     # Map enemy base names to pools
     if "Elite" in enemy_name:
         pool = ENEMY_WEAPON_POOLS.get("Elite", [])
@@ -267,20 +326,80 @@ def choose_weapon_for_enemy(enemy_name: str) -> Optional[Weapon]:
     if not pool:
         return None
 
-    wname = random.choice(pool)
+    wname = rng.choice(pool)
     return make_weapon_by_name(wname)
 
+# -------------------------
+# Helper: enemy rolls and squads
+# -------------------------
+def roll_ai_type(rng=random) -> str:
+    ai_choice = rng.random()
+    if ai_choice < 0.12:
+        return "coward"
+    elif ai_choice < 0.7:
+        return "standard"
+    elif ai_choice < 0.9:
+        return "tactical"
+    return "berserk"
+
+
+def make_enemy(enemy_name: str, rng=random) -> Enemy:
+    ed = ENEMIES_DB[enemy_name]
+    ai = roll_ai_type(rng)
+    has_g = rng.random() < (0.18 if "Elite" in enemy_name or enemy_name == "Jackal" else 0.06)
+    return Enemy(name=enemy_name, hp=ed["hp"], shield=ed["shield"], damage=ed["damage"], accuracy=ed["accuracy"],
+                 ai_type=ai, has_grenades=has_g, weapon=choose_weapon_for_enemy(enemy_name, rng))
+
+
+def make_squad(leader: Enemy, rng) -> List[Enemy]:
+    pool = SQUAD_POOLS.get(leader.name, SQUAD_POOLS["Covenant"])
+    size = rng.randint(*SQUAD_SIZE)
+    scale = SQUAD_STRENGTH / (size - 1)
+    squad = [leader]
+    for _ in range(size - 1):
+        e = make_enemy(rng.choice(pool), rng)
+        e.hp = max(1, int(e.hp * scale))
+        e.shield = int(e.shield * scale)
+        e.damage = max(1, int(e.damage * scale))
+        e.has_grenades = False  # a frag does full damage whatever the thrower; leave them to the leader
+        if e.weapon:
+            e.weapon = replace(e.weapon, damage=max(1, int(e.weapon.damage * scale)))
+        squad.append(e)
+    return squad
+
+
+def enemy_threat(enemy: Enemy) -> float:
+    # expected damage per turn per point of remaining health: kill the glass cannons first
+    damage = enemy.weapon.damage if enemy.weapon else enemy.damage
+    return damage * enemy.accuracy / max(1, enemy.hp + enemy.shield)
+
+
+def apply_damage(enemy: Enemy, dmg: int, piercing: int = 0) -> Tuple[int, int]:
+    """Shields soak damage first, except the piercing share; returns (absorbed by shield, dealt to hp)."""
+    absorbed = min(enemy.shield, dmg - piercing)
+    enemy.shield -= absorbed
+    dealt = min(enemy.hp, dmg - absorbed)
+    enemy.hp -= dealt
+    return absorbed, dealt
+
 # -------------------------
 # World generator
 # -------------------------
+def new_seed() -> str:
+    # drawn from the session RNG (not os.urandom) so recorded sessions replay the same worlds
+    return str(uuid.UUID(int=random.getrandbits(128), version=4))
+
+
 class World:
     def __init__(self, seed: Optional[str] = None):
-        self.seed = seed or str(uuid.uuid4())
+        self.seed = seed or new_seed()
         self.encounters = []
         self.npcs = {}  # position -> NPC
         self.generate()
 
+    @profiled("world.generate")
     def generate(self):
+        t0 = time.perf_counter()
         random.seed(self.seed)
         self.encounters = []
         self.npcs = {}
@@ -289,21 +408,8 @@ class World:
             if r < 0.5:
                 # combat encounter
                 enemy_name = random.choice(list(ENEMIES_DB.keys()))
-                ed = ENEMIES_DB[enemy_name]
-                ai_choice = random.random()
-                if ai_choice < 0.12:
-                    ai = "coward"
-                elif ai_choice < 0.7:
-                    ai = "standard"
-                elif ai_choice < 0.9:
-                    ai = "tactical"
-                else:
-                    ai = "berserk"
-                has_g = random.random() < (0.18 if "Elite" in enemy_name or enemy_name == "Jackal" else 0.06)
                 # create enemy with a weapon suitable to its class
-                enemy_weapon = choose_weapon_for_enemy(enemy_name)
-                enemy = Enemy(name=enemy_name, hp=ed["hp"], shield=ed["shield"],
-                              damage=ed["damage"], accuracy=ed["accuracy"], ai_type=ai, has_grenades=has_g, weapon=enemy_weapon)
+                enemy = make_enemy(enemy_name)
                 self.encounters.append(("combat", enemy))
             elif r < 0.75:
                 npc_name = random.choice(FRIENDLY_TYPES)
@@ -315,6 +421,11 @@ class World:
             else:
                 item = random.choice(["ammo_pack", "shield_battery", "artifact", "vehicle_key", "frag_grenade"])
                 self.encounters.append(("loot", item))
+        squad_rng = random.Random(f"{self.seed}:squads")
+        for i, (kind, enemy) in enumerate(self.encounters):
+            if kind == "combat" and squad_rng.random() < SQUAD_CHANCE:
+                self.encounters[i] = ("squad", make_squad(enemy, squad_rng))
+        metrics.WORLD_GENERATE.observe(time.perf_counter() - t0, "halo")
 
     def to_dict(self):
         return {"seed": self.seed, "npcs": {str(k): asdict(v) for k, v in self.npcs.items()}}
@@ -330,14 +441,138 @@ class World:
 # Save manager
 # -------------------------
 class SaveManager:
-    def __init__(self):
-        ensure_save_dir()
+    """
+    Unlimited save slots in two files under save_dir (SAVE_DIR by default):
+
+    - a data file that every save appends one JSON record to, and
+    - CATALOG_FILE, the index: a header line naming the data file, then one
+      line per change giving a slot's player name, level, position and seed,
+      the save time, and the byte offset and length of its latest record.
+
+    A save appends its record, then its catalog line; a line only counts once
+    its newline is on disk, so a crash at any point leaves the previous save
+    in charge and at worst some unreferenced bytes behind. Listing slots reads
+    the catalog alone and loading parses only the chosen record.
+
+    Both files are compacted in the background of normal saves: the catalog is
+    rewritten as one line per slot once superseded lines outnumber live ones,
+    and the data file is rewritten under a new name once overwritten records
+    take COMPACT_MIN_GARBAGE bytes and outweigh the live ones.
+    """
+
+    def __init__(self, save_dir: Optional[str] = None):
+        self.save_dir = save_dir or SAVE_DIR
+        self.catalog_path = catalog_path(self.save_dir)
+        os.makedirs(self.save_dir, exist_ok=True)
+        self.slots: Dict[str, Dict[str, Any]] = {}
+        self.garbage = 0        # bytes of the data file no slot points to
+        self.live = 0           # bytes of the data file the slots point to
+        self.catalog_lines = 0  # change lines in the catalog, live or superseded
+        if os.path.exists(self.catalog_path):
+            self._read_catalog()
+        else:
+            self.data_file = "slots-1.dat"
+            self._write_catalog()  # marks the legacy import done even when there is nothing to import
+            self._import_legacy()
+
+    @property
+    def data_path(self) -> str:
+        return os.path.join(self.save_dir, self.data_file)
+
+    @profiled("save.catalog")
+    def _read_catalog(self):
+        with open(self.catalog_path, "r") as f:
+            header = json.loads(f.readline())
+            self.data_file = header["data"]
+            self.garbage = header.get("garbage", 0)
+            torn = False
+            for line in f:
+                try:
+                    change = json.loads(line) if line.endswith("\n") else None
+                except ValueError:
+                    change = None
+                if change is None:
+                    torn = True  # a crash mid-append: that change never happened
+                    continue
+                self._apply(change.pop("slot"), change or None)  # an empty change is a delete
+                self.catalog_lines += 1
+        if torn:
+            self._write_catalog()  # so the next append starts on a clean line
+
+    def _write_catalog(self):
+        # one line per slot under a fresh header; replaces the journal atomically
+        dirpath = os.path.dirname(self.catalog_path)
+        with tempfile.NamedTemporaryFile("w", dir=dirpath, delete=False) as tf:
+            tf.write(json.dumps({"data": self.data_file, "garbage": self.garbage}) + "\n")
+            for slot, entry in self.slots.items():
+                tf.write(json.dumps(dict(entry, slot=slot)) + "\n")
+            tempname = tf.name
+        shutil.move(tempname, self.catalog_path)
+        self.catalog_lines = len(self.slots)
+
+    def _apply(self, slot: str, entry: Optional[Dict[str, Any]]):
+        old = self.slots.pop(slot, None)
+        if old:
+            self.garbage += old["length"]
+            self.live -= old["length"]
+        if entry:
+            self.slots[slot] = entry
+            self.live += entry["length"]
+
+    def _log_change(self, slot: int, entry: Optional[Dict[str, Any]]):
+        self._apply(str(slot), entry)
+        with open(self.catalog_path, "a") as f:
+            f.write(json.dumps(dict(entry or {}, slot=str(slot))) + "\n")
+        self.catalog_lines += 1
+        if self.garbage >= COMPACT_MIN_GARBAGE and self.garbage >= self.live:
+            self._compact_data()
+        elif self.catalog_lines > 2 * len(self.slots) + 64:
+            self._write_catalog()
+
+    def _compact_data(self, replaced: Optional[Dict[str, bytes]] = None):
+        # copies the live records (or their replacements) into the next generation's data file
+        replaced = replaced or {}
+        old_path = self.data_path
+        generation = int(self.data_file[len("slots-"):-len(".dat")]) + 1
+        self.data_file = f"slots-{generation}.dat"
+        with open(old_path, "rb") as src, open(self.data_path, "wb") as dst:
+            for slot, entry in self.slots.items():
+                record = replaced.get(slot)
+                if record is None:
+                    src.seek(entry["offset"])
+                    record = src.read(entry["length"])
+                entry["offset"] = dst.tell()
+                entry["length"] = len(record)
+                dst.write(record)
+            self.live = dst.tell()
+        self.garbage = 0
+        self._write_catalog()  # the switch-over; until here the old file is still the live one
+        os.remove(old_path)
+
+    def _import_legacy(self):
+        for path in sorted(glob.glob(os.path.join(self.save_dir, LEGACY_SLOT_GLOB))):
+            slot = os.path.basename(path)[len("save_slot_"):-len(".json")]
+            try:
+                self.save_slot(int(slot), SAVE_SCHEMA.current(load_json(path)))
+            except (ValueError, KeyError, TypeError):  # SchemaError is a ValueError
+                print(f"Skipping unreadable legacy save {path}.")
 
     def slot_exists(self, slot: int) -> bool:
-        return os.path.exists(slot_filename(slot))
+        return str(slot) in self.slots
+
+    def list_slots(self) -> List[Tuple[int, Dict[str, Any]]]:
+        """(slot, catalog entry) for every used slot, in slot order."""
+        return sorted((int(k), v) for k, v in self.slots.items())
+
+    def free_slot(self) -> int:
+        used = self.slots
+        slot = 1
+        while str(slot) in used:
+            slot += 1
+        return slot
 
     def new_game(self, slot: int, player_name: str) -> Dict[str, Any]:
-        seed = str(uuid.uuid4())
+        seed = new_seed()
         world = World(seed=seed)
 
         # helper to create Weapon instances for starter loadout
@@ -354,39 +589,89 @@ class SaveManager:
         save_data = {
             "player": player.to_dict(),
             "world": world.to_dict(),
-            "meta": {"slot_created": slot, "seed": seed}
+            "meta": {"slot_created": slot, "seed": seed},
+            "version": SAVE_SCHEMA.version,
         }
         self.save_slot(slot, save_data)
         return save_data
 
+    @staticmethod
+    def _encode(data: Dict[str, Any]) -> bytes:
+        return (json.dumps(data, separators=(",", ":")) + "\n").encode("ascii")
+
+    def _read_record(self, slot: int) -> Optional[Dict[str, Any]]:
+        entry = self.slots.get(str(slot))
+        if entry is None:
+            return None
+        with open(self.data_path, "rb") as f:
+            f.seek(entry["offset"])
+            record = f.read(entry["length"])
+        if len(record) != entry["length"]:
+            return None  # data file truncated behind the catalog's back
+        return json.loads(record)
+
+    @profiled("save.slot")
     def save_slot(self, slot: int, data: Dict[str, Any]):
-        path = slot_filename(slot)
-        atomic_save(path, data)
-
+        record = self._encode(data)
+        with open(self.data_path, "ab") as f:
+            offset = f.tell()
+            f.write(record)
+        p = data["player"]
+        self._log_change(slot, {"name": p["name"], "level": p["level"], "pos": p["pos"], "seed": p["seed"],
+                                "time": int(time.time()), "offset": offset, "length": len(record)})
+        metrics.save_written("halo", len(record), sum(p["inventory"].values()))
+
+    @profiled("save.load_slot")
     def load_slot(self, slot: int) -> Optional[Dict[str, Any]]:
-        path = slot_filename(slot)
-        return load_json(path)
+        data = self._read_record(slot)
+        return SAVE_SCHEMA.current(data) if data is not None else None
 
     def delete_slot(self, slot: int):
-        path = slot_filename(slot)
-        if os.path.exists(path):
-            os.remove(path)
+        if str(slot) in self.slots:
+            self._log_change(slot, None)
+
+    def migrate(self, dry_run: bool = False) -> Dict[str, Any]:
+        """Validates every slot and upgrades old ones into a fresh data file (python -m rpgcommon.migrate)."""
+        replaced: Dict[str, bytes] = {}
+        problems = []
+        oldest = None
+        for slot in self.slots:
+            data = self._read_record(int(slot))
+            try:
+                if data is None:
+                    raise SchemaError("record truncated")
+                version = SAVE_SCHEMA.version_of(data)
+                if version != SAVE_SCHEMA.version:
+                    SAVE_SCHEMA.upgrade(data)
+                    oldest = version if oldest is None else min(oldest, version)
+                    replaced[slot] = self._encode(data)
+                SAVE_SCHEMA.validate(data)
+            except SchemaError as err:
+                replaced.pop(slot, None)
+                problems.append(f"slot {slot}: {err}")
+        if replaced and not dry_run:
+            self._compact_data(replaced)
+        status = "invalid" if problems else "upgraded" if replaced else "current"
+        return {"status": status, "from": oldest, "records": len(self.slots), "message": "; ".join(problems)}
 
 # -------------------------
 # Combat system (mostly unchanged; weapon use updated)
 # -------------------------
+@profiled("combat.perform_attack")
 def perform_attack(attacker_name: str, weapon: Optional[Weapon], attacker_accuracy: float, defender: Enemy) -> (str, int):
     """
     Returns (description, damage_dealt)
     - Uses weapon damage (weapon param) if provided; otherwise fallback 6
     - Crit chance base 0.05 + weapon.crit_bonus
     - Crit multiplier 1.5x (special-case Hunter handled in enemy_turn)
+    - The description is "" in quiet mode, where nothing would print it
     """
     # miss check
     roll = random.random()
     hit_threshold = attacker_accuracy
     if roll > hit_threshold:
-        return (f"{attacker_name} fires but misses!", 0)
+        emit(EV.MISS, source=attacker_name, target=defender.name)
+        return ("" if output.QUIET else f"{attacker_name} fires but misses!", 0)
 
     # Determine base damage
     base_damage = weapon.damage if weapon else 6
@@ -399,6 +684,12 @@ def perform_attack(attacker_name: str, weapon: Optional[Weapon], attacker_accura
         crit = True
         base_damage = int(base_damage * 1.5)
 
+    emit(EV.ATTACK, source=attacker_name, target=defender.name, amount=base_damage,
+         weapon=weapon.name if weapon else None)
+    if crit:
+        emit(EV.CRIT, source=attacker_name, target=defender.name, amount=base_damage)
+    if output.QUIET:
+        return ("", base_damage)
     crit_text = " Critical hit!" if crit else ""
     return (f"{attacker_name} hits {defender.name} for {base_damage} damage.{crit_text}", base_damage)
 
@@ -415,14 +706,175 @@ def throw_grenade(attacker_name: str, target_name: str, inventory: Dict[str, int
         dud_dmg = int(FRAG_DAMAGE * 0.25)
         return (f"{attacker_name} fumbles the throw; weak explosion deals {dud_dmg} damage.", dud_dmg, inventory)
 
+# -------------------------
+# Lookahead model (see rpgcommon.combatstate)
+# -------------------------
+class CombatRules(Rules):
+    """
+    run_combat() and enemy_take_turn() over CombatState cells. The player moves
+    with a/g/m/f, then the enemy answers with "shoot" or "grenade"; the default
+    enemy move rolls the ENEMY_GRENADE_CHANCE ladder like enemy_take_turn().
+    Enemy frags are unlimited (-1) unless the state says otherwise.
+    """
+    P_HP, P_SH, FRAGS, MEDKITS, E_HP, E_SH, E_FRAGS = range(HEADER, HEADER + 7)
+    size = HEADER + 7
+
+    def __init__(self, player: Player, enemy: Enemy):
+        w = player.weapons[player.current_weapon] if player.weapons else None
+        self.max_hp = player.max_hp
+        self.max_total = max(1, player.max_hp + player.max_shield)
+        self.damage = w.damage if w else 6
+        self.crit = 0.05 + (w.crit_bonus if w else 0.0)
+        self.e_total = max(1, enemy.hp + enemy.shield)
+        self.e_accuracy = enemy.accuracy * (0.9 if enemy.ai_type == "berserk" else 1.0)
+        if enemy.weapon:
+            self.e_damage, self.e_crit = enemy.weapon.damage, 0.03 + enemy.weapon.crit_bonus
+        else:
+            self.e_damage, self.e_crit = enemy.damage, 0.02
+        if enemy.weapon and enemy.weapon.name == "Fuel Rod Cannon":
+            self.e_crit_damage = min(90, int(self.e_damage * 2.25))
+        else:
+            self.e_crit_damage = int(self.e_damage * 1.5)
+        self.grenade_prob = ENEMY_GRENADE_CHANCE.get(enemy.ai_type, ENEMY_GRENADE_CHANCE["coward"]) if enemy.has_grenades else 0.0
+        self.enemy_moves = ("shoot", "grenade") if enemy.has_grenades else ("shoot",)
+
+    def actions(self, state):
+        c = state.cells
+        if c[SIDE] == ENEMY:
+            return self.enemy_moves if c[self.E_FRAGS] else ("shoot",)
+        moves = ["a"]
+        if c[self.FRAGS] > 0:
+            moves.append("g")
+        if c[self.MEDKITS] > 0 and c[self.P_HP] < self.max_hp:
+            moves.append("m")
+        moves.append("f")
+        return tuple(moves)
+
+    def default(self, state):
+        if state.cells[SIDE] == ENEMY:
+            return "grenade" if state.cells[self.E_FRAGS] and state.random() < self.grenade_prob else "shoot"
+        return "a"
+
+    def apply(self, state, action):
+        c = state.writable()
+        if c[SIDE] == ENEMY:
+            if action == "grenade" and c[self.E_FRAGS]:
+                if c[self.E_FRAGS] > 0:
+                    c[self.E_FRAGS] -= 1
+                self._frag(c, self.P_HP, self.P_SH, FRAG_DAMAGE)
+            elif state.random() < self.e_accuracy:
+                dmg = self.e_crit_damage if state.random() < self.e_crit else self.e_damage
+                self._hit(c, self.P_HP, self.P_SH, dmg)
+            c[SIDE] = PLAYER
+            if c[self.P_HP] <= 0:
+                c[STATUS] = LOST
+            return
+        c[TURN] += 1
+        if action == "a":
+            if state.random() <= PLAYER_ACCURACY:
+                self._hit(c, self.E_HP, self.E_SH, int(self.damage * 1.5) if state.random() < self.crit else self.damage)
+        elif action == "g" and c[self.FRAGS] > 0:
+            c[self.FRAGS] -= 1
+            self._frag(c, self.E_HP, self.E_SH, FRAG_DAMAGE if state.random() < 0.9 else int(FRAG_DAMAGE * 0.25))
+        elif action == "m" and c[self.MEDKITS] > 0:
+            c[self.MEDKITS] -= 1
+            c[self.P_HP] = min(self.max_hp, c[self.P_HP] + MEDKIT_HEAL)
+        elif action == "f" and state.random() < 0.5:
+            c[STATUS] = FLED
+            return
+        if c[self.E_HP] <= 0:
+            c[STATUS] = WON
+        else:
+            c[SIDE] = ENEMY
+
+    @staticmethod
+    def _hit(c, hp, sh, dmg):
+        absorbed = min(c[sh], dmg)
+        c[sh] -= absorbed
+        c[hp] = max(0, c[hp] - (dmg - absorbed))
+
+    @staticmethod
+    def _frag(c, hp, sh, raw):
+        absorbed = min(c[sh], int(raw * (1 - FRAG_SHIELD_PENETRATION)))
+        c[sh] -= absorbed
+        c[hp] = max(0, c[hp] - (raw - absorbed))
+
+    def value(self, state):
+        c = state.cells
+        return self.outlook(c[STATUS], (c[self.P_HP] + c[self.P_SH]) / self.max_total,
+                            (c[self.E_HP] + c[self.E_SH]) / self.e_total)
+
+
+    def state(self, player: Player, enemy: Enemy, side: int = PLAYER, turn: int = 0, enemy_frags: int = -1,
+              seed: Optional[int] = None) -> CombatState:
+        return self.new_state([ONGOING, side, 0, turn, player.hp, player.shield, player.inventory.get("frag_grenade", 0),
+                               player.inventory.get("medkit", 0), enemy.hp, enemy.shield, enemy_frags], seed)
+
+
+def lookahead_state(player: Player, enemy: Enemy, seed: Optional[int] = None) -> CombatState:
+    """A searchable copy of a one-on-one fight, player to move."""
+    return CombatRules(player, enemy).state(player, enemy, seed=seed)
+
+# -------------------------
+# Adaptive difficulty (see rpgcommon.difficulty)
+# -------------------------
+TUNE_AHEAD = 3  # upcoming encounters queued for the tuner
+SIM_HP = 10 ** 6  # the tuning model plays with no HP cap and counts the damage taken
+
+
+def build_key(player: Player) -> Tuple:
+    w = player.weapons[player.current_weapon] if player.weapons else None
+    return (player.max_hp, player.max_shield, w.damage if w else 6, w.crit_bonus if w else 0.0)
+
+
+def enemy_key(enemy: Enemy) -> Tuple:
+    w = enemy.weapon
+    return (enemy.name, enemy.hp, enemy.shield, enemy.damage, enemy.accuracy, enemy.ai_type, enemy.has_grenades,
+            (w.name, w.damage, w.crit_bonus) if w else None)
+
+
+def scale_enemy(enemy: Enemy, hp_factor: float, attack_factor: float) -> Enemy:
+    """A copy with HP and shield scaled by hp_factor and its damage (weapon included) by attack_factor."""
+    weapon = replace(enemy.weapon, damage=max(1, int(enemy.weapon.damage * attack_factor))) if enemy.weapon else None
+    return replace(enemy, hp=max(1, int(enemy.hp * hp_factor)), shield=int(enemy.shield * hp_factor),
+                   damage=max(1, int(enemy.damage * attack_factor)), weapon=weapon)
+
+
+def _enemy_from_key(key: Tuple) -> Enemy:
+    name, hp, shield, damage, accuracy, ai_type, has_grenades, w = key
+    weapon = Weapon(name=w[0], damage=w[1], mag=0, ammo=0, wtype="", range=0, crit_bonus=w[2]) if w else None
+    return Enemy(name=name, hp=hp, shield=shield, damage=damage, accuracy=accuracy, ai_type=ai_type,
+                 has_grenades=has_grenades, weapon=weapon)
+
+
+def simulate_fight(rng: random.Random, build: Tuple, enemy: Enemy) -> Tuple[int, int]:
+    """CombatRules played out with plain attacks; returns (damage taken, turns)."""
+    max_hp, max_shield, damage, crit = build
+    weapon = Weapon(name="", damage=damage, mag=0, ammo=0, wtype="", range=0, crit_bonus=crit)
+    player = Player(name="", hp=SIM_HP, max_hp=SIM_HP, shield=max_shield, max_shield=max_shield, xp=0, level=1,
+                    weapons=[weapon])
+    state = CombatRules(player, enemy).state(player, enemy, seed=rng.getrandbits(64)).playout()
+    c = state.cells
+    return SIM_HP + max_shield - c[CombatRules.P_HP] - c[CombatRules.P_SH], c[TURN]
+
+
+tuner = difficulty.Tuner(simulate_fight, lambda key, hp_factor, attack_factor:
+                         scale_enemy(_enemy_from_key(key), hp_factor, attack_factor))
+
 # -------------------------
 # Simple CLI helpers
 # -------------------------
+@profiled("ui.clear_screen")
 def clear_screen():
-    os.system('cls' if os.name == 'nt' else 'clear')
+    if output.batching() or replay.playing():
+        return
+    output.clear()
 
 
 def pause(msg="Press Enter to continue..."):
+    # queued combat turns run back-to-back without waiting
+    if output.batching():
+        return
     input(msg)
 
 
@@ -435,9 +887,12 @@ class Game:
         self.player: Optional[Player] = None
         self.world: Optional[World] = None
         self.save_slot: Optional[int] = None
+        self.entry: Optional[str] = None  # "new"/"load" while in a top-level adventure (replay checkpoints)
 
     def main_menu(self):
         while True:
+            self.entry = None
+            replay.safe_point()
             clear_screen()
             print("=== HALO-TEXT-RPG (Prototype) ===")
             print("1) New Game")
@@ -458,51 +913,62 @@ class Game:
                 print("Invalid choice.")
                 pause()
 
+    def print_slots(self) -> bool:
+        # reads only the catalog, however many slots there are
+        slots = self.savemgr.list_slots()
+        for i, e in slots:
+            saved = time.strftime("%Y-%m-%d %H:%M", time.localtime(e["time"]))
+            print(f"{i}) {e['name']}  L{e['level']}  encounter {e['pos'] + 1}  saved {saved}")
+        if not slots:
+            print("(no saves)")
+        return bool(slots)
+
     def menu_new_game(self):
         clear_screen()
-        print("Choose save slot for new game (1-3). Creating a new game will overwrite that slot.")
-        for i in range(1, NUM_SLOTS + 1):
-            exists = self.savemgr.slot_exists(i)
-            print(f"{i}) Slot {i} - {'USED' if exists else 'EMPTY'}")
+        free = self.savemgr.free_slot()
+        print("Choose save slot for new game. Creating a new game in a used slot will overwrite it.")
+        self.print_slots()
         try:
-            slot = int(input("Slot: ").strip() or "1")
+            slot = int(input(f"Slot (Enter for free slot {free}): ").strip() or free)
         except ValueError:
             print("Invalid slot.")
             pause(); return
-        if slot < 1 or slot > NUM_SLOTS:
+        if slot < 1:
             print("Invalid slot.")
             pause(); return
         name = input("Enter your player name (default: 'Chief'): ").strip() or "Chief"
         save = self.savemgr.new_game(slot, name)
         print(f"New game created in slot {slot}.")
         pause()
+        self.entry = "new"
         self.load_from_save(slot, save)
 
     def menu_load_game(self):
         clear_screen()
-        print("Choose a slot to load (1-3)")
-        for i in range(1, NUM_SLOTS + 1):
-            exists = self.savemgr.slot_exists(i)
-            print(f"{i}) Slot {i} - {'USED' if exists else 'EMPTY'}")
+        print("Choose a slot to load")
+        self.print_slots()
         try:
             slot = int(input("Slot: ").strip() or "1")
         except ValueError:
             print("Invalid slot.")
             pause(); return
-        loaded = self.savemgr.load_slot(slot)
+        try:
+            loaded = self.savemgr.load_slot(slot)
+        except SchemaError as err:
+            print(f"The save in slot {slot} is damaged: {err}")
+            pause(); return
         if not loaded:
             print("No save in that slot.")
             pause(); return
+        self.entry = "load"
         self.load_from_save(slot, loaded)
         print(f"Loaded slot {slot}.")
         pause()
 
     def menu_delete_save(self):
         clear_screen()
-        print("Choose a slot to delete (1-3)")
-        for i in range(1, NUM_SLOTS + 1):
-            exists = self.savemgr.slot_exists(i)
-            print(f"{i}) Slot {i} - {'USED' if exists else 'EMPTY'}")
+        print("Choose a slot to delete")
+        self.print_slots()
         try:
             slot = int(input("Slot to delete: ").strip() or "1")
         except ValueError:
@@ -537,13 +1003,16 @@ class Game:
         if not self.save_slot or not self.player or not self.world:
             print("No game to save.")
             return
-        data = {"player": self.player.to_dict(), "world": self.world.to_dict(), "meta": {"slot": self.save_slot}}
+        data = {"player": self.player.to_dict(), "world": self.world.to_dict(), "meta": {"slot": self.save_slot},
+                "version": SAVE_SCHEMA.version}
         self.savemgr.save_slot(self.save_slot, data)
         print("Game saved.")
 
     # ---- Gameplay loop & mechanics
     def game_loop(self):
         while True:
+            if self.entry:
+                replay.safe_point()
             clear_screen()
             print(f"=== Adventure (Slot {self.save_slot}) ===")
             print(f"Player: {self.player.name}  Level: {self.player.level}  XP: {self.player.xp}")
@@ -582,6 +1051,32 @@ class Game:
                 print("Unknown action.")
                 pause()
 
+    # ---- Replay checkpoints (see rpgcommon.replay)
+    def snapshot(self) -> Dict[str, Any]:
+        if not self.entry:
+            return {"entry": None}
+        return {"entry": self.entry, "slot": self.save_slot,
+                "player": self.player.to_dict(), "world": self.world.to_dict()}
+
+    def resume(self, state: Dict[str, Any]):
+        if not state["entry"]:
+            return self.main_menu
+        self.entry = state["entry"]
+        self.save_slot = state["slot"]
+        self.player = Player.from_dict(state["player"])
+        self.world = World.from_dict(state["world"])
+
+        entry, slot = self.entry, self.save_slot
+
+        def carry_on():
+            # finish the adventure, then unwind the way menu_new_game/menu_load_game would
+            self.game_loop()
+            if entry == "load":
+                print(f"Loaded slot {slot}.")
+                pause()
+            self.main_menu()
+        return carry_on
+
     def show_inventory(self):
         clear_screen()
         print("== Inventory ==")
@@ -611,25 +1106,22 @@ class Game:
 
     def advance(self):
         idx = self.player.pos
+        if difficulty.ENABLED:
+            self.tune_ahead()
         encounter = self.world.encounters[idx]
         typ = encounter[0]
         if typ == "combat":
-            enemy: Enemy = encounter[1]
-            # If Hunter appears but player hasn't unlocked them yet, replace with non-Hunter
-            if "Hunter" in enemy.name and self.player.level < HUNTER_UNLOCK_LEVEL:
-                # pick a different enemy (non-Hunter)
-                alternative = random.choice([n for n in ENEMIES_DB.keys() if "Hunter" not in n and n != "Engineer"])
-                ed = ENEMIES_DB[alternative]
-                enemy = Enemy(name=alternative, hp=ed["hp"], shield=ed["shield"], damage=ed["damage"], accuracy=ed["accuracy"], ai_type=enemy.ai_type, has_grenades=enemy.has_grenades, weapon=choose_weapon_for_enemy(alternative))
-            # copy enemy so save file keeps deterministic world but we battle fresh instance
-            ecopy = Enemy(name=enemy.name, hp=enemy.hp, shield=enemy.shield, damage=enemy.damage, accuracy=enemy.accuracy, ai_type=enemy.ai_type, has_grenades=enemy.has_grenades, weapon=enemy.weapon)
-            self.run_combat(ecopy)
+            self.run_combat(self.tuned_copy(encounter[1]))
             # if player alive, gain small xp and continue
             if self.player.hp > 0:
                 self.player.xp += 10
                 # drop small loot sometimes
                 if random.random() < 0.35:
                     self.give_loot("ammo_pack")
+        elif typ == "squad":
+            kills = self.run_squad_combat([self.battle_copy(e) for e in encounter[1]])
+            if self.player.hp > 0:
+                self.player.xp += 10 + 2 * kills
         elif typ == "npc":
             npc: NPC = encounter[1]
             self.interact_npc(npc)
@@ -642,6 +1134,32 @@ class Game:
         # auto-save after each encounter
         self.save_game()
 
+    def battle_copy(self, enemy: Enemy) -> Enemy:
+        # If Hunter appears but player hasn't unlocked them yet, replace with non-Hunter
+        if "Hunter" in enemy.name and self.player.level < HUNTER_UNLOCK_LEVEL:
+            # pick a different enemy (non-Hunter)
+            alternative = random.choice([n for n in ENEMIES_DB.keys() if "Hunter" not in n and n != "Engineer"])
+            ed = ENEMIES_DB[alternative]
+            return Enemy(name=alternative, hp=ed["hp"], shield=ed["shield"], damage=ed["damage"], accuracy=ed["accuracy"], ai_type=enemy.ai_type, has_grenades=enemy.has_grenades, weapon=choose_weapon_for_enemy(alternative))
+        # copy enemy so save file keeps deterministic world but we battle fresh instance
+        return replace(enemy)
+
+    def tuned_copy(self, enemy: Enemy) -> Enemy:
+        """battle_copy() for a one-on-one fight; adaptive mode scales the enemy to the player's build instead."""
+        if not difficulty.ENABLED:
+            return self.battle_copy(enemy)
+        factors = tuner.factors(build_key(self.player), enemy_key(enemy), self.player.max_hp + self.player.max_shield)
+        if factors is None:
+            return self.battle_copy(enemy)  # not tuned yet: the usual fight
+        # a tuned Hunter is a fair fight at any level, so it is no longer swapped out
+        return scale_enemy(enemy, *factors)
+
+    def tune_ahead(self):
+        """Queues the next few one-on-one encounters so their factors are ready when the player gets there."""
+        upcoming = self.world.encounters[self.player.pos:self.player.pos + TUNE_AHEAD]
+        tuner.prefetch(build_key(self.player), [enemy_key(e) for typ, e in upcoming if typ == "combat"],
+                       self.player.max_hp + self.player.max_shield)
+
     def give_loot(self, item: str):
         if item == "ammo_pack":
             # legacy: ammo_pack adds ammo to current weapon if desired — but ammo isn't used.
@@ -697,179 +1215,335 @@ class Game:
         print(f"Enemy behavior: {enemy.ai_type}")
         pause("Press Enter to begin combat...")
         # simple turn-based: player then enemy until one dies
-        while enemy.is_alive() and self.player.hp > 0:
-            clear_screen()
-            # Display enemy stats + weapon
-            print(f"Enemy: {enemy.name}   HP:{enemy.hp}  SH:{enemy.shield}  AI:{enemy.ai_type}")
-            if enemy.weapon:
-                print(f"  Weapon: {enemy.weapon.name}  (DMG {enemy.weapon.damage})")
-            # Display player stats
-            print(f"You: HP:{self.player.hp}/{self.player.max_hp}  SH:{self.player.shield}/{self.player.max_shield}")
-            cw = self.player.weapons[self.player.current_weapon]
-            # No ammo display
-            print(f"Equipped: {cw.name}  (Crit +{cw.crit_bonus*100:.1f}%)")
-            print(f"Frag grenades: {self.player.inventory.get('frag_grenade', 0)}")
-            print("Actions: [A]ttack  [G]renade  [M]edkit  [F]lee  [S]tatus")
-            act = input("> ").strip().lower()
-            if act == "a":
-                # attack with current weapon (no ammo checks)
-                w = self.player.weapons[self.player.current_weapon]
-                player_accuracy = 0.75
-                desc, dmg = perform_attack(self.player.name, w, player_accuracy, enemy)
-                print(desc)
-                # apply damage: shields first
-                applied = 0
-                if enemy.shield > 0:
-                    if dmg <= enemy.shield:
-                        enemy.shield -= dmg
-                        applied = dmg
-                        dmg = 0
+        queue = CommandQueue(BATCH_VERBS, self.player.name)
+        # hard mode: grenadiers weigh grenade against rifle by searching ahead instead of rolling their ladder
+        brain = mcts.Planner(ENEMY) if mcts.HARD_MODE and enemy.has_grenades else None
+        rules = CombatRules(self.player, enemy) if brain else None
+        enemy_frags = HARD_MODE_GRENADES
+        turns = 0
+        fled = False
+        try:
+            while enemy.is_alive() and self.player.hp > 0:
+                clear_screen()
+                # Display enemy stats + weapon
+                print(f"Enemy: {enemy.name}   HP:{enemy.hp}  SH:{enemy.shield}  AI:{enemy.ai_type}")
+                if enemy.weapon:
+                    print(f"  Weapon: {enemy.weapon.name}  (DMG {enemy.weapon.damage})")
+                # Display player stats
+                print(f"You: HP:{self.player.hp}/{self.player.max_hp}  SH:{self.player.shield}/{self.player.max_shield}")
+                cw = self.player.weapons[self.player.current_weapon]
+                # No ammo display
+                print(f"Equipped: {cw.name}  (Crit +{cw.crit_bonus*100:.1f}%)")
+                print(f"Frag grenades: {self.player.inventory.get('frag_grenade', 0)}")
+                print("Actions: [A]ttack  [G]renade  [M]edkit  [F]lee  [S]tatus   (queue: 'a x5', 'g, a*3', 'a until hp<30 then m')")
+                try:
+                    act = queue.read("> ", hp=self.player.hp, max_hp=self.player.max_hp,
+                                     shield=self.player.shield, max_shield=self.player.max_shield, enemies=1)
+                except CommandError as err:
+                    print(err)
+                    pause()
+                    continue
+                if act in ("a", "g", "m", "f"):
+                    turns += 1
+                if act == "a":
+                    # attack with current weapon (no ammo checks)
+                    w = self.player.weapons[self.player.current_weapon]
+                    desc, dmg = perform_attack(self.player.name, w, PLAYER_ACCURACY, enemy)
+                    print(desc)
+                    # apply damage: shields first
+                    applied = 0
+                    if enemy.shield > 0:
+                        if dmg <= enemy.shield:
+                            enemy.shield -= dmg
+                            applied = dmg
+                            dmg = 0
+                        else:
+                            applied = enemy.shield
+                            dmg -= enemy.shield
+                            enemy.shield = 0
+                    if dmg > 0:
+                        enemy.hp = max(0, enemy.hp - dmg)
+                    if applied:
+                        emit(EV.DAMAGE_SHIELD, source=self.player.name, target=enemy.name, amount=applied)
+                    if dmg > 0:
+                        emit(EV.DAMAGE_HP, source=self.player.name, target=enemy.name, amount=dmg)
+                    pause()
+                elif act == "g":
+                    # throw grenade if player has any
+                    desc, raw_dmg, self.player.inventory = throw_grenade(self.player.name, enemy.name, self.player.inventory)
+                    print(desc)
+                    # grenade : apply shield penetration
+                    shield_dmg = int(raw_dmg * (1 - FRAG_SHIELD_PENETRATION))
+                    hp_dmg = raw_dmg - shield_dmg
+                    if raw_dmg:
+                        emit(EV.ATTACK, source=self.player.name, target=enemy.name, amount=raw_dmg, weapon="Frag Grenade")
+                    # apply shield component first (the shield_dmg portion)
+                    absorbed = 0
+                    if enemy.shield > 0:
+                        if shield_dmg <= enemy.shield:
+                            enemy.shield -= shield_dmg
+                            absorbed = shield_dmg
+                            shield_dmg = 0
+                        else:
+                            absorbed = enemy.shield
+                            shield_dmg -= enemy.shield
+                            enemy.shield = 0
+                    # any leftover small shield_dmg is converted to hp damage
+                    total_hp_damage = hp_dmg + shield_dmg
+                    if total_hp_damage > 0:
+                        enemy.hp = max(0, enemy.hp - total_hp_damage)
+                    if absorbed:
+                        emit(EV.DAMAGE_SHIELD, source=self.player.name, target=enemy.name, amount=absorbed)
+                    if total_hp_damage > 0:
+                        emit(EV.DAMAGE_HP, source=self.player.name, target=enemy.name, amount=total_hp_damage)
+                    pause()
+                elif act == "m":
+                    if self.player.inventory.get("medkit", 0) > 0:
+                        self.player.inventory["medkit"] -= 1
+                        self.player.hp = min(self.player.max_hp, self.player.hp + MEDKIT_HEAL)
+                        print("Used medkit. Restored HP.")
                     else:
-                        applied = enemy.shield
-                        dmg -= enemy.shield
-                        enemy.shield = 0
-                if dmg > 0:
-                    enemy.hp = max(0, enemy.hp - dmg)
-                pause()
-            elif act == "g":
-                # throw grenade if player has any
-                desc, raw_dmg, self.player.inventory = throw_grenade(self.player.name, enemy.name, self.player.inventory)
-                print(desc)
-                # grenade : apply shield penetration
-                shield_dmg = int(raw_dmg * (1 - FRAG_SHIELD_PENETRATION))
-                hp_dmg = raw_dmg - shield_dmg
-                # apply shield component first (the shield_dmg portion)
-                if enemy.shield > 0:
-                    if shield_dmg <= enemy.shield:
-                        enemy.shield -= shield_dmg
-                        shield_dmg = 0
+                        print("No medkits!")
+                    pause()
+                elif act == "f":
+                    chance = 0.5
+                    if random.random() < chance:
+                        print("You fled successfully.")
+                        fled = True
+                        break
                     else:
-                        shield_dmg -= enemy.shield
-                        enemy.shield = 0
-                # any leftover small shield_dmg is converted to hp damage
-                total_hp_damage = hp_dmg + shield_dmg
-                if total_hp_damage > 0:
-                    enemy.hp = max(0, enemy.hp - total_hp_damage)
-                pause()
-            elif act == "m":
-                if self.player.inventory.get("medkit", 0) > 0:
-                    self.player.inventory["medkit"] -= 1
-                    heal = 40
-                    self.player.hp = min(self.player.max_hp, self.player.hp + heal)
-                    print("Used medkit. Restored HP.")
+                        print("Failed to flee!")
+                        pause()
+                elif act == "s":
+                    pause("Status view.")
                 else:
-                    print("No medkits!")
-                pause()
-            elif act == "f":
-                chance = 0.5
-                if random.random() < chance:
-                    print("You fled successfully.")
+                    print("Unknown action.")
                     pause()
-                    return
-                else:
-                    print("Failed to flee!")
+                    continue
+
+                # enemy turn (if still alive)
+                if enemy.is_alive():
+                    move = None
+                    if brain:
+                        move = brain.choose(rules.state(self.player, enemy, ENEMY, turns, enemy_frags))
+                        if move == "grenade":
+                            enemy_frags -= 1
+                    self.enemy_take_turn(enemy, move)
                     pause()
-            elif act == "s":
-                pause("Status view.")
-            else:
-                print("Unknown action.")
-                pause()
-                continue
-
-            # enemy turn (if still alive)
-            if enemy.is_alive():
-                self.enemy_take_turn(enemy)
-                pause()
-
+        finally:
+            queue.close()
+        metrics.fight_finished("halo", turns)
+        if fled:
+            pause()
+            return
         if self.player.hp <= 0:
-            # PERMADEATH flow: delete this save slot, prompt to start again
-            print("You died. Mission failed.")
-            if self.save_slot:
-                # remove save file
-                try:
-                    self.savemgr.delete_slot(self.save_slot)
-                    print("Your save slot has been wiped (permadeath).")
-                except Exception:
-                    pass
-            # ask player whether to start a new game immediately
-            choice = input("Start a new game in this slot now? (y/n) ").strip().lower()
-            if choice == "y":
-                # prompt for name and create new game in same slot
-                name = input("Enter new player name (default: 'Chief'): ").strip() or "Chief"
-                save = self.savemgr.new_game(self.save_slot, name)
-                print("New game created. Loading...")
-                pause()
-                self.load_from_save(self.save_slot, save)
-                return
-            else:
-                print("Returning to main menu.")
-                pause()
-                return
+            self.permadeath(enemy)
+            return
 
         if not enemy.is_alive():
+            emit(EV.DEATH, source=self.player.name, target=enemy.name)
             print(f"You defeated the {enemy.name}!")
-            # reward: a small chance for weapon or medkit or grenade
-            r = random.random()
-            # Weapon drop logic: enemy may drop its own weapon (if any)
-            dropped_weapon = None
-            if enemy.weapon and r < 0.3:
-                # 30% of the time the enemy's weapon is recoverable
-                dropped_weapon = enemy.weapon
-            if r < 0.2:
-                # medkit
+            self.loot_enemy(enemy)
+            pause()
+
+    def run_squad_combat(self, squad: List[Enemy]) -> int:
+        """
+        Fights a squad SQUAD_FRONT members at a time; the most threatening reserves
+        move up as the front line falls. Turns come from an initiative scheduler and
+        the player's shots go to the top of the threat index. Returns the kill count.
+        """
+        leader = squad[0]
+        print(f"Squad contact! {leader.name} leads {len(squad) - 1} more.")
+        pause("Press Enter to begin combat...")
+        you = -1  # scheduler key for the player; enemies are keyed by their index in squad
+        scheduler = TurnScheduler()
+        front = ThreatIndex()
+        reserve = ThreatIndex()
+        for i, e in enumerate(squad):
+            reserve.update(i, enemy_threat(e))
+
+        def engage():
+            i = reserve.pop()
+            scheduler.add(i, ENEMY_SPEED.get(squad[i].name, PLAYER_SPEED))
+            front.update(i, enemy_threat(squad[i]))
+            return squad[i]
+
+        for _ in range(min(SQUAD_FRONT, len(squad))):
+            engage()
+        scheduler.add(you, PLAYER_SPEED)
+
+        def hit(i, dmg, piercing=0):
+            enemy = squad[i]
+            absorbed, dealt = apply_damage(enemy, dmg, piercing)
+            if absorbed:
+                emit(EV.DAMAGE_SHIELD, source=self.player.name, target=enemy.name, amount=absorbed)
+            if dealt:
+                emit(EV.DAMAGE_HP, source=self.player.name, target=enemy.name, amount=dealt)
+            if enemy.is_alive():
+                front.update(i, enemy_threat(enemy))
+                return False
+            emit(EV.DEATH, source=self.player.name, target=enemy.name)
+            print(f"{enemy.name} is down!")
+            front.remove(i)
+            scheduler.remove(i)
+            if len(reserve):
+                arrival = engage()
+                print(f"{arrival.name} moves up to the front!")
+                queue.cancel("reinforcements")
+            return True
+
+        queue = CommandQueue(BATCH_VERBS, self.player.name)
+        turns = kills = 0
+        killer = leader
+        fled = False
+        try:
+            while len(front) and self.player.hp > 0:
+                actor = scheduler.next()
+                if actor != you:
+                    killer = squad[actor]
+                    self.enemy_take_turn(killer)
+                    continue
+                while True:  # the player's turn; status and bad input don't spend it
+                    print(f"-- Squad: {len(front)} engaged, {len(reserve)} in reserve, {kills} down --")
+                    target = front.top()
+                    for i in sorted(front):
+                        mark = ">" if i == target else " "
+                        print(f" {mark} {squad[i].name:15s} HP:{squad[i].hp:4d}  SH:{squad[i].shield:3d}  AI:{squad[i].ai_type}")
+                    print(f"You: HP:{self.player.hp}/{self.player.max_hp}  SH:{self.player.shield}/{self.player.max_shield}"
+                          f"  Frags: {self.player.inventory.get('frag_grenade', 0)}")
+                    print("Actions: [A]ttack  [G]renade  [M]edkit  [F]lee  [S]tatus   (> marks the highest threat)")
+                    try:
+                        act = queue.read("> ", hp=self.player.hp, max_hp=self.player.max_hp, shield=self.player.shield,
+                                         max_shield=self.player.max_shield, enemies=len(front))
+                    except CommandError as err:
+                        print(err)
+                        continue
+                    if act in ("a", "g", "m", "f"):
+                        break
+                    if act != "s":
+                        print("Unknown action.")
+                turns += 1
+                enemy = squad[target]
+                if act == "a":
+                    w = self.player.weapons[self.player.current_weapon]
+                    desc, dmg = perform_attack(self.player.name, w, PLAYER_ACCURACY, enemy)
+                    print(desc)
+                    kills += hit(target, dmg)
+                elif act == "g":
+                    desc, raw_dmg, self.player.inventory = throw_grenade(self.player.name, enemy.name, self.player.inventory)
+                    print(desc)
+                    if raw_dmg:
+                        emit(EV.ATTACK, source=self.player.name, target=enemy.name, amount=raw_dmg, weapon="Frag Grenade")
+                        piercing = raw_dmg - int(raw_dmg * (1 - FRAG_SHIELD_PENETRATION))
+                        kills += hit(target, raw_dmg, piercing)
+                elif act == "m":
+                    if self.player.inventory.get("medkit", 0) > 0:
+                        self.player.inventory["medkit"] -= 1
+                        self.player.hp = min(self.player.max_hp, self.player.hp + MEDKIT_HEAL)
+                        print("Used medkit. Restored HP.")
+                    else:
+                        print("No medkits!")
+                elif act == "f":
+                    if random.random() < 0.5:
+                        print("You break contact and fall back.")
+                        fled = True
+                        break
+                    print("Failed to flee!")
+        finally:
+            queue.close()
+        metrics.fight_finished("halo", turns)
+        if fled:
+            pause()
+            return kills
+        if self.player.hp <= 0:
+            self.permadeath(killer)
+            return kills
+        print(f"Squad eliminated! {kills} hostiles down.")
+        self.loot_enemy(leader)
+        pause()
+        return kills
+
+    def permadeath(self, killer: Enemy):
+        # PERMADEATH flow: delete this save slot, prompt to start again
+        emit(EV.DEATH, source=killer.name, target=self.player.name)
+        metrics.DEATHS.inc("halo", f"L{self.player.level}")  # no ranks in Halo; level stands in
+        print("You died. Mission failed.")
+        if self.save_slot:
+            # remove save file
+            try:
+                self.savemgr.delete_slot(self.save_slot)
+                print("Your save slot has been wiped (permadeath).")
+            except Exception:
+                pass
+        # ask player whether to start a new game immediately
+        choice = input("Start a new game in this slot now? (y/n) ").strip().lower()
+        if choice == "y":
+            # prompt for name and create new game in same slot
+            name = input("Enter new player name (default: 'Chief'): ").strip() or "Chief"
+            save = self.savemgr.new_game(self.save_slot, name)
+            print("New game created. Loading...")
+            pause()
+            self.entry = None  # nested adventure: no checkpoints until back at the menu
+            self.load_from_save(self.save_slot, save)
+        else:
+            print("Returning to main menu.")
+            pause()
+
+    def loot_enemy(self, enemy: Enemy):
+        # reward: a small chance for weapon or medkit or grenade
+        dropped_weapon = None
+        for item in ENEMY_LOOT.roll():
+            if item == "medkit":
                 self.player.inventory["medkit"] = self.player.inventory.get("medkit", 0) + 1
+                emit(EV.LOOT_DROP, source=enemy.name, target=self.player.name, amount=1, item="medkit")
                 print("Found medkit on enemy.")
-            elif r < 0.28:
-                # small chance for a random weapon (legacy behavior kept but rare)
-                drop = random.choice(list(WEAPONS_DB.keys()))
-                wd = WEAPONS_DB[drop]
-                neww = Weapon(name=drop, damage=wd["damage"], mag=wd["mag"], ammo=wd["mag"], wtype=wd["type"], range=wd["range"], crit_bonus=wd.get("crit", 0.0))
-                dropped_weapon = neww
-            elif r < 0.36:
+            elif item == "frag_grenade":
                 self.player.inventory["frag_grenade"] = self.player.inventory.get("frag_grenade", 0) + 1
+                emit(EV.LOOT_DROP, source=enemy.name, target=self.player.name, amount=1, item="frag_grenade")
                 print("Enemy dropped a frag grenade!")
+            elif item == OWN_WEAPON:
+                if enemy.weapon:
+                    # a tuned enemy's weapon is recovered at its stock damage
+                    dropped_weapon = make_weapon_by_name(enemy.weapon.name) if difficulty.ENABLED else enemy.weapon
+            else:
+                dropped_weapon = make_weapon_by_name(item)
 
-            # If there's a weapon to pick up, prompt player to replace one of their two weapons
-            if dropped_weapon:
-                print(f"The enemy dropped a weapon: {dropped_weapon.name} (DMG {dropped_weapon.damage})")
-                choice = input("Pick it up and replace one of your two weapons? (y/n) ").strip().lower()
-                if choice == "y":
-                    # show current weapons
-                    print("Your current weapons:")
-                    for idx, w in enumerate(self.player.weapons):
-                        print(f"{idx}) {w.name} (DMG {w.damage})")
-                    try:
-                        replace_idx = int(input("Select slot to replace (0 or 1): ").strip())
-                        if replace_idx not in (0, 1):
-                            print("Invalid slot. Cancelling pickup.")
-                        else:
-                            self.player.weapons[replace_idx] = dropped_weapon
-                            # ensure current_weapon index remains valid
-                            if self.player.current_weapon not in (0, 1):
-                                self.player.current_weapon = 0
-                            print(f"Replaced slot {replace_idx} with {dropped_weapon.name}.")
-                    except Exception:
-                        print("Invalid input; not picking up weapon.")
-                else:
-                    print("You leave the weapon behind.")
-            pause()
+        # If there's a weapon to pick up, prompt player to replace one of their two weapons
+        if dropped_weapon:
+            emit(EV.LOOT_DROP, source=enemy.name, target=self.player.name, amount=1, item=dropped_weapon.name)
+            print(f"The enemy dropped a weapon: {dropped_weapon.name} (DMG {dropped_weapon.damage})")
+            choice = input("Pick it up and replace one of your two weapons? (y/n) ").strip().lower()
+            if choice == "y":
+                # show current weapons
+                print("Your current weapons:")
+                for idx, w in enumerate(self.player.weapons):
+                    print(f"{idx}) {w.name} (DMG {w.damage})")
+                try:
+                    replace_idx = int(input("Select slot to replace (0 or 1): ").strip())
+                    if replace_idx not in (0, 1):
+                        print("Invalid slot. Cancelling pickup.")
+                    else:
+                        self.player.weapons[replace_idx] = dropped_weapon
+                        # ensure current_weapon index remains valid
+                        if self.player.current_weapon not in (0, 1):
+                            self.player.current_weapon = 0
+                        print(f"Replaced slot {replace_idx} with {dropped_weapon.name}.")
+                except Exception:
+                    print("Invalid input; not picking up weapon.")
+            else:
+                print("You leave the weapon behind.")
 
-    def enemy_take_turn(self, enemy: Enemy):
+    @profiled("combat.enemy_take_turn")
+    def enemy_take_turn(self, enemy: Enemy, move: Optional[str] = None):
         """
         Determines enemy action based on AI type and state.
         Now uses enemy.weapon (if present) for damage; falls back to enemy.damage.
         Hunters are handled so crits are limited to the desired cap.
+        move ("shoot" or "grenade") overrides the AI-type ladder; hard mode's planner passes it.
         """
         # Basic chance to attempt grenade (if has)
-        if enemy.has_grenades and self.player.inventory.get("frag_grenade", 0) >= 0:
-            if enemy.ai_type == "tactical":
-                grenade_prob = 0.45
-            elif enemy.ai_type == "standard":
-                grenade_prob = 0.18
-            elif enemy.ai_type == "berserk":
-                grenade_prob = 0.08
-            else:  # coward
-                grenade_prob = 0.05
+        if enemy.has_grenades:
+            grenade_prob = ENEMY_GRENADE_CHANCE.get(enemy.ai_type, ENEMY_GRENADE_CHANCE["coward"])
         else:
             grenade_prob = 0.0
 
@@ -880,21 +1554,30 @@ class Game:
                 return
 
         # grenade attempt
-        if random.random() < grenade_prob:
+        throw = move == "grenade" if move else random.random() < grenade_prob
+        if throw:
             raw_dmg = FRAG_DAMAGE
             print(f"{enemy.name} throws a frag grenade at you!")
+            emit(EV.ATTACK, source=enemy.name, target=self.player.name, amount=raw_dmg, weapon="Frag Grenade")
             shield_dmg = int(raw_dmg * (1 - FRAG_SHIELD_PENETRATION))
             hp_dmg = raw_dmg - shield_dmg
+            absorbed = 0
             if self.player.shield > 0:
                 if shield_dmg <= self.player.shield:
                     self.player.shield -= shield_dmg
+                    absorbed = shield_dmg
                     shield_dmg = 0
                 else:
+                    absorbed = self.player.shield
                     shield_dmg -= self.player.shield
                     self.player.shield = 0
             total_hp_damage = hp_dmg + shield_dmg
             if total_hp_damage > 0:
                 self.player.hp = max(0, self.player.hp - total_hp_damage)
+            if absorbed:
+                emit(EV.DAMAGE_SHIELD, source=enemy.name, target=self.player.name, amount=absorbed)
+            if total_hp_damage > 0:
+                emit(EV.DAMAGE_HP, source=enemy.name, target=self.player.name, amount=total_hp_damage)
             print(f"It explodes for {raw_dmg} total damage (after shields you take {total_hp_damage}).")
             return
 
@@ -945,19 +1628,45 @@ class Game:
                 self.player.hp = max(0, self.player.hp - to_apply)
                 applied_to_hp = to_apply
 
+            emit(EV.ATTACK, source=enemy.name, target=self.player.name, amount=dmg,
+                 weapon=enemy.weapon.name if enemy.weapon else None)
+            if crit:
+                emit(EV.CRIT, source=enemy.name, target=self.player.name, amount=dmg)
+            if applied_to_shield:
+                emit(EV.DAMAGE_SHIELD, source=enemy.name, target=self.player.name, amount=applied_to_shield)
+            if applied_to_hp:
+                emit(EV.DAMAGE_HP, source=enemy.name, target=self.player.name, amount=applied_to_hp)
+
             if crit:
                 print(f"{enemy.name} lands a CRITICAL HIT for {dmg}! (Shield absorbed {applied_to_shield}, HP damage {applied_to_hp})")
             else:
                 print(f"{enemy.name} hits you for {dmg} (Shield absorbed {applied_to_shield}, HP damage {applied_to_hp}).")
         else:
+            emit(EV.MISS, source=enemy.name, target=self.player.name)
             print(f"{enemy.name} fires but misses you.")
 
 # -------------------------
 # Entry point
 # -------------------------
+current_game: Optional[Game] = None
+
+
+def resume_session(state):
+    global current_game
+    current_game = Game()
+    return current_game.resume(state)
+
+
+replay.register("halo", files=save_files,
+                snapshot=lambda: current_game.snapshot() if current_game else None, resume=resume_session)
+
+
 def main():
-    game = Game()
-    game.main_menu()
+    global current_game
+    output.install()
+    random.seed(replay.begin())
+    current_game = Game()
+    current_game.main_menu()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Weapon x enemy tournament for balancing WEAPONS_DB and ENEMIES_DB.
+
+Every weapon in WEAPONS_DB fights every enemy class in ENEMIES_DB, once for
+each ai_type, with and without grenades, `--trials` times over. The fights use
+the game's own rules headlessly: the player fires perform_attack() every turn
+and the enemy answers with Game.enemy_take_turn(), as run_combat() plays them,
+against a fresh Spartan (new_game()'s HP and shields) and an enemy armed from
+its class's weapon pool. A fight that lasts MAX_TURNS is a loss.
+
+Matchups are spread over a process pool. Each one is seeded from the seed and
+its own name, so results do not depend on the pool or on what else was run, and
+they are kept in a summary file next to the script. A rerun only plays the
+matchups whose inputs changed: a weapon's row when its stats change, an enemy's
+column when its stats or weapon pool do, everything when the rule constants,
+--trials or --seed do. Code changes to the combat functions are not detected;
+rerun with --force after those.
+
+    python tournament.py                       # matrix: win rate and turns to kill
+    python tournament.py --pairs               # plus every two-weapon loadout
+    python tournament.py --csv matrix.csv      # every matchup, one row each
+
+A loadout pair is scored from the single-weapon results: weapons are switched
+between fights, so for each matchup the player carries the better of the two.
+"""
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+os.environ["RPG_QUIET"] = "1"  # silences the game's own prints, in the workers too
+import halo_text_rpg as halo  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE = os.path.join(HERE, "tournament.json")
+AI_TYPES = ("coward", "standard", "tactical", "berserk")
+DEFAULT_TRIALS = 500
+DEFAULT_SEED = 1337
+MAX_TURNS = 100
+PLAYER_HP = 100      # a new game's Spartan
+PLAYER_SHIELD = 50
+CACHE_VERSION = 1
+
+Matchup = Tuple[str, str, str, bool]  # (weapon, enemy, ai_type, grenades)
+
+
+# -------------------------
+# Headless fights
+# -------------------------
+class Arena(halo.Game):
+    """A Game without saves or a world: just the player enemy_take_turn() shoots at."""
+
+    def __init__(self, player: halo.Player):
+        self.player = player
+
+
+def fight(weapon: halo.Weapon, enemy: halo.Enemy) -> Tuple[bool, int]:
+    """One fight to the finish; returns (won, turns)."""
+    player = halo.Player(name="Spartan", hp=PLAYER_HP, max_hp=PLAYER_HP, shield=PLAYER_SHIELD,
+                         max_shield=PLAYER_SHIELD, xp=0, level=1, weapons=[weapon])
+    arena = Arena(player)
+    turns = 0
+    while enemy.is_alive() and player.hp > 0 and turns < MAX_TURNS:
+        turns += 1
+        _, dmg = halo.perform_attack(player.name, weapon, halo.PLAYER_ACCURACY, enemy)
+        halo.apply_damage(enemy, dmg)
+        if enemy.is_alive():
+            arena.enemy_take_turn(enemy)
+    return not enemy.is_alive(), turns
+
+
+def play(matchup: Matchup, trials: int, seed: int) -> Dict[str, int]:
+    weapon_name, enemy_name, ai_type, grenades = matchup
+    random.seed(f"{seed}:{weapon_name}:{enemy_name}:{ai_type}:{grenades}")
+    ed = halo.ENEMIES_DB[enemy_name]
+    wins = kill_turns = 0
+    for _ in range(trials):
+        enemy = halo.Enemy(name=enemy_name, hp=ed["hp"], shield=ed["shield"], damage=ed["damage"],
+                           accuracy=ed["accuracy"], ai_type=ai_type, has_grenades=grenades,
+                           weapon=halo.choose_weapon_for_enemy(enemy_name))
+        won, turns = fight(halo.make_weapon_by_name(weapon_name), enemy)
+        if won:
+            wins += 1
+            kill_turns += turns
+    return {"trials": trials, "wins": wins, "kill_turns": kill_turns}
+
+
+def play_all(task: Tuple[List[Matchup], int, int]) -> List[Dict[str, int]]:
+    """Pool entry point: one weapon against one enemy class, every variant."""
+    matchups, trials, seed = task
+    return [play(m, trials, seed) for m in matchups]
+
+
+# -------------------------
+# Summary file
+# -------------------------
+def fingerprint(*parts) -> str:
+    return hashlib.sha1(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def rules_fingerprint() -> str:
+    return fingerprint(halo.PLAYER_ACCURACY, halo.FRAG_DAMAGE, halo.FRAG_SHIELD_PENETRATION,
+                       halo.ENEMY_GRENADE_CHANCE, PLAYER_HP, PLAYER_SHIELD, MAX_TURNS)
+
+
+def enemy_fingerprint(enemy_name: str) -> str:
+    # the enemy's weapons are part of it; pools are matched the way choose_weapon_for_enemy() matches them
+    pools = {k: v for k, v in halo.ENEMY_WEAPON_POOLS.items() if k in enemy_name}
+    armory = {w: halo.WEAPONS_DB[w] for pool in pools.values() for w in pool if w in halo.WEAPONS_DB}
+    return fingerprint(halo.ENEMIES_DB[enemy_name], pools, armory)
+
+
+def cell_key(matchup: Matchup) -> str:
+    weapon, enemy, ai_type, grenades = matchup
+    return f"{weapon}|{enemy}|{ai_type}|{'grenades' if grenades else 'rifle'}"
+
+
+def load_cache(path: str) -> Dict[str, dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+        return {}
+    return data.get("cells", {})
+
+
+def save_cache(path: str, cells: Dict[str, dict]):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": CACHE_VERSION, "cells": cells}, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def run(trials: int, seed: int, jobs: int, cache_path: str, force: bool = False) -> Dict[str, dict]:
+    """Brings the summary up to date and returns its cells (matchup key -> trials/wins/kill_turns)."""
+    cells = {} if force else load_cache(cache_path)
+    rules = rules_fingerprint()
+    enemy_fps = {e: enemy_fingerprint(e) for e in halo.ENEMIES_DB}
+    tasks, fps = [], []
+    for weapon, enemy in itertools.product(halo.WEAPONS_DB, halo.ENEMIES_DB):
+        fp = fingerprint(rules, halo.WEAPONS_DB[weapon], enemy_fps[enemy], trials, seed)
+        stale = [(weapon, enemy, ai, g) for ai in AI_TYPES for g in (False, True)
+                 if cells.get(cell_key((weapon, enemy, ai, g)), {}).get("fp") != fp]
+        if stale:
+            tasks.append((stale, trials, seed))
+            fps.append(fp)
+    if tasks:
+        print(f"Playing {sum(len(t[0]) for t in tasks)} matchups x {trials} trials...", file=sys.stderr)
+        if jobs == 1:
+            results = list(map(play_all, tasks))
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                results = list(pool.map(play_all, tasks))
+        for (matchups, _, _), fp, outcome in zip(tasks, fps, results):
+            for m, o in zip(matchups, outcome):
+                cells[cell_key(m)] = dict(o, fp=fp)
+        save_cache(cache_path, cells)
+    # drop matchups whose weapon or enemy is gone from the tables
+    live = {cell_key((w, e, ai, g)) for w, e, ai, g in
+            itertools.product(halo.WEAPONS_DB, halo.ENEMIES_DB, AI_TYPES, (False, True))}
+    return {k: v for k, v in cells.items() if k in live}
+
+
+# -------------------------
+# Reports
+# -------------------------
+def summarize(results: List[dict]) -> Tuple[float, float]:
+    """(win rate, mean turns to kill) over several matchups."""
+    trials = sum(r["trials"] for r in results)
+    wins = sum(r["wins"] for r in results)
+    return wins / max(1, trials), sum(r["kill_turns"] for r in results) / max(1, wins)
+
+
+def better(a: dict, b: dict) -> dict:
+    """The result a player would rather have: more wins, then quicker kills."""
+    return max(a, b, key=lambda r: (r["wins"], -r["kill_turns"] / max(1, r["wins"])))
+
+
+def loadouts(pairs: bool) -> List[Tuple[str, ...]]:
+    rows = [(w,) for w in halo.WEAPONS_DB]
+    if pairs:
+        rows += list(itertools.combinations(halo.WEAPONS_DB, 2))
+    return rows
+
+
+def matchup_results(cells: Dict[str, dict], loadout: Tuple[str, ...], enemy: str) -> List[dict]:
+    found = []
+    for ai, g in itertools.product(AI_TYPES, (False, True)):
+        options = [cells[cell_key((w, enemy, ai, g))] for w in loadout]
+        best = options[0]
+        for option in options[1:]:
+            best = better(best, option)
+        found.append(best)
+    return found
+
+
+def print_matrix(cells: Dict[str, dict], pairs: bool):
+    enemies = list(halo.ENEMIES_DB)
+    rows = loadouts(pairs)
+    label = max(len(" + ".join(r)) for r in rows)
+    width = max(11, max(len(e) for e in enemies))
+    print("win rate / turns to kill, over every ai_type with and without grenades")
+    print(" " * label + "".join(f"  {e:>{width}}" for e in enemies))
+    for loadout in rows:
+        line = f"{' + '.join(loadout):<{label}}"
+        for e in enemies:
+            win, ttk = summarize(matchup_results(cells, loadout, e))
+            line += f"  {f'{win:4.0%} {ttk:5.1f}' if win else '0%     -':>{width}}"
+        print(line)
+
+
+def write_csv(cells: Dict[str, dict], path: str, pairs: bool):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        out = csv.writer(f)
+        out.writerow(["loadout", "enemy", "ai_type", "grenades", "trials", "win_rate", "turns_to_kill"])
+        for loadout in loadouts(pairs):
+            for e in halo.ENEMIES_DB:
+                variants = itertools.product(AI_TYPES, (False, True))
+                for (ai, g), r in zip(variants, matchup_results(cells, loadout, e)):
+                    win, ttk = summarize([r])
+                    out.writerow([" + ".join(loadout), e, ai, int(g), r["trials"], f"{win:.4f}", f"{ttk:.2f}"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--trials", type=int, default=DEFAULT_TRIALS, help="fights per matchup")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="worker processes (1: no pool)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE, help="summary file")
+    parser.add_argument("--force", action="store_true", help="replay every matchup")
+    parser.add_argument("--pairs", action="store_true", help="add a row for every two-weapon loadout")
+    parser.add_argument("--csv", metavar="FILE", help="also write every matchup to FILE")
+    args = parser.parse_args(argv)
+    if args.trials < 1 or args.jobs < 1:
+        parser.error("--trials and --jobs must be at least 1")
+    cells = run(args.trials, args.seed, args.jobs, args.cache, args.force)
+    print_matrix(cells, args.pairs)
+    if args.csv:
+        write_csv(cells, args.csv, args.pairs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Long-horizon loot economy simulator for the Lucidus RPG.
+
+A fresh hunter plays --runs runs back to back in each content tier -- a
+dungeon at one rank (the rank picks the enemy pool and the bosses' rank) or
+one of the raids -- and every run is streamed through constant-memory
+aggregators (see rpgcommon.aggregate): how many of each item every source
+added and every sink took, and the inventory and its potions at the end of
+each run, as quantiles and as a time series. Nothing is kept per run, so a
+tier takes the same memory for a hundred runs as for a million.
+
+Runs follow the game's own code and tables: generate_dungeon(), roll_room()
+and select_enemy() for dungeons, roll_raid_room() for raids, the loot tables
+for drops. Fights are sampled from the auto-resolve model instead of played,
+and the hunter keeps to one policy: drink a potion before a fight when below
+POTION_THRESHOLD of max HP, equip raid gear that beats what is worn, keep
+everything else, and take the stat planner's pick on level-ups (STR without a
+plan).
+
+    sources   treasure rooms, raid loot, the raid bosses' exotic drop (with its
+              pity streak), armor taken off for a better piece
+    sinks     potions drunk, gear equipped, and death -- which empties the
+              inventory in combat() but not in raid_boss_combat()
+
+As the game is wired, raid rooms are fought with combat(), so raid loot never
+drops and a death there empties the inventory, and drop_loot() is never
+called. --raid-combat fights raid rooms by raid_combat()'s rules instead (note
+that it takes the loot table from player['current_raid'], which nothing sets,
+so both raids drop raid 1's loot), and --enemy-drops adds drop_loot() after
+every won dungeon fight, to see the economy those paths would make.
+
+    python economy.py                                  # every tier, 2000 runs each
+    python economy.py --tiers raid:1 raid:2 --raid-combat --runs 50000
+    python economy.py --series economy.csv             # the time series, one row per stretch of runs
+"""
+import argparse
+import copy
+import csv
+import itertools
+import os
+import random
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+os.environ["RPG_QUIET"] = "1"  # silences the game's own prints, in the workers too
+import game  # noqa: E402
+from rpgcommon import aggregate  # noqa: E402
+from rpgcommon import loot  # noqa: E402
+
+raids = game.load_raids()
+
+DEFAULT_RUNS = 2000
+DEFAULT_SEED = 1337
+POTION_THRESHOLD = 0.5      # the hunter drinks a potion before a fight below this HP fraction
+PUZZLE_SOLVE_CHANCE = 0.6   # three guesses at 1-5, none repeated
+PUZZLE_ATTEMPTS = 3         # start_raid() lets a failed puzzle through after this many
+PUZZLE_DAMAGE = 5
+QUANTILES = (0.5, 0.9, 0.99)
+XP_VALUES = {"E":5,"D":10,"C":20,"B":40,"A":80,"S":150}  # combat()'s XP per enemy rank
+FISTS = {'min_damage':5,'max_damage':10}
+
+TIERS = [f"dungeon:{rank}" for rank in game.RANKS] + [f"raid:{raid}" for raid in raids.RAIDS]
+SOURCES = ("treasure", "enemy drop", "raid loot", "exotic", "unequipped")
+SINKS = ("drunk", "equipped", "death")
+
+
+def item_name(item) -> str:
+    return item['name'] if isinstance(item, dict) else item
+
+
+# every item the loot tables can produce, in a fixed order for the reports
+ITEMS = list(dict.fromkeys(item_name(drop) for drop in itertools.chain(
+    game.TREASURE.drops, game.ENEMY_LOOT.drops, [raids.EXOTIC_BLADE],
+    *(table.drops for table in raids.RAID_LOOT_TABLES.values())) if drop is not None))
+
+
+# -----------------------------
+# Aggregation
+# -----------------------------
+class Ledger:
+    """Everything one tier's runs add up to, in constant memory."""
+
+    def __init__(self, tier: str):
+        self.tier = tier
+        self.runs = 0
+        self.deaths = 0
+        self.boss_kills = 0
+        self.exotics = 0
+        self.level = 1
+        self.flows: Counter = Counter()  # (source or sink, item name) -> count
+        self.held = {item: [aggregate.Quantile(p) for p in QUANTILES] for item in ITEMS}
+        self.inventory = aggregate.Moments()
+        self.inventory_quantiles = [aggregate.Quantile(p) for p in QUANTILES]
+        self.exotic_gap = aggregate.Moments()  # raid bosses beaten per exotic
+        self.exotic_gap_quantiles = [aggregate.Quantile(p) for p in QUANTILES]
+        self.series = {"inventory": aggregate.Series(), "potions": aggregate.Series(), "deaths": aggregate.Series()}
+
+    def record(self, hunter: "Hunter", deaths: int):
+        """Folds in the state at the end of one run."""
+        self.runs += 1
+        self.deaths += deaths
+        self.level = hunter.state['level']
+        size = hunter.size
+        self.inventory.add(size)
+        for q in self.inventory_quantiles:
+            q.add(size)
+        for item, quantiles in self.held.items():
+            for q in quantiles:
+                q.add(hunter.held[item])
+        self.series["inventory"].add(size)
+        self.series["potions"].add(sum(n for item, n in hunter.held.items() if "Health Potion" in item))
+        self.series["deaths"].add(deaths)
+
+    def exotic_found(self, gap: int):
+        self.exotics += 1
+        self.exotic_gap.add(gap)
+        for q in self.exotic_gap_quantiles:
+            q.add(gap)
+
+    def per_run(self, flow: str, item: Optional[str] = None) -> float:
+        if item is None:
+            total = sum(n for (f, _), n in self.flows.items() if f == flow)
+        else:
+            total = self.flows[flow, item]
+        return total / max(1, self.runs)
+
+
+# -----------------------------
+# Headless runs
+# -----------------------------
+class Hunter:
+    """A fresh player at one rank, played by the policy in the module docstring."""
+
+    def __init__(self, rank: str, ledger: Ledger, rng: random.Random, raid_combat: bool, enemy_drops: bool):
+        self.state = copy.deepcopy(game.DEFAULT_PLAYER)
+        self.state['rank'] = rank
+        self.ledger = ledger
+        self.rng = rng
+        self.raid_combat = raid_combat
+        self.enemy_drops = enemy_drops
+        self.held: Counter = Counter()  # the inventory, as item name -> count, so it never grows with the runs
+        self.size = 0
+        self.pity: Dict[str, int] = {}
+        self.dry = 0                    # raid bosses beaten since the last exotic
+        self.deaths = 0
+        game.player = self.state        # roll_room(), select_enemy() and combat_build_key() read it
+
+    # inventory flows
+    def gain(self, source: str, item):
+        name = item_name(item)
+        self.held[name] += 1
+        self.size += 1
+        self.ledger.flows[source, name] += 1
+
+    def take(self, sink: str, name: str):
+        self.held[name] -= 1
+        self.size -= 1
+        self.ledger.flows[sink, name] += 1
+
+    def die(self, wipe: bool):
+        self.deaths += 1
+        if wipe:
+            for name, n in self.held.items():
+                if n:
+                    self.ledger.flows["death", name] += n
+            self.held.clear()
+            self.size = 0
+        self.state['current_hp'] = self.state['max_hp']
+
+    def drink_potion(self):
+        for name, n in self.held.items():
+            if n and "Health Potion" in name:
+                self.take("drunk", name)
+                heal = int(name.split("+")[1].split()[0])
+                self.state['current_hp'] = min(self.state['max_hp'], self.state['current_hp'] + heal)
+                return
+
+    def equip_if_better(self, item: Dict[str, Any]):
+        """equip_item() for a piece of gear just gained, if it beats what is worn."""
+        state = self.state
+        if item.get('type') == "weapon":
+            worn = state['equipped_weapon'] or FISTS
+            if item['min_damage'] + item['max_damage'] > worn['min_damage'] + worn['max_damage']:
+                self.take("equipped", item['name'])
+                state['equipped_weapon'] = item
+        elif item.get('type') == "armor":
+            worn = state['equipped_armor'][item['slot']]
+            if item['defense'] > (worn['defense'] if worn else 0):
+                self.take("equipped", item['name'])
+                state['equipped_armor'][item['slot']] = item
+                if worn:
+                    self.gain("unequipped", worn)
+
+    def gain_xp(self, amount: int):
+        state = self.state
+        state['xp'] += amount
+        while state['xp'] >= state['xp_cap']:
+            state['xp'] -= state['xp_cap']
+            state['level'] += 1
+            state['xp_cap'] = game.xp_cap(state['level'])
+            state['max_hp'] += 10
+            hint = game.stat_plan.recommend(state['rank'], state['level'], state['stats'])
+            for stat, amount in game.STAT_PICKS[hint[0] if hint else "STR"].items():
+                if stat == "max_hp":
+                    state['max_hp'] += amount
+                else:
+                    state['stats'][stat] += amount
+            state['current_hp'] = state['max_hp']
+
+    def fight(self, enemies: List[Dict[str, Any]]) -> bool:
+        """One fight sampled from the auto-resolve model; True if the hunter is still standing."""
+        state = self.state
+        if state['current_hp'] < state['max_hp'] * POTION_THRESHOLD:
+            self.drink_potion()
+        if state['current_hp'] > 0:
+            dist = game.outcome_table.get(game.combat_build_key(), tuple(game.enemy_key(e) for e in enemies))
+            state['current_hp'] -= dist.sample(self.rng)[0]
+        return state['current_hp'] > 0
+
+    def win(self, enemies: List[Dict[str, Any]]):
+        for e in enemies:
+            self.gain_xp(XP_VALUES.get(e.get('rank','E'),10))
+
+    # runs
+    def dungeon(self):
+        for room in game.generate_dungeon(self.rng):
+            contents = game.roll_room(room, self.rng)
+            if room == "monster":
+                enemy = contents['enemy']
+                if not self.fight([enemy]):
+                    self.die(wipe=True)
+                    continue
+                self.win([enemy])
+                if self.enemy_drops:
+                    table = (loot.LootTable((i['item'], i['chance']) for i in enemy['loot_table'])
+                             if 'loot_table' in enemy else game.ENEMY_LOOT)
+                    for item in table.roll_n(self.rng.randint(1,3), self.rng):
+                        self.gain("enemy drop", item)
+            elif room == "treasure":
+                self.gain("treasure", contents['loot'])
+            elif room == "trap":
+                self.state['current_hp'] -= contents['damage']
+                if self.state['current_hp'] <= 0:
+                    self.die(wipe=True)  # play_room() runs an empty combat(), which does
+            elif room == "boss":
+                if not self.fight([contents['boss']]):
+                    self.die(wipe=True)
+
+    def raid(self, raid_id: int):
+        raid = raids.RAIDS[raid_id]
+        for room in range(1, raid["rooms"] + 1):
+            contents = raids.roll_raid_room(raid, room, self.rng)
+            if "boss" in contents:
+                b = contents["boss"]
+                boss = {"name": b['name'], "health": b['max_hp'], "attack_min": b['attack_min'],
+                        "attack_max": b['attack_max'], "crit": b.get('crit', raids.BOSS_CRIT)}
+                if not self.fight([boss]):
+                    self.die(wipe=False)
+                    continue
+                self.ledger.boss_kills += 1
+                self.dry += 1
+                for exotic in raids.EXOTIC_DROP.roll(self.rng, self.pity):
+                    self.gain("exotic", exotic)
+                    self.ledger.exotic_found(self.dry)
+                    self.dry = 0
+            elif "puzzle" in contents:
+                for _ in range(PUZZLE_ATTEMPTS):
+                    if self.rng.random() < PUZZLE_SOLVE_CHANCE:
+                        break
+                    self.state['current_hp'] -= PUZZLE_DAMAGE
+            else:
+                enemies = contents["enemies"]
+                if not self.fight(enemies):
+                    self.die(wipe=not self.raid_combat)
+                    continue
+                self.win(enemies)
+                if self.raid_combat:
+                    table = raids.RAID_LOOT_TABLES.get(self.state.get('current_raid',1))
+                    for item in table.roll_n(len(enemies), self.rng) if table else ():
+                        self.gain("raid loot", item)
+                        self.equip_if_better(dict(item))
+
+    def run(self, tier: str):
+        kind, _, which = tier.partition(":")
+        self.deaths = 0
+        if kind == "raid":
+            self.raid(int(which))
+        else:
+            self.dungeon()
+        self.ledger.record(self, self.deaths)
+
+
+def play_tier(task: Tuple[str, int, int, bool, bool]) -> Ledger:
+    """Pool entry point: every run of one tier."""
+    tier, runs, seed, raid_combat, enemy_drops = task
+    game.stat_plan.load()  # a missing plan means STR on every level-up
+    ledger = Ledger(tier)
+    rank = tier.partition(":")[2] if tier.startswith("dungeon:") else game.DEFAULT_PLAYER['rank']
+    hunter = Hunter(rank, ledger, random.Random(f"{seed}:{tier}"), raid_combat, enemy_drops)
+    for _ in range(runs):
+        hunter.run(tier)
+    return ledger
+
+
+# -----------------------------
+# Reports
+# -----------------------------
+def quantile_str(quantiles: List[aggregate.Quantile]) -> str:
+    return "/".join(f"{q.value():.0f}" for q in quantiles)
+
+
+def print_ledger(ledger: Ledger):
+    runs = max(1, ledger.runs)
+    print(f"\n=== {ledger.tier}: {ledger.runs} runs, level {ledger.level} at the end, "
+          f"{ledger.deaths / runs:.2f} deaths per run ===")
+    p = "/".join(f"p{q * 100:g}" for q in QUANTILES)
+    print(f"  {'item':<20} {'in/run':>8} {'out/run':>8} {'net/run':>8}   held at run end ({p})")
+    for item in ITEMS:
+        gained = sum(ledger.per_run(source, item) for source in SOURCES)
+        spent = sum(ledger.per_run(sink, item) for sink in SINKS)
+        if gained or spent:
+            print(f"  {item:<20} {gained:8.3f} {spent:8.3f} {gained - spent:+8.3f}   {quantile_str(ledger.held[item])}")
+    print("  sources per run: " + ", ".join(f"{s} {ledger.per_run(s):.3f}" for s in SOURCES if ledger.per_run(s)))
+    print("  sinks per run:   " + ", ".join(f"{s} {ledger.per_run(s):.3f}" for s in SINKS if ledger.per_run(s)))
+    inv = ledger.inventory
+    print(f"  inventory at run end: mean {inv.mean:.1f} (sd {inv.stdev:.1f}), {p} "
+          f"{quantile_str(ledger.inventory_quantiles)}, max {inv.max:.0f}")
+    rows = ledger.series["inventory"].rows()
+    stride = max(1, len(rows) // 8)
+    print("  inventory by runs:    " + ", ".join(f"{a}-{b}: {mean:.1f}" for a, b, mean in rows[::stride]))
+    if ledger.boss_kills:
+        rate = ledger.exotics / ledger.boss_kills
+        line = f"  raid bosses beaten: {ledger.boss_kills}, exotics {ledger.exotics} ({rate:.1%} of kills)"
+        if ledger.exotics:
+            line += f", kills per exotic {p} {quantile_str(ledger.exotic_gap_quantiles)}, max {ledger.exotic_gap.max:.0f}"
+        print(line)
+
+
+def write_series(ledgers: List[Ledger], path: str):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        out = csv.writer(f)
+        out.writerow(["tier", "first_run", "last_run", "inventory", "potions", "deaths_per_run"])
+        for ledger in ledgers:
+            columns = [ledger.series[name].rows() for name in ("inventory", "potions", "deaths")]
+            for (first, last, inventory), (_, _, potions), (_, _, deaths) in zip(*columns):
+                out.writerow([ledger.tier, first, last, f"{inventory:.3f}", f"{potions:.3f}", f"{deaths:.4f}"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="runs per tier")
+    parser.add_argument("--tiers", nargs="+", choices=TIERS, default=TIERS, metavar="TIER",
+                        help=f"content tiers to play (default: all of {' '.join(TIERS)})")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="worker processes (1: no pool)")
+    parser.add_argument("--raid-combat", action="store_true", help="fight raid rooms by raid_combat()'s rules")
+    parser.add_argument("--enemy-drops", action="store_true", help="drop_loot() after every won dungeon fight")
+    parser.add_argument("--series", metavar="FILE", help="also write each tier's time series to FILE (CSV)")
+    args = parser.parse_args(argv)
+    if args.runs < 1 or args.jobs < 1:
+        parser.error("--runs and --jobs must be at least 1")
+    tasks = [(tier, args.runs, args.seed, args.raid_combat, args.enemy_drops) for tier in args.tiers]
+    print(f"Playing {len(tasks)} tiers x {args.runs} runs...", file=sys.stderr)
+    if args.jobs == 1:
+        ledgers = list(map(play_tier, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=min(args.jobs, len(tasks))) as pool:
+            ledgers = list(pool.map(play_tier, tasks))
+    for ledger in ledgers:
+        print_ledger(ledger)
+    if args.series:
+        write_series(ledgers, args.series)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,33 @@
+import copy
 import random
 import json
 import os
+import sys
+from collections import deque
+
+# shared helpers live in rpgcommon/ at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rpgcommon import events
+from rpgcommon.events import EventType as EV
+from rpgcommon.autoresolve import OutcomeTable
+from rpgcommon.commands import CommandQueue, CommandError
+from rpgcommon import profiling
+from rpgcommon import metrics
+from rpgcommon import replay
+from rpgcommon import content
+from rpgcommon import dungeongraph
+from rpgcommon import checkpoint
+from rpgcommon import difficulty
+from rpgcommon import output
+from rpgcommon import statplan
+from rpgcommon import loot
+from rpgcommon.profiling import profiled
+from rpgcommon.turns import TurnScheduler
+from rpgcommon.migrate import Schema, SchemaError, require
+from rpgcommon.combatstate import Rules, HEADER, STATUS, SIDE, ACTOR, TURN, ONGOING, WON, LOST, FLED, PLAYER, ENEMY
+
+emit = events.emitter("lucidus")
+print = output.print  # a no-op in quiet mode (see rpgcommon.output)
 
 # -----------------------------
 # Terminal Colors
@@ -13,20 +40,12 @@ BLUE = "\033[94m"
 MAGENTA = "\033[95m"
 CYAN = "\033[96m"
 
-SHADOW_STONE_EFFECTS = [
-    f"{MAGENTA}Restore 30 HP{RESET}",
-    f"{MAGENTA}Gain +5 STR this fight{RESET}",
-    f"{MAGENTA}Gain +5 AGI this fight{RESET}",
-    f"{MAGENTA}Gain +5 VIT this fight{RESET}",
-    f"{MAGENTA}Double crit chance for 1 attack{RESET}",
-    f"{MAGENTA}Immediate small heal +10 HP{RESET}",
-    f"{MAGENTA}Ignore enemy defense this attack{RESET}",
-    f"{MAGENTA}Next attack guaranteed critical{RESET}",
-    f"{MAGENTA}Block next enemy attack completely{RESET}",
-    f"{MAGENTA}Gain +2 XP instantly{RESET}"
-]
-
+# -----------------------------
+# Content tables: data/*.json, compiled to data/content.bin (see rpgcommon.content)
+# -----------------------------
+CONTENT = content.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
 
+SHADOW_STONE_EFFECTS = [f"{MAGENTA}{effect}{RESET}" for effect in CONTENT["shadow_stone_effects"]]
 
 
 # -----------------------------
@@ -35,6 +54,17 @@ SHADOW_STONE_EFFECTS = [
 SAVE_FILE = "player_data.json"
 LORE_FILE = "lore.txt"
 
+# Auto-resolve: fights at or above this win chance are settled in one step
+AUTO_RESOLVE_THRESHOLD = 0.95
+
+# Words that can be queued at the combat prompt ("attack x3", "attack until hp<20 then dodge")
+BATCH_VERBS = {"attack": "attack", "dodge": "dodge", "special": "special", "run": "run"}
+
+# Initiative: a combatant gets a turn every 1/(BASE_SPEED + AGI) time units
+BASE_SPEED = 10
+ENEMY_AGI = 5      # enemies without an 'agi' entry keep pace with a fresh hunter
+HORDE_FRONT = 3    # enemies engaged at once; the rest of a horde waits in reserve
+
 # -----------------------------
 # Rank & level system
 # -----------------------------
@@ -55,35 +85,55 @@ DEFAULT_PLAYER = {
     "inventory": [],
     "equipped_weapon": None,
     "equipped_armor": {"helmet": None, "chest": None, "leggings": None, "boots": None},
-    "special_counter": 0
+    "special_counter": 0,
+    "auto_resolve": False,
+    "version": 2
 }
 
 player = {}
 
 # -----------------------------
-# Enemy definitions
+# Save schema (see rpgcommon.migrate)
+# -----------------------------
+PLAYER_FIELDS = {"name": str, "level": int, "xp": int, "xp_cap": int, "rank": str, "stats": dict, "max_hp": int,
+                 "current_hp": int, "inventory": list, "equipped_weapon": (dict, type(None)),
+                 "equipped_armor": dict, "special_counter": int, "auto_resolve": bool}
+
+def validate_player(data):
+    require(data, PLAYER_FIELDS)
+    require(data['stats'], {stat: int for stat in DEFAULT_PLAYER['stats']}, "stats.")
+    if data['rank'] not in RANKS:
+        raise SchemaError(f"rank: unknown rank {data['rank']!r}")
+    if set(data['equipped_armor']) != set(DEFAULT_PLAYER['equipped_armor']):
+        raise SchemaError(f"equipped_armor: expected slots {', '.join(DEFAULT_PLAYER['equipped_armor'])}")
+    if data['equipped_weapon'] is not None:
+        require(data['equipped_weapon'], {"name": str, "min_damage": int, "max_damage": int}, "equipped_weapon.")
+    if data.get('deep_dungeon') is not None:
+        require(data['deep_dungeon'], dungeongraph.SAVE_FIELDS, "deep_dungeon.")
+    checkpoint.validate(data)
+    loot.validate(data)
+
+SAVE_SCHEMA = Schema("lucidus", 2, validate_player)
+
+@SAVE_SCHEMA.step(1)
+def _add_missing_fields(data):
+    # fields added over time get their defaults; combat flags (temp_*, extra_turn) only ever meant one fight
+    for key, value in DEFAULT_PLAYER.items():
+        if key not in data:
+            data[key] = copy.deepcopy(value)
+    for stat, value in DEFAULT_PLAYER['stats'].items():
+        data['stats'].setdefault(stat, value)
+    for slot in DEFAULT_PLAYER['equipped_armor']:
+        data['equipped_armor'].setdefault(slot, None)
+    for key in [k for k in data if k.startswith("temp_") or k == "extra_turn"]:
+        del data[key]
+
+# -----------------------------
+# Enemy definitions (data/enemies.json, data/bosses.json)
 # -----------------------------
-ENEMIES = [
-    {"name": "Goblin", "rank": "E", "health": 15, "attack_min": 3, "attack_max": 6, "crit": 0.1},
-    {"name": "Lesser Spider", "rank": "D", "health": 18, "attack_min": 4, "attack_max": 7, "crit": 0.1},
-    {"name": "Skeleton Warrior", "rank": "C", "health": 20, "attack_min": 4, "attack_max": 8, "crit": 0.15},
-    {"name": "Orc", "rank": "B", "health": 25, "attack_min": 5, "attack_max": 10, "crit": 0.15},
-    {"name": "Troll", "rank": "A", "health": 30, "attack_min": 6, "attack_max": 12, "crit": 0.2},
-    {"name": "Wolf Pack", "rank": "D", "health": 22, "attack_min": 3, "attack_max": 6, "crit": 0.1},
-    {"name": "Dark Mage", "rank": "C", "health": 18, "attack_min": 5, "attack_max": 9, "crit": 0.15},
-    {"name": "Bandit Leader", "rank": "B", "health": 28, "attack_min": 6, "attack_max": 12, "crit": 0.2},
-    {"name": "Giant Rat", "rank": "E", "health": 12, "attack_min": 2, "attack_max": 5, "crit": 0.05},
-    {"name": "Wraith", "rank": "A", "health": 35, "attack_min": 7, "attack_max": 14, "crit": 0.25},
-    {"name": "Harpy", "rank": "C", "health": 20, "attack_min": 4, "attack_max": 8, "crit": 0.15},
-    {"name": "Dark Knight", "rank": "B", "health": 30, "attack_min": 6, "attack_max": 12, "crit": 0.2},
-    {"name": "Slime King", "rank": "D", "health": 18, "attack_min": 3, "attack_max": 7, "crit": 0.1}
-]
-
-BOSSES = [
-    {"name": "Dragon", "rank_offset": 2, "health": 100, "attack_min": 10, "attack_max": 20, "crit": 0.25},
-    {"name": "Cerberus", "rank_offset": 2, "health": 90, "attack_min": 8, "attack_max": 18, "crit": 0.2},
-    {"name": "Ancient Deity", "rank_offset": 2, "health": 120, "attack_min": 12, "attack_max": 24, "crit": 0.3}
-]
+ENEMIES = CONTENT["enemies"]
+
+BOSSES = CONTENT["bosses"]
 
 ROOM_TYPES = ["monster","treasure","trap","intermission","boss"]
 
@@ -105,16 +155,22 @@ def load_player():
     global player
     if os.path.exists(SAVE_FILE):
         with open(SAVE_FILE,"r") as f:
-            player=json.load(f)
+            data=json.load(f)
+        try:
+            player = SAVE_SCHEMA.current(data)
+        except SchemaError as err:
+            sys.exit(f"{RED}{SAVE_FILE} is damaged: {err}{RESET}")
         print(f"Loaded player data: Level {player['level']} {player['rank']} {player['name']}")
     else:
         player = DEFAULT_PLAYER.copy()
         save_player()
         print("Created new player.")
 
+@profiled("save.player")
 def save_player():
     with open(SAVE_FILE,"w") as f:
         json.dump(player,f,indent=2)
+        metrics.save_written("lucidus", f.tell(), len(player['inventory']))
     print("[Game Saved]")
 
 # -----------------------------
@@ -135,6 +191,7 @@ def level_up():
     player['xp_cap'] = xp_cap(player['level'])
     player['max_hp'] +=10
     player['current_hp'] = player['max_hp']
+    emit(EV.LEVEL_UP, target=player['name'], amount=player['level'])
     print(f"\n*** You leveled up to Level {player['level']}! ***")
     print(f"Max HP increased to {player['max_hp']}")
     choose_stat()
@@ -146,6 +203,9 @@ def choose_stat():
     print("2. Vitality (+10 HP)")
     print("3. Agility (+3% Hit/Dodge chance)")
     print("4. Critical (+3% Crit chance)")
+    hint = stat_plan.recommend(player['rank'], player['level'], player['stats'])
+    if hint:
+        print(f"{CYAN}Planner suggests {STAT_NAMES[hint[0]]} (expected clear rate at rank {player['rank']}: {hint[1]:.0%}){RESET}")
     choice = input("Enter number: ").strip()
     if choice=="1":
         player['stats']['STR']+=2
@@ -258,9 +318,333 @@ def equip_item():
     else:
         print("Unknown item type.")
 
+# -----------------------------
+# Auto-resolve (headless combat model)
+# -----------------------------
+def simulate_fight(rng, build, enemies):
+    """
+    Plays combat() with the 'attack' action every turn and no HP cap.
+    build: (STR, AGI, weapon min, weapon max, armor defense); AGI sets the hit
+    chance and the player's speed, BASE_SPEED + AGI against each enemy's
+    BASE_SPEED + ENEMY_AGI, in the order Initiative gives the turns.
+    enemies: tuple of (name, health, attack_min, attack_max, crit), all engaged
+    Returns (damage taken before the last enemy fell, player turns).
+    """
+    strength, agi, wmin, wmax, defense = build
+    hit_chance = 0.85 + agi*0.01
+    hps = [e[1] for e in enemies]
+    scheduler = TurnScheduler()
+    scheduler.add(Initiative.PLAYER, BASE_SPEED + agi)
+    for i in range(len(enemies)):
+        scheduler.add(i, BASE_SPEED + ENEMY_AGI)
+    standing = len(enemies)
+    damage_taken = 0
+    turns = 0
+    while turns < 500 and standing:
+        actor = scheduler.next()
+        if actor == Initiative.PLAYER:
+            turns += 1
+            for i, hp in enumerate(hps):
+                if hp > 0 and rng.random() < hit_chance:
+                    hps[i] = hp - (rng.randint(wmin, wmax) + strength)
+                    if hps[i] <= 0:
+                        scheduler.remove(i)
+                        standing -= 1
+        elif rng.random() < 0.8:
+            e = enemies[actor]
+            edamage = rng.randint(e[2], e[3])
+            if rng.random() < e[4]:
+                edamage *= 2
+            damage_taken += max(0, edamage - defense)
+    return damage_taken, turns
+
+outcome_table = OutcomeTable(simulate_fight)
+
+def scale_enemy_key(key, hp_factor, attack_factor):
+    name, health, attack_min, attack_max, crit = key
+    attack_min = max(1, int(attack_min * attack_factor))
+    return (name, max(1, int(health * hp_factor)), attack_min, max(attack_min, int(attack_max * attack_factor)), crit)
+
+# adaptive difficulty: solved in the background, one enemy at a time (see rpgcommon.difficulty)
+tuner = difficulty.Tuner(lambda rng, build, e: simulate_fight(rng, build, (e,)), scale_enemy_key)
+
+def combat_build_key():
+    weapon = player['equipped_weapon'] if player.get('equipped_weapon') else {'min_damage':5,'max_damage':10}
+    armor = player.get('equipped_armor') or {}
+    return (player['stats']['STR'], player['stats']['AGI'], weapon['min_damage'], weapon['max_damage'], armor.get('defense', 0))
+
+def enemy_key(e):
+    return (e['name'], e['health'], e['attack_min'], e['attack_max'], e['crit'])
+
+def auto_resolve(enemies):
+    """
+    Settles the fight in one step if the player opted in and the cached win chance
+    clears AUTO_RESOLVE_THRESHOLD. Returns the simulated turn count, 0 when the
+    fight still has to be played.
+    """
+    if not player.get('auto_resolve') or not enemies:
+        return 0
+    if len(enemies) > HORDE_FRONT:
+        return 0  # the model has everyone attack every turn; hordes are never trivial anyway
+    dist = outcome_table.get(combat_build_key(), tuple(enemy_key(e) for e in enemies))
+    if dist.win_probability(player['current_hp']) < AUTO_RESOLVE_THRESHOLD:
+        return 0
+    damage_taken, turns = dist.sample(random)
+    player['current_hp'] -= damage_taken
+    emit(EV.DAMAGE_HP, source="auto-resolve", target=player['name'], amount=damage_taken, turns=turns)
+    if player['current_hp'] > 0:
+        for e in enemies:
+            e['current_hp'] = 0
+            emit(EV.DEATH, source=player['name'], target=e['name'], auto=True)
+    print(f"{CYAN}[Auto-resolved in {turns} turns: -{damage_taken} HP]{RESET}")
+    return turns
+
+# -----------------------------
+# Initiative
+# -----------------------------
+class Initiative:
+    """
+    Turn order for one fight. The player and the engaged enemies sit on a
+    TurnScheduler; up to HORDE_FRONT enemies are engaged and the rest wait in
+    reserve, moving up as the front falls. Every turn, kill and victory check
+    costs the same whether the room holds three enemies or three hundred.
+    With equal speeds the order is the old one: the player, then each enemy.
+    """
+    PLAYER = "player"
+
+    def __init__(self, enemies):
+        self.enemies = enemies
+        self.scheduler = TurnScheduler()
+        self.player_speed = BASE_SPEED + player['stats']['AGI']
+        self.scheduler.add(self.PLAYER, self.player_speed)
+        self.engaged = {}  # index -> enemy, in the order they engaged
+        self.reserve = deque(i for i, e in enumerate(enemies) if e['current_hp'] > 0)
+        self.reserve_hp = sum(enemies[i]['current_hp'] for i in self.reserve)
+        while self.reserve and len(self.engaged) < HORDE_FRONT:
+            self._engage()
+
+    def _engage(self):
+        i = self.reserve.popleft()
+        e = self.enemies[i]
+        self.reserve_hp -= e['current_hp']
+        self.engaged[i] = e
+        self.scheduler.add(i, BASE_SPEED + e.get('agi', ENEMY_AGI))
+        return e
+
+    def next(self):
+        """Returns PLAYER or the index of the enemy whose turn it is."""
+        return self.scheduler.next()
+
+    def targets(self):
+        return list(self.engaged.items())
+
+    def killed(self, i):
+        """Drops a fallen enemy; returns the reserve that moves up to replace it, if any."""
+        del self.engaged[i]
+        self.scheduler.remove(i)
+        if self.reserve:
+            return self._engage()
+        return None
+
+    def refresh_player(self):
+        # Shadow Stones can raise AGI mid-fight
+        speed = BASE_SPEED + player['stats']['AGI']
+        if speed != self.player_speed:
+            self.player_speed = speed
+            self.scheduler.add(self.PLAYER, speed)
+
+    @property
+    def alive(self):
+        return len(self.engaged) + len(self.reserve)
+
+# -----------------------------
+# Lookahead model (see rpgcommon.combatstate)
+# -----------------------------
+class CombatRules(Rules):
+    """
+    combat() over CombatState cells. Up to `front` enemies hold a slot of
+    (enemy, hp, next turn time); the reserve is just the index of the next enemy
+    to step up, since waiting enemies are still at full health. Turn order
+    follows the same initiative clocks as Initiative, ties going to the player
+    and then to the lower slot. 'use item' drinks the strongest potion left;
+    Shadow Stones are random and are left out of the model.
+    """
+    P_HP, DODGE, SPECIAL, DOUBLE_CRIT, GUARANTEED_CRIT, POTIONS_USED, RESERVE, NOW, P_NEXT = range(HEADER, HEADER + 9)
+    SLOTS = HEADER + 9
+    SLOT = 3  # cells per front slot: enemy index (-1 if empty), hp, next turn time
+
+    def __init__(self, enemies, boss=False, front=HORDE_FRONT, potions=()):
+        weapon = player['equipped_weapon'] if player.get('equipped_weapon') else {'min_damage':5,'max_damage':10}
+        armor = player.get('equipped_armor') or {}
+        self.strength = player['stats']['STR']
+        self.hit = 0.85 + player['stats']['AGI']*0.01
+        self.dodge = 0.5 + player['stats']['AGI']*0.01
+        self.wmin, self.wmax = weapon['min_damage'], weapon['max_damage']
+        self.defense = armor.get('defense', 0)
+        self.max_hp = player['max_hp']
+        self.delay = 1.0 / (BASE_SPEED + player['stats']['AGI'])
+        self.boss = boss
+        self.front = front
+        self.potions = tuple(sorted(potions, reverse=True))
+        # (hp, attack_min, attack_max, crit, turn delay) for every enemy still standing, in arrival order
+        self.enemies = tuple((e['current_hp'], e['attack_min'], e['attack_max'], e['crit'],
+                              1.0 / (BASE_SPEED + e.get('agi', ENEMY_AGI))) for e in enemies)
+        self.reserve_hp = [0] * (len(self.enemies) + 1)  # health still waiting from index i on
+        for i in range(len(self.enemies) - 1, -1, -1):
+            self.reserve_hp[i] = self.reserve_hp[i + 1] + self.enemies[i][0]
+        self.total_hp = max(1, self.reserve_hp[0])
+        self.size = self.SLOTS + self.SLOT * front
+
+    def initial(self, seed=None):
+        c = [ONGOING, PLAYER, 0, 0, player['current_hp'], int(player.get('temp_dodge', False)),
+             player.get('special_counter', 0), int(player.get('temp_double_crit', False)),
+             int(player.get('temp_guaranteed_crit', False)), 0, 0, 0.0, self.delay] + [-1, 0, 0.0] * self.front
+        for s in range(self.front):
+            self._engage(c, self.SLOTS + s*self.SLOT)
+        state = self.new_state(c, seed)
+        self._advance(c)
+        return state
+
+    def _engage(self, c, slot):
+        i = c[self.RESERVE]
+        if i >= len(self.enemies):
+            return
+        c[self.RESERVE] = i + 1
+        c[slot] = i
+        c[slot+1] = self.enemies[i][0]
+        c[slot+2] = c[self.NOW] + self.enemies[i][4]
+
+    def _advance(self, c):
+        """Hands the turn to whoever's clock is lowest and moves that clock on."""
+        best, t = self.P_NEXT, c[self.P_NEXT]
+        for slot in range(self.SLOTS, self.size, self.SLOT):
+            if c[slot] >= 0 and c[slot+2] < t:
+                best, t = slot + 2, c[slot+2]
+        c[self.NOW] = t
+        if best == self.P_NEXT:
+            c[SIDE], c[ACTOR] = PLAYER, 0
+            c[best] = t + self.delay
+        else:
+            c[SIDE], c[ACTOR] = ENEMY, best - 2
+            c[best] = t + self.enemies[c[best-2]][4]
+
+    def actions(self, state):
+        c = state.cells
+        if c[SIDE] == ENEMY:
+            return ("attack",)
+        moves = ["attack", "dodge"]
+        if c[self.SPECIAL] >= 3 or self.boss:
+            moves.append("special")
+        if c[self.POTIONS_USED] < len(self.potions) and c[self.P_HP] < self.max_hp:
+            moves.append("use item")
+        if not self.boss:
+            moves.append("run")
+        return tuple(moves)
+
+    def apply(self, state, action):
+        c = state.writable()
+        if c[SIDE] == ENEMY:
+            self._enemy_attack(state, c, self.enemies[c[c[ACTOR]]])
+            if c[self.P_HP] <= 0:
+                c[STATUS] = LOST
+                return
+        else:
+            c[TURN] += 1
+            if action == "attack" or (action == "special" and (c[self.SPECIAL] >= 3 or self.boss)):
+                special = action == "special"
+                for slot in [s for s in range(self.SLOTS, self.size, self.SLOT) if c[s] >= 0]:
+                    if special:
+                        damage = state.randint(10+self.strength, 20+self.strength)
+                    elif state.random() < self.hit:
+                        damage = state.randint(self.wmin, self.wmax) + self.strength
+                        if c[self.DOUBLE_CRIT] and state.random() < 0.2:
+                            damage *= 2
+                        if c[self.GUARANTEED_CRIT]:
+                            damage *= 2
+                            c[self.GUARANTEED_CRIT] = 0
+                    else:
+                        continue
+                    c[slot+1] -= damage
+                    if c[slot+1] <= 0:
+                        c[slot] = -1
+                        self._engage(c, slot)
+                if special and not self.boss:
+                    c[self.SPECIAL] = 0
+                if c[self.RESERVE] >= len(self.enemies) and all(c[s] < 0 for s in range(self.SLOTS, self.size, self.SLOT)):
+                    c[STATUS] = WON
+                    return
+            elif action == "dodge":
+                c[self.DODGE] = 1
+            elif action == "use item":
+                if c[self.POTIONS_USED] < len(self.potions):
+                    c[self.P_HP] = min(self.max_hp, c[self.P_HP] + self.potions[c[self.POTIONS_USED]])
+                    c[self.POTIONS_USED] += 1
+            elif action == "run" and not self.boss and state.random() < 0.5:
+                c[STATUS] = FLED
+                return
+        self._advance(c)
+
+    def _enemy_attack(self, state, c, e):
+        # enemy_attack(): a successful dodge keeps the stance up, a failed one drops it
+        if state.random() >= 0.8:
+            return
+        if c[self.DODGE]:
+            if state.random() < self.dodge:
+                return
+            c[self.DODGE] = 0
+        edamage = state.randint(e[1], e[2])
+        if state.random() < e[3]:
+            edamage *= 2
+        c[self.P_HP] -= max(0, edamage - self.defense)
+
+    def value(self, state):
+        c = state.cells
+        foes = self.reserve_hp[c[self.RESERVE]] + sum(max(0, c[s+1]) for s in range(self.SLOTS, self.size, self.SLOT) if c[s] >= 0)
+        return self.outlook(c[STATUS], max(0, c[self.P_HP]) / self.max_hp, foes / self.total_hp)
+
+def potion_heals():
+    return [int(item.split("+")[1].split()[0]) for item in player['inventory']
+            if isinstance(item, str) and "Health Potion" in item]
+
+def lookahead_state(enemies, boss=False, seed=None):
+    """
+    A searchable copy of a fight from the current moment: enemies carry their
+    current_hp (those at 0 or below are gone), the player dict its HP and stances.
+    """
+    standing = [e for e in enemies if e.get('current_hp', e['health']) > 0]
+    standing = [dict(e, current_hp=e.get('current_hp', e['health'])) for e in standing]
+    return CombatRules(standing, boss, potions=potion_heals()).initial(seed)
+
 # -----------------------------
 # Combat
 # -----------------------------
+@profiled("combat.enemy_turn")
+def enemy_attack(e):
+    if random.random() < 0.8:
+        if player.get('temp_dodge', False):
+            if random.random() < 0.5 + player['stats']['AGI']*0.01:
+                emit(EV.DODGE, source=e['name'], target=player['name'])
+                print(f"{CYAN}You dodged {e['name']}'s attack!{RESET}")
+                return
+            player['temp_dodge'] = False
+        edamage = random.randint(e['attack_min'], e['attack_max'])
+        crit = random.random() < e['crit']
+        if crit:
+            edamage *= 2
+            print(f"{RED}{e['name']} CRITICAL HIT!{RESET}")
+        if player.get('equipped_armor'):
+            armor = player['equipped_armor']
+            edamage = max(0, edamage - armor.get('defense', 0))
+        player['current_hp'] -= edamage
+        emit(EV.ATTACK, source=e['name'], target=player['name'], amount=edamage)
+        if crit:
+            emit(EV.CRIT, source=e['name'], target=player['name'], amount=edamage)
+        emit(EV.DAMAGE_HP, source=e['name'], target=player['name'], amount=edamage)
+        print(f"{RED}{e['name']} hits you for {edamage} damage!{RESET}")
+    else:
+        emit(EV.MISS, source=e['name'], target=player['name'])
+        print(f"{CYAN}{e['name']} missed!{RESET}")
+
 def combat(enemies, boss=False):
     if not isinstance(enemies, list):
         enemies = [enemies]
@@ -274,102 +658,129 @@ def combat(enemies, boss=False):
 
     print()
     for idx, e in enumerate(enemies, 1):
+        e['current_hp'] = e['health']
+        if idx > HORDE_FRONT:
+            continue
         rank = e.get('rank', 'E')  # default if missing
         print(f"{YELLOW}Enemy {idx} approaches!{RESET}")
         print(f"{RED}!!! ({rank}) {e['name']} appears !!!{RESET}\n")
-        e['current_hp'] = e['health']
-
-    while any(e['current_hp'] > 0 for e in enemies) and player['current_hp'] > 0:
-        weapon_name = player['equipped_weapon']['name'] if player.get('equipped_weapon') else "None"
-        print(f"{CYAN}Your HP: {player['current_hp']} | Weapon: {weapon_name}{RESET}")
+    if len(enemies) > HORDE_FRONT:
+        print(f"{RED}!!! ...and {len(enemies) - HORDE_FRONT} more behind them !!!{RESET}\n")
 
-        for idx, e in enumerate(enemies, 1):
-            if e['current_hp'] > 0:
-                print(f"{RED}{e['name']} HP: {e['current_hp']}{RESET}")
-
-        action = input(f"{YELLOW}Actions: [attack] [use item] [dodge] [special] [run]\nChoose action: {RESET}").strip().lower()
-
-        if action not in ["attack","use item","dodge","special","run"]:
-            print(f"{RED}Invalid input. Try again.{RESET}")
-            continue  # does not consume a turn
+    turns = 0
+    if not boss:
+        turns = auto_resolve(enemies)
+
+    initiative = Initiative(enemies)
+    commands = CommandQueue(BATCH_VERBS, player['name'])
+    try:
+        while initiative.alive and player['current_hp'] > 0:
+            actor = initiative.next()
+            if actor != Initiative.PLAYER:
+                enemy_attack(enemies[actor])
+                continue
 
-        # Player attacks
-        if action == "attack":
-            for e in enemies:
-                if e['current_hp'] <= 0:
+            while True:  # the player's turn; invalid input does not consume it
+                weapon_name = player['equipped_weapon']['name'] if player.get('equipped_weapon') else "None"
+                print(f"{CYAN}Your HP: {player['current_hp']} | Weapon: {weapon_name}{RESET}")
+                for _, e in initiative.targets():
+                    print(f"{RED}{e['name']} HP: {e['current_hp']}{RESET}")
+                if initiative.reserve:
+                    print(f"{RED}...and {len(initiative.reserve)} more waiting ({initiative.reserve_hp} HP){RESET}")
+
+                try:
+                    action = commands.read(f"{YELLOW}Actions: [attack] [use item] [dodge] [special] [run] (queue: attack x3)\nChoose action: {RESET}",
+                                           hp=player['current_hp'], max_hp=player['max_hp'], enemies=initiative.alive)
+                except CommandError as err:
+                    print(f"{RED}{err}{RESET}")
                     continue
-                hit_chance = 0.85 + player['stats']['AGI']*0.01
-                if random.random() < hit_chance:
-                    weapon = player['equipped_weapon'] if player.get('equipped_weapon') else {'min_damage':5,'max_damage':10}
-                    damage = random.randint(weapon['min_damage'], weapon['max_damage']) + player['stats']['STR']
-
-                    # Apply Shadow Stone effects
-                    if player.get('temp_double_crit', False) and random.random() < 0.2:
-                        damage *= 2
-                        print(f"{MAGENTA}Shadow Stone Effect: Double Crit!{RESET}")
-                    if player.get('temp_guaranteed_crit', False):
-                        damage *= 2
-                        print(f"{MAGENTA}Shadow Stone Effect: Guaranteed Crit!{RESET}")
-                        player['temp_guaranteed_crit'] = False  # one-time
-
-                    e['current_hp'] -= damage
-                    print(f"{GREEN}You dealt {damage} damage to {e['name']}.{RESET}")
-                else:
-                    print(f"{RED}You missed!{RESET}")
-
-        elif action == "use item":
-            use_item()
-
-        elif action == "dodge":
-            print(f"{YELLOW}You prepare to dodge the next attack!{RESET}")
-            player['temp_dodge'] = True
-
-        elif action == "special":
-            if player.get('special_counter', 0) >= 3 or boss:
-                print(f"{CYAN}You unleash your special ability!{RESET}")
-                for e in enemies:
-                    if e['current_hp'] <= 0:
-                        continue
-                    damage = random.randint(10+player['stats']['STR'], 20+player['stats']['STR'])
-                    e['current_hp'] -= damage
-                    print(f"{GREEN}Special hits {e['name']} for {damage} damage!{RESET}")
-                if not boss:
-                    player['special_counter'] = 0
-            else:
-                print(f"{RED}Special not ready. {3 - player.get('special_counter',0)} more normal fights needed.{RESET}")
-
-        elif action == "run":
-            if boss:
-                print(f"{RED}Cannot run from a boss!{RESET}")
-            elif random.random() < 0.5:
-                print(f"{CYAN}You successfully escaped!{RESET}")
-                return
-            else:
-                print(f"{RED}Failed to escape!{RESET}")
 
-        # Enemy turn
-        for e in enemies:
-            if e['current_hp'] <= 0:
-                continue
-            if random.random() < 0.8:
-                if player.get('temp_dodge', False):
-                    if random.random() < 0.5 + player['stats']['AGI']*0.01:
-                        print(f"{CYAN}You dodged {e['name']}'s attack!{RESET}")
-                        continue
-                    player['temp_dodge'] = False
-                edamage = random.randint(e['attack_min'], e['attack_max'])
-                if random.random() < e['crit']:
-                    edamage *= 2
-                    print(f"{RED}{e['name']} CRITICAL HIT!{RESET}")
-                if player.get('equipped_armor'):
-                    armor = player['equipped_armor']
-                    edamage = max(0, edamage - armor.get('defense', 0))
-                player['current_hp'] -= edamage
-                print(f"{RED}{e['name']} hits you for {edamage} damage!{RESET}")
-            else:
-                print(f"{CYAN}{e['name']} missed!{RESET}")
+                if action in ["attack","use item","dodge","special","run"]:
+                    break
+                print(f"{RED}Invalid input. Try again.{RESET}")
+            turn_t0 = profiling.start()
+            turns += 1
+
+            def fell(i, e):
+                emit(EV.DEATH, source=player['name'], target=e['name'])
+                arrival = initiative.killed(i)
+                if arrival:
+                    print(f"{YELLOW}{arrival['name']} steps up to fight!{RESET}")
+                    commands.cancel("reinforcements")
+
+            # Player attacks
+            if action == "attack":
+                for i, e in initiative.targets():
+                    hit_chance = 0.85 + player['stats']['AGI']*0.01
+                    if random.random() < hit_chance:
+                        weapon = player['equipped_weapon'] if player.get('equipped_weapon') else {'min_damage':5,'max_damage':10}
+                        damage = random.randint(weapon['min_damage'], weapon['max_damage']) + player['stats']['STR']
+
+                        # Apply Shadow Stone effects
+                        crit = False
+                        if player.get('temp_double_crit', False) and random.random() < 0.2:
+                            damage *= 2
+                            crit = True
+                            print(f"{MAGENTA}Shadow Stone Effect: Double Crit!{RESET}")
+                        if player.get('temp_guaranteed_crit', False):
+                            damage *= 2
+                            crit = True
+                            print(f"{MAGENTA}Shadow Stone Effect: Guaranteed Crit!{RESET}")
+                            player['temp_guaranteed_crit'] = False  # one-time
+
+                        e['current_hp'] -= damage
+                        emit(EV.ATTACK, source=player['name'], target=e['name'], amount=damage)
+                        if crit:
+                            emit(EV.CRIT, source=player['name'], target=e['name'], amount=damage)
+                        emit(EV.DAMAGE_HP, source=player['name'], target=e['name'], amount=damage)
+                        print(f"{GREEN}You dealt {damage} damage to {e['name']}.{RESET}")
+                        if e['current_hp'] <= 0:
+                            fell(i, e)
+                    else:
+                        emit(EV.MISS, source=player['name'], target=e['name'])
+                        print(f"{RED}You missed!{RESET}")
+
+            elif action == "use item":
+                use_item()
+                initiative.refresh_player()
+
+            elif action == "dodge":
+                print(f"{YELLOW}You prepare to dodge the next attack!{RESET}")
+                player['temp_dodge'] = True
+
+            elif action == "special":
+                if player.get('special_counter', 0) >= 3 or boss:
+                    print(f"{CYAN}You unleash your special ability!{RESET}")
+                    for i, e in initiative.targets():
+                        damage = random.randint(10+player['stats']['STR'], 20+player['stats']['STR'])
+                        e['current_hp'] -= damage
+                        emit(EV.ATTACK, source=player['name'], target=e['name'], amount=damage, special=True)
+                        emit(EV.DAMAGE_HP, source=player['name'], target=e['name'], amount=damage)
+                        print(f"{GREEN}Special hits {e['name']} for {damage} damage!{RESET}")
+                        if e['current_hp'] <= 0:
+                            fell(i, e)
+                    if not boss:
+                        player['special_counter'] = 0
+                else:
+                    print(f"{RED}Special not ready. {3 - player.get('special_counter',0)} more normal fights needed.{RESET}")
+
+            elif action == "run":
+                if boss:
+                    print(f"{RED}Cannot run from a boss!{RESET}")
+                elif random.random() < 0.5:
+                    print(f"{CYAN}You successfully escaped!{RESET}")
+                    metrics.fight_finished("lucidus", turns)
+                    return
+                else:
+                    print(f"{RED}Failed to escape!{RESET}")
+            profiling.stop("combat.turn", turn_t0)
+    finally:
+        commands.close()
 
+    metrics.fight_finished("lucidus", turns)
     if player['current_hp'] <= 0:
+        emit(EV.DEATH, target=player['name'], inventory_lost=len(player['inventory']))
+        metrics.DEATHS.inc("lucidus", player['rank'])
         print(f"{RED}You died...{RESET}")
         player['inventory'] = []
         player['current_hp'] = player['max_hp']
@@ -397,12 +808,12 @@ def combat(enemies, boss=False):
 # -----------------------------
 # Dungeon generation
 # -----------------------------
-def generate_dungeon():
-    num_rooms = random.randint(5,15)
+def generate_dungeon(rng=random):
+    num_rooms = rng.randint(5,15)
     dungeon = []
     boss_inserted = False
     for _ in range(num_rooms):
-        room_type = random.choices(
+        room_type = rng.choices(
             ROOM_TYPES,
             weights=[0.55,0.2,0.1,0.1,0.05], k=1
         )[0]
@@ -419,17 +830,47 @@ def generate_dungeon():
 # -----------------------------
 # Select enemy
 # -----------------------------
-def select_enemy():
+ENCHANTED_CHANCE = 0.1
+
+def select_enemy(rng=random):
     possible = [e for e in ENEMIES if RANKS.index(e['rank']) <= RANKS.index(player['rank'])+2]
-    enemy=random.choice(possible)
-    if random.random()<0.1:
-        enemy=enemy.copy()
-        enemy['health']+=5
-        enemy['attack_min']+=2
-        enemy['attack_max']+=2
-        enemy['name']="Enchanted "+enemy['name']
+    enemy=rng.choice(possible)
+    if rng.random()<ENCHANTED_CHANCE:
+        enemy=enchant(enemy)
     return enemy
 
+def enchant(enemy):
+    enemy=enemy.copy()
+    enemy['health']+=5
+    enemy['attack_min']+=2
+    enemy['attack_max']+=2
+    enemy['name']="Enchanted "+enemy['name']
+    return enemy
+
+# -----------------------------
+# Stat planner (see rpgcommon.statplan)
+# -----------------------------
+STAT_PICKS = {"STR": {"STR": 2}, "VIT": {"VIT": 1, "max_hp": 10}, "AGI": {"AGI": 1}, "CRIT": {"CRIT": 1}}  # choose_stat()
+STAT_NAMES = {"STR": "Strength", "VIT": "Vitality", "AGI": "Agility", "CRIT": "Critical"}
+
+def content_tier(rank):
+    """A rank's dungeon for the planner: a monster room at select_enemy()'s odds, then the boss room."""
+    possible = [e for e in ENEMIES if RANKS.index(e['rank']) <= RANKS.index(rank)+2]
+    monsters = []
+    for e in possible:
+        monsters.append(((1-ENCHANTED_CHANCE)/len(possible), (enemy_key(e),)))
+        monsters.append((ENCHANTED_CHANCE/len(possible), (enemy_key(enchant(e)),)))
+    return [monsters, [(1/len(BOSSES), (enemy_key(b),)) for b in BOSSES]]
+
+# planned for the starting gear: combat_build_key() with no weapon or armor
+stat_plan = statplan.StatPlan(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "stat_plan.bin"),
+    simulate_fight, STAT_PICKS,
+    start=dict(DEFAULT_PLAYER['stats'], max_hp=DEFAULT_PLAYER['max_hp']),
+    build=lambda stats: (stats['STR'], stats['AGI'], 5, 10, 0),
+    tiers={rank: content_tier(rank) for rank in RANKS},
+    weight=xp_cap, level_hp=10)
+
 # -----------------------------
 # Story/Intermission rooms
 # -----------------------------
@@ -437,7 +878,7 @@ def story_room():
     if not os.path.exists(LORE_FILE):
         print(f"{CYAN}You see nothing but silence...{RESET}")
         return
-    with open(LORE_FILE,"r") as f:
+    with profiling.span("lore.read"), open(LORE_FILE,"r") as f:
         lore=f.read().split("\n\n")
     paragraph=random.choice(lore)
     print(f"{CYAN}{paragraph}{RESET}")
@@ -446,457 +887,192 @@ def story_room():
 # -----------------------------
 # Dungeon loop
 # -----------------------------
+TREASURE = loot.LootTable.uniform(["Health Potion +20","Shadow Stone"])
+
+def roll_room(room, rng=random):
+    """What a room holds, rolled before the player steps in so a checkpoint can keep it."""
+    if room=="monster":
+        enemy = select_enemy(rng)
+        return {"enemy": scale_enemy(enemy) if difficulty.ENABLED else enemy}
+    if room=="treasure":
+        return {"loot": TREASURE.draw(rng)}
+    if room=="trap":
+        return {"damage": rng.randint(5,15)}
+    if room=="boss":
+        boss_copy=rng.choice(BOSSES).copy()
+        boss_copy['rank']=RANKS[min(RANKS.index(player['rank'])+2,len(RANKS)-1)]
+        return {"boss": boss_copy}
+    return {}
+
+def play_room(room, contents=None):
+    if contents is None:
+        contents = roll_room(room)
+    if room=="monster":
+        combat(contents['enemy'])
+    elif room=="treasure":
+        item = contents['loot']
+        player['inventory'].append(item)
+        emit(EV.LOOT_DROP, source="treasure", target=player['name'], amount=1, item=item)
+        print(f"You found {item}!")
+        save_player()
+    elif room=="trap":
+        damage=contents['damage']
+        player['current_hp']-=damage
+        print(f"A trap hits you for {damage} damage!")
+        if player['current_hp']<=0:
+            combat([],boss=False)
+        save_player()
+    elif room=="intermission":
+        story_room()
+    elif room=="boss":
+        combat(contents['boss'],boss=True)
+
 def start_dungeon():
-    print(f"{CYAN}[Dungeon generated! You enter a dark corridor...]{RESET}")
-    dungeon=generate_dungeon()
+    run = checkpoint.resume(player, "dungeon")
+    if run:
+        print(f"{CYAN}[You return to room {run['room']} of the dungeon you left...]{RESET}")
+    else:
+        run = checkpoint.begin(player, "dungeon")
+        print(f"{CYAN}[Dungeon generated! You enter a dark corridor...]{RESET}")
+    if difficulty.ENABLED:
+        tune_ahead()
+    dungeon=generate_dungeon(random.Random(run['seed']))
     for room_num,room in enumerate(dungeon,1):
+        if room_num < run['room']:
+            continue
+        contents = checkpoint.pending(run, room_num) or roll_room(room, checkpoint.room_rng(run, room_num))
+        checkpoint.reach(run, room_num, contents)
+        save_player()
         print(f"\n--- Room {room_num} ---")
-        if room=="monster":
-            enemy = select_enemy()
-            combat(enemy)
-        elif room=="treasure":
-            loot = random.choice(["Health Potion +20","Shadow Stone"])
-            player['inventory'].append(loot)
-            print(f"You found {loot}!")
-            save_player()
-        elif room=="trap":
-            damage=random.randint(5,15)
-            player['current_hp']-=damage
-            print(f"A trap hits you for {damage} damage!")
-            if player['current_hp']<=0:
-                combat([],boss=False)
-            save_player()
-        elif room=="intermission":
-            story_room()
-        elif room=="boss":
-            boss=random.choice(BOSSES)
-            boss_copy=boss.copy()
-            boss_copy['rank']=RANKS[min(RANKS.index(player['rank'])+2,len(RANKS)-1)]
-            combat(boss_copy,boss=True)
+        play_room(room, contents)
+    checkpoint.finish(player, "dungeon")
+    save_player()
     print(f"{GREEN}Dungeon cleared!{RESET}")
     input("Press Enter to return to the menu...")
 
-# ========================
-# RAID SYSTEM FRAMEWORK
-# ========================
-
-import os
-import random
-
-# Raid configuration
-RAIDS = {
-    1: {
-        "name": "The Shattered Depths",
-        "rooms": 30,
-        "boss_rooms": [10, 25],
-        "lore_file": "raid1_lore.txt"
-    },
-    2: {
-        "name": "The Ashen Citadel",
-        "rooms": 40,
-        "boss_rooms": [15, 35],
-        "lore_file": "raid2_lore.txt"
-    }
-}
-
-# Function to load raid lore
-def load_raid_lore(file_path):
-    if not os.path.exists(file_path):
-        return {}
-    lore = {}
-    with open(file_path, "r") as f:
-        current_key = None
-        for line in f:
-            line = line.strip()
-            if line.startswith("##"):  # Lore section header
-                current_key = line[2:].strip()
-                lore[current_key] = []
-            elif current_key:
-                lore[current_key].append(line)
-    return {k: "\n".join(v) for k, v in lore.items()}
-
-# Generate normal raid enemies (keep dungeon enemies separate)
-def generate_raid_enemies():
-    enemy_pool = [
-        {"name": "Goblin", "health": 15, "attack_min": 3, "attack_max": 6, "crit": 0.1, "rank": "E"},
-        {"name": "Lesser Spider", "health": 12, "attack_min": 2, "attack_max": 5, "crit": 0.05, "rank": "D"},
-        {"name": "Skeleton Warrior", "health": 20, "attack_min": 4, "attack_max": 8, "crit": 0.1, "rank": "C"}
-    ]
-    num_enemies = random.randint(1, 3)
-    return [random.choice(enemy_pool).copy() for _ in range(num_enemies)]
-
-# Puzzle room system
-def puzzle_room(lore_text):
-    print(f"{MAGENTA}{lore_text}{RESET}")
-    print("Solve the puzzle to continue. (Guess the number between 1-5)")
-    number = random.randint(1,5)
-    attempts = 0
-    while True:
-        guess = input("Enter your guess: ").strip()
-        if not guess.isdigit():
-            print(f"{RED}Invalid input.{RESET}")
-            continue
-        guess = int(guess)
-        attempts += 1
-        if guess == number:
-            print(f"{GREEN}You solved the puzzle!{RESET}")
-            return True
-        else:
-            print(f"{RED}Wrong! Try again.{RESET}")
-        if attempts >= 3:
-            print(f"{RED}The puzzle overwhelms you, but you proceed cautiously.{RESET}")
-            return False
-
-# Raid boss combat system
-def raid_boss_combat(boss):
-    print(f"{RED}Boss: {boss['name']} appears!{RESET}")
-    boss['current_hp'] = boss['health']
-    damage_phase_active = False
-    damage_phase_counter = 0
-    turns_in_phase = 0
-
-    while boss['current_hp'] > 0 and player['current_hp'] > 0:
-        input(f"\nPress Enter to continue your turn against {boss['name']}...")
-
-        # Player attacks
-        weapon = player.get('equipped_weapon')
-        if not weapon:
-            print("you have no weapon equipped! You swing your fists instead.")
-            weapon = {'min_damage': 5, 'max_damage': 10, 'name': 'Fists'}
-
-        damage = random.randint(weapon['min_damage'], weapon['max_damage']) + player['stats']['STR']
-        boss['current_hp'] -= damage
-        print(f"You hit {boss['name']} for {damage} damage! Boss HP: {max(0,boss['current_hp'])}")
-
-        # Damage phase triggering
-        if not damage_phase_active and random.random() < 0.3:
-            damage_phase_active = True
-            damage_phase_counter = random.randint(2,4)
-            turns_in_phase = 0
-            print(f"{RED}{boss['name']} enters a damage phase! You must dodge attacks!{RESET}")
-
-        # Boss attacks if damage phase active
-        if damage_phase_active:
-            print(f"{RED}{boss['name']} attacks! Solve the dodge puzzle to avoid damage.{RESET}")
-            dodge_number = random.randint(1,3)
-            guess = input("Guess the correct number (1-3) to dodge: ").strip()
-            if guess.isdigit() and int(guess) == dodge_number:
-                print(f"{GREEN}You dodged the attack!{RESET}")
-            else:
-                boss_attack = random.randint(boss['attack_min'], boss['attack_max'])
-                if player.get('equipped_armor'):
-                    armor = player['equipped_armor']
-                    boss_attack = max(0, boss_attack - armor.get('defense',0))
-                player['current_hp'] -= boss_attack
-                print(f"{RED}{boss['name']} hits you for {boss_attack} damage!{RESET} HP: {player['current_hp']}")
-            turns_in_phase += 1
-            if turns_in_phase >= damage_phase_counter:
-                damage_phase_active = False
-
-    if player['current_hp'] <= 0:
-        print(f"{RED}You died!{RESET}")
-        player['current_hp'] = player['max_hp']
-        save_player()
-    else:
-        print(f"{GREEN}You defeated {boss['name']}!{RESET}")
-        # Optional: drop exotic loot
-        if random.random() < 0.05:
-            loot = {"name":"Exotic Weapon", "min_damage":20,"max_damage":35}
-            player['inventory'].append(loot)
-            print(f"{MAGENTA}You received an exotic weapon: {loot['name']}!{RESET}")
-
-
-# Raid main function
-def start_raid(raid_id):
-    raid = RAIDS[raid_id]
-    lore = load_raid_lore(raid["lore_file"])
-    print(f"\n{CYAN}=== RAID: {raid['name']} ==={RESET}")
-    print(lore.get("intro", "The air grows heavy as you step into the raid..."))
-
-    room = 1
-    while room <= raid["rooms"]:
-        input(f"\nPress Enter to enter Raid Room {room}...")
-        print(f"\n--- Raid Room {room} ---")
-
-        # Boss check
-        if room in raid["boss_rooms"]:
-            print(f"{RED}A Boss blocks your path!{RESET}")
-            print(lore.get(f"boss_{room}", "The boss looms over you..."))
-            raid_boss_combat({"name": f"Boss {room}", "max_hp": 50 + room*5, "attack_min":5, "attack_max":10})
-            room += 1
-            continue
-
-        # Puzzle room every 7th room
-        if room % 7 == 0:
-            solved = False
-            extra_attempts = 3
-            while not solved:
-                success = puzzle_room(lore.get(f"puzzle_{room}", "A strange mechanism hums before you."))
-                if success:
-                    solved = True
-                else:
-                    # Deal small damage and give extra attempts
-                    player['current_hp'] -= 5
-                    print(f"{RED}You take 5 damage for failing the puzzle! Current HP: {player['current_hp']}{RESET}")
-                    extra_attempts -= 1
-                    if extra_attempts <= 0:
-                        print(f"{RED}You finally force your way through the puzzle.{RESET}")
-                        solved = True
-
-        else:
-            # Normal enemies
-            enemies = generate_raid_enemies()
-            print("Combat encounter!")
-            for e in enemies:
-                print(f"{e['name']} appears!")
-            combat(enemies)  # Reuse dungeon combat function
-
-        room += 1
-
-    print(f"\n{GREEN}You have completed {raid['name']}!{RESET}")
-    print(lore.get("outro", "The raid echoes with silence as you emerge victorious..."))
-
-
-
-# Raid menu integration
-def raid_menu():
-    print("\n=== Raid Menu ===")
-    for raid_id, raid in RAIDS.items():
-        print(f"{raid_id}. {raid['name']} ({raid['rooms']} rooms)")
-    print("0. Back")
-    choice = input("Choose a raid: ").strip()
-    if choice == "0":
-        return
-    if choice.isdigit() and int(choice) in RAIDS:
-        start_raid(int(choice))
-    else:
-        print("Invalid choice.")
-
-# ========================
-# RAID LOOT AND EXOTIC ITEMS
-# ========================
-
-# Exotic weapon pool for raids
-RAID_EXOTIC_WEAPONS = [
-    {"name":"Void Reaver", "min_damage":25, "max_damage":40},
-    {"name":"Celestial Fang", "min_damage":30, "max_damage":45},
-    {"name":"Stormbreaker", "min_damage":28, "max_damage":42},
-    {"name":"Eclipse Edge", "min_damage":32, "max_damage":50}
-]
-
-# Special Shadow Stone effects in raids (purple text)
-RAID_SHADOW_STONE_EFFECTS = [
-    "Double Crit Chance", 
-    "Guaranteed Crit Next Attack", 
-    "Ignore Enemy Defense", 
-    "Heal +20 HP", 
-    "Gain Extra Turn", 
-    "Reflect Next Damage", 
-    "Boost STR by 3", 
-    "Boost AGI by 3", 
-    "Shield 15 Damage", 
-    "Instant Kill Minor Enemy"
-]
-
-# Function to apply a Shadow Stone effect in raids
-def apply_raid_shadowstone():
-    effect = random.choice(RAID_SHADOW_STONE_EFFECTS)
-    print(f"{MAGENTA}Shadow Stone Effect Activated: {effect}!{RESET}")
-
-    if effect == "Double Crit Chance":
-        player['temp_double_crit'] = True
-    elif effect == "Guaranteed Crit Next Attack":
-        player['temp_guaranteed_crit'] = True
-    elif effect == "Ignore Enemy Defense":
-        player['temp_ignore_defense'] = True
-    elif effect == "Heal +20 HP":
-        player['current_hp'] = min(player['max_hp'], player['current_hp'] + 20)
-        print(f"{GREEN}Healed 20 HP!{RESET}")
-    elif effect == "Gain Extra Turn":
-        player['extra_turn'] = True
-    elif effect == "Reflect Next Damage":
-        player['temp_reflect'] = True
-    elif effect == "Boost STR by 3":
-        player['stats']['STR'] += 3
-    elif effect == "Boost AGI by 3":
-        player['stats']['AGI'] += 3
-    elif effect == "Shield 15 Damage":
-        player['temp_shield'] = 15
-    elif effect == "Instant Kill Minor Enemy":
-        player['temp_instant_kill'] = True
-
-# ========================
-# RAID BOSS COMBAT SYSTEM
-# ========================
-def raid_boss_combat(boss):
-    """
-    Handles multi-phase raid boss combat with dodge-based puzzle mechanics.
-    boss: dict containing boss info: name, max_hp, phases (list of dicts)
-    """
-    print(f"\n{RED}--- Boss Encounter: {boss['name']} ---{RESET}")
-    boss['current_hp'] = boss['max_hp']
-    phase_index = 0
-    puzzles_completed = 0
-    damage_phase_active = False
-    damage_phase_turns = 0
-
-    while boss['current_hp'] > 0 and player['current_hp'] > 0:
-        # Check if a new damage phase should trigger
-        if not damage_phase_active and (puzzles_completed >= 4 or boss.get('enemies_killed',0) >= 10):
-            damage_phase_active = True
-            damage_phase_turns = random.randint(1,5)
-            print(f"{RED}Boss enters a damage phase! You must dodge carefully.{RESET}")
-
-        print(f"\nYour HP: {player['current_hp']} | Boss HP: {boss['current_hp']}")
-        print("Actions: [attack] [use item] [dodge] [special]")
-
-        action = input("Choose action: ").strip().lower()
-        if action not in ['attack','use item','dodge','special']:
-            print(f"{RED}Invalid input. Try again.{RESET}")
-            continue
-
-        # Player action
-        if action == "attack":
-            weapon = player.get('equipped_weapon', {'min_damage':5,'max_damage':10,'name':'Fists'})
-            damage = random.randint(weapon['min_damage'], weapon['max_damage']) + player['stats']['STR']
-
-            # Shadow Stone effects
-            if player.get('temp_double_crit', False) and random.random() < 0.2:
-                damage *= 2
-                print(f"{MAGENTA}Shadow Stone Effect: Double Crit!{RESET}")
-            if player.get('temp_guaranteed_crit', False):
-                damage *= 2
-                print(f"{MAGENTA}Shadow Stone Effect: Guaranteed Crit!{RESET}")
-                player['temp_guaranteed_crit'] = False
-
-            boss['current_hp'] -= damage
-            print(f"You deal {damage} damage to {boss['name']}!")
-
-        elif action == "use item":
-            use_item()
-
-        elif action == "dodge":
-            player['temp_dodge'] = True
-            print("You prepare to dodge the next attack!")
-
-        elif action == "special":
-            if player.get('special_counter',0) >= 3:
-                damage = random.randint(10+player['stats']['STR'], 20+player['stats']['STR'])
-                boss['current_hp'] -= damage
-                print(f"Special hits {boss['name']} for {damage} damage!")
-                player['special_counter'] = 0
-            else:
-                print(f"Special not ready. {3 - player.get('special_counter',0)} more normal fights needed.")
-
-        # Boss attack / dodge puzzle
-        if damage_phase_active:
-            puzzle_number = random.randint(1,10)
-            print(f"{RED}Boss prepares a powerful attack! Solve the puzzle to dodge.{RESET}")
-            try:
-                guess = int(input("Pick a number between 1-10: "))
-            except ValueError:
-                guess = 0
-            if guess == puzzle_number or player.get('temp_dodge',False):
-                print(f"{GREEN}You dodged the attack!{RESET}")
-            else:
-                boss_damage = random.randint(10,20)
-                player['current_hp'] -= boss_damage
-                print(f"{RED}Boss hits you for {boss_damage} damage!{RESET}")
-
-            damage_phase_turns -= 1
-            player['temp_dodge'] = False
-            if damage_phase_turns <= 0:
-                damage_phase_active = False
-                print(f"{CYAN}Damage phase ends. You can breathe again...{RESET}")
-
-    if player['current_hp'] <= 0:
-        print(f"{RED}You died...{RESET}")
-        player['current_hp'] = player['max_hp']
-        save_player()
+# -----------------------------
+# Deep dungeon (see rpgcommon.dungeongraph)
+# -----------------------------
+DEEP_FLOORS = 400
+DEEP_ROOM_WEIGHTS = {"monster": 0.55, "treasure": 0.2, "trap": 0.1, "intermission": 0.1}  # bosses wait in the locked wings
+
+def start_deep_dungeon():
+    run = None
+    if player.get('deep_dungeon'):
+        try:
+            run = dungeongraph.DungeonRun.from_dict(player['deep_dungeon'], DEEP_ROOM_WEIGHTS)
+            print(f"{CYAN}[You return to floor {run.room.floor + 1} of the deep dungeon...]{RESET}")
+        except (ValueError, KeyError):
+            print(f"{RED}Your map of the deep dungeon is unreadable. You start over.{RESET}")
+    if run is None:
+        run = dungeongraph.DungeonRun.new(random.getrandbits(32), DEEP_ROOM_WEIGHTS, DEEP_FLOORS)
+        print(f"{CYAN}[A stairway leads down into a dungeon {DEEP_FLOORS} floors deep...]{RESET}")
+    deaths = []
+    on_death = events.bus.subscribe(lambda e: e.target == player['name'] and deaths.append(e), [EV.DEATH])
+    try:
         while True:
-            choice = input("Do you want to [continue] or [save & quit]? ").strip().lower()
-            if choice == "continue":
-                return
-            elif choice == "save & quit":
+            room = run.room
+            if not run.visited(room.id):
+                print(f"\n--- Floor {room.floor + 1}, room {room.id % dungeongraph.FLOOR_SLOTS + 1} ---")
+                if room.kind == "key":
+                    print(f"{YELLOW}You find a heavy iron key. Somewhere on this floor a door now opens.{RESET}")
+                    play_room("treasure")
+                elif room.kind != "corridor":
+                    play_room(room.kind)
+                if deaths:
+                    deaths.clear()
+                    run.at = dungeongraph.ENTRANCE
+                    player['deep_dungeon'] = run.to_dict()
+                    save_player()
+                    continue
+                run.visit(room.id)
+                if run.cleared:
+                    print(f"{GREEN}The deepest boss falls. The deep dungeon is cleared!{RESET}")
+                    player['deep_dungeon'] = None
+                    save_player()
+                    return
+                player['deep_dungeon'] = run.to_dict()
                 save_player()
-                exit()
-            else:
-                print("Invalid input.")
-    else:
-        print(f"{GREEN}You defeated {boss['name']}!{RESET}")
-        # Rare chance for exotic item
-        if random.random() < 0.05:
-            exotic_weapon = {"name":"Exotic Blade","min_damage":15,"max_damage":25}
-            player['inventory'].append(exotic_weapon)
-            print(f"{MAGENTA}You found an EXOTIC WEAPON: {exotic_weapon['name']}!{RESET}")
-        save_player()
-
+            exits = run.exits()
+            print("Exits:")
+            for i, (label, _) in enumerate(exits, 1):
+                print(f"{i}. {label}")
+            print("0. Leave (your way through is remembered)")
+            choice = input("Go where? ").strip()
+            if choice == "0":
+                player['deep_dungeon'] = run.to_dict()
+                save_player()
+                return
+            if not (choice.isdigit() and 1 <= int(choice) <= len(exits)):
+                print(f"{RED}Invalid choice.{RESET}")
+            elif not run.move(exits[int(choice) - 1][1]):
+                print(f"{RED}The door is locked. Its key lies somewhere on this floor.{RESET}")
+    finally:
+        events.bus.unsubscribe(on_death)
 
 # -----------------------------
-# Main loop
+# Raids (loaded on first use)
 # -----------------------------
-if __name__=="__main__":
-    prologue()
-    load_player()
-    while True:
-        print(f"\n{BLUE}=== Dungeon Menu ==={RESET}")
-        print("1. Enter Dungeon")
-        print("2. Check Status / Inventory")
-        print("3. Equip Weapon/Armor")
-        print("4. Save & Quit")
-        print("5. Enter Raid")
-        choice = input("Choose an option: ").strip()
-        if choice=="1":
-            start_dungeon()
-        elif choice=="2":
-            print(f"{BLUE}Level {player['level']} {player['rank']} {player['name']}{RESET}")
-            print(f"HP: {player['current_hp']} / {player['max_hp']}")
-            print(f"XP: {player['xp']} / {player['xp_cap']}")
-            print("Stats:", player['stats'])
-            show_inventory()
-        elif choice=="3":
-            equip_item()
-        elif choice=="4":
-            save_player()
-            print(f"{BLUE}Exiting game.{RESET}")
-            break
-        elif choice == "5":
-            raid_menu()
-        else:
-            print(f"{RED}Invalid choice.{RESET}")
+_raids = None
+
+def load_raids():
+    """Imports raids.py the first time a raid is opened and returns it."""
+    global _raids
+    if _raids is None:
+        # raids.py does `import game`; make that resolve to this module even when run as a script
+        sys.modules.setdefault("game", sys.modules[__name__])
+        import raids
+        _raids = raids
+    return _raids
+
+def raid_menu():
+    load_raids().raid_menu()
 
 # -----------------------------
 # ENEMY SCALING AND LOOT HELPER
 # -----------------------------
 def scale_enemy(enemy):
     """
-    Returns a scaled copy of the enemy based on player level and rank.
-    HP and attack are increased for a more challenging fight.
+    Returns a scaled copy of the enemy. With adaptive difficulty on, HP and
+    attack use the tuner's factors for the player's current build (the enemy is
+    left as it is until they are solved); otherwise both grow 15% per level.
     """
     enemy = enemy.copy()  # avoid modifying original
-    level_factor = 1 + (player['level'] * 0.15)  # 15% increase per player level
-    enemy['current_hp'] = int(enemy['health'] * level_factor)
-    enemy['attack_min'] = max(1, int(enemy['attack_min'] * level_factor))
-    enemy['attack_max'] = max(enemy['attack_min'], int(enemy['attack_max'] * level_factor))
+    if difficulty.ENABLED:
+        hp_factor, attack_factor = tuner.factors(combat_build_key(), enemy_key(enemy), player['max_hp']) or (1.0, 1.0)
+    else:
+        hp_factor = attack_factor = 1 + (player['level'] * 0.15)  # 15% increase per player level
+    # combat() starts every enemy at full 'health', so that is what gets scaled
+    enemy['health'] = enemy['current_hp'] = max(1, int(enemy['health'] * hp_factor))
+    enemy['attack_min'] = max(1, int(enemy['attack_min'] * attack_factor))
+    enemy['attack_max'] = max(enemy['attack_min'], int(enemy['attack_max'] * attack_factor))
     return enemy
 
+def tune_ahead():
+    """Queues every enemy the player's rank can meet, so the tuner is done before the fights are."""
+    eligible = [e for e in ENEMIES if RANKS.index(e['rank']) <= RANKS.index(player['rank'])+2]
+    tuner.prefetch(combat_build_key(), [enemy_key(e) for e in eligible], player['max_hp'])
+
+ENEMY_LOOT = loot.LootTable([
+    ("Health Potion +20", 0.4),
+    ("Shadow Stone", 0.1),
+    ("Dagger", 0.05),
+    ("Leather Armor", 0.05)
+])
+
 def drop_loot(enemy):
     """
     Generates loot for an enemy if the player survived the fight.
     Each enemy can drop 1-3 items from a weighted loot table.
     """
-    loot_table = enemy.get('loot_table', [
-        {"item": "Health Potion +20", "chance": 0.4},
-        {"item": "Shadow Stone", "chance": 0.1},
-        {"item": "Dagger", "chance": 0.05},
-        {"item": "Leather Armor", "chance": 0.05}
-    ])
-    num_drops = random.randint(1,3)
-    dropped = []
-    for _ in range(num_drops):
-        drop = random.choices(loot_table, weights=[i['chance'] for i in loot_table])[0]
-        player['inventory'].append(drop['item'])
-        dropped.append(drop['item'])
+    if 'loot_table' in enemy:
+        table = loot.LootTable((i['item'], i['chance']) for i in enemy['loot_table'])
+    else:
+        table = ENEMY_LOOT
+    dropped = table.roll_n(random.randint(1,3))
+    for item in dropped:
+        player['inventory'].append(item)
+        emit(EV.LOOT_DROP, source=enemy['name'], target=player['name'], amount=1, item=item)
     if dropped:
         print(f"{GREEN}{enemy['name']} dropped: {', '.join(dropped)}{RESET}")
 
@@ -924,190 +1100,65 @@ def reward_player_after_combat(enemy, boss=False):
         player['special_counter'] = player.get('special_counter',0)+1
     save_player()
 
+# -----------------------------
+# Main loop
+# -----------------------------
+def main_menu():
+    while True:
+        replay.safe_point()
+        print(f"\n{BLUE}=== Dungeon Menu ==={RESET}")
+        print("1. Enter Dungeon")
+        print("2. Check Status / Inventory")
+        print("3. Equip Weapon/Armor")
+        print("4. Save & Quit")
+        print("5. Enter Raid")
+        print(f"6. Auto-Resolve Easy Fights [{'ON' if player.get('auto_resolve') else 'OFF'}]")
+        print("7. Enter Deep Dungeon")
+        choice = input("Choose an option: ").strip()
+        if choice=="1":
+            start_dungeon()
+        elif choice=="2":
+            print(f"{BLUE}Level {player['level']} {player['rank']} {player['name']}{RESET}")
+            print(f"HP: {player['current_hp']} / {player['max_hp']}")
+            print(f"XP: {player['xp']} / {player['xp_cap']}")
+            print("Stats:", player['stats'])
+            show_inventory()
+        elif choice=="3":
+            equip_item()
+        elif choice=="4":
+            save_player()
+            print(f"{BLUE}Exiting game.{RESET}")
+            return
+        elif choice == "5":
+            raid_menu()
+        elif choice == "6":
+            player['auto_resolve'] = not player.get('auto_resolve', False)
+            print(f"Auto-resolve is now {'ON' if player['auto_resolve'] else 'OFF'}.")
+            save_player()
+        elif choice == "7":
+            start_deep_dungeon()
+        else:
+            print(f"{RED}Invalid choice.{RESET}")
 
-# ========================
-# RAID COMBAT & PUZZLE SYSTEM
-# ========================
-
-import random
-
-# Raid enemies and loot pools
-RAID_ENEMIES = {
-    1: [
-        {"name": "Shattered Goblin", "health": 30, "attack_min": 5, "attack_max": 10, "crit": 0.1, "rank": "D"},
-        {"name": "Cave Fiend", "health": 40, "attack_min": 6, "attack_max": 12, "crit": 0.15, "rank": "C"},
-    ],
-    2: [
-        {"name": "Ashen Soldier", "health": 35, "attack_min": 7, "attack_max": 14, "crit": 0.1, "rank": "D"},
-        {"name": "Molten Brute", "health": 50, "attack_min": 8, "attack_max": 16, "crit": 0.2, "rank": "B"},
-    ],
-}
-
-RAID_LOOT = {
-    1: [
-        {"name": "Shard Blade", "type": "weapon", "min_damage": 8, "max_damage": 15},
-        {"name": "Mystic Helm", "type": "armor", "slot": "helmet", "defense": 5},
-        {"name": "Shadow Stone", "type": "consumable", "effect": "random"},
-    ],
-    2: [
-        {"name": "Ashen Sword", "type": "weapon", "min_damage": 10, "max_damage": 18},
-        {"name": "Flame Chestplate", "type": "armor", "slot": "chest", "defense": 6},
-        {"name": "Shadow Stone", "type": "consumable", "effect": "random"},
-    ],
-}
-
-# Puzzle examples
-RAID_PUZZLES = [
-    {"prompt": "Guess the correct number between 1 and 5:", "answer": "3"},
-    {"prompt": "Type the word 'shadow' backwards:", "answer": "wodahs"},
-    {"prompt": "Enter the sum of 7 + 4:", "answer": "11"},
-]
-
-def raid_puzzle(room_id):
-    print(f"{MAGENTA}Puzzle {room_id}: Solve it to proceed!{RESET}")
-    puzzle = random.choice(RAID_PUZZLES)
-    print(puzzle['prompt'])
-    answer = input("Your answer: ").strip()
-    if answer.lower() == puzzle['answer'].lower():
-        print(f"{GREEN}Correct!{RESET}")
-        return True
-    else:
-        print(f"{RED}Incorrect!{RESET}")
-        return False
-
-def raid_combat(enemies, boss=False):
-    if not isinstance(enemies, list):
-        enemies = [enemies]
-
-    # Initialize temporary Shadow Stone effects
-    player['temp_double_crit'] = False
-    player['temp_guaranteed_crit'] = False
-    player['temp_ignore_defense'] = False
-    player['temp_block_next_attack'] = False
-    player['temp_dodge'] = False
-
-    print()
-    for idx, e in enumerate(enemies, 1):
-        rank = e.get('rank', 'D')
-        print(f"Enemy {idx} approaches!")
-        print(f"!!! ({rank}) {e['name']} appears !!!\n")
-        e['current_hp'] = e['health']
-
-    while any(e['current_hp'] > 0 for e in enemies) and player['current_hp'] > 0:
-        weapon_name = player['equipped_weapon']['name'] if player['equipped_weapon'] else "None"
-        print(f"Your HP: {player['current_hp']} | Weapon: {weapon_name}")
-        for idx, e in enumerate(enemies,1):
-            if e['current_hp'] > 0:
-                print(f"{e['name']} HP: {e['current_hp']}")
-
-        action = input(f"Actions: [attack] [use item] [dodge] [special] [run]\nChoose action: ").strip().lower()
-        if action not in ["attack","use item","dodge","special","run"]:
-            print(f"{RED}Invalid input. Try again.{RESET}")
-            continue  # does not consume a turn
-
-        # Player attacks
-        if action == "attack":
-            for e in enemies:
-                if e['current_hp'] <= 0:
-                    continue
-                hit_chance = 0.85 + player['stats']['AGI']*0.01
-                if random.random() < hit_chance:
-                    weapon = player.get('equipped_weapon', {'min_damage':5,'max_damage':10})
-                    damage = random.randint(weapon['min_damage'], weapon['max_damage']) + player['stats']['STR']
-
-                    # Shadow Stone effects
-                    if player.get('temp_double_crit', False) and random.random() < 0.2:
-                        damage *= 2
-                        print(f"{MAGENTA}Shadow Stone Effect: Double Crit!{RESET}")
-                    if player.get('temp_guaranteed_crit', False):
-                        damage *= 2
-                        print(f"{MAGENTA}Shadow Stone Effect: Guaranteed Crit!{RESET}")
-                        player['temp_guaranteed_crit'] = False
-
-                    e['current_hp'] -= damage
-                    print(f"You dealt {damage} damage to {e['name']}.")
-                else:
-                    print("You missed!")
-
-        elif action == "use item":
-            use_item()
-        elif action == "dodge":
-            print("You prepare to dodge the next attack!")
-            player['temp_dodge'] = True
-        elif action == "special":
-            if player.get('special_counter',0) >= 3 or boss:
-                print("You unleash your special ability!")
-                for e in enemies:
-                    if e['current_hp'] <= 0:
-                        continue
-                    damage = random.randint(10+player['stats']['STR'], 20+player['stats']['STR'])
-                    e['current_hp'] -= damage
-                    print(f"Special hits {e['name']} for {damage} damage!")
-                if not boss:
-                    player['special_counter'] = 0
-            else:
-                print(f"Special not ready. {3 - player.get('special_counter',0)} more normal fights needed.")
-
-        elif action == "run":
-            if boss:
-                print("Cannot run from a boss!")
-            elif random.random() < 0.5:
-                print("You successfully escaped!")
-                return
-            else:
-                print("Failed to escape!")
-
-        # Enemy turn
-        for e in enemies:
-            if e['current_hp'] <= 0:
-                continue
-            if random.random() < 0.8:
-                if player.get('temp_dodge',False):
-                    if random.random() < 0.5 + player['stats']['AGI']*0.01:
-                        print(f"You dodged {e['name']}'s attack!")
-                        continue
-                    player['temp_dodge'] = False
-                edamage = random.randint(e['attack_min'], e['attack_max'])
-                if random.random() < e['crit']:
-                    edamage *= 2
-                    print(f"{e['name']} CRITICAL HIT!")
-                if player.get('equipped_armor'):
-                    armor = player['equipped_armor']
-                    edamage = max(0, edamage - armor.get('defense',0))
-                player['current_hp'] -= edamage
-                print(f"{e['name']} hits you for {edamage} damage!")
-            else:
-                print(f"{e['name']} missed!")
-
-    if player['current_hp'] <= 0:
-        print("You died in the raid...")
-        player['current_hp'] = player['max_hp']
-        save_player()
-        while True:
-            choice = input("Do you want to [continue] or [save & quit]? ").strip().lower()
-            if choice == "continue":
-                return
-            elif choice == "save & quit":
-                save_player()
-                exit()
-            else:
-                print("Invalid input.")
-
-    print(f"{GREEN}You defeated the raid enemies!{RESET}")
-
-    # Gain XP only if not boss (optional)
-    if not boss:
-        for e in enemies:
-            xp_values = {"E":5,"D":10,"C":20,"B":40,"A":80,"S":150}
-            gain_xp(xp_values.get(e.get('rank','E'),10))
-        player['special_counter'] = player.get('special_counter',0)+1
+def resume(state):
+    """Picks a replayed session up at the main menu (see rpgcommon.replay)."""
+    global player
+    player = state
+    return main_menu
 
-    # Loot drops
-    for e in enemies:
-        loot = random.choice(RAID_LOOT.get(player.get('current_raid',1), []))
-        if loot:
-            player['inventory'].append(loot)
-            print(f"You found {loot['name']}!")
+replay.register("lucidus", files=lambda: [SAVE_FILE], snapshot=lambda: player, resume=resume)
 
-    save_player()
+def main():
+    output.install()
+    if "--build-stat-plan" in sys.argv:
+        stat_plan.build(jobs=os.cpu_count() or 1)
+        print(f"Stat plan written to {stat_plan.path}")
+        return
+    stat_plan.warm()
+    prologue()
+    random.seed(replay.begin())
+    load_player()
+    main_menu()
 
+if __name__=="__main__":
+    main()
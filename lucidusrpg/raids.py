@@ -0,0 +1,693 @@
+"""
+Raid system for the Lucidus RPG.
+
+game.py imports this module the first time the raid menu is opened, so a
+dungeon-only session never builds the raid tables. Python keeps the module
+(and every table in it) cached after that first load.
+"""
+import functools
+import os
+import random
+
+import game
+from game import RESET, RED, GREEN, CYAN, MAGENTA, emit, EV, combat, save_player, use_item, gain_xp, BATCH_VERBS
+from game import HORDE_FRONT, Initiative
+from rpgcommon.commands import CommandQueue, CommandError
+from rpgcommon import profiling
+from rpgcommon import metrics
+from rpgcommon.profiling import profiled
+from rpgcommon import mcts
+from rpgcommon import checkpoint
+from rpgcommon import loot
+from rpgcommon import output
+from rpgcommon.combatstate import Rules, HEADER, STATUS, SIDE, TURN, ONGOING, WON, LOST, PLAYER, ENEMY
+
+print = output.print  # a no-op in quiet mode (see rpgcommon.output)
+
+# ========================
+# RAID SYSTEM FRAMEWORK
+# ========================
+
+RAIDS = {
+    1: {
+        "name": "The Shattered Depths",
+        "rooms": 30,
+        "boss_rooms": [10, 25],
+        "lore_file": "raid1_lore.txt"
+    },
+    2: {
+        "name": "The Ashen Citadel",
+        "rooms": 40,
+        "boss_rooms": [15, 35],
+        "lore_file": "raid2_lore.txt"
+    }
+}
+
+# Function to load raid lore (parsed once per file)
+@functools.lru_cache(maxsize=None)
+@profiled("lore.read")
+def load_raid_lore(file_path):
+    if not os.path.exists(file_path):
+        return {}
+    lore = {}
+    with open(file_path, "r") as f:
+        current_key = None
+        for line in f:
+            line = line.strip()
+            if line.startswith("##"):  # Lore section header
+                current_key = line[2:].strip()
+                lore[current_key] = []
+            elif current_key:
+                lore[current_key].append(line)
+    return {k: "\n".join(v) for k, v in lore.items()}
+
+# Generate normal raid enemies (keep dungeon enemies separate)
+def generate_raid_enemies(rng=random):
+    enemy_pool = [
+        {"name": "Goblin", "health": 15, "attack_min": 3, "attack_max": 6, "crit": 0.1, "rank": "E"},
+        {"name": "Lesser Spider", "health": 12, "attack_min": 2, "attack_max": 5, "crit": 0.05, "rank": "D"},
+        {"name": "Skeleton Warrior", "health": 20, "attack_min": 4, "attack_max": 8, "crit": 0.1, "rank": "C"}
+    ]
+    num_enemies = rng.randint(1, 3)
+    return [rng.choice(enemy_pool).copy() for _ in range(num_enemies)]
+
+# Puzzle room system
+def puzzle_room(lore_text):
+    print(f"{MAGENTA}{lore_text}{RESET}")
+    print("Solve the puzzle to continue. (Guess the number between 1-5)")
+    number = random.randint(1,5)
+    attempts = 0
+    while True:
+        guess = input("Enter your guess: ").strip()
+        if not guess.isdigit():
+            print(f"{RED}Invalid input.{RESET}")
+            continue
+        guess = int(guess)
+        attempts += 1
+        if guess == number:
+            print(f"{GREEN}You solved the puzzle!{RESET}")
+            return True
+        else:
+            print(f"{RED}Wrong! Try again.{RESET}")
+        if attempts >= 3:
+            print(f"{RED}The puzzle overwhelms you, but you proceed cautiously.{RESET}")
+            return False
+
+# Raid boss combat system
+
+def roll_raid_room(raid, room, rng=random):
+    """What a raid room holds, rolled before the player steps in so a checkpoint can keep it."""
+    if room in raid["boss_rooms"]:
+        return {"boss": {"name": f"Boss {room}", "max_hp": 50 + room*5, "attack_min":5, "attack_max":10}}
+    if room % 7 == 0:
+        return {"puzzle": True}
+    return {"enemies": generate_raid_enemies(rng)}
+
+def start_raid(raid_id):
+    player = game.player
+    raid = RAIDS[raid_id]
+    lore = load_raid_lore(raid["lore_file"])
+    print(f"\n{CYAN}=== RAID: {raid['name']} ==={RESET}")
+    run = checkpoint.resume(player, "raid", raid=raid_id)
+    if run:
+        print(f"{CYAN}You return to Raid Room {run['room']}, where you left off.{RESET}")
+    else:
+        if checkpoint.resume(player, "raid"):
+            print(f"{RED}Your unfinished raid is abandoned.{RESET}")
+        run = checkpoint.begin(player, "raid", raid=raid_id)
+        print(lore.get("intro", "The air grows heavy as you step into the raid..."))
+
+    room = max(run['room'], 1)
+    while room <= raid["rooms"]:
+        contents = checkpoint.pending(run, room) or roll_raid_room(raid, room, checkpoint.room_rng(run, room))
+        checkpoint.reach(run, room, contents)
+        save_player()
+        if input(f"\nPress Enter to enter Raid Room {room} (or type 'leave' to come back later)...").strip().lower() == "leave":
+            print(f"{CYAN}You slip out of the raid. It will wait for you at Room {room}.{RESET}")
+            return
+        print(f"\n--- Raid Room {room} ---")
+
+        # Boss check
+        if "boss" in contents:
+            print(f"{RED}A Boss blocks your path!{RESET}")
+            print(lore.get(f"boss_{room}", "The boss looms over you..."))
+            raid_boss_combat(contents["boss"])
+            room += 1
+            continue
+
+        # Puzzle room every 7th room
+        if "puzzle" in contents:
+            solved = False
+            extra_attempts = 3
+            while not solved:
+                success = puzzle_room(lore.get(f"puzzle_{room}", "A strange mechanism hums before you."))
+                if success:
+                    solved = True
+                else:
+                    # Deal small damage and give extra attempts
+                    player['current_hp'] -= 5
+                    print(f"{RED}You take 5 damage for failing the puzzle! Current HP: {player['current_hp']}{RESET}")
+                    extra_attempts -= 1
+                    if extra_attempts <= 0:
+                        print(f"{RED}You finally force your way through the puzzle.{RESET}")
+                        solved = True
+
+        else:
+            # Normal enemies
+            enemies = contents["enemies"]
+            print("Combat encounter!")
+            for e in enemies:
+                print(f"{e['name']} appears!")
+            combat(enemies)  # Reuse dungeon combat function
+
+        room += 1
+
+    checkpoint.finish(player, "raid")
+    save_player()
+    print(f"\n{GREEN}You have completed {raid['name']}!{RESET}")
+    print(lore.get("outro", "The raid echoes with silence as you emerge victorious..."))
+
+
+
+# Raid menu integration
+def raid_menu():
+    print("\n=== Raid Menu ===")
+    for raid_id, raid in RAIDS.items():
+        print(f"{raid_id}. {raid['name']} ({raid['rooms']} rooms)")
+    print("0. Back")
+    choice = input("Choose a raid: ").strip()
+    if choice == "0":
+        return
+    if choice.isdigit() and int(choice) in RAIDS:
+        start_raid(int(choice))
+    else:
+        print("Invalid choice.")
+
+# ========================
+# RAID LOOT AND EXOTIC ITEMS
+# ========================
+
+# Exotic weapon pool for raids
+RAID_EXOTIC_WEAPONS = game.CONTENT["raid_exotic_weapons"]
+
+# Special Shadow Stone effects in raids (purple text)
+RAID_SHADOW_STONE_EFFECTS = game.CONTENT["raid_shadow_stone_effects"]
+
+# Function to apply a Shadow Stone effect in raids
+def apply_raid_shadowstone():
+    player = game.player
+    effect = random.choice(RAID_SHADOW_STONE_EFFECTS)
+    print(f"{MAGENTA}Shadow Stone Effect Activated: {effect}!{RESET}")
+
+    if effect == "Double Crit Chance":
+        player['temp_double_crit'] = True
+    elif effect == "Guaranteed Crit Next Attack":
+        player['temp_guaranteed_crit'] = True
+    elif effect == "Ignore Enemy Defense":
+        player['temp_ignore_defense'] = True
+    elif effect == "Heal +20 HP":
+        player['current_hp'] = min(player['max_hp'], player['current_hp'] + 20)
+        print(f"{GREEN}Healed 20 HP!{RESET}")
+    elif effect == "Gain Extra Turn":
+        player['extra_turn'] = True
+    elif effect == "Reflect Next Damage":
+        player['temp_reflect'] = True
+    elif effect == "Boost STR by 3":
+        player['stats']['STR'] += 3
+    elif effect == "Boost AGI by 3":
+        player['stats']['AGI'] += 3
+    elif effect == "Shield 15 Damage":
+        player['temp_shield'] = 15
+    elif effect == "Instant Kill Minor Enemy":
+        player['temp_instant_kill'] = True
+
+# ========================
+# RAID BOSS COMBAT SYSTEM
+# ========================
+EXOTIC_BLADE = {"name":"Exotic Blade","min_damage":15,"max_damage":25}
+EXOTIC_PITY = 30        # raid bosses in a row without an exotic before one is certain
+EXOTIC_DROP = loot.LootTable([(EXOTIC_BLADE, 0.05), (None, 0.95)], pity=(EXOTIC_BLADE, EXOTIC_PITY), name="raid_exotic")
+BOSS_CRIT = 0.15        # crit chance of a boss strike when the boss entry has none
+SLAM_DAMAGE = (10, 20)  # the damage-phase blow; only a dodge stance or the right guess avoids it
+DAMAGE_PHASE_TURNS = (1, 5)  # boss turns per damage phase
+PUZZLE_RANGE = 10       # the guess is 1..PUZZLE_RANGE
+
+def boss_slam(boss):
+    """The damage-phase attack: guess the number or hold a dodge stance. Either way the stance is spent."""
+    player = game.player
+    puzzle_number = random.randint(1,PUZZLE_RANGE)
+    print(f"{RED}Boss prepares a powerful attack! Solve the puzzle to dodge.{RESET}")
+    try:
+        guess = int(input(f"Pick a number between 1-{PUZZLE_RANGE}: "))
+    except ValueError:
+        guess = 0
+    if guess == puzzle_number or player.get('temp_dodge',False):
+        emit(EV.DODGE, source=boss['name'], target=player['name'])
+        print(f"{GREEN}You dodged the attack!{RESET}")
+    else:
+        boss_damage = random.randint(*SLAM_DAMAGE)
+        player['current_hp'] -= boss_damage
+        emit(EV.ATTACK, source=boss['name'], target=player['name'], amount=boss_damage)
+        emit(EV.DAMAGE_HP, source=boss['name'], target=player['name'], amount=boss_damage)
+        print(f"{RED}Boss hits you for {boss_damage} damage!{RESET}")
+    player['temp_dodge'] = False
+
+class BossRules(Rules):
+    """
+    raid_boss_combat() over CombatState cells, for hard mode's boss brain. The
+    player's attack always lands. The boss only acts in a damage phase, as in
+    normal mode, and answers with "strike" (a normal raid_enemy_attack, which a
+    dodge stance may slip) or "slam" (boss_slam, modelled as a 1-in-PUZZLE_RANGE
+    guess); otherwise it can only "wait". A phase that ends while its trigger
+    still holds starts again. 'use item' drinks the strongest potion.
+
+    Built from the player as they are now, so make a new one each turn.
+    """
+    P_HP, DODGE, SPECIAL, DOUBLE_CRIT, GUARANTEED_CRIT, POTIONS_USED, B_HP, PHASE, REARM = range(HEADER, HEADER + 9)
+    size = HEADER + 9
+
+    def __init__(self, boss):
+        player = game.player
+        weapon = player.get('equipped_weapon') or {'min_damage':5,'max_damage':10}
+        armor = player.get('equipped_armor') or {}
+        self.strength = player['stats']['STR']
+        self.dodge = 0.5 + player['stats']['AGI']*0.01
+        self.wmin, self.wmax = weapon['min_damage'], weapon['max_damage']
+        self.defense = armor.get('defense', 0)
+        self.max_hp = player['max_hp']
+        self.potions = tuple(sorted(game.potion_heals(), reverse=True))
+        self.b_max_hp = max(1, boss['max_hp'])
+        self.b_min, self.b_max = boss['attack_min'], boss['attack_max']
+        self.b_crit = boss.get('crit', BOSS_CRIT)
+        # what the cells leave out; positions searched under other rules are not comparable
+        self.signature = (self.strength, self.dodge, self.wmin, self.wmax, self.defense, self.max_hp, self.potions)
+
+    def state(self, boss, side=PLAYER, turn=0, seed=None):
+        player = game.player
+        phase = boss['phase']
+        return self.new_state([ONGOING, side, 0, turn, player['current_hp'], int(player.get('temp_dodge', False)),
+                               player.get('special_counter', 0), int(player.get('temp_double_crit', False)),
+                               int(player.get('temp_guaranteed_crit', False)), 0, boss['current_hp'],
+                               phase['damage_phase_turns'] if phase['damage_phase_active'] else 0,
+                               int(damage_phase_due(boss))], seed)
+
+    def actions(self, state):
+        c = state.cells
+        if c[SIDE] == ENEMY:
+            return ("strike", "slam") if c[self.PHASE] > 0 else ("wait",)
+        moves = ["attack", "dodge"]
+        if c[self.SPECIAL] >= 3:
+            moves.append("special")
+        if c[self.POTIONS_USED] < len(self.potions) and c[self.P_HP] < self.max_hp:
+            moves.append("use item")
+        return tuple(moves)
+
+    def apply(self, state, action):
+        c = state.writable()
+        if c[SIDE] == ENEMY:
+            if action == "slam":
+                if not c[self.DODGE] and state.random() >= 1.0 / PUZZLE_RANGE:
+                    c[self.P_HP] -= state.randint(*SLAM_DAMAGE)
+                c[self.DODGE] = 0
+            elif action == "strike" and state.random() < 0.8:
+                if not (c[self.DODGE] and state.random() < self.dodge):  # a slipped strike keeps the stance
+                    c[self.DODGE] = 0
+                    edamage = state.randint(self.b_min, self.b_max)
+                    if state.random() < self.b_crit:
+                        edamage *= 2
+                    c[self.P_HP] -= max(0, edamage - self.defense)
+            if action != "wait":
+                c[self.PHASE] -= 1
+                if c[self.PHASE] <= 0 and c[self.REARM]:
+                    c[self.PHASE] = state.randint(*DAMAGE_PHASE_TURNS)
+            c[SIDE] = PLAYER
+            if c[self.P_HP] <= 0:
+                c[STATUS] = LOST
+            return
+        c[TURN] += 1
+        if action == "attack":
+            damage = state.randint(self.wmin, self.wmax) + self.strength
+            if c[self.DOUBLE_CRIT] and state.random() < 0.2:
+                damage *= 2
+            if c[self.GUARANTEED_CRIT]:
+                damage *= 2
+                c[self.GUARANTEED_CRIT] = 0
+            c[self.B_HP] -= damage
+        elif action == "special" and c[self.SPECIAL] >= 3:
+            c[self.B_HP] -= state.randint(10+self.strength, 20+self.strength)
+            c[self.SPECIAL] = 0
+        elif action == "dodge":
+            c[self.DODGE] = 1
+        elif action == "use item" and c[self.POTIONS_USED] < len(self.potions):
+            c[self.P_HP] = min(self.max_hp, c[self.P_HP] + self.potions[c[self.POTIONS_USED]])
+            c[self.POTIONS_USED] += 1
+        if c[self.B_HP] <= 0:
+            c[STATUS] = WON
+        else:
+            c[SIDE] = ENEMY
+
+    def default(self, state):
+        return self.actions(state)[0] if state.cells[SIDE] == ENEMY else "attack"
+
+    def value(self, state):
+        c = state.cells
+        return self.outlook(c[STATUS], max(0, c[self.P_HP]) / self.max_hp, max(0, c[self.B_HP]) / self.b_max_hp)
+
+def damage_phase_due(boss):
+    return boss['phase']['puzzles_completed'] >= 4 or boss.get('enemies_killed',0) >= 10
+
+def raid_boss_combat(boss):
+    """
+    Handles multi-phase raid boss combat with dodge-based puzzle mechanics.
+    boss: dict containing boss info: name, max_hp, phases (list of dicts)
+    HP and phase state are kept on the boss, so a checkpointed boss picks up where it was left.
+    """
+    player = game.player
+    print(f"\n{RED}--- Boss Encounter: {boss['name']} ---{RESET}")
+    boss.setdefault('current_hp', boss['max_hp'])
+    phase = boss.setdefault('phase', {"puzzles_completed": 0, "damage_phase_active": False, "damage_phase_turns": 0})
+    turns = 0
+    # hard mode: in a damage phase the boss picks strike or slam by searching ahead
+    brain = mcts.Planner(ENEMY) if mcts.HARD_MODE else None
+    signature = None
+    boss.setdefault('crit', BOSS_CRIT)
+
+    while boss['current_hp'] > 0 and player['current_hp'] > 0:
+        # Check if a new damage phase should trigger
+        if not phase['damage_phase_active'] and damage_phase_due(boss):
+            phase['damage_phase_active'] = True
+            phase['damage_phase_turns'] = random.randint(*DAMAGE_PHASE_TURNS)
+            print(f"{RED}Boss enters a damage phase! You must dodge carefully.{RESET}")
+
+        print(f"\nYour HP: {player['current_hp']} | Boss HP: {boss['current_hp']}")
+        print("Actions: [attack] [use item] [dodge] [special]")
+
+        action = input("Choose action: ").strip().lower()
+        if action not in ['attack','use item','dodge','special']:
+            print(f"{RED}Invalid input. Try again.{RESET}")
+            continue
+        turns += 1
+
+        # Player action
+        if action == "attack":
+            weapon = player.get('equipped_weapon', {'min_damage':5,'max_damage':10,'name':'Fists'})
+            damage = random.randint(weapon['min_damage'], weapon['max_damage']) + player['stats']['STR']
+
+            # Shadow Stone effects
+            crit = False
+            if player.get('temp_double_crit', False) and random.random() < 0.2:
+                damage *= 2
+                crit = True
+                print(f"{MAGENTA}Shadow Stone Effect: Double Crit!{RESET}")
+            if player.get('temp_guaranteed_crit', False):
+                damage *= 2
+                crit = True
+                print(f"{MAGENTA}Shadow Stone Effect: Guaranteed Crit!{RESET}")
+                player['temp_guaranteed_crit'] = False
+
+            boss['current_hp'] -= damage
+            emit(EV.ATTACK, source=player['name'], target=boss['name'], amount=damage)
+            if crit:
+                emit(EV.CRIT, source=player['name'], target=boss['name'], amount=damage)
+            emit(EV.DAMAGE_HP, source=player['name'], target=boss['name'], amount=damage)
+            print(f"You deal {damage} damage to {boss['name']}!")
+
+        elif action == "use item":
+            use_item()
+
+        elif action == "dodge":
+            player['temp_dodge'] = True
+            print("You prepare to dodge the next attack!")
+
+        elif action == "special":
+            if player.get('special_counter',0) >= 3:
+                damage = random.randint(10+player['stats']['STR'], 20+player['stats']['STR'])
+                boss['current_hp'] -= damage
+                emit(EV.ATTACK, source=player['name'], target=boss['name'], amount=damage, special=True)
+                emit(EV.DAMAGE_HP, source=player['name'], target=boss['name'], amount=damage)
+                print(f"Special hits {boss['name']} for {damage} damage!")
+                player['special_counter'] = 0
+            else:
+                print(f"Special not ready. {3 - player.get('special_counter',0)} more normal fights needed.")
+
+        # Boss attack / dodge puzzle
+        if phase['damage_phase_active']:
+            if not brain:
+                boss_slam(boss)
+            elif boss['current_hp'] > 0:
+                # potions drunk, stones used and gear swapped this turn all change the rules
+                rules = BossRules(boss)
+                if rules.signature != signature:
+                    brain.table.clear()
+                    signature = rules.signature
+                if brain.choose(rules.state(boss, ENEMY, turns)) == "slam":
+                    boss_slam(boss)
+                else:
+                    raid_enemy_attack(boss)
+            phase['damage_phase_turns'] -= 1
+            if phase['damage_phase_turns'] <= 0:
+                phase['damage_phase_active'] = False
+                print(f"{CYAN}Damage phase ends. You can breathe again...{RESET}")
+
+    metrics.fight_finished("lucidus", turns)
+    if player['current_hp'] <= 0:
+        emit(EV.DEATH, source=boss['name'], target=player['name'])
+        metrics.DEATHS.inc("lucidus", player['rank'])
+        print(f"{RED}You died...{RESET}")
+        player['current_hp'] = player['max_hp']
+        save_player()
+        while True:
+            choice = input("Do you want to [continue] or [save & quit]? ").strip().lower()
+            if choice == "continue":
+                return
+            elif choice == "save & quit":
+                save_player()
+                exit()
+            else:
+                print("Invalid input.")
+    else:
+        emit(EV.DEATH, source=player['name'], target=boss['name'])
+        print(f"{GREEN}You defeated {boss['name']}!{RESET}")
+        # Rare chance for exotic item, certain after EXOTIC_PITY bosses without one
+        for exotic in EXOTIC_DROP.roll(random, player.setdefault(loot.PITY_FIELD, {})):
+            exotic_weapon = dict(exotic)
+            player['inventory'].append(exotic_weapon)
+            emit(EV.LOOT_DROP, source=boss['name'], target=player['name'], amount=1, item=exotic_weapon['name'])
+            print(f"{MAGENTA}You found an EXOTIC WEAPON: {exotic_weapon['name']}!{RESET}")
+        save_player()
+
+
+# ========================
+# RAID COMBAT & PUZZLE SYSTEM
+# ========================
+
+# Raid enemies and loot pools, by raid (data/raid_*.json)
+RAID_ENEMIES = game.CONTENT["raid_enemies"]
+
+RAID_LOOT = game.CONTENT["raid_loot"]
+RAID_LOOT_TABLES = {raid: loot.LootTable.uniform(items) for raid, items in RAID_LOOT.items() if items}
+
+# Puzzle examples
+RAID_PUZZLES = game.CONTENT["raid_puzzles"]
+
+def raid_puzzle(room_id):
+    print(f"{MAGENTA}Puzzle {room_id}: Solve it to proceed!{RESET}")
+    puzzle = random.choice(RAID_PUZZLES)
+    print(puzzle['prompt'])
+    answer = input("Your answer: ").strip()
+    if answer.lower() == puzzle['answer'].lower():
+        print(f"{GREEN}Correct!{RESET}")
+        return True
+    else:
+        print(f"{RED}Incorrect!{RESET}")
+        return False
+
+@profiled("combat.enemy_turn")
+def raid_enemy_attack(e):
+    player = game.player
+    if random.random() < 0.8:
+        if player.get('temp_dodge',False):
+            if random.random() < 0.5 + player['stats']['AGI']*0.01:
+                emit(EV.DODGE, source=e['name'], target=player['name'])
+                print(f"You dodged {e['name']}'s attack!")
+                return
+            player['temp_dodge'] = False
+        edamage = random.randint(e['attack_min'], e['attack_max'])
+        crit = random.random() < e['crit']
+        if crit:
+            edamage *= 2
+            print(f"{e['name']} CRITICAL HIT!")
+        if player.get('equipped_armor'):
+            armor = player['equipped_armor']
+            edamage = max(0, edamage - armor.get('defense',0))
+        player['current_hp'] -= edamage
+        emit(EV.ATTACK, source=e['name'], target=player['name'], amount=edamage)
+        if crit:
+            emit(EV.CRIT, source=e['name'], target=player['name'], amount=edamage)
+        emit(EV.DAMAGE_HP, source=e['name'], target=player['name'], amount=edamage)
+        print(f"{e['name']} hits you for {edamage} damage!")
+    else:
+        emit(EV.MISS, source=e['name'], target=player['name'])
+        print(f"{e['name']} missed!")
+
+def raid_combat(enemies, boss=False):
+    player = game.player
+    if not isinstance(enemies, list):
+        enemies = [enemies]
+
+    # Initialize temporary Shadow Stone effects
+    player['temp_double_crit'] = False
+    player['temp_guaranteed_crit'] = False
+    player['temp_ignore_defense'] = False
+    player['temp_block_next_attack'] = False
+    player['temp_dodge'] = False
+
+    print()
+    for idx, e in enumerate(enemies, 1):
+        e['current_hp'] = e['health']
+        if idx > HORDE_FRONT:
+            continue
+        rank = e.get('rank', 'D')
+        print(f"Enemy {idx} approaches!")
+        print(f"!!! ({rank}) {e['name']} appears !!!\n")
+    if len(enemies) > HORDE_FRONT:
+        print(f"!!! ...and {len(enemies) - HORDE_FRONT} more behind them !!!\n")
+
+    turns = 0
+    initiative = Initiative(enemies)
+    commands = CommandQueue(BATCH_VERBS, player['name'])
+    try:
+        while initiative.alive and player['current_hp'] > 0:
+            actor = initiative.next()
+            if actor != Initiative.PLAYER:
+                raid_enemy_attack(enemies[actor])
+                continue
+
+            while True:  # the player's turn; invalid input does not consume it
+                weapon_name = player['equipped_weapon']['name'] if player['equipped_weapon'] else "None"
+                print(f"Your HP: {player['current_hp']} | Weapon: {weapon_name}")
+                for _, e in initiative.targets():
+                    print(f"{e['name']} HP: {e['current_hp']}")
+                if initiative.reserve:
+                    print(f"...and {len(initiative.reserve)} more waiting ({initiative.reserve_hp} HP)")
+
+                try:
+                    action = commands.read("Actions: [attack] [use item] [dodge] [special] [run] (queue: attack x3)\nChoose action: ",
+                                           hp=player['current_hp'], max_hp=player['max_hp'], enemies=initiative.alive)
+                except CommandError as err:
+                    print(f"{RED}{err}{RESET}")
+                    continue
+                if action in ["attack","use item","dodge","special","run"]:
+                    break
+                print(f"{RED}Invalid input. Try again.{RESET}")
+            turn_t0 = profiling.start()
+            turns += 1
+
+            def fell(i, e):
+                emit(EV.DEATH, source=player['name'], target=e['name'])
+                arrival = initiative.killed(i)
+                if arrival:
+                    print(f"{arrival['name']} steps up to fight!")
+                    commands.cancel("reinforcements")
+
+            # Player attacks
+            if action == "attack":
+                for i, e in initiative.targets():
+                    hit_chance = 0.85 + player['stats']['AGI']*0.01
+                    if random.random() < hit_chance:
+                        weapon = player.get('equipped_weapon', {'min_damage':5,'max_damage':10})
+                        damage = random.randint(weapon['min_damage'], weapon['max_damage']) + player['stats']['STR']
+
+                        # Shadow Stone effects
+                        crit = False
+                        if player.get('temp_double_crit', False) and random.random() < 0.2:
+                            damage *= 2
+                            crit = True
+                            print(f"{MAGENTA}Shadow Stone Effect: Double Crit!{RESET}")
+                        if player.get('temp_guaranteed_crit', False):
+                            damage *= 2
+                            crit = True
+                            print(f"{MAGENTA}Shadow Stone Effect: Guaranteed Crit!{RESET}")
+                            player['temp_guaranteed_crit'] = False
+
+                        e['current_hp'] -= damage
+                        emit(EV.ATTACK, source=player['name'], target=e['name'], amount=damage)
+                        if crit:
+                            emit(EV.CRIT, source=player['name'], target=e['name'], amount=damage)
+                        emit(EV.DAMAGE_HP, source=player['name'], target=e['name'], amount=damage)
+                        print(f"You dealt {damage} damage to {e['name']}.")
+                        if e['current_hp'] <= 0:
+                            fell(i, e)
+                    else:
+                        emit(EV.MISS, source=player['name'], target=e['name'])
+                        print("You missed!")
+
+            elif action == "use item":
+                use_item()
+                initiative.refresh_player()
+            elif action == "dodge":
+                print("You prepare to dodge the next attack!")
+                player['temp_dodge'] = True
+            elif action == "special":
+                if player.get('special_counter',0) >= 3 or boss:
+                    print("You unleash your special ability!")
+                    for i, e in initiative.targets():
+                        damage = random.randint(10+player['stats']['STR'], 20+player['stats']['STR'])
+                        e['current_hp'] -= damage
+                        emit(EV.ATTACK, source=player['name'], target=e['name'], amount=damage, special=True)
+                        emit(EV.DAMAGE_HP, source=player['name'], target=e['name'], amount=damage)
+                        print(f"Special hits {e['name']} for {damage} damage!")
+                        if e['current_hp'] <= 0:
+                            fell(i, e)
+                    if not boss:
+                        player['special_counter'] = 0
+                else:
+                    print(f"Special not ready. {3 - player.get('special_counter',0)} more normal fights needed.")
+
+            elif action == "run":
+                if boss:
+                    print("Cannot run from a boss!")
+                elif random.random() < 0.5:
+                    print("You successfully escaped!")
+                    metrics.fight_finished("lucidus", turns)
+                    return
+                else:
+                    print("Failed to escape!")
+            profiling.stop("combat.turn", turn_t0)
+    finally:
+        commands.close()
+
+    metrics.fight_finished("lucidus", turns)
+    if player['current_hp'] <= 0:
+        emit(EV.DEATH, target=player['name'], raid=True)
+        metrics.DEATHS.inc("lucidus", player['rank'])
+        print("You died in the raid...")
+        player['current_hp'] = player['max_hp']
+        save_player()
+        while True:
+            choice = input("Do you want to [continue] or [save & quit]? ").strip().lower()
+            if choice == "continue":
+                return
+            elif choice == "save & quit":
+                save_player()
+                exit()
+            else:
+                print("Invalid input.")
+
+    print(f"{GREEN}You defeated the raid enemies!{RESET}")
+
+    # Gain XP only if not boss (optional)
+    if not boss:
+        for e in enemies:
+            xp_values = {"E":5,"D":10,"C":20,"B":40,"A":80,"S":150}
+            gain_xp(xp_values.get(e.get('rank','E'),10))
+        player['special_counter'] = player.get('special_counter',0)+1
+
+    # Loot drops
+    table = RAID_LOOT_TABLES.get(player.get('current_raid',1))
+    for e, item in zip(enemies, table.roll_n(len(enemies)) if table else ()):
+        player['inventory'].append(item)
+        emit(EV.LOOT_DROP, source=e['name'], target=player['name'], amount=1, item=item['name'])
+        print(f"You found {item['name']}!")
+
+    save_player()
@@ -0,0 +1,6 @@
+"""
+Helpers shared by the three text RPGs (halorpg, lucidusrpg, sololevelingrpg).
+
+The games are plain scripts run from their own folders, so each one puts the
+repository root on sys.path before importing from here.
+"""
@@ -0,0 +1,155 @@
+"""
+Streaming aggregators for long simulations.
+
+Each one takes values one at a time with add() and keeps a fixed amount of
+state however many it is given, so a simulation can stream a million results
+through them without keeping any:
+
+    Moments        count, mean, standard deviation, min and max (Welford)
+    Quantile       one quantile: exact over the first EXACT_SAMPLES values,
+                   then estimated with the P-square algorithm (Jain &
+                   Chlamtac, 1985): five markers, no samples kept
+    Series         the mean per stretch of the stream, in at most `buckets`
+                   stretches; when they run out, neighbours merge in pairs and
+                   every stretch doubles in length
+
+They are plain objects, so they pickle back from a process pool.
+"""
+import math
+from typing import List, Tuple
+
+SERIES_BUCKETS = 64
+EXACT_SAMPLES = 512  # values a Quantile keeps before switching to P-square; short streams stay exact
+
+
+class Moments:
+    __slots__ = ("n", "mean", "_m2", "min", "max")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x: float):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (x - self.mean)
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+
+    @property
+    def stdev(self) -> float:
+        return math.sqrt(self._m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+
+class Quantile:
+    """The p-quantile of everything added so far; exact for the first EXACT_SAMPLES values, an estimate after."""
+    __slots__ = ("p", "_samples", "_q", "_n", "_want", "_step")
+
+    def __init__(self, p: float):
+        if not 0 < p < 1:
+            raise ValueError("a quantile needs 0 < p < 1")
+        self.p = p
+        self._samples: List[float] = []  # the stream itself until EXACT_SAMPLES; [] once the markers take over
+        self._q: List[float] = []        # marker heights
+        self._n: List[int] = []          # marker positions
+        self._step = [0, p / 2, p, (1 + p) / 2, 1]
+        self._want: List[float] = []     # desired positions
+
+    def add(self, x: float):
+        if self._q:
+            self._add(x)
+            return
+        self._samples.append(x)
+        if len(self._samples) == EXACT_SAMPLES:
+            self._start()
+
+    def _start(self):
+        # the markers start out as the order statistics nearest their desired positions
+        ordered = sorted(self._samples)
+        last = len(ordered) - 1
+        self._want = [last * step for step in self._step]
+        n = []
+        for i, want in enumerate(self._want):
+            n.append(min(max(round(want), n[-1] + 1 if n else 0), last - (4 - i)))
+        self._n = n
+        self._q = [ordered[i] for i in n]
+        self._samples = []
+
+    def _add(self, x: float):
+        q, n = self._q, self._n
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._want[i] += self._step[i]
+        for i in (1, 2, 3):
+            d = self._want[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    def _parabolic(self, i: int, d: int) -> float:
+        q, n = self._q, self._n
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    def value(self) -> float:
+        if self._q:
+            return self._q[2]
+        if not self._samples:
+            return math.nan
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(self.p * len(ordered)))]
+
+
+class Series:
+    """The stream as up to `buckets` consecutive stretches of equal length, with each one's mean."""
+    __slots__ = ("buckets", "width", "_sums", "_partial", "_partial_n")
+
+    def __init__(self, buckets: int = SERIES_BUCKETS):
+        if buckets < 2 or buckets % 2:
+            raise ValueError("a series needs an even number of buckets")
+        self.buckets = buckets
+        self.width = 1
+        self._sums: List[float] = []
+        self._partial = 0.0
+        self._partial_n = 0
+
+    def add(self, x: float):
+        self._partial += x
+        self._partial_n += 1
+        if self._partial_n == self.width:
+            self._sums.append(self._partial)
+            self._partial = 0.0
+            self._partial_n = 0
+            if len(self._sums) == self.buckets:
+                self._sums = [self._sums[i] + self._sums[i + 1] for i in range(0, self.buckets, 2)]
+                self.width *= 2
+
+    def rows(self) -> List[Tuple[int, int, float]]:
+        """(first, last, mean) per stretch, counting from 1; the last stretch may be short."""
+        found = [(i * self.width + 1, (i + 1) * self.width, s / self.width) for i, s in enumerate(self._sums)]
+        if self._partial_n:
+            first = len(self._sums) * self.width + 1
+            found.append((first, first + self._partial_n - 1, self._partial / self._partial_n))
+        return found
@@ -0,0 +1,64 @@
+"""
+Auto-resolve for trivial fights.
+
+Each game supplies a headless simulate(rng, build, enemies) -> (damage_taken, turns)
+that plays its own combat rules with the "attack every turn" policy and no HP
+cap. That policy never heals, so in the real fight the player dies exactly when
+the damage taken before the last enemy falls reaches their current HP. One
+cached sample set per (build, enemies) therefore answers every starting HP:
+the win probability is a bisect into the sorted damage samples, and sampling a
+stored run reproduces the same outcome distribution as playing it out.
+"""
+import bisect
+import random
+from collections import OrderedDict
+from typing import Callable, Hashable, List, Tuple
+
+DEFAULT_THRESHOLD = 0.95
+DEFAULT_SAMPLES = 2000
+
+Simulator = Callable[[random.Random, Hashable, Hashable], Tuple[int, int]]
+
+
+class OutcomeDistribution:
+    __slots__ = ("damage", "turns")
+
+    def __init__(self, samples: List[Tuple[int, int]]):
+        samples.sort()
+        self.damage = [d for d, _ in samples]
+        self.turns = [t for _, t in samples]
+
+    def win_probability(self, current_hp: int) -> float:
+        return bisect.bisect_left(self.damage, current_hp) / len(self.damage)
+
+    def sample(self, rng=random) -> Tuple[int, int]:
+        """Returns (damage_taken, turns) of one simulated fight."""
+        i = rng.randrange(len(self.damage))
+        return self.damage[i], self.turns[i]
+
+
+class OutcomeTable:
+    """LRU cache of outcome distributions keyed by (build, enemies); both keys must be hashable."""
+
+    def __init__(self, simulate: Simulator, samples: int = DEFAULT_SAMPLES, max_entries: int = 4096):
+        self.simulate = simulate
+        self.samples = samples
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple[Hashable, Hashable], OutcomeDistribution]" = OrderedDict()
+
+    def get(self, build: Hashable, enemies: Hashable) -> OutcomeDistribution:
+        key = (build, enemies)
+        dist = self._cache.get(key)
+        if dist is not None:
+            self._cache.move_to_end(key)
+            return dist
+        # seeded from the key so a table is identical across runs and processes
+        rng = random.Random(repr(key))
+        dist = OutcomeDistribution([self.simulate(rng, build, enemies) for _ in range(self.samples)])
+        self._cache[key] = dist
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return dist
+
+    def __len__(self):
+        return len(self._cache)
@@ -0,0 +1,71 @@
+"""
+Resumable dungeon and raid runs.
+
+A run's layout and the contents of its rooms are rolled from the run's own
+seed, so a checkpoint never stores the rooms themselves. It records which run
+this is, the room the player has reached and what that room holds: the enemies
+already rolled, or a boss with the HP and phase it has left. Games rewrite it
+at room boundaries as part of the player's save and drop it when the run
+ends; a player has at most one checkpoint per kind of run.
+
+    run = checkpoint.resume(player, "raid", raid=2) or checkpoint.begin(player, "raid", raid=2)
+    for room in range(max(run["room"], 1), rooms + 1):
+        contents = checkpoint.pending(run, room) or roll(checkpoint.room_rng(run, room))
+        checkpoint.reach(run, room, contents)
+        save_player()
+        ...
+    checkpoint.finish(player, "raid")
+"""
+import random
+from typing import Any, Dict, Optional
+
+from rpgcommon.migrate import SchemaError, require
+
+SAVE_FIELDS = {"seed": int, "room": int, "pending": (dict, type(None))}
+
+
+def begin(player: Dict[str, Any], kind: str, **identity) -> Dict[str, Any]:
+    """Starts a run of `kind`, replacing any checkpoint of that kind; identity (e.g. raid=2) is stored with it."""
+    run = {"seed": random.getrandbits(32), "room": 0, "pending": None, **identity}
+    if not player.get('checkpoints'):
+        player['checkpoints'] = {}
+    player['checkpoints'][kind] = run
+    return run
+
+
+def resume(player: Dict[str, Any], kind: str, **identity) -> Optional[Dict[str, Any]]:
+    """The player's unfinished run of `kind` matching identity, if there is one."""
+    run = (player.get('checkpoints') or {}).get(kind)
+    if run is None or any(run.get(k) != v for k, v in identity.items()):
+        return None
+    return run
+
+
+def room_rng(run: Dict[str, Any], room: int) -> random.Random:
+    """The stream a room's contents are rolled from; the same for every attempt at the run."""
+    return random.Random(f"{run['seed']}:{room}")
+
+
+def pending(run: Dict[str, Any], room: int) -> Optional[Dict[str, Any]]:
+    """What `room` held when the run was left there, or None if it has not been reached."""
+    return run['pending'] if run['room'] == room else None
+
+
+def reach(run: Dict[str, Any], room: int, contents: Dict[str, Any]):
+    run['room'] = room
+    run['pending'] = contents
+
+
+def finish(player: Dict[str, Any], kind: str):
+    (player.get('checkpoints') or {}).pop(kind, None)
+
+
+def validate(data: Dict[str, Any]):
+    """Schema check for a save's optional 'checkpoints' field."""
+    checkpoints = data.get('checkpoints')
+    if checkpoints is None:
+        return
+    if not isinstance(checkpoints, dict):
+        raise SchemaError("checkpoints: expected an object")
+    for kind, run in checkpoints.items():
+        require(run, SAVE_FIELDS, f"checkpoints.{kind}.")
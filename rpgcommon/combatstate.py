@@ -0,0 +1,176 @@
+"""
+Compact combat states for lookahead search.
+
+A CombatState is one flat list of numbers (hit points, counters, turn clocks)
+plus a 64-bit RNG word. Everything that cannot change during a fight -- stats,
+weapon ranges, enemy templates -- lives on the game's Rules object, which every
+state of that fight shares, so a state stays a few dozen cells however big the
+fight is.
+
+fork() is O(1): the child shares its parent's cells and whichever of the two
+writes first copies them (copy-on-write). Each fork derives its own RNG stream
+from the parent's word and a branch number, so sibling branches roll different
+dice, re-forking the same branch rolls the same ones, and no search ever
+touches the global `random` state a recorded session depends on.
+
+Each game supplies a Rules subclass next to its combat code that mirrors it:
+actions(state) for the side to move, apply(state, action) to play one in place,
+default(state) for the move the game itself would make there (the enemy's
+built-in AI, a plain attack for the player) and value(state), the player's
+outlook in [0, 1].
+"""
+import random
+from typing import List, Optional, Tuple
+
+# header cells shared by every game's layout; the rules add their own after HEADER
+STATUS, SIDE, ACTOR, TURN = range(4)
+HEADER = 4
+
+ONGOING, WON, LOST, FLED = range(4)
+PLAYER, ENEMY = 0, 1
+
+_MASK = (1 << 64) - 1
+_GAMMA = 0x9E3779B97F4A7C15  # splitmix64 stream increment
+_FORK = 0xD1B54A32D192ED03   # odd multiplier spreading branch numbers across seeds
+_UNIT = 2.0 ** -53
+
+
+def _mix(z: int) -> int:
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK
+    return z ^ (z >> 31)
+
+
+class Rules:
+    """One game's combat rules over CombatState cells."""
+    size = HEADER  # cells per state
+
+    def actions(self, state: "CombatState") -> Tuple[str, ...]:
+        raise NotImplementedError
+
+    def apply(self, state: "CombatState", action: str):
+        raise NotImplementedError
+
+    def default(self, state: "CombatState") -> str:
+        return self.actions(state)[0]
+
+    def value(self, state: "CombatState") -> float:
+        raise NotImplementedError
+
+    @staticmethod
+    def outlook(status: int, hp_left: float, foes_left: float) -> float:
+        """
+        The value scale every game shares, from the fractions of player and enemy
+        health left: a loss is 0, an open fight 0-0.5, a win 0.5-1 by health kept.
+        Fleeing scores below a fresh fight, so it only pays when things look bad.
+        """
+        if status == ONGOING:
+            return 0.25 * (hp_left + 1.0 - foes_left)
+        if status == WON:
+            return 0.5 + 0.5 * hp_left
+        if status == FLED:
+            return 0.2 * hp_left
+        return 0.0
+
+    def new_state(self, cells: List, seed: Optional[int] = None) -> "CombatState":
+        if len(cells) != self.size:
+            raise ValueError(f"{type(self).__name__} states have {self.size} cells, got {len(cells)}")
+        # drawn from the session RNG so recorded sessions replay the same searches
+        return CombatState(self, cells, random.getrandbits(64) if seed is None else seed)
+
+
+class CombatState:
+    __slots__ = ("rules", "cells", "seed", "_shared")
+
+    def __init__(self, rules: Rules, cells: List, seed: int):
+        self.rules = rules
+        self.cells = cells
+        self.seed = seed & _MASK
+        self._shared = False
+
+    # -------------------------
+    # Snapshots
+    # -------------------------
+    def fork(self, branch: int = 0) -> "CombatState":
+        """An O(1) snapshot with its own RNG stream; cells are copied by whichever side writes first."""
+        self._shared = True
+        child = CombatState.__new__(CombatState)
+        child.rules = self.rules
+        child.cells = self.cells
+        child.seed = _mix((self.seed + (branch + 1) * _FORK) & _MASK)
+        child._shared = True
+        return child
+
+    def child(self, action: str, branch: int = 0) -> "CombatState":
+        """A fork with action already played."""
+        state = self.fork(branch)
+        self.rules.apply(state, action)
+        return state
+
+    def writable(self) -> List:
+        if self._shared:
+            self.cells = self.cells[:]
+            self._shared = False
+        return self.cells
+
+    def key(self) -> Tuple:
+        """Hashable position (cells only): states reached by different rolls to the same numbers share it."""
+        return tuple(self.cells)
+
+    # -------------------------
+    # Per-branch RNG (splitmix64)
+    # -------------------------
+    def random(self) -> float:
+        self.seed = s = (self.seed + _GAMMA) & _MASK
+        return (_mix(s) >> 11) * _UNIT
+
+    def chance(self, p: float) -> bool:
+        return self.random() < p
+
+    def randint(self, a: int, b: int) -> int:
+        return a + int(self.random() * (b - a + 1))
+
+    # -------------------------
+    # Shortcuts
+    # -------------------------
+    @property
+    def status(self) -> int:
+        return self.cells[STATUS]
+
+    @property
+    def terminal(self) -> bool:
+        return self.cells[STATUS] != ONGOING
+
+    @property
+    def to_move(self) -> int:
+        return self.cells[SIDE]
+
+    @property
+    def actor(self) -> int:
+        return self.cells[ACTOR]
+
+    @property
+    def turn(self) -> int:
+        return self.cells[TURN]
+
+    def actions(self) -> Tuple[str, ...]:
+        return () if self.cells[STATUS] != ONGOING else self.rules.actions(self)
+
+    def default(self) -> str:
+        return self.rules.default(self)
+
+    def value(self) -> float:
+        return self.rules.value(self)
+
+    def playout(self, max_turns: int = 200) -> "CombatState":
+        """Plays default moves in place until the fight ends or max_turns more turns pass."""
+        rules = self.rules
+        cells = self.cells
+        stop = cells[TURN] + max_turns
+        while cells[STATUS] == ONGOING and cells[TURN] < stop:
+            rules.apply(self, rules.default(self))
+            cells = self.cells
+        return self
+
+    def __repr__(self):
+        return f"CombatState({type(self.rules).__name__}, {self.cells!r})"
@@ -0,0 +1,201 @@
+"""
+Batched multi-turn combat input.
+
+Lets a player queue several turns with one prompt:
+
+    attack x5
+    grenade, attack*3
+    attack until hp<30 then medkit
+    attack until hp<40% then dodge, special
+
+Queued actions are handed back one per turn by CommandQueue.read(). The queue
+is dropped when an interrupt fires (low HP, a new enemy, a critical hit taken),
+and everything printed while it runs is collected into one output frame
+(rpgcommon.output) that is written out when the player is next asked for input.
+"""
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from rpgcommon import events
+from rpgcommon import output
+from rpgcommon.events import EventType as EV
+
+MAX_REPEAT = 50  # upper bound for "xN" and "until" steps
+
+_BATCH_SYNTAX = re.compile(r"[,;*]|\buntil\b|\bx\s*\d+\s*$")
+_REPEAT = re.compile(r"(\w+)\s*(?:[x*]\s*(\d+))?")
+_UNTIL = re.compile(r"(\w+)\s+until\s+(.+?)(?:\s+then\s+(.+))?")
+_CONDITION = re.compile(r"(hp|shield|enemies)\s*(<=|>=|<|>|==)\s*(\d+)\s*(%?)")
+
+
+class CommandError(ValueError):
+    pass
+
+
+# -------------------------
+# Parsing
+# -------------------------
+@dataclass
+class Condition:
+    stat: str
+    op: str
+    value: int
+    percent: bool = False
+
+    def holds(self, state: Dict[str, int]) -> bool:
+        current = state.get(self.stat, 0)
+        target = self.value
+        if self.percent:
+            target = state.get("max_" + self.stat, 0) * self.value / 100.0
+        return {"<": current < target, "<=": current <= target, ">": current > target,
+                ">=": current >= target, "==": current == target}[self.op]
+
+
+@dataclass
+class Step:
+    action: str
+    count: int = 1
+    until: Optional[Condition] = None
+
+
+def parse_condition(text: str) -> Condition:
+    m = _CONDITION.fullmatch(text.strip().lower())
+    if not m:
+        raise CommandError(f"Unknown condition '{text.strip()}' (try hp<30 or hp<40%).")
+    return Condition(stat=m.group(1), op=m.group(2), value=int(m.group(3)), percent=bool(m.group(4)))
+
+
+def parse(text: str, verbs: Dict[str, str]) -> List[Step]:
+    """Turns a command line into steps; verbs maps typed words to the game's action strings."""
+    steps: List[Step] = []
+    for part in re.split(r"[,;]", text.strip().lower()):
+        part = part.strip()
+        if not part:
+            continue
+        m = _UNTIL.fullmatch(part)
+        if m:
+            steps.append(Step(_verb(m.group(1), verbs), MAX_REPEAT, parse_condition(m.group(2))))
+            if m.group(3):
+                steps.extend(parse(m.group(3), verbs))
+            continue
+        m = _REPEAT.fullmatch(part)
+        if not m:
+            raise CommandError(f"Could not understand '{part}'.")
+        count = int(m.group(2)) if m.group(2) else 1
+        steps.append(Step(_verb(m.group(1), verbs), max(1, min(count, MAX_REPEAT))))
+    if not steps:
+        raise CommandError("Nothing to do.")
+    return steps
+
+
+def _verb(word: str, verbs: Dict[str, str]) -> str:
+    if word not in verbs:
+        raise CommandError(f"'{word}' can't be queued. Queueable: {', '.join(sorted(set(verbs)))}")
+    return verbs[word]
+
+
+# -------------------------
+# Queue
+# -------------------------
+@dataclass
+class InterruptRules:
+    low_hp: float = 0.25      # fraction of max HP; 0 disables
+    new_enemy: bool = True
+    crit_taken: bool = True
+
+
+DEFAULT_RULES = InterruptRules()
+
+
+class CommandQueue:
+    """
+    One per fight. read() returns the next action string for the combat loop,
+    prompting only when nothing is queued. State is passed as keyword counters
+    (hp, max_hp, shield, max_shield, enemies) so conditions can be checked.
+    A line that cannot be queued, or leaves nothing to do, raises CommandError
+    with the batch already closed; the loop prints it and asks again.
+    """
+
+    def __init__(self, verbs: Dict[str, str], owner: str, rules: InterruptRules = DEFAULT_RULES):
+        self.verbs = verbs
+        self.owner = owner
+        self.rules = rules
+        self._steps: List[Step] = []
+        self._enemies = None
+        self._crit_taken = False
+        self._subscribed = False
+        output.end_frame()
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._steps)
+
+    def read(self, prompt: str, **state) -> str:
+        if self._steps:
+            reason = self._interrupt_reason(state)
+            if reason:
+                self.cancel(reason)
+            else:
+                action = self._next(state)
+                if action is not None:
+                    self._enemies = state.get("enemies")
+                    return action
+        self.close()
+        raw = input(prompt).strip().lower()
+        if not _BATCH_SYNTAX.search(raw):
+            return raw
+        self._steps = parse(raw, self.verbs)
+        self._enemies = state.get("enemies")
+        self._crit_taken = False
+        if not self._subscribed:
+            events.bus.subscribe(self._on_event, (EV.CRIT,))
+            self._subscribed = True
+        output.begin_frame()
+        action = self._next(state)
+        if action is None:
+            self.close()
+            raise CommandError("Nothing to do: the stop condition already holds.")
+        return action
+
+    def cancel(self, reason: str = ""):
+        if self._steps and reason:
+            print(f"[Queue interrupted: {reason}]")
+        self._steps = []
+        self.close()
+
+    def close(self):
+        self._steps = []
+        if self._subscribed:
+            events.bus.unsubscribe(self._on_event)
+            self._subscribed = False
+        output.end_frame()
+
+    # ---- internals
+    def _next(self, state) -> Optional[str]:
+        while self._steps:
+            step = self._steps[0]
+            if step.until is not None and step.until.holds(state):
+                self._steps.pop(0)
+                continue
+            step.count -= 1
+            if step.count <= 0:
+                self._steps.pop(0)
+            return step.action
+        return None
+
+    def _interrupt_reason(self, state) -> Optional[str]:
+        rules = self.rules
+        if self._crit_taken and rules.crit_taken:
+            return "critical hit taken"
+        if rules.low_hp and state.get("max_hp") and state.get("hp", 0) <= rules.low_hp * state["max_hp"]:
+            # an explicit "until hp<..." step is the player's own stop condition
+            if self._steps[0].until is None or self._steps[0].until.stat != "hp":
+                return "low HP"
+        if rules.new_enemy and self._enemies is not None and state.get("enemies", 0) > self._enemies:
+            return "new enemy"
+        return None
+
+    def _on_event(self, event):
+        if event.target == self.owner:
+            self._crit_taken = True
@@ -0,0 +1,490 @@
+"""
+Game content compiled to a binary cache.
+
+Each game keeps its content tables -- enemies, bosses, weapons, loot, effects
+-- as JSON files in its data/ folder, one table per file, shaped like the
+Python literal it replaces:
+
+    [{...}, {...}]           rows                        -> Table, a sequence of dicts
+    ["a", "b"]               values                      -> Table of values
+    {"key": {...}, ...}      rows by unique key          -> KeyedTable, a mapping
+    {"key": [...], ...}      rows or values in groups    -> GroupedTable, a mapping of lists
+
+load(folder) compiles every table into data/content.bin the first time, and
+again whenever a data file is added, removed or touched: the cache records the
+name, size and mtime of each source. The cache is a small JSON directory
+followed by struct-packed arrays -- one per column (int64, float64, bool, or
+uint32 ids into one de-duplicated string table), presence bitmaps for columns
+some rows lack, group offsets and an open-addressing hash index per keyed
+table. Loading maps the file and parses only the directory, so it costs the
+same for forty rows as for forty thousand. Rows are decoded the first time
+they are read and kept, so reading a row twice gives the same dict, just like
+the literal it replaces.
+
+A row's id is its position: table.id(key) is one hash probe, table.row(id)
+one decode.
+
+A server running game sessions in several worker processes calls publish(folder)
+in the parent before starting them. It compiles the cache if it is stale and
+lists it in RPG_CONTENT_PUBLISHED, which the workers inherit; load() in a worker
+then maps the published file as it is, without scanning data/ and without
+racing the other workers to recompile after an edit. Every worker maps the same
+file, so the tables sit once in the page cache rather than once per process,
+and a new worker's load is one mmap. Tables derived from the content (e.g. the
+stat planner's policy, see rpgcommon.statplan) are stored the same way:
+compile_tables() builds an image from any JSON-shaped data, store() writes and
+maps it, and attach(path, signature) maps it again if its signature matches.
+
+    python -m rpgcommon.content DIR [--force]     compile DIR/*.json and list the tables
+"""
+import argparse
+import array
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import zlib
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, List, Optional, Tuple
+
+MAGIC = b"RPGC"
+VERSION = 1
+CACHE_FILE = "content.bin"
+PUBLISHED_ENV = "RPG_CONTENT_PUBLISHED"  # os.pathsep-separated cache files a parent process vouches for
+HEADER = struct.Struct("<4sII4x")  # magic, version, directory length
+ALIGN = 8
+
+# column kind -> array typecode
+TYPECODES = {"int": "q", "float": "d", "bool": "B", "str": "I"}
+
+
+class ContentError(ValueError):
+    pass
+
+
+# -------------------------
+# Compiler
+# -------------------------
+class _Builder:
+    def __init__(self):
+        self.body = bytearray()
+        self.strings: Dict[str, int] = {}
+
+    def put(self, data: bytes) -> int:
+        self.body.extend(b"\0" * (-len(self.body) % ALIGN))
+        offset = len(self.body)
+        self.body.extend(data)
+        return offset
+
+    def sid(self, s: str) -> int:
+        sid = self.strings.get(s)
+        if sid is None:
+            sid = self.strings[s] = len(self.strings)
+        return sid
+
+    def columns(self, table: str, rows: List[Dict[str, Any]]) -> List[list]:
+        names: Dict[str, None] = {}
+        for row in rows:
+            names.update(dict.fromkeys(row))
+        columns = []
+        for name in names:
+            values = [row.get(name) for row in rows]
+            kind = _kind(table, name, [v for v in values if v is not None])
+            data = array.array(TYPECODES[kind], [0]) * len(rows)
+            for i, v in enumerate(values):
+                if v is not None:
+                    data[i] = self.sid(v) if kind == "str" else v
+            presence = -1
+            if None in values:
+                bits = bytearray((len(rows) + 7) // 8)
+                for i, v in enumerate(values):
+                    if v is not None:
+                        bits[i >> 3] |= 1 << (i & 7)
+                presence = self.put(bytes(bits))
+            columns.append([name, kind, self.put(data.tobytes()), presence])
+        return columns
+
+    def items(self, table: str, items: list) -> Dict[str, Any]:
+        """Directory entry for a list of rows (dicts) or of values."""
+        if all(isinstance(item, dict) for item in items):
+            for item in items:
+                for name, v in item.items():
+                    if v is None or isinstance(v, (list, dict)):
+                        raise ContentError(f"{table}: {name}: values must be numbers, strings or booleans")
+            return {"shape": "rows", "rows": len(items), "columns": self.columns(table, items)}
+        if any(isinstance(item, (dict, list)) or item is None for item in items):
+            raise ContentError(f"{table}: a list must hold only objects or only plain values")
+        return {"shape": "values", "rows": len(items), "columns": self.columns(table, [{"value": v} for v in items])}
+
+    def table(self, name: str, data: Any) -> Dict[str, Any]:
+        if isinstance(data, list):
+            return self.items(name, data)
+        if not isinstance(data, dict):
+            raise ContentError(f"{name}: expected a list or an object")
+        keys = list(data)
+        if all(isinstance(v, dict) for v in data.values()):
+            entry = self.items(name, list(data.values()))
+            entry["shape"] = "keyed"
+            entry["keys"] = self.put(array.array("I", [self.sid(k) for k in keys]).tobytes())
+            entry["index"] = self.put(_hash_index(keys).tobytes())
+            return entry
+        if all(isinstance(v, list) for v in data.values()):
+            flat = [item for group in data.values() for item in group]
+            entry = self.items(name, flat)
+            if not flat:
+                entry["shape"] = "rows"
+            entry = {"shape": "grouped", "inner": entry["shape"], "rows": len(flat), "columns": entry["columns"]}
+            offsets = array.array("I", [0])
+            for group in data.values():
+                offsets.append(offsets[-1] + len(group))
+            entry["groups"] = [int(k) for k in keys] if all(_is_int(k) for k in keys) else keys
+            entry["offsets"] = self.put(offsets.tobytes())
+            return entry
+        raise ContentError(f"{name}: an object must map every key to an object, or every key to a list")
+
+    def finish(self, directory: Dict[str, Any]) -> bytes:
+        blobs = [s.encode("utf-8") for s in self.strings]
+        offsets = array.array("I", [0])
+        for b in blobs:
+            offsets.append(offsets[-1] + len(b))
+        directory["strings"] = [len(blobs), self.put(offsets.tobytes()), self.put(b"".join(blobs))]
+        head = json.dumps(directory, separators=(",", ":")).encode("utf-8")
+        head += b" " * (-(HEADER.size + len(head)) % ALIGN)
+        return HEADER.pack(MAGIC, VERSION, len(head)) + head + bytes(self.body)
+
+
+def _kind(table: str, column: str, values: list) -> str:
+    kinds = {bool: "bool", int: "int", float: "float", str: "str"}
+    seen = {kinds.get(type(v)) for v in values}
+    if None in seen:
+        raise ContentError(f"{table}: {column}: unsupported value")
+    if seen <= {"int", "float"} and "float" in seen:
+        return "float"
+    if len(seen) > 1:
+        raise ContentError(f"{table}: {column}: mixes {' and '.join(sorted(seen))} values")
+    kind = seen.pop() if seen else "int"
+    if kind == "int" and not all(-2**63 <= v < 2**63 for v in values):
+        raise ContentError(f"{table}: {column}: integer out of range")
+    return kind
+
+
+def _is_int(key: str) -> bool:
+    return key.lstrip("-").isdigit() and str(int(key)) == key
+
+
+def _hash_index(keys: List[str]) -> array.array:
+    """Open addressing, linear probing; slots hold row + 1 (0 = empty), at most half full."""
+    cap = 8
+    while cap < 2 * len(keys):
+        cap *= 2
+    slots = array.array("I", [0]) * cap
+    for row, key in enumerate(keys):
+        h = zlib.crc32(key.encode("utf-8")) & (cap - 1)
+        while slots[h]:
+            h = (h + 1) & (cap - 1)
+        slots[h] = row + 1
+    return slots
+
+
+def sources(folder: str) -> List[list]:
+    """[name, size, mtime_ns] of every data file; the cache is rebuilt when this changes."""
+    found = []
+    for entry in os.scandir(folder):
+        if entry.is_file() and entry.name.endswith(".json"):
+            st = entry.stat()
+            found.append([entry.name, st.st_size, st.st_mtime_ns])
+    return sorted(found)
+
+
+def compile_folder(folder: str, signature: Optional[List[list]] = None) -> bytes:
+    builder = _Builder()
+    tables = {}
+    for name, _, _ in signature if signature is not None else sources(folder):
+        path = os.path.join(folder, name)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except ValueError as err:
+            raise ContentError(f"{path}: {err}") from None
+        tables[name[:-len(".json")]] = builder.table(name, data)
+    return builder.finish({"sources": signature if signature is not None else sources(folder), "tables": tables})
+
+
+def compile_tables(tables: Dict[str, Any], signature: Any) -> bytes:
+    """An image of name -> data (shaped like a data file), tagged with the signature attach() checks."""
+    builder = _Builder()
+    return builder.finish({"sources": signature,
+                           "tables": {name: builder.table(name, data) for name, data in tables.items()}})
+
+
+# -------------------------
+# Loader
+# -------------------------
+class Catalog(Mapping):
+    """The tables of one compiled folder, by file name without .json."""
+
+    def __init__(self, buf):
+        magic, version, head_len = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ContentError("not a content cache of this version")
+        self._buf = buf
+        self.directory = json.loads(bytes(buf[HEADER.size:HEADER.size + head_len]))
+        self._body = memoryview(buf)[HEADER.size + head_len:]
+        count, offsets, blob = self.directory["strings"]
+        self._offsets = self.array("I", offsets, count + 1)
+        self._blob = self._body[blob:]
+        self._strings: Dict[int, str] = {}
+        self._tables: Dict[str, Any] = {}
+
+    def array(self, typecode: str, offset: int, length: int) -> memoryview:
+        size = struct.calcsize(typecode)
+        return self._body[offset:offset + size * length].cast(typecode)
+
+    def string(self, sid: int) -> str:
+        s = self._strings.get(sid)
+        if s is None:
+            s = self._strings[sid] = str(self.raw_string(sid), "utf-8")
+        return s
+
+    def raw_string(self, sid: int) -> memoryview:
+        return self._blob[self._offsets[sid]:self._offsets[sid + 1]]
+
+    def __getitem__(self, name: str):
+        view = self._tables.get(name)
+        if view is None:
+            meta = self.directory["tables"][name]
+            cls = {"rows": Table, "values": Table, "keyed": KeyedTable, "grouped": GroupedTable}[meta["shape"]]
+            view = self._tables[name] = cls(self, name, meta)
+        return view
+
+    def __iter__(self):
+        return iter(self.directory["tables"])
+
+    def __len__(self):
+        return len(self.directory["tables"])
+
+
+class Table(Sequence):
+    def __init__(self, catalog: Catalog, name: str, meta: Dict[str, Any]):
+        self.catalog = catalog
+        self.name = name
+        self._n = meta["rows"]
+        self._values = meta.get("inner", meta["shape"]) == "values"
+        self._columns: List[Tuple[str, str, memoryview, Optional[memoryview]]] = []
+        for col, kind, data, presence in meta["columns"]:
+            bits = catalog.array("B", presence, (self._n + 7) // 8) if presence >= 0 else None
+            self._columns.append((col, kind, catalog.array(TYPECODES[kind], data, self._n), bits))
+        self._rows: Dict[int, Any] = {}
+
+    def __len__(self):
+        return self._n
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.row(j) for j in range(*i.indices(self._n))]
+        if i < 0:
+            i += self._n
+        if not 0 <= i < self._n:
+            raise IndexError(f"{self.name}: row {i} out of range")
+        return self.row(i)
+
+    def __iter__(self):
+        return (self.row(i) for i in range(self._n))
+
+    def row(self, i: int):
+        row = self._rows.get(i)
+        if row is None and i not in self._rows:
+            row = self._rows[i] = self._decode(i)
+        return row
+
+    def _decode(self, i: int):
+        row = {}
+        string = self.catalog.string
+        for name, kind, data, bits in self._columns:
+            if bits is None or bits[i >> 3] >> (i & 7) & 1:
+                v = data[i]
+                row[name] = string(v) if kind == "str" else bool(v) if kind == "bool" else v
+        return row["value"] if self._values else row
+
+    def column(self, name: str):
+        """Every row's value of one column: a zero-copy array for numbers, a list for strings."""
+        for col, kind, data, bits in self._columns:
+            if col == name:
+                if kind == "str":
+                    return [self.catalog.string(v) for v in data]
+                return data
+        raise KeyError(name)
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.name}: {self._n} rows>"
+
+
+class KeyedTable(Table, Mapping):
+    """Rows by key; iterates keys in file order like the dict literal it replaces."""
+
+    def __init__(self, catalog, name, meta):
+        super().__init__(catalog, name, meta)
+        self._keys = catalog.array("I", meta["keys"], self._n)
+        cap = 8
+        while cap < 2 * self._n:
+            cap *= 2
+        self._index = catalog.array("I", meta["index"], cap)
+        self._mask = cap - 1
+        self._by_key: Dict[str, Any] = {}
+        self._key_list: Optional[List[str]] = None
+
+    def id(self, key: str) -> int:
+        b = key.encode("utf-8")
+        raw_string, keys, index, mask = self.catalog.raw_string, self._keys, self._index, self._mask
+        h = zlib.crc32(b) & mask
+        while True:
+            slot = index[h]
+            if not slot:
+                raise KeyError(key)
+            if raw_string(keys[slot - 1]) == b:
+                return slot - 1
+            h = (h + 1) & mask
+
+    def key(self, i: int) -> str:
+        return self.catalog.string(self._keys[i])
+
+    def __getitem__(self, key):
+        row = self._by_key.get(key)
+        if row is None:
+            if not isinstance(key, str):
+                raise KeyError(key)
+            row = self._by_key[key] = self.row(self.id(key))
+        return row
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        if self._key_list is None:
+            self._key_list = [self.key(i) for i in range(self._n)]
+        return iter(self._key_list)
+
+    def rows(self):
+        return Table.__iter__(self)
+
+
+class GroupedTable(Mapping):
+    """Lists of rows (or values) by group key, e.g. raid tier -> enemies."""
+
+    def __init__(self, catalog, name, meta):
+        self.name = name
+        self.flat = Table(catalog, name, meta)
+        self._groups = {k: g for g, k in enumerate(meta["groups"])}
+        self._offsets = catalog.array("I", meta["offsets"], len(self._groups) + 1)
+        self._lists: Dict[Any, list] = {}
+
+    def __getitem__(self, key):
+        items = self._lists.get(key)
+        if items is None:
+            g = self._groups[key]
+            items = self._lists[key] = self.flat[self._offsets[g]:self._offsets[g + 1]]
+        return items
+
+    def __iter__(self):
+        return iter(self._groups)
+
+    def __len__(self):
+        return len(self._groups)
+
+    def __repr__(self):
+        return f"<GroupedTable {self.name}: {len(self)} groups, {len(self.flat)} rows>"
+
+
+# -------------------------
+# Cache
+# -------------------------
+def attach(path: str, signature: Any = None) -> Optional[Catalog]:
+    """Maps a cache file, or None if it is missing, corrupt or (given a signature) out of date."""
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                return None
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except OSError:
+        return None
+    try:
+        catalog = Catalog(buf)
+    except (ContentError, ValueError, struct.error):
+        buf.close()
+        return None
+    if signature is not None and catalog.directory.get("sources") != signature:
+        del catalog
+        buf.close()
+        return None
+    return catalog
+
+
+def store(path: str, data: bytes, signature: Any) -> Catalog:
+    """Writes a compiled image to path and maps it; a read-only folder keeps the image in memory instead."""
+    try:
+        with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(path) or ".", delete=False) as tf:
+            tf.write(data)
+            tempname = tf.name
+        os.replace(tempname, path)
+    except OSError:
+        return Catalog(data)  # read-only install: use the compiled tables without caching them
+    return attach(path, signature) or Catalog(data)
+
+
+def load(folder: str, force: bool = False) -> Catalog:
+    """The folder's tables, rebuilding its content.bin first if any data file changed."""
+    path = os.path.join(folder, CACHE_FILE)
+    if not force and os.path.abspath(path) in published():
+        catalog = attach(path)
+        if catalog is not None:
+            return catalog
+    signature = sources(folder)
+    catalog = None if force else attach(path, signature)
+    if catalog is not None:
+        return catalog
+    return store(path, compile_folder(folder, signature), signature)
+
+
+# -------------------------
+# Publishing
+# -------------------------
+def published() -> List[str]:
+    return [p for p in os.environ.get(PUBLISHED_ENV, "").split(os.pathsep) if p]
+
+
+def publish(folder: str) -> Catalog:
+    """
+    For a parent process: brings the folder's cache up to date and lists it in
+    PUBLISHED_ENV, so the processes it starts from here on attach to it as is.
+    """
+    catalog = load(folder)
+    if isinstance(catalog._buf, mmap.mmap):  # not an in-memory fallback
+        path = os.path.abspath(os.path.join(folder, CACHE_FILE))
+        paths = published()
+        if path not in paths:
+            os.environ[PUBLISHED_ENV] = os.pathsep.join(paths + [path])
+    return catalog
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m rpgcommon.content", description="Compile a data folder's content cache.")
+    parser.add_argument("folder")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the cache is current")
+    args = parser.parse_args()
+    try:
+        catalog = load(args.folder, args.force)
+    except ContentError as err:
+        sys.exit(f"error: {err}")
+    for name in catalog:
+        print(f"  {catalog[name]!r}")
+    print(f"{os.path.join(args.folder, CACHE_FILE)}: {len(catalog)} tables, {catalog.directory['strings'][0]} strings")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Adaptive difficulty (RPG_ADAPTIVE=1 or --adaptive).
+
+A Tuner finds, for one player build and one enemy, the factors to scale the
+enemy's HP and attack by so that the fight lasts about TARGET_TURNS turns and
+the player wins it about TARGET_WIN of the time. It plays the game's headless
+simulate(rng, build, enemy) -> (damage_taken, turns) -- the same model
+auto-resolve uses -- so a win is damage taken below the player's HP:
+
+  1. bisect the HP factor (geometrically, within FACTOR_RANGE) until the
+     median fight reaches TARGET_TURNS;
+  2. with that HP, bisect the attack factor until the win chance is TARGET_WIN.
+
+Every trial replays the same seeded dice (common random numbers), so the
+search only sees the effect of the factors and a solution is identical across
+runs and processes.
+
+Solving takes a few thousand simulated fights, so it never happens on the
+caller's thread. factors() only looks in the cache: a miss queues the
+(build, enemy, hp) key for a daemon worker and returns None, and the game
+plays that fight unscaled. Keys hold the player's stats and gear, so nothing
+is recomputed until one of them changes. The worker yields the GIL every
+SLICE fights, so a prompt waiting on it is held up well under a millisecond.
+
+While a session is recorded or replayed (see rpgcommon.replay) the enemy may
+not depend on how far the worker has got, so factors() solves a miss on the
+spot instead; a solution depends only on its key, so the replay matches. A key
+whose solve fails is logged to stderr and plays unscaled from then on.
+"""
+import math
+import os
+import queue
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+from rpgcommon import replay
+from rpgcommon.autoresolve import OutcomeDistribution
+
+ENABLED = os.environ.get("RPG_ADAPTIVE", "") not in ("", "0") or "--adaptive" in sys.argv
+
+TARGET_WIN = 0.8
+TARGET_TURNS = 6
+SAMPLES = 250             # simulated fights per trial
+STEPS = 10                # bisection steps per factor
+FACTOR_RANGE = (0.25, 4.0)
+SLICE = 8                 # simulated fights between GIL yields
+
+Factors = Tuple[float, float]  # (hp_factor, attack_factor)
+Scaler = Callable[[Hashable, float, float], Any]
+
+
+class Tuner:
+    """
+    Background solver and LRU cache of Factors keyed by (build, enemy, hp).
+    scale(enemy, hp_factor, attack_factor) returns the scaled enemy that
+    simulate(rng, build, enemy) accepts.
+    """
+
+    def __init__(self, simulate: Callable[[random.Random, Hashable, Any], Tuple[int, int]], scale: Scaler,
+                 target_win: float = TARGET_WIN, target_turns: float = TARGET_TURNS,
+                 samples: int = SAMPLES, steps: int = STEPS, max_entries: int = 1024):
+        self.simulate = simulate
+        self.scale = scale
+        self.target_win = target_win
+        self.target_turns = target_turns
+        self.samples = samples
+        self.steps = steps
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple[Hashable, Hashable, int], Factors]" = OrderedDict()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[Tuple[Hashable, Hashable, int]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+
+    def factors(self, build: Hashable, enemy: Hashable, hp: int) -> Optional[Factors]:
+        """
+        The cached factors, or None (and the key queued for the worker) if they
+        are not solved yet. In a recorded or replayed session a miss is solved here.
+        """
+        key = (build, enemy, hp)
+        with self._lock:
+            found = self._cache.get(key)
+            if found is not None:
+                self._cache.move_to_end(key)
+                return found
+        if replay.active():
+            found = self._solve_or_skip(key)
+            self._store(key, found)
+            return found
+        with self._lock:
+            if key in self._pending:
+                return None
+            self._pending.add(key)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="difficulty-tuner", daemon=True)
+                self._worker.start()
+        self._queue.put(key)
+        return None
+
+    def prefetch(self, build: Hashable, enemies, hp: int):
+        """Queues every enemy not yet solved for this build, e.g. the ones a dungeon can roll."""
+        for enemy in enemies:
+            self.factors(build, enemy, hp)
+
+    def wait(self):
+        """Blocks until the queue is empty (benchmarks and scripted runs)."""
+        self._queue.join()
+
+    def solve(self, build: Hashable, enemy: Hashable, hp: int) -> Factors:
+        seed = repr((build, enemy, hp))
+
+        def trial(hp_factor: float, attack_factor: float) -> OutcomeDistribution:
+            rng = random.Random(seed)
+            scaled = self.scale(enemy, hp_factor, attack_factor)
+            samples = []
+            for i in range(self.samples):
+                samples.append(self.simulate(rng, build, scaled))
+                if i % SLICE == SLICE - 1:
+                    time.sleep(0)  # let the game thread take the GIL
+            return OutcomeDistribution(samples)
+
+        lo, hi = FACTOR_RANGE
+        for _ in range(self.steps):
+            mid = math.sqrt(lo * hi)
+            if statistics.median_low(trial(mid, 1.0).turns) < self.target_turns:
+                lo = mid
+            else:
+                hi = mid
+        hp_factor = math.sqrt(lo * hi)
+        lo, hi = FACTOR_RANGE
+        for _ in range(self.steps):
+            mid = math.sqrt(lo * hi)
+            if trial(hp_factor, mid).win_probability(hp) > self.target_win:
+                lo = mid
+            else:
+                hi = mid
+        return round(hp_factor, 3), round(math.sqrt(lo * hi), 3)
+
+    def _store(self, key: Tuple[Hashable, Hashable, int], found: Factors):
+        with self._lock:
+            self._cache[key] = found
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _solve_or_skip(self, key: Tuple[Hashable, Hashable, int]) -> Factors:
+        try:
+            return self.solve(*key)
+        except Exception as err:  # one bad key must not stop the worker for the rest of the session
+            print(f"difficulty: cannot tune {key!r}: {err!r}", file=sys.stderr)
+            return (1.0, 1.0)
+
+    def _run(self):
+        while True:
+            key = self._queue.get()
+            self._store(key, self._solve_or_skip(key))
+            with self._lock:
+                self._pending.discard(key)
+            self._queue.task_done()
+
+    def __len__(self):
+        return len(self._cache)
@@ -0,0 +1,240 @@
+"""
+Seeded dungeon graphs, explored one room at a time.
+
+A dungeon is a stack of floors. Each floor is a corridor of rooms with side
+rooms (and now and then a room behind a side room) hanging off it; every
+BOSS_EVERY-th floor, and the last one, ends in a boss wing whose door stays
+locked until the player has found that floor's key. The stairs down leave from
+the end of the corridor, or from the boss room on a boss floor.
+
+Nothing is generated up front. A floor's layout is a pure function of the
+seed and the floor number, built the first time one of its rooms is needed
+and kept in a small LRU cache (FLOOR_CACHE floors), so a dungeon of a
+thousand floors costs no more memory than one of three.
+
+A run only has to remember its seed, the room the player is in and which rooms
+have been visited: a bitmap with one bit per room id, saved zlib-compressed.
+Keys and bosses need nothing else -- a key is held once its room has been
+visited, and a boss wing is beaten once its boss room has been.
+"""
+import base64
+import random
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+FLOOR_SLOTS = 16         # room ids per floor: room id = floor * FLOOR_SLOTS + slot
+CORRIDOR = (3, 6)        # corridor rooms per floor
+SIDE_ROOMS = (0.4, 0.4, 0.2)  # chance of 0, 1 or 2 side rooms off each corridor room
+INNER_ROOM_CHANCE = 0.25  # chance a side room leads on to one more room
+EMPTY_CORRIDOR = 0.5     # chance a corridor room holds nothing
+BOSS_EVERY = 5           # floors per boss wing
+FLOOR_CACHE = 4          # floor layouts kept in memory
+ENTRANCE = 0
+
+SAVE_FIELDS = {"seed": int, "floors": int, "at": int, "visited": str}
+
+
+@dataclass(frozen=True)
+class Room:
+    id: int
+    floor: int
+    kind: str               # "corridor" (empty), "key", "boss" or one of the game's room kinds
+    role: str               # "corridor", "side" or "boss"
+    exits: Tuple[int, ...]
+    locked: bool = False    # boss wing door; open once the floor's key room is visited
+
+
+class _Floor:
+    __slots__ = ("kinds", "roles", "links", "exit", "key", "boss")
+
+    def __init__(self):
+        self.kinds: List[str] = []
+        self.roles: List[str] = []
+        self.links: Dict[int, List[int]] = {}
+        self.exit = 0
+        self.key: Optional[int] = None
+        self.boss: Optional[int] = None
+
+    def add(self, kind: str, role: str, after: Optional[int] = None) -> int:
+        slot = len(self.kinds)
+        self.kinds.append(kind)
+        self.roles.append(role)
+        self.links[slot] = []
+        if after is not None:
+            self.links[after].append(slot)
+            self.links[slot].append(after)
+        return slot
+
+
+class DungeonGraph:
+    """The rooms of one seeded dungeon; `weights` maps the game's room kinds to their odds."""
+
+    def __init__(self, seed: int, weights: Dict[str, float], floors: int, cache_floors: int = FLOOR_CACHE):
+        if floors < 1:
+            raise ValueError("a dungeon needs at least one floor")
+        self.seed = seed
+        self.floors = floors
+        self._kinds = list(weights)
+        self._weights = list(weights.values())
+        self._cache: "OrderedDict[int, _Floor]" = OrderedDict()
+        self._cache_floors = cache_floors
+
+    @property
+    def size(self) -> int:
+        """Room ids in use, i.e. bits in a visited map of the whole dungeon."""
+        return self.floors * FLOOR_SLOTS
+
+    def is_boss_floor(self, floor: int) -> bool:
+        return (floor + 1) % BOSS_EVERY == 0 or floor == self.floors - 1
+
+    def key_room(self, floor: int) -> Optional[int]:
+        layout = self._floor(floor)
+        return None if layout.key is None else floor * FLOOR_SLOTS + layout.key
+
+    def boss_room(self, floor: int) -> Optional[int]:
+        layout = self._floor(floor)
+        return None if layout.boss is None else floor * FLOOR_SLOTS + layout.boss
+
+    def room(self, room_id: int) -> Room:
+        floor, slot = divmod(room_id, FLOOR_SLOTS)
+        if not 0 <= floor < self.floors:
+            raise KeyError(room_id)
+        layout = self._floor(floor)
+        if slot >= len(layout.kinds):
+            raise KeyError(room_id)
+        base = floor * FLOOR_SLOTS
+        exits = [base + s for s in layout.links[slot]]
+        if slot == 0 and floor > 0:
+            exits.insert(0, (floor - 1) * FLOOR_SLOTS + self._floor(floor - 1).exit)
+        if slot == layout.exit and floor + 1 < self.floors:
+            exits.append((floor + 1) * FLOOR_SLOTS)
+        return Room(room_id, floor, layout.kinds[slot], layout.roles[slot], tuple(exits), slot == layout.boss)
+
+    def _floor(self, floor: int) -> _Floor:
+        layout = self._cache.get(floor)
+        if layout is not None:
+            self._cache.move_to_end(floor)
+            return layout
+        layout = self._cache[floor] = self._build(floor)
+        if len(self._cache) > self._cache_floors:
+            self._cache.popitem(last=False)
+        return layout
+
+    def _build(self, floor: int) -> _Floor:
+        rng = random.Random(f"{self.seed}:{floor}")
+        draw = lambda: rng.choices(self._kinds, self._weights)[0]
+        layout = _Floor()
+        corridor = []
+        for i in range(rng.randint(*CORRIDOR)):
+            kind = "corridor" if i == 0 or rng.random() < EMPTY_CORRIDOR else draw()
+            corridor.append(layout.add(kind, "corridor", corridor[-1] if corridor else None))
+        sides = []
+        room_left = lambda: len(layout.kinds) < FLOOR_SLOTS - 2  # keeps a slot for a key room and one for the boss
+        for c in corridor:
+            for _ in range(rng.choices((0, 1, 2), SIDE_ROOMS)[0]):
+                if not room_left():
+                    break
+                side = layout.add(draw(), "side", c)
+                sides.append(side)
+                if rng.random() < INNER_ROOM_CHANCE and room_left():
+                    sides.append(layout.add(draw(), "side", side))
+        layout.exit = corridor[-1]
+        if self.is_boss_floor(floor):
+            if not sides:
+                sides.append(layout.add(draw(), "side", rng.choice(corridor)))
+            layout.key = rng.choice(sides)
+            layout.kinds[layout.key] = "key"
+            layout.boss = layout.exit = layout.add("boss", "boss", corridor[-1])
+        return layout
+
+
+class DungeonRun:
+    """One player's way through a DungeonGraph: where they are and what they have visited."""
+
+    def __init__(self, graph: DungeonGraph, at: int = ENTRANCE, visited: bytes = b""):
+        self.graph = graph
+        self.at = at
+        self._visited = bytearray(visited)
+
+    @classmethod
+    def new(cls, seed: int, weights: Dict[str, float], floors: int) -> "DungeonRun":
+        return cls(DungeonGraph(seed, weights, floors))
+
+    @property
+    def room(self) -> Room:
+        return self.graph.room(self.at)
+
+    def visited(self, room_id: int) -> bool:
+        byte = room_id >> 3
+        return byte < len(self._visited) and bool(self._visited[byte] >> (room_id & 7) & 1)
+
+    def visit(self, room_id: int):
+        byte = room_id >> 3
+        if byte >= len(self._visited):
+            self._visited.extend(bytes(byte + 1 - len(self._visited)))
+        self._visited[byte] |= 1 << (room_id & 7)
+
+    @property
+    def rooms_visited(self) -> int:
+        return sum(bin(b).count("1") for b in self._visited)
+
+    def has_key(self, floor: int) -> bool:
+        key = self.graph.key_room(floor)
+        return key is not None and self.visited(key)
+
+    def can_enter(self, room: Room) -> bool:
+        return not room.locked or self.has_key(room.floor)
+
+    @property
+    def cleared(self) -> bool:
+        """True once the boss on the last floor has been beaten."""
+        return self.visited(self.graph.boss_room(self.graph.floors - 1))
+
+    def exits(self) -> List[Tuple[str, int]]:
+        """(label, room id) for every way out of the current room."""
+        here = self.room
+        found = []
+        for room_id in here.exits:
+            there = self.graph.room(room_id)
+            if there.floor != here.floor:
+                label = f"Stairs {'down' if there.floor > here.floor else 'up'} to floor {there.floor + 1}"
+            elif there.role == "boss":
+                label = "Boss wing" if self.can_enter(there) else "Boss wing (locked)"
+            elif there.role == "side":
+                # an inner room is added after the side room it hangs off, so a lower id is the way back
+                label = "Back to the side room" if here.role == "side" and room_id < here.id else "Side room"
+            elif here.role == "corridor":
+                label = "Corridor ahead" if room_id > here.id else "Corridor back"
+            else:
+                label = "Back to the corridor"
+            if self.visited(room_id) and there.role != "corridor":
+                label += " (visited)"
+            found.append((label, room_id))
+        return found
+
+    def move(self, room_id: int) -> bool:
+        """Steps into a neighbouring room; False if its door is locked."""
+        if room_id not in self.room.exits:
+            raise ValueError(f"room {room_id} is not next to room {self.at}")
+        if not self.can_enter(self.graph.room(room_id)):
+            return False
+        self.at = room_id
+        return True
+
+    def to_dict(self) -> dict:
+        packed = zlib.compress(bytes(self._visited.rstrip(b"\0")), 9)
+        return {"seed": self.graph.seed, "floors": self.graph.floors, "at": self.at,
+                "visited": base64.b64encode(packed).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, data: dict, weights: Dict[str, float]) -> "DungeonRun":
+        try:
+            visited = zlib.decompress(base64.b64decode(data["visited"]))
+        except (ValueError, zlib.error) as err:
+            raise ValueError(f"visited: {err}") from None
+        graph = DungeonGraph(data["seed"], weights, data["floors"])
+        run = cls(graph, data["at"], visited)
+        graph.room(run.at)  # raises KeyError for a position outside the dungeon
+        return run
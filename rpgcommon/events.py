@@ -0,0 +1,218 @@
+"""
+Structured combat events.
+
+Games call emit() next to the print() that shows a combat result. Every
+subscriber sees the event synchronously; the JSONL writer only appends it to a
+bounded ring buffer and a background thread does the (compressed) disk work,
+so logging never blocks a turn.
+
+Set RPG_EVENT_LOG=<directory> to turn the writer on for a session.
+"""
+import atexit
+import gzip
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, asdict, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+# -------------------------
+# Event types
+# -------------------------
+class EventType:
+    ATTACK = "attack"
+    MISS = "miss"
+    CRIT = "crit"
+    DODGE = "dodge"
+    DAMAGE_SHIELD = "damage_shield"
+    DAMAGE_HP = "damage_hp"
+    LOOT_DROP = "loot_drop"
+    LEVEL_UP = "level_up"
+    DEATH = "death"
+
+    ALL = (ATTACK, MISS, CRIT, DODGE, DAMAGE_SHIELD, DAMAGE_HP, LOOT_DROP, LEVEL_UP, DEATH)
+
+
+@dataclass
+class CombatEvent:
+    kind: str
+    game: str
+    source: str = ""
+    target: str = ""
+    amount: int = 0
+    detail: Dict[str, Any] = field(default_factory=dict)
+    seq: int = 0
+    ts: float = 0.0
+
+    def to_dict(self):
+        return asdict(self)
+
+
+Subscriber = Callable[[CombatEvent], None]
+
+
+# -------------------------
+# Event bus
+# -------------------------
+class EventBus:
+    def __init__(self):
+        # (callback, kinds or None); replaced rather than mutated so emit() never needs a lock
+        self._subscribers: Tuple[Tuple[Subscriber, Optional[frozenset]], ...] = ()
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return bool(self._subscribers)
+
+    def subscribe(self, callback: Subscriber, kinds: Optional[Iterable[str]] = None) -> Subscriber:
+        wanted = frozenset(kinds) if kinds is not None else None
+        with self._lock:
+            self._subscribers = self._subscribers + ((callback, wanted),)
+        return callback
+
+    def unsubscribe(self, callback: Subscriber):
+        # == rather than `is`: every self.method lookup makes a new bound method, equal to the last one
+        with self._lock:
+            self._subscribers = tuple(s for s in self._subscribers if s[0] != callback)
+
+    def emit(self, kind: str, game: str, source: str = "", target: str = "", amount: int = 0, **detail) -> Optional[CombatEvent]:
+        subscribers = self._subscribers
+        if not subscribers:
+            return None
+        event = CombatEvent(kind=kind, game=game, source=source, target=target, amount=int(amount),
+                            detail=detail, seq=next(self._seq), ts=time.time())
+        for callback, kinds in subscribers:
+            if kinds is None or kind in kinds:
+                callback(event)
+        return event
+
+
+bus = EventBus()
+
+
+def emitter(game: str) -> Callable[..., Optional[CombatEvent]]:
+    """Returns an emit function with the game name filled in."""
+    def emit(kind: str, source: str = "", target: str = "", amount: int = 0, **detail):
+        return bus.emit(kind, game, source, target, amount, **detail)
+    return emit
+
+
+# -------------------------
+# Asynchronous rotating JSONL writer
+# -------------------------
+class JsonlLogWriter:
+    """
+    Bus subscriber that buffers events in a ring buffer and writes them from a
+    daemon thread to rotating gzip-compressed JSONL files.
+    When the buffer is full the oldest events are overwritten and counted in `dropped`.
+    """
+
+    def __init__(self, directory: str, prefix: str = "combat", capacity: int = 65536,
+                 max_bytes: int = 8 * 1024 * 1024, backups: int = 10, flush_interval: float = 0.25):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.written = 0
+        self._buffer: deque = deque(maxlen=capacity)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._fh = None
+        self._file_bytes = 0
+        self._file_index = 0
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="combat-log-writer", daemon=True)
+        self._thread.start()
+
+    def __call__(self, event: CombatEvent):
+        buf = self._buffer
+        if len(buf) == buf.maxlen:
+            self.dropped += 1
+        buf.append(event)
+        if len(buf) * 2 >= buf.maxlen:
+            self._wake.set()
+
+    def close(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self._drain()
+        self._close_file()
+
+    # ---- writer thread
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._drain()
+
+    def _drain(self):
+        buf = self._buffer
+        if not buf:
+            return
+        lines: List[str] = []
+        while True:
+            try:
+                event = buf.popleft()
+            except IndexError:
+                break
+            lines.append(json.dumps(event.to_dict(), separators=(",", ":")))
+        data = "\n".join(lines) + "\n"
+        if self._fh is None or self._file_bytes >= self.max_bytes:
+            self._rotate()
+        self._fh.write(data)
+        self._fh.flush()
+        self._file_bytes += len(data)
+        self.written += len(lines)
+
+    def _rotate(self):
+        self._close_file()
+        self._file_index += 1
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        name = f"{self.prefix}-{stamp}-{os.getpid()}-{self._file_index:04d}.jsonl.gz"
+        self._fh = gzip.open(os.path.join(self.directory, name), "wt", encoding="utf-8")
+        self._file_bytes = 0
+        self._prune()
+
+    def _prune(self):
+        logs = sorted(f for f in os.listdir(self.directory)
+                      if f.startswith(self.prefix + "-") and f.endswith(".jsonl.gz"))
+        for old in logs[:max(0, len(logs) - self.backups)]:
+            try:
+                os.remove(os.path.join(self.directory, old))
+            except OSError:
+                pass
+
+    def _close_file(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+def start_log_writer(directory: str, **kwargs) -> JsonlLogWriter:
+    writer = JsonlLogWriter(directory, **kwargs)
+    bus.subscribe(writer)
+    atexit.register(writer.close)
+    return writer
+
+
+def read_log(path: str) -> Iterable[Dict[str, Any]]:
+    """Yields the events stored in one compressed log file."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+log_writer: Optional[JsonlLogWriter] = None
+if os.environ.get("RPG_EVENT_LOG"):
+    log_writer = start_log_writer(os.environ["RPG_EVENT_LOG"])
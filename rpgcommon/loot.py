@@ -0,0 +1,140 @@
+"""
+Compiled loot tables.
+
+A LootTable is built once from (drop, weight) entries into a Walker alias
+table, so a roll costs one random() and two list lookups however many
+entries the table has, and none of the weights are looked at again. A drop is
+
+  - an item (anything: a name, a dict, a token the game resolves later),
+  - a tuple of drops, all of which drop together,
+  - another LootTable, rolled in turn (nested tables), or
+  - None, for nothing.
+
+A table can also have `guaranteed` drops, added to every roll, and a pity
+drop: pity=(drop, n) adds it on the n-th roll in a row that has not produced
+it. Pity counts live in a mapping the caller passes in -- usually a dict in
+the player's save under PITY_FIELD -- keyed by the table's name, so the same
+compiled table serves every player.
+
+    TREASURE = LootTable.uniform(["Health Potion +20", "Shadow Stone"])
+    item = TREASURE.draw(rng)
+    drops = TABLE.roll_n(len(enemies), pity=player.setdefault(PITY_FIELD, {}))
+"""
+import random
+from collections import Counter
+from typing import Any, Dict, Iterable, List, MutableMapping, Optional, Sequence, Tuple
+
+from rpgcommon.migrate import SchemaError
+
+PITY_FIELD = "loot_pity"
+
+
+class AliasTable:
+    """Walker's alias method (Vose's construction): O(n) to build, O(1) per sample."""
+    __slots__ = ("n", "prob", "alias")
+
+    def __init__(self, weights: Sequence[float]):
+        n = len(weights)
+        total = float(sum(weights))
+        if n == 0 or total <= 0 or any(w < 0 for w in weights):
+            raise ValueError("an alias table needs non-negative weights with a positive sum")
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        self.n = n
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] += scaled[s] - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        # whatever is left is 1 up to rounding
+
+    def index(self, u: float) -> int:
+        """The entry for one uniform draw u in [0, 1): its integer part picks a column, the rest a side."""
+        x = u * self.n
+        i = int(x)
+        return i if x - i < self.prob[i] else self.alias[i]
+
+
+class LootTable:
+    def __init__(self, entries: Iterable[Tuple[Any, float]], guaranteed: Sequence[Any] = (),
+                 pity: Optional[Tuple[Any, int]] = None, name: Optional[str] = None):
+        entries = list(entries)
+        if pity is not None and (name is None or pity[1] < 1):
+            raise ValueError("a pity drop needs a table name and a streak of at least 1")
+        self.drops = [drop for drop, _ in entries]
+        self.weights = [weight for _, weight in entries]
+        self.alias = AliasTable(self.weights)
+        self.guaranteed = list(guaranteed)
+        self.pity = pity
+        self.name = name
+        # plain items only: roll_n can skip the expansion step
+        self._flat = not self.guaranteed and pity is None and not any(
+            isinstance(d, (tuple, LootTable)) for d in self.drops)
+
+    @classmethod
+    def uniform(cls, drops: Iterable[Any], **kwargs) -> "LootTable":
+        return cls(((drop, 1.0) for drop in drops), **kwargs)
+
+    def draw(self, rng=random) -> Any:
+        """One entry, with nested tables drawn through; no guaranteed or pity drops."""
+        drop = self.drops[self.alias.index(rng.random())]
+        while isinstance(drop, LootTable):
+            drop = drop.drops[drop.alias.index(rng.random())]
+        return drop
+
+    def roll(self, rng=random, pity: Optional[MutableMapping[str, int]] = None) -> List[Any]:
+        """Everything one roll drops, flattened; the pity count is kept in `pity` when given."""
+        found = list(self.guaranteed)
+        self._expand(self.drops[self.alias.index(rng.random())], rng, found)
+        if self.pity is not None:
+            self._apply_pity(found, {} if pity is None else pity)
+        return found
+
+    def roll_n(self, n: int, rng=random, pity: Optional[MutableMapping[str, int]] = None) -> List[Any]:
+        """The drops of n rolls in one list (None never appears)."""
+        if self._flat:
+            drops, index, draw = self.drops, self.alias.index, rng.random
+            return [d for d in (drops[index(draw())] for _ in range(n)) if d is not None]
+        counts = {} if pity is None else pity
+        found = []
+        for _ in range(n):
+            found.extend(self.roll(rng, counts))
+        return found
+
+    def tally(self, n: int, rng=random) -> Counter:
+        """Counts per drop over n rolls, for simulations; drops must be hashable."""
+        return Counter(self.roll_n(n, rng))
+
+    def _expand(self, drop, rng, found: List[Any]):
+        if drop is None:
+            return
+        if isinstance(drop, LootTable):
+            found.extend(drop.roll(rng))
+        elif isinstance(drop, tuple):
+            for part in drop:
+                self._expand(part, rng, found)
+        else:
+            found.append(drop)
+
+    def _apply_pity(self, found: List[Any], counts: MutableMapping[str, int]):
+        drop, streak = self.pity
+        if drop in found:
+            counts[self.name] = 0
+            return
+        counts[self.name] = counts.get(self.name, 0) + 1
+        if counts[self.name] >= streak:
+            found.append(drop)
+            counts[self.name] = 0
+
+
+def validate(data: Dict[str, Any]):
+    """Schema check for a save's optional PITY_FIELD."""
+    counts = data.get(PITY_FIELD)
+    if counts is None:
+        return
+    if not isinstance(counts, dict) or not all(isinstance(v, int) and not isinstance(v, bool) for v in counts.values()):
+        raise SchemaError(f"{PITY_FIELD}: expected an object of counts")
@@ -0,0 +1,127 @@
+"""
+Search-based enemy brains for hard mode.
+
+A Planner picks moves for one side of a fight by Monte Carlo tree search
+(UCT) over the game's CombatRules (see rpgcommon.combatstate). Each
+iteration forks the current state, walks the tree with UCB1 -- both sides
+choose, each for its own good -- grows it by one position, finishes with a
+short rollout of the game's own default moves and backs the result up.
+
+Every search stops at a wall-clock budget (RPG_AI_BUDGET_MS, default 5 ms) and
+may overrun it by at most one iteration. Positions are keyed by their cells in
+a transposition table that outlives the turn: the state the planner is asked
+about next turn is usually one it already explored, so its statistics carry
+over and each turn's budget goes into refining them rather than starting cold.
+
+While a session is recorded or replayed (rpgcommon.replay) the budget is a
+fixed number of iterations instead, so the same inputs reach the same choices.
+
+Turn it on with RPG_HARD_MODE=1 or by passing --hard to any of the games.
+"""
+import math
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from rpgcommon import replay
+from rpgcommon.combatstate import CombatState, ONGOING, PLAYER, SIDE, STATUS
+from rpgcommon.profiling import profiled
+
+HARD_MODE = os.environ.get("RPG_HARD_MODE", "") not in ("", "0") or "--hard" in sys.argv
+BUDGET_MS = float(os.environ.get("RPG_AI_BUDGET_MS", "5"))
+REPLAY_ITERATIONS = 150  # search size while recording or replaying; about one budget's worth
+EXPLORATION = 1.4        # UCB1 constant; values are in [0, 1]
+ROLLOUT_TURNS = 8        # default-policy turns after the tree before the position is scored
+MAX_NODES = 200_000      # transposition entries kept between turns
+
+
+class _Node:
+    __slots__ = ("moves", "visits", "n", "w")
+
+    def __init__(self, moves: Tuple[str, ...]):
+        self.moves = moves
+        self.visits = 0
+        self.n = [0] * len(moves)
+        self.w = [0.0] * len(moves)
+
+
+class Planner:
+    """Chooses moves for `side` (combatstate.PLAYER or ENEMY); keep one per fight."""
+
+    def __init__(self, side: int, budget_ms: Optional[float] = None, iterations: Optional[int] = None,
+                 exploration: float = EXPLORATION, rollout_turns: int = ROLLOUT_TURNS, max_nodes: int = MAX_NODES):
+        self.side = side
+        self.budget = (BUDGET_MS if budget_ms is None else budget_ms) / 1000.0
+        self.iterations = iterations
+        self.exploration = exploration
+        self.rollout_turns = rollout_turns
+        self.max_nodes = max_nodes
+        self.table: Dict[Tuple, _Node] = {}
+        self.last_iterations = 0
+        self.last_elapsed = 0.0
+
+    @profiled("ai.plan")
+    def choose(self, state: CombatState) -> str:
+        """The move for `state`, which must have self.side to move."""
+        if state.cells[STATUS] != ONGOING or state.cells[SIDE] != self.side:
+            raise ValueError("planner asked to move for the wrong side")
+        moves = state.actions()
+        if len(moves) == 1:
+            return moves[0]
+        if len(self.table) > self.max_nodes:
+            self.table.clear()  # between searches, so the clear never eats into a budget
+
+        t0 = time.perf_counter()
+        limit = self.iterations
+        if limit is None and replay.active():
+            limit = REPLAY_ITERATIONS
+        deadline = t0 + self.budget if limit is None else math.inf
+        limit = math.inf if limit is None else limit
+        i = 0
+        while i < limit and (i == 0 or time.perf_counter() < deadline):
+            self._iterate(state.fork(i))
+            i += 1
+        self.last_iterations = i
+        self.last_elapsed = time.perf_counter() - t0
+
+        root = self.table[state.key()]
+        best = max(range(len(root.moves)), key=lambda k: (root.n[k], root.w[k] / root.n[k] if root.n[k] else 0.0))
+        return root.moves[best]
+
+    def _iterate(self, state: CombatState):
+        table = self.table
+        rules = state.rules
+        c = self.exploration
+        path: List[Tuple[_Node, int, int]] = []
+        while state.cells[STATUS] == ONGOING:
+            key = state.key()
+            node = table.get(key)
+            if node is None:
+                table[key] = _Node(rules.actions(state))
+                break
+            k = self._select(node, c)
+            path.append((node, k, state.cells[SIDE]))
+            rules.apply(state, node.moves[k])
+        if state.cells[STATUS] == ONGOING and self.rollout_turns:
+            state.playout(self.rollout_turns)
+        value = rules.value(state)
+        for node, k, side in path:
+            node.visits += 1
+            node.n[k] += 1
+            node.w[k] += value if side == PLAYER else 1.0 - value
+
+    @staticmethod
+    def _select(node: _Node, c: float) -> int:
+        n = node.n
+        for k in range(len(n)):
+            if not n[k]:
+                return k
+        log_visits = math.log(node.visits)
+        w = node.w
+        best, best_score = 0, -1.0
+        for k in range(len(n)):
+            score = w[k] / n[k] + c * math.sqrt(log_visits / n[k])
+            if score > best_score:
+                best, best_score = k, score
+        return best
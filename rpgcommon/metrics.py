@@ -0,0 +1,221 @@
+"""
+Process metrics for running game instances.
+
+Counters and summaries keep one cell per thread: the owning thread is the only
+writer, so recording never takes a lock, and the exporter sums the cells when
+it renders. Gauges are plain assignments.
+
+Exposition is Prometheus text format, either served over HTTP or written to a
+file on an interval:
+
+    RPG_METRICS_PORT=9105              serve http://127.0.0.1:9105/metrics
+    RPG_METRICS_FILE=/tmp/rpg.prom     rewrite the file every RPG_METRICS_INTERVAL seconds (default 10)
+"""
+import atexit
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Tuple
+
+Labels = Tuple[str, ...]
+
+
+# -------------------------
+# Metric types
+# -------------------------
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+
+    def _label_str(self, values: Labels) -> str:
+        pairs = [f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, values)]
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._local = threading.local()
+        self._cells: List[Dict[Labels, float]] = []
+        self._lock = threading.Lock()
+
+    def _cell(self) -> Dict[Labels, float]:
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell: Dict[Labels, float] = {}
+            with self._lock:  # once per thread
+                self._cells.append(cell)
+            self._local.cell = cell
+            return cell
+
+    def inc(self, *labelvalues: str, amount: float = 1):
+        cell = self._cell()
+        cell[labelvalues] = cell.get(labelvalues, 0) + amount
+
+    def values(self) -> Dict[Labels, float]:
+        with self._lock:
+            cells = list(self._cells)
+        totals: Dict[Labels, float] = {}
+        for cell in cells:
+            for labels, v in list(cell.items()):
+                totals[labels] = totals.get(labels, 0) + v
+        return totals
+
+    def render(self):
+        return [f"{self.name}{self._label_str(k)} {_num(v)}" for k, v in sorted(self.values().items())]
+
+
+class Summary(_Metric):
+    """Sum and count of observations (e.g. bytes per save, turns per fight)."""
+    kind = "summary"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._sum = Counter(name + "_sum", help_text, labelnames)
+        self._count = Counter(name + "_count", help_text, labelnames)
+
+    def observe(self, value: float, *labelvalues: str):
+        self._sum.inc(*labelvalues, amount=value)
+        self._count.inc(*labelvalues)
+
+    def render(self):
+        return self._sum.render() + self._count.render()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def set(self, value: float, *labelvalues: str):
+        self._values[labelvalues] = value
+
+    def render(self):
+        return [f"{self.name}{self._label_str(k)} {_num(v)}" for k, v in sorted(list(self._values.items()))]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+# -------------------------
+# Registry
+# -------------------------
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labelnames=()) -> Counter:
+        return self.register(Counter(name, help_text, labelnames))
+
+    def summary(self, name, help_text, labelnames=()) -> Summary:
+        return self.register(Summary(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, help_text, labelnames))
+
+    def exposition(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+FIGHTS = registry.counter("rpg_fights_total", "Fights finished.", ("game",))
+FIGHT_TURNS = registry.summary("rpg_fight_turns", "Turns taken per finished fight.", ("game",))
+SAVES = registry.counter("rpg_saves_total", "Save files written.", ("game",))
+SAVE_BYTES = registry.summary("rpg_save_bytes", "Bytes written per save.", ("game",))
+DEATHS = registry.counter("rpg_deaths_total", "Player deaths by hunter rank (player level for Halo).", ("game", "rank"))
+INVENTORY = registry.gauge("rpg_inventory_items", "Items in the player's inventory.", ("game",))
+WORLD_GENERATE = registry.summary("rpg_world_generate_seconds", "Time spent generating worlds.", ("game",))
+START_TIME = registry.gauge("rpg_process_start_time_seconds", "Unix time the game process started.")
+START_TIME.set(time.time())
+
+
+def fight_finished(game: str, turns: int):
+    FIGHTS.inc(game)
+    FIGHT_TURNS.observe(turns, game)
+
+
+def save_written(game: str, nbytes: int, inventory_items: int):
+    SAVES.inc(game)
+    SAVE_BYTES.observe(nbytes, game)
+    INVENTORY.set(inventory_items, game)
+
+
+# -------------------------
+# Exporters
+# -------------------------
+def start_http_server(port: int, addr: str = "127.0.0.1"):
+    # imported here: http.server pulls in ssl and email, too much for every game start that never serves
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.exposition().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass  # keep the game's terminal clean
+
+    server = ThreadingHTTPServer((addr, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def write_file(path: str):
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile("w", dir=directory, delete=False) as tf:
+        tf.write(registry.exposition())
+        tempname = tf.name
+    os.chmod(tempname, 0o644)  # temp files are 0600; a textfile collector usually runs as another user
+    os.replace(tempname, path)
+
+
+def start_file_writer(path: str, interval: float = 10.0) -> threading.Thread:
+    def loop():
+        while True:
+            time.sleep(interval)
+            write_file(path)
+    thread = threading.Thread(target=loop, name="metrics-file", daemon=True)
+    thread.start()
+    atexit.register(write_file, path)  # short sessions still leave a final snapshot
+    return thread
+
+
+if os.environ.get("RPG_METRICS_PORT"):
+    start_http_server(int(os.environ["RPG_METRICS_PORT"]))
+if os.environ.get("RPG_METRICS_FILE"):
+    start_file_writer(os.environ["RPG_METRICS_FILE"], float(os.environ.get("RPG_METRICS_INTERVAL", "10")))
@@ -0,0 +1,267 @@
+"""
+Versioned save schemas and the bulk migration tool.
+
+Each game declares a Schema: its current version, one upgrade step per older
+version and a validator. The game's load path calls schema.current(data),
+which hands a current save back untouched, so a migrated save loads without
+any fix-up work; only older saves run the upgrade steps on the way in.
+
+Saves written before versioning count as version 1.
+
+    python -m rpgcommon.migrate DIR [--dry-run] [--workers N] [--game GAME] [--json]
+
+walks DIR, validates and upgrades every save it recognises in a process pool,
+writes each changed file atomically and prints a summary. The exit status is
+1 when any save was invalid or could not be read.
+"""
+import argparse
+import collections
+import concurrent.futures
+import fnmatch
+import importlib
+import json
+import os
+import stat
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# game -> (folder, module); modules are imported only by the workers that need them
+GAMES = {
+    "halo": ("halorpg", "halo_text_rpg"),
+    "lucidus": ("lucidusrpg", "game"),
+    "sl": ("sololevelingrpg", "sl"),
+}
+PLAYER_FILE = "player_data.json"
+IN_FLIGHT_PER_WORKER = 4  # jobs queued per worker; the directory walk stays ahead without listing the whole tree
+
+
+class SchemaError(ValueError):
+    pass
+
+
+# -------------------------
+# Schemas
+# -------------------------
+class Schema:
+    def __init__(self, game: str, version: int, validate: Callable[[Dict[str, Any]], None], key: str = "version"):
+        self.game = game
+        self.version = version
+        self.validate = validate
+        self.key = key
+        self.steps: Dict[int, Callable[[Dict[str, Any]], None]] = {}
+
+    def step(self, from_version: int):
+        """Registers an in-place upgrade from from_version to from_version + 1."""
+        def wrap(fn):
+            self.steps[from_version] = fn
+            return fn
+        return wrap
+
+    def version_of(self, data: Dict[str, Any]) -> int:
+        return data.get(self.key, 1)
+
+    def upgrade(self, data: Dict[str, Any]) -> int:
+        """Upgrades data in place to the current version; returns the version it started at."""
+        start = v = self.version_of(data)
+        if v > self.version:
+            raise SchemaError(f"{self.game} save version {v} is newer than this game ({self.version})")
+        while v < self.version:
+            if v not in self.steps:
+                raise SchemaError(f"no {self.game} upgrade from version {v}")
+            self.steps[v](data)
+            v += 1
+            data[self.key] = v
+        return start
+
+    def current(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """The load path: current saves pass straight through, older ones are upgraded and validated."""
+        if self.version_of(data) != self.version:
+            self.upgrade(data)
+            self.validate(data)
+        return data
+
+
+def require(data: Dict[str, Any], fields: Dict[str, Any], where: str = ""):
+    """Raises SchemaError unless every field is present with the given type (or tuple of types)."""
+    if not isinstance(data, dict):
+        raise SchemaError(f"{where or 'save'}: expected an object")
+    for name, types in fields.items():
+        if name not in data:
+            raise SchemaError(f"{where}{name}: missing")
+        if not isinstance(data[name], types):
+            raise SchemaError(f"{where}{name}: expected {_type_names(types)}, got {type(data[name]).__name__}")
+
+
+def _type_names(types) -> str:
+    types = types if isinstance(types, tuple) else (types,)
+    return " or ".join("null" if t is type(None) else t.__name__ for t in types)
+
+
+# -------------------------
+# Files
+# -------------------------
+def write_json_atomic(path: str, data: Any):
+    """Replaces path with data; on disk before the switch, and with the mode the old file had."""
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile("w", dir=directory, delete=False) as tf:
+        json.dump(data, tf, indent=2)
+        tf.flush()
+        os.fsync(tf.fileno())
+        tempname = tf.name
+    try:
+        os.chmod(tempname, stat.S_IMODE(os.stat(path).st_mode))  # temp files are 0600
+    except FileNotFoundError:
+        os.chmod(tempname, 0o644)
+    os.replace(tempname, path)
+
+
+def _game_module(game: str):
+    folder, name = GAMES[game]
+    path = os.path.join(ROOT, folder)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    return importlib.import_module(name)
+
+
+def classify(path: str, game: Optional[str] = None) -> Optional[Tuple[str, str]]:
+    """(game, kind) for a save file the tool knows how to migrate, else None."""
+    name = os.path.basename(path)
+    if name == "catalog.jsonl":
+        return "halo", "catalog"
+    if fnmatch.fnmatch(name, "save_slot_*.json"):
+        return "halo", "json"
+    if name == PLAYER_FILE:
+        if game:
+            return game, "json"
+        folder = os.path.basename(os.path.dirname(os.path.abspath(path)))
+        for g, (game_folder, _) in GAMES.items():
+            if folder == game_folder:
+                return g, "json"
+        return "?", "json"  # decided by content in the worker
+    return None
+
+
+def _guess_player_game(data: Dict[str, Any]) -> str:
+    # only Lucidus has gear slots and a special-move counter
+    return "lucidus" if any(k in data for k in ("equipped_armor", "equipped_weapon", "special_counter")) else "sl"
+
+
+def migrate_file(job: Tuple[str, str, str, bool]) -> Dict[str, Any]:
+    """Worker entry point: validates and upgrades one save file (or one Halo catalog)."""
+    path, game, kind, dry_run = job
+    result = {"path": path, "game": game, "status": "current", "from": None, "records": 1, "message": ""}
+    try:
+        if kind == "catalog":
+            halo = _game_module("halo")
+            report = halo.SaveManager(os.path.dirname(path)).migrate(dry_run)
+            result.update(report)
+            return result
+        with open(path, "r") as f:
+            data = json.load(f)
+        if game == "?":
+            game = result["game"] = _guess_player_game(data)
+        schema = _game_module(game).SAVE_SCHEMA
+        version = result["from"] = schema.version_of(data)
+        if version != schema.version:
+            schema.upgrade(data)
+            result["status"] = "upgraded"
+        schema.validate(data)
+        if result["status"] == "upgraded" and not dry_run:
+            write_json_atomic(path, data)
+    except SchemaError as err:
+        result.update(status="invalid", message=str(err))
+    except (OSError, ValueError) as err:
+        result.update(status="error", message=f"{type(err).__name__}: {err}")
+    return result
+
+
+def find_saves(root: str, game: Optional[str] = None) -> Iterator[Tuple[str, str, str]]:
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in ("__pycache__", ".git")]
+        catalog = "catalog.jsonl" in filenames
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            kind = classify(path, game)
+            if kind is None or (catalog and kind == ("halo", "json")):
+                continue  # legacy slots beside a catalog were already imported into it
+            if game and kind[0] != game:
+                continue
+            yield (path,) + kind
+
+
+# -------------------------
+# Runner
+# -------------------------
+def run(root: str, workers: Optional[int] = None, dry_run: bool = False, game: Optional[str] = None,
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    jobs = ((path, g, kind, dry_run) for path, g, kind in find_saves(root, game))
+    results = []
+
+    def done(result):
+        results.append(result)
+        if on_result:
+            on_result(result)
+
+    if workers == 0:
+        for job in jobs:
+            done(migrate_file(job))
+    else:
+        workers = workers or os.cpu_count() or 1
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            limit = IN_FLIGHT_PER_WORKER * workers
+            pending = set()
+            for job in jobs:
+                pending.add(pool.submit(migrate_file, job))
+                if len(pending) >= limit:
+                    finished, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for fut in finished:
+                        done(fut.result())
+            for fut in concurrent.futures.as_completed(pending):
+                done(fut.result())
+    return summarize(results, time.perf_counter() - t0, dry_run)
+
+
+def summarize(results, elapsed: float, dry_run: bool) -> Dict[str, Any]:
+    by_status = collections.Counter(r["status"] for r in results)
+    by_game = collections.Counter(r["game"] for r in results)
+    upgraded_from = collections.Counter(str(r["from"]) for r in results if r["status"] == "upgraded")
+    problems = sorted((r for r in results if r["status"] in ("invalid", "error")), key=lambda r: r["path"])
+    return {"files": len(results), "records": sum(r["records"] for r in results), "dry_run": dry_run,
+            "elapsed_s": round(elapsed, 3), "status": dict(by_status), "games": dict(by_game),
+            "upgraded_from": dict(upgraded_from), "problems": problems}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m rpgcommon.migrate", description="Validate and upgrade save files.")
+    parser.add_argument("root", help="directory tree to scan")
+    parser.add_argument("--dry-run", action="store_true", help="validate and report without writing")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count, 0 = in-process)")
+    parser.add_argument("--game", choices=sorted(GAMES), help="only this game's saves; also decides ambiguous player files")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    summary = run(args.root, args.workers, args.dry_run, args.game)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        verb = "would upgrade" if args.dry_run else "upgraded"
+        s = summary["status"]
+        print(f"{summary['files']} files ({summary['records']} saves) in {summary['elapsed_s']}s: "
+              f"{s.get('current', 0)} current, {s.get('upgraded', 0)} {verb}, "
+              f"{s.get('invalid', 0)} invalid, {s.get('error', 0)} unreadable")
+        if summary["upgraded_from"]:
+            print("  from versions: " + ", ".join(f"v{v}: {n}" for v, n in sorted(summary["upgraded_from"].items())))
+        for r in summary["problems"]:
+            print(f"  {r['status']}: {r['path']}: {r['message']}")
+    sys.exit(1 if summary["problems"] else 0)
+
+
+if __name__ == "__main__":
+    # run through the package module so the pool pickles rpgcommon.migrate.migrate_file, not __main__'s copy
+    from rpgcommon import migrate as _migrate
+    _migrate.main()
@@ -0,0 +1,158 @@
+"""
+Frame-buffered terminal output.
+
+install() puts a FrameSink in front of stdout. Everything printed is collected
+into the current frame, and the frame is written to the real stream in one go
+when it is flushed -- which input() does before every prompt, so a combat
+turn, a menu or a room reaches the terminal as a single write. A frame that
+grows past FRAME_LIMIT characters is written early.
+
+begin_frame() and end_frame() mark a batch: turns queued with one command
+(rpgcommon.commands) that run without prompts in between. batching() tells
+the game to skip its pauses and screen clears until the batch ends.
+
+Colors are kept on a terminal and stripped (once per frame) everywhere else:
+pipes, files, sockets, logs. NO_COLOR=1 strips them on a terminal too and
+FORCE_COLOR=1 keeps them anywhere.
+
+Quiet mode (RPG_QUIET=1 or --quiet) is for headless runs. The games bind
+`print = output.print`, which is then a no-op, so nothing is joined or
+written, and the sink drops whatever else reaches stdout. The arguments are
+still evaluated -- an f-string is built before print is called -- so code a
+headless run calls per shot checks QUIET and skips building its text.
+"""
+import atexit
+import builtins
+import io
+import os
+import re
+import sys
+from typing import List, Optional, TextIO
+
+QUIET = os.environ.get("RPG_QUIET", "") not in ("", "0") or "--quiet" in sys.argv
+FRAME_LIMIT = 64 * 1024  # buffered characters that force a write before the next prompt
+
+ANSI = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+CLEAR = "\033[2J\033[H"
+
+
+def _discard(*args, **kwargs):
+    pass
+
+
+# Games shadow the builtin with this; quiet mode makes every print a no-op
+print = _discard if QUIET else builtins.print
+
+
+def color_enabled(stream: TextIO) -> bool:
+    if os.environ.get("FORCE_COLOR", "") not in ("", "0"):
+        return True
+    if "NO_COLOR" in os.environ:
+        return False
+    try:
+        return stream.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+
+def strip_ansi(text: str) -> str:
+    return ANSI.sub("", text)
+
+
+class FrameSink(io.TextIOBase):
+    """A stdout stand-in that turns many small writes into one per frame."""
+
+    def __init__(self, stream: TextIO, color: Optional[bool] = None, quiet: bool = False):
+        self.stream = stream
+        self.color = color_enabled(stream) if color is None else color
+        self.quiet = quiet
+        self.batch = False      # between begin_frame() and end_frame()
+        self.temporary = False  # put in by begin_frame() because install() never ran
+        self._parts: List[str] = []
+        self._size = 0
+
+    def write(self, text: str) -> int:
+        if not self.quiet:
+            self._parts.append(text)
+            self._size += len(text)
+            if self._size > FRAME_LIMIT:
+                self.flush()
+        return len(text)
+
+    def flush(self):
+        if self._parts:
+            frame = "".join(self._parts)
+            self._parts = []
+            self._size = 0
+            self.stream.write(frame if self.color else strip_ansi(frame))
+        self.stream.flush()
+
+    def writable(self) -> bool:
+        return True
+
+    def isatty(self) -> bool:
+        return self.stream.isatty()
+
+    def fileno(self) -> int:
+        return self.stream.fileno()
+
+    @property
+    def encoding(self):
+        return self.stream.encoding
+
+    def begin_frame(self):
+        self.batch = True
+
+    def end_frame(self):
+        self.batch = False
+        self.flush()
+
+
+def install(stream: Optional[TextIO] = None) -> FrameSink:
+    """Routes sys.stdout through a FrameSink (once); games call this at the top of main()."""
+    if isinstance(sys.stdout, FrameSink):
+        return sys.stdout
+    sink = FrameSink(stream or sys.stdout, quiet=QUIET)
+    sys.stdout = sink
+    atexit.register(sink.flush)
+    return sink
+
+
+# -------------------------
+# Batches
+# -------------------------
+def batching() -> bool:
+    sink = sys.stdout
+    return isinstance(sink, FrameSink) and sink.batch
+
+
+def begin_frame():
+    """Starts a batch on the installed sink; without one, a sink stands in until end_frame()."""
+    sink = sys.stdout
+    if not isinstance(sink, FrameSink):
+        sink = sys.stdout = FrameSink(sink, color=True)  # passes text through as it was
+        sink.temporary = True
+    sink.begin_frame()
+
+
+def end_frame():
+    sink = sys.stdout
+    if isinstance(sink, FrameSink) and sink.batch:
+        sink.end_frame()
+        if sink.temporary:
+            sys.stdout = sink.stream
+
+
+def clear():
+    """Clears the screen: an escape sequence in the frame rather than a `clear` subprocess."""
+    sink = sys.stdout
+    if not isinstance(sink, FrameSink) or sink.quiet or not sink.isatty():
+        return  # nothing to clear in a pipe or a log
+    if os.name == "nt":
+        sink.flush()
+        os.system("cls")
+    elif sink.color:
+        sink.write(CLEAR)
+    else:
+        sink.flush()  # NO_COLOR strips escapes from frames, but a terminal still gets cleared
+        sink.stream.write(CLEAR)
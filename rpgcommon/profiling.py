@@ -0,0 +1,194 @@
+"""
+Opt-in hot-path profiling.
+
+Turn it on with RPG_PROFILE=1 or by passing --profile to any of the games.
+When it is off, @profiled returns the function untouched and span()/start()/
+stop() are no-ops, so the instrumentation costs nothing measurable.
+
+When it is on, every named span records its latency into an HDR-style
+histogram (log-linear buckets, <1% relative error) and a summary table
+(count, p50, p99, max, total) is printed to stderr at exit, on SIGUSR1, or
+whenever report() is called.
+"""
+import atexit
+import functools
+import os
+import signal
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+ENABLED = os.environ.get("RPG_PROFILE", "") not in ("", "0") or "--profile" in sys.argv
+
+SUB_BUCKET_BITS = 8  # the top bit is always set: 128 sub-buckets per power of two, <0.8% error
+
+
+# -------------------------
+# Histogram
+# -------------------------
+class Histogram:
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    @staticmethod
+    def _bucket(value: int) -> int:
+        shift = max(0, value.bit_length() - SUB_BUCKET_BITS)
+        return ((shift + 1) << SUB_BUCKET_BITS | (value >> shift)) if shift else value
+
+    @staticmethod
+    def _bucket_value(bucket: int) -> int:
+        if bucket < (1 << SUB_BUCKET_BITS):
+            return bucket
+        shift = (bucket >> SUB_BUCKET_BITS) - 1
+        sub = bucket & ((1 << SUB_BUCKET_BITS) - 1) | (1 << (SUB_BUCKET_BITS - 1))
+        # upper edge of the bucket, so percentiles never under-report
+        return ((sub + 1) << shift) - 1
+
+    def record(self, value: int):
+        if value < 0:
+            value = 0
+        b = self._bucket(value)
+        self.counts[b] = self.counts.get(b, 0) + 1
+        if self.count == 0 or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.count += 1
+        self.total += value
+
+    def percentile(self, q: float) -> int:
+        if not self.count:
+            return 0
+        rank = max(1, int(round(q / 100.0 * self.count)))
+        seen = 0
+        for b in sorted(self.counts):
+            seen += self.counts[b]
+            if seen >= rank:
+                return min(self._bucket_value(b), self.max)
+        return self.max
+
+
+# -------------------------
+# Spans
+# -------------------------
+_histograms: Dict[str, Histogram] = {}
+_lock = threading.Lock()
+
+
+def record(name: str, elapsed_ns: int):
+    hist = _histograms.get(name)
+    if hist is None:
+        with _lock:
+            hist = _histograms.setdefault(name, Histogram())
+    hist.record(elapsed_ns)
+
+
+class _Span:
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter_ns() - self.t0)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str):
+    """Context manager timing the block as `name`."""
+    return _Span(name) if ENABLED else _NULL_SPAN
+
+
+def start() -> int:
+    """Start timestamp for stop(); lets a loop body be timed without re-indenting it."""
+    return time.perf_counter_ns() if ENABLED else 0
+
+
+def stop(name: str, t0: int):
+    if t0:
+        record(name, time.perf_counter_ns() - t0)
+
+
+def profiled(name: str):
+    """Decorator timing every call as `name`; returns the function unchanged when profiling is off."""
+    def wrap(func):
+        if not ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter_ns() - t0)
+        return timed
+    return wrap
+
+
+# -------------------------
+# Reporting
+# -------------------------
+def _fmt(ns: int) -> str:
+    if ns >= 1_000_000_000:
+        return f"{ns / 1e9:.2f}s"
+    if ns >= 1_000_000:
+        return f"{ns / 1e6:.2f}ms"
+    if ns >= 1_000:
+        return f"{ns / 1e3:.1f}us"
+    return f"{ns}ns"
+
+
+def summary() -> Dict[str, Dict[str, int]]:
+    with _lock:
+        items = list(_histograms.items())
+    return {name: {"count": h.count, "p50_ns": h.percentile(50), "p99_ns": h.percentile(99),
+                   "max_ns": h.max, "total_ns": h.total} for name, h in items}
+
+
+def report(file=None):
+    file = file or sys.stderr
+    rows = sorted(summary().items(), key=lambda kv: kv[1]["total_ns"], reverse=True)
+    if not rows:
+        return
+    print("\n=== Profile (per span) ===", file=file)
+    print(f"{'span':24s} {'calls':>8s} {'p50':>10s} {'p99':>10s} {'max':>10s} {'total':>10s}", file=file)
+    for name, r in rows:
+        print(f"{name:24s} {r['count']:8d} {_fmt(r['p50_ns']):>10s} {_fmt(r['p99_ns']):>10s} "
+              f"{_fmt(r['max_ns']):>10s} {_fmt(r['total_ns']):>10s}", file=file)
+    file.flush()
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+if ENABLED:
+    atexit.register(report)
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda *_: report())
@@ -0,0 +1,457 @@
+"""
+Deterministic session recording and headless replay.
+
+Record a session by passing --record PATH to a game (or setting RPG_RECORD).
+The file holds the RNG seed, the save files the session started from, every
+line typed at a prompt and, every CHECKPOINT_EVERY inputs, a checkpoint taken
+at the next safe point (a menu prompt): game state, save files and RNG state.
+When the game exits a hash of the final state is appended.
+
+    python -m rpgcommon.replay SESSION.rpgr              # replay from the last checkpoint, verify the final hash
+    python -m rpgcommon.replay SESSION.rpgr --from-start # replay every input, verify the final hash
+    python -m rpgcommon.replay SESSION.rpgr --to 1200    # jump to input 1200 and print the state there
+    python -m rpgcommon.replay SESSION.rpgr --to 1200 --play   # ...then keep playing interactively
+
+File layout (all lengths are unsigned LEB128 varints):
+
+    "RPGR" version:u8 game:str seed:str files:blob
+    then records, each starting with a tag byte:
+      0x01 INPUT       text:str
+      0x02 CHECKPOINT  turn:varint data:blob   (zlib-compressed JSON)
+      0x03 END         turn:varint sha256:32 bytes
+      0x04 EOF         (input() raised EOFError)
+      0x05 INTERRUPT   (input() raised KeyboardInterrupt)
+
+Games take part by calling register() at import time, seeding their RNG with
+begin() before the session starts and calling safe_point() at the top of each
+menu loop. A "turn" is one input line.
+"""
+import argparse
+import atexit
+import builtins
+import contextlib
+import hashlib
+import importlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+MAGIC = b"RPGR"
+VERSION = 1
+CHECKPOINT_EVERY = 100  # inputs between checkpoints
+
+TAG_INPUT, TAG_CHECKPOINT, TAG_END, TAG_EOF, TAG_INTERRUPT = 1, 2, 3, 4, 5
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GAMES = {  # game name -> (directory, module)
+    "halo": ("halorpg", "halo_text_rpg"),
+    "lucidus": ("lucidusrpg", "game"),
+    "sololeveling": ("sololevelingrpg", "sl"),
+}
+
+
+class ReplayError(Exception):
+    pass
+
+
+# -------------------------
+# Encoding
+# -------------------------
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _blob(data: bytes) -> bytes:
+    return _varint(len(data)) + data
+
+
+def _pack(obj) -> bytes:
+    return _blob(zlib.compress(json.dumps(obj, separators=(",", ":")).encode("utf-8"), 6))
+
+
+class _Reader:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def varint(self) -> int:
+        shift = result = 0
+        while True:
+            byte = self.data[self.pos]
+            self.pos += 1
+            result |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                return result
+            shift += 7
+
+    def take(self, n: int) -> bytes:
+        chunk = self.data[self.pos:self.pos + n]
+        if len(chunk) < n:
+            raise ReplayError("truncated session file")
+        self.pos += n
+        return chunk
+
+    def blob(self) -> bytes:
+        return self.take(self.varint())
+
+    def text(self) -> str:
+        return self.blob().decode("utf-8")
+
+    def unpack(self):
+        return json.loads(zlib.decompress(self.blob()))
+
+    def done(self) -> bool:
+        return self.pos >= len(self.data)
+
+
+def state_hash(state, files: Dict[str, Optional[str]]) -> bytes:
+    canonical = json.dumps({"state": state, "files": files}, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).digest()
+
+
+def _rng_state():
+    return random.getstate()
+
+
+def _set_rng_state(s):
+    random.setstate((s[0], tuple(s[1]), s[2]))
+
+
+# -------------------------
+# Game hooks
+# -------------------------
+class _Hooks:
+    def __init__(self, game: str, files: Callable[[], List[str]], snapshot: Callable[[], Any],
+                 resume: Callable[[Any], Callable[[], None]]):
+        self.game = game
+        self.files = files
+        self.snapshot = snapshot
+        self.resume = resume
+
+    def read_files(self) -> Dict[str, Optional[str]]:
+        contents = {}
+        for path in self.files():
+            if os.path.exists(path):
+                with open(path, "r") as f:
+                    contents[path] = f.read()
+            else:
+                contents[path] = None
+        return contents
+
+
+_hooks: Optional[_Hooks] = None
+_recorder = None
+_player = None
+
+
+def register(game: str, files: Callable[[], List[str]], snapshot: Callable[[], Any],
+             resume: Callable[[Any], Callable[[], None]]):
+    """
+    files() lists the save files the game reads; snapshot() returns the JSON-able
+    state at a safe point; resume(state) rebuilds that state and returns the call
+    that carries the session on from the same safe point.
+    """
+    global _hooks
+    _hooks = _Hooks(game, files, snapshot, resume)
+
+
+def playing() -> bool:
+    """True while a session is being replayed headless."""
+    return _player is not None
+
+
+def active() -> bool:
+    """True while a session is recorded or replayed; nothing timing-dependent may steer the game then."""
+    return _recorder is not None or _player is not None
+
+
+def begin(argv: Optional[List[str]] = None) -> int:
+    """Returns the seed for the session's RNG and starts recording if it was asked for."""
+    global _recorder
+    if _player is not None:
+        return _player.seed
+    seed = int(os.environ["RPG_SEED"]) if os.environ.get("RPG_SEED") else int.from_bytes(os.urandom(8), "big")
+    argv = sys.argv if argv is None else argv
+    path = os.environ.get("RPG_RECORD")
+    if "--record" in argv and argv.index("--record") + 1 < len(argv):
+        path = argv[argv.index("--record") + 1]
+    if path and _hooks is not None and _recorder is None:
+        _recorder = Recorder(path, _hooks, seed)
+    return seed
+
+
+def safe_point():
+    if _recorder is not None:
+        _recorder.safe_point()
+
+
+# -------------------------
+# Recording
+# -------------------------
+class Recorder:
+    def __init__(self, path: str, hooks: _Hooks, seed: int):
+        self.hooks = hooks
+        self.turn = 0
+        self.last_checkpoint = 0
+        self.f = open(path, "wb")
+        self.f.write(MAGIC + bytes([VERSION]) + _blob(hooks.game.encode()) + _blob(str(seed).encode())
+                     + _pack(hooks.read_files()))
+        self.f.flush()
+        self.real_input = builtins.input
+        builtins.input = self.input
+        atexit.register(self.close)
+
+    def input(self, prompt=""):
+        try:
+            line = self.real_input(prompt)
+        except EOFError:
+            self.f.write(bytes([TAG_EOF]))
+            raise
+        except KeyboardInterrupt:
+            self.f.write(bytes([TAG_INTERRUPT]))
+            raise
+        self.f.write(bytes([TAG_INPUT]) + _blob(line.encode("utf-8")))
+        self.f.flush()
+        self.turn += 1
+        return line
+
+    def safe_point(self):
+        if self.turn - self.last_checkpoint < CHECKPOINT_EVERY:
+            return
+        data = {"state": self.hooks.snapshot(), "files": self.hooks.read_files(), "rng": _rng_state()}
+        self.f.write(bytes([TAG_CHECKPOINT]) + _varint(self.turn) + _pack(data))
+        self.f.flush()
+        self.last_checkpoint = self.turn
+
+    def close(self):
+        if self.f.closed:
+            return
+        digest = state_hash(self.hooks.snapshot(), self.hooks.read_files())
+        self.f.write(bytes([TAG_END]) + _varint(self.turn) + digest)
+        self.f.close()
+        builtins.input = self.real_input
+
+
+# -------------------------
+# Replay
+# -------------------------
+class Session:
+    """A parsed recording."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            r = _Reader(f.read())
+        if r.take(4) != MAGIC:
+            raise ReplayError(f"{path} is not a session recording")
+        version = r.take(1)[0]
+        if version != VERSION:
+            raise ReplayError(f"unsupported session version {version}")
+        self.game = r.text()
+        self.seed = int(r.text())
+        self.files: Dict[str, Optional[str]] = r.unpack()
+        self.inputs: List[Any] = []  # str, or EOFError / KeyboardInterrupt
+        self.checkpoints: List[Tuple[int, bytes]] = []  # (turn, packed data), decoded on demand
+        self.end: Optional[Tuple[int, bytes]] = None
+        while not r.done():
+            tag = r.take(1)[0]
+            if tag == TAG_INPUT:
+                self.inputs.append(r.text())
+            elif tag == TAG_CHECKPOINT:
+                turn = r.varint()
+                self.checkpoints.append((turn, r.blob()))
+            elif tag == TAG_END:
+                self.end = (r.varint(), r.take(32))
+            elif tag == TAG_EOF:
+                self.inputs.append(EOFError)
+            elif tag == TAG_INTERRUPT:
+                self.inputs.append(KeyboardInterrupt)
+            else:
+                raise ReplayError(f"unknown record tag {tag}")
+
+    def checkpoint_before(self, turn: int) -> Optional[Tuple[int, dict]]:
+        best = None
+        for t, packed in self.checkpoints:
+            if t <= turn:
+                best = (t, packed)
+        if best is None:
+            return None
+        return best[0], json.loads(zlib.decompress(best[1]))
+
+
+class _Stop(BaseException):  # must get past the games' own except clauses
+    pass
+
+
+class _Null:
+    def write(self, text):
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+class Player:
+    """Feeds recorded inputs back to the game, stopping at `stop_at` (or handing over to the keyboard)."""
+
+    def __init__(self, session: Session, turn: int, stop_at: Optional[int], interactive: bool):
+        self.session = session
+        self.seed = session.seed
+        self.turn = turn
+        self.stop_at = len(session.inputs) if stop_at is None else stop_at
+        self.interactive = interactive
+        self.real_input = builtins.input
+        self.real_stdout = sys.stdout
+
+    def input(self, prompt=""):
+        if self.turn >= self.stop_at:
+            if not self.interactive:
+                raise _Stop
+            self.hand_over()
+            return self.real_input(prompt)
+        value = self.session.inputs[self.turn]
+        self.turn += 1
+        if value in (EOFError, KeyboardInterrupt):
+            raise value
+        return value
+
+    def hand_over(self):
+        global _player
+        builtins.input = self.real_input
+        sys.stdout = self.real_stdout
+        _player = None
+
+
+def _scratch_dir(game_dir: str, files: Dict[str, Optional[str]]) -> str:
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else None  # saves are rewritten constantly
+    scratch = tempfile.mkdtemp(prefix="rpg-replay-", dir=base)
+    for name in os.listdir(game_dir):
+        src = os.path.join(game_dir, name)
+        if os.path.isfile(src) and not name.endswith(".py") and name not in files:
+            shutil.copy(src, scratch)  # lore and other read-only data
+    return scratch
+
+
+def _write_files(files: Dict[str, Optional[str]]):
+    for path, content in files.items():
+        if content is None:
+            if os.path.exists(path):
+                os.remove(path)
+            continue
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+
+def replay(path: str, to: Optional[int] = None, interactive: bool = False, from_start: bool = False) -> dict:
+    """
+    Replays a recording headless, fast-forwarding from the last checkpoint before
+    `to` unless from_start is set; returns a report with the final state and hash check.
+    """
+    global _player
+    session = Session(path)
+    if session.game not in GAMES:
+        raise ReplayError(f"unknown game '{session.game}'")
+    subdir, module_name = GAMES[session.game]
+    game_dir = os.path.join(ROOT, subdir)
+    cwd = os.getcwd()
+    scratch = _scratch_dir(game_dir, session.files)
+    os.chdir(scratch)
+    sys.path.insert(0, game_dir)
+    t0 = time.perf_counter()
+    crash = None
+    try:
+        module = importlib.import_module(module_name)
+        if _hooks is None or _hooks.game != session.game:
+            raise ReplayError(f"{module_name} did not register with the replayer")
+        target = len(session.inputs) if to is None else min(to, len(session.inputs))
+        checkpoint = None if from_start else session.checkpoint_before(target)
+        start_turn = checkpoint[0] if checkpoint else 0
+        _player = Player(session, start_turn, to, interactive)
+        builtins.input = _player.input
+        sys.stdout = _Null()
+        try:
+            if checkpoint:
+                _write_files(checkpoint[1]["files"])
+                carry_on = _hooks.resume(checkpoint[1]["state"])
+                _set_rng_state(checkpoint[1]["rng"])
+                carry_on()
+            else:
+                _write_files(session.files)
+                module.main()
+        except (_Stop, SystemExit, EOFError, KeyboardInterrupt):
+            pass
+        except Exception:  # the recorded session crashed here too, or the replay diverged
+            crash = traceback.format_exc()
+        finally:
+            if _player is not None:
+                turn = _player.turn
+                _player.hand_over()
+            else:
+                turn = target
+        state = _hooks.snapshot()
+        digest = state_hash(state, _hooks.read_files())
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(scratch, ignore_errors=True)
+    report = {"game": session.game, "seed": session.seed, "inputs": len(session.inputs),
+              "checkpoints": len(session.checkpoints), "resumed_from": start_turn, "stopped_at": turn,
+              "seconds": round(time.perf_counter() - t0, 3), "state": state, "crash": crash}
+    if to is None and not interactive:
+        report["hash_ok"] = None if session.end is None else session.end[1] == digest
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("session")
+    parser.add_argument("--to", type=int, help="stop before input number N")
+    parser.add_argument("--play", action="store_true", help="continue interactively from --to")
+    parser.add_argument("--from-start", action="store_true", help="ignore checkpoints and replay every input")
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    args = parser.parse_args()
+    try:
+        report = replay(args.session, args.to, args.play, args.from_start)
+    except ReplayError as err:
+        sys.exit(str(err))
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+    else:
+        print(f"{report['game']} session, seed {report['seed']}: {report['inputs']} inputs, "
+              f"{report['checkpoints']} checkpoints")
+        print(f"replayed inputs {report['resumed_from']}..{report['stopped_at']} in {report['seconds']}s")
+        if report["crash"]:
+            print("the game raised an exception at input " + str(report["stopped_at"]) + ":\n" + report["crash"])
+        if args.to is not None:
+            print(json.dumps(report["state"], indent=2, default=str))
+        elif report.get("hash_ok") is None:
+            print("no final hash recorded (session did not exit cleanly)")
+        else:
+            print("final state hash " + ("OK" if report["hash_ok"] else "MISMATCH"))
+    if report.get("hash_ok") is False:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    # run under the package name so games importing rpgcommon.replay share this module's state
+    from rpgcommon import replay as _replay
+    with contextlib.suppress(BrokenPipeError):
+        _replay.main()
@@ -0,0 +1,197 @@
+"""
+Stat-allocation planner for choose_stat().
+
+Every level-up offers the same picks (STR, VIT, AGI, CRIT), and the player
+spends twice as long at each level as at the one before (xp_cap() doubles),
+so an early bad pick is paid for over most of the game. The planner picks the
+sequence that maximizes the expected clear rate over the first PLAN_LEVELS
+levels: the clear rate at each level, weighted by the XP that level takes.
+
+A clear rate is a product of stages, each a weighted mix of fights -- e.g. a
+monster room and then the boss room, each entered at full HP. Win chances
+come from the game's auto-resolve model (see rpgcommon.autoresolve): one
+sorted damage sample per (build, enemy) answers every HP, so a VIT pick never
+costs a simulation and only the distinct builds are played, in a process pool
+when jobs > 1.
+
+Picks commute, so a state is how many times each pick has been taken, and the
+plan is a dynamic programme over (level, counts):
+
+    V(L, c) = w(L) * clear(L, c) + max over picks p of V(L + 1, c + p)
+
+The policy is written to a table file, one row per (tier, level, stats), with
+a fingerprint of everything it was computed from; a stale or missing table is
+rebuilt. The file is a content cache (see rpgcommon.content): loading it is one
+mmap, and every process of a multi-process server shares its pages once the
+parent has called publish(). Recommendations are a lookup of the row nearest
+the player's stats (bonuses from items move them off the plan), so the prompt
+never waits.
+"""
+import bisect
+import hashlib
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from rpgcommon import content
+from rpgcommon.autoresolve import OutcomeTable
+
+PLAN_LEVELS = 15
+SAMPLES = 500     # simulated fights per (build, enemy)
+TABLE_VERSION = 3
+
+Stage = Sequence[Tuple[float, Hashable]]  # (weight, enemy key); weights sum to 1
+
+
+def _outcomes(job) -> List[List[int]]:
+    """Pool entry point: sorted damage samples for a chunk of (build, enemy) pairs."""
+    simulate, samples, pairs = job
+    table = OutcomeTable(simulate, samples, max_entries=len(pairs) + 1)
+    found = []
+    for build, enemy in pairs:
+        found.append(table.get(build, enemy).damage)
+        time.sleep(0)  # a background build leaves the game thread the GIL between pairs
+    return found
+
+
+class StatPlan:
+    """
+    One game's planner. picks maps each choose_stat() option to what it adds
+    (e.g. "VIT": {"VIT": 1, "max_hp": 10}), in menu order; start holds the
+    stats and max_hp of a level-1 player; build(stats) is the key simulate()
+    takes; tiers maps a content tier to its stages; weight(level) is the XP the
+    level takes and level_hp the max_hp every level-up adds.
+    """
+
+    def __init__(self, path: str, simulate: Callable, picks: Dict[str, Dict[str, int]], start: Dict[str, int],
+                 build: Callable[[Dict[str, int]], Hashable], tiers: Dict[str, Sequence[Stage]],
+                 weight: Callable[[int], float], level_hp: int, levels: int = PLAN_LEVELS, samples: int = SAMPLES):
+        self.path = path
+        self.simulate = simulate
+        self.picks = picks
+        self.start = start
+        self.build_key = build
+        self.tiers = tiers
+        self.weight = weight
+        self.level_hp = level_hp
+        self.levels = levels
+        self.samples = samples
+        self.stats = [s for s in start if s != "max_hp"]
+        self._table: Optional[content.GroupedTable] = None  # "tier:level" -> rows
+        self._warming: Optional[threading.Thread] = None
+
+    # -------------------------
+    # Recommendations
+    # -------------------------
+    def recommend(self, tier: str, level: int, stats: Dict[str, int]) -> Optional[Tuple[str, float]]:
+        """
+        (pick, expected clear rate from here on) at the prompt for reaching
+        `level`, or None if the table is not loaded or the level is past the plan.
+        """
+        table = self._table
+        rows = table.get(f"{tier}:{level}") if table is not None else None
+        if not rows:
+            return None
+        best = min(rows, key=lambda r: sum(abs(r[s] - stats.get(s, 0)) for s in self.stats))
+        return list(self.picks)[best["pick"]], best["expected"]
+
+    def warm(self):
+        """Loads the table, or builds it on a background thread, without blocking the caller."""
+        if self._table is not None or self._warming is not None or self.load():
+            return
+        self._warming = threading.Thread(target=self.build, name="stat-plan", daemon=True)
+        self._warming.start()
+
+    def publish(self, jobs: int = 1):
+        """For a server's parent process: a current table file before the workers start and load it."""
+        if not self.load():
+            self.build(jobs)
+
+    # -------------------------
+    # Table file
+    # -------------------------
+    def fingerprint(self) -> str:
+        parts = [TABLE_VERSION, self.picks, self.start, self.tiers,
+                 [self.weight(level) for level in range(1, self.levels + 1)], self.level_hp, self.levels,
+                 self.samples, getattr(self.simulate, "__qualname__", "")]
+        return hashlib.sha1(json.dumps(parts, sort_keys=True, default=repr).encode("utf-8")).hexdigest()[:16]
+
+    def load(self) -> bool:
+        catalog = content.attach(self.path, self.fingerprint())
+        if catalog is None or "policy" not in catalog:
+            return False
+        self._table = catalog["policy"]
+        return True
+
+    def build(self, jobs: int = 1) -> content.GroupedTable:
+        """Computes the plan (over `jobs` processes), writes the table file and loads it."""
+        states = self._states()
+        builds = {}
+        for counts in itertools.chain.from_iterable(states):
+            builds.setdefault(self.build_key(self._stats(counts)), None)
+        enemies = sorted({e for stages in self.tiers.values() for stage in stages for _, e in stage}, key=repr)
+        pairs = list(itertools.product(builds, enemies))
+        chunk = max(1, len(pairs) // (jobs * 4))
+        jobs_list = [(self.simulate, self.samples, pairs[i:i + chunk]) for i in range(0, len(pairs), chunk)]
+        if jobs > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                results = list(pool.map(_outcomes, jobs_list))
+        else:
+            results = [_outcomes(job) for job in jobs_list]
+        damage = dict(zip(pairs, itertools.chain.from_iterable(results)))
+        policy = {}
+        for tier, stages in self.tiers.items():
+            for level, rows in self._solve(stages, states, damage).items():
+                policy[f"{tier}:{level}"] = rows
+        fingerprint = self.fingerprint()
+        catalog = content.store(self.path, content.compile_tables({"policy": policy}, fingerprint), fingerprint)
+        self._table = catalog["policy"]
+        return self._table
+
+    # -------------------------
+    # Dynamic programme
+    # -------------------------
+    def _states(self) -> List[List[Tuple[int, ...]]]:
+        """Count vectors per level: states[L - 1] holds every way to spend L - 1 picks."""
+        n = len(self.picks)
+        return [[c for c in itertools.product(range(level), repeat=n) if sum(c) == level - 1]
+                for level in range(1, self.levels + 1)]
+
+    def _stats(self, counts: Tuple[int, ...]) -> Dict[str, int]:
+        stats = dict(self.start)
+        for times, adds in zip(counts, self.picks.values()):
+            for stat, amount in adds.items():
+                stats[stat] += times * amount
+        return stats
+
+    def _solve(self, stages: Sequence[Stage], states, damage) -> Dict[int, List[dict]]:
+        def clear(level: int, counts: Tuple[int, ...]) -> float:
+            stats = self._stats(counts)
+            hp = stats["max_hp"] + (level - 1) * self.level_hp
+            build = self.build_key(stats)
+            rate = 1.0
+            for stage in stages:
+                rate *= sum(w * bisect.bisect_left(damage[build, e], hp) / len(damage[build, e]) for w, e in stage)
+            return rate
+
+        steps = [tuple(int(i == j) for j in range(len(self.picks))) for i in range(len(self.picks))]
+        value = {c: self.weight(self.levels) * clear(self.levels, c) for c in states[-1]}
+        remaining = self.weight(self.levels)
+        policy = {}
+        for level in range(self.levels - 1, 0, -1):
+            remaining += self.weight(level)
+            here, rows = {}, []
+            for c in states[level - 1]:
+                nexts = [value[tuple(a + b for a, b in zip(c, step))] for step in steps]
+                pick = max(range(len(steps)), key=lambda i: (nexts[i], -i))  # ties go to the earlier menu option
+                here[c] = self.weight(level) * clear(level, c) + nexts[pick]
+                stats = self._stats(c)
+                expected = nexts[pick] / (remaining - self.weight(level))
+                rows.append(dict({s: stats[s] for s in self.stats}, pick=pick, expected=round(float(expected), 4)))
+            policy[level + 1] = rows
+            value = here
+        return policy
+
@@ -0,0 +1,114 @@
+"""
+Turn order and target selection for fights with many combatants.
+
+TurnScheduler hands out turns by initiative: every actor acts once per
+1/speed time units, so a speed-12 Elite gets six turns for every five of a
+speed-10 Jackal. ThreatIndex keeps targets ordered by a threat score that is
+updated as they take damage.
+
+Both are heaps with lazy invalidation: removing or re-scoring an entry bumps
+its version instead of searching the heap, and stale entries are discarded
+when they surface (or compacted away once they outnumber live ones). Every
+operation is O(log n) amortised, whatever the size of the fight.
+"""
+import heapq
+import itertools
+from typing import Dict, Hashable, List, Optional, Tuple
+
+COMPACT_SLACK = 16  # stale entries tolerated beyond 2x the live ones
+
+
+class TurnScheduler:
+    def __init__(self):
+        self.now = 0.0
+        self._heap: List[Tuple[float, int, Hashable, int]] = []
+        self._delay: Dict[Hashable, float] = {}
+        self._version: Dict[Hashable, int] = {}
+        self._seq = itertools.count()  # ties go to whoever was scheduled first
+
+    def add(self, actor: Hashable, speed: float):
+        """Schedules actor's first turn one interval from now."""
+        version = self._version.get(actor, 0) + 1
+        self._version[actor] = version
+        self._delay[actor] = 1.0 / speed
+        heapq.heappush(self._heap, (self.now + self._delay[actor], next(self._seq), actor, version))
+        self._maybe_compact()
+
+    def remove(self, actor: Hashable):
+        if self._delay.pop(actor, None) is not None:
+            self._version[actor] += 1
+
+    def next(self) -> Hashable:
+        """Returns the actor whose turn comes next and schedules its following one."""
+        heap = self._heap
+        while heap:
+            t, _, actor, version = heapq.heappop(heap)
+            if self._version.get(actor) == version and actor in self._delay:
+                self.now = t
+                heapq.heappush(heap, (t + self._delay[actor], next(self._seq), actor, version))
+                return actor
+        raise IndexError("no actors scheduled")
+
+    def __len__(self):
+        return len(self._delay)
+
+    def __contains__(self, actor):
+        return actor in self._delay
+
+    def _maybe_compact(self):
+        if len(self._heap) > 2 * len(self._delay) + COMPACT_SLACK:
+            self._heap = [e for e in self._heap if self._version.get(e[2]) == e[3] and e[2] in self._delay]
+            heapq.heapify(self._heap)
+
+
+class ThreatIndex:
+    """Targets keyed by threat score; top() is the most threatening live one."""
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, Hashable, int]] = []
+        self._score: Dict[Hashable, float] = {}
+        self._version: Dict[Hashable, int] = {}
+        self._seq = itertools.count()
+
+    def update(self, key: Hashable, score: float):
+        version = self._version.get(key, 0) + 1
+        self._version[key] = version
+        self._score[key] = score
+        heapq.heappush(self._heap, (-score, next(self._seq), key, version))
+        self._maybe_compact()
+
+    def remove(self, key: Hashable):
+        if self._score.pop(key, None) is not None:
+            self._version[key] += 1
+
+    def top(self) -> Optional[Hashable]:
+        heap = self._heap
+        while heap:
+            _, _, key, version = heap[0]
+            if self._version.get(key) == version and key in self._score:
+                return key
+            heapq.heappop(heap)
+        return None
+
+    def pop(self) -> Optional[Hashable]:
+        key = self.top()
+        if key is not None:
+            self.remove(key)
+        return key
+
+    def score(self, key: Hashable) -> float:
+        return self._score[key]
+
+    def __len__(self):
+        return len(self._score)
+
+    def __contains__(self, key):
+        return key in self._score
+
+    def __iter__(self):
+        return iter(list(self._score))
+
+    def _maybe_compact(self):
+        if len(self._heap) > 2 * len(self._score) + COMPACT_SLACK:
+            self._heap = [(-self._score[k], next(self._seq), k, self._version[k]) for k in self._score]
+            heapq.heapify(self._heap)
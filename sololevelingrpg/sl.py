@@ -1,12 +1,42 @@
+import copy
 import random
 import json
 import os
+import sys
+
+# shared helpers live in rpgcommon/ at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rpgcommon import events
+from rpgcommon.events import EventType as EV
+from rpgcommon.autoresolve import OutcomeTable
+from rpgcommon.commands import CommandQueue, CommandError
+from rpgcommon import profiling
+from rpgcommon import metrics
+from rpgcommon import replay
+from rpgcommon import content
+from rpgcommon import dungeongraph
+from rpgcommon import checkpoint
+from rpgcommon import output
+from rpgcommon import statplan
+from rpgcommon import loot
+from rpgcommon.profiling import profiled
+from rpgcommon.migrate import Schema, SchemaError, require
+from rpgcommon.combatstate import Rules, HEADER, STATUS, SIDE, TURN, ONGOING, WON, LOST, FLED, PLAYER, ENEMY
+
+emit = events.emitter("sololeveling")
+print = output.print  # a no-op in quiet mode (see rpgcommon.output)
 
 # -----------------------------
 # JSON save file
 # -----------------------------
 SAVE_FILE = "player_data.json"
 
+# Auto-resolve: fights at or above this win chance are settled in one step
+AUTO_RESOLVE_THRESHOLD = 0.95
+
+# Words that can be queued at the combat prompt ("attack x3")
+BATCH_VERBS = {"attack": "attack", "run": "run"}
+
 # -----------------------------
 # Rank & level system
 # -----------------------------
@@ -24,25 +54,47 @@ DEFAULT_PLAYER = {
     "stats": {"STR": 5, "VIT": 5, "AGI": 5, "CRIT": 5},
     "max_hp": 50,
     "current_hp": 50,
-    "inventory": []
+    "inventory": [],
+    "auto_resolve": False,
+    "version": 2
 }
 
 player = {}
 
 # -----------------------------
-# Enemy definitions
+# Save schema (see rpgcommon.migrate)
+# -----------------------------
+PLAYER_FIELDS = {"name": str, "level": int, "xp": int, "xp_cap": int, "rank": str, "stats": dict,
+                 "max_hp": int, "current_hp": int, "inventory": list, "auto_resolve": bool}
+
+def validate_player(data):
+    require(data, PLAYER_FIELDS)
+    require(data['stats'], {stat: int for stat in DEFAULT_PLAYER['stats']}, "stats.")
+    if data['rank'] not in RANKS:
+        raise SchemaError(f"rank: unknown rank {data['rank']!r}")
+    if data.get('deep_dungeon') is not None:
+        require(data['deep_dungeon'], dungeongraph.SAVE_FIELDS, "deep_dungeon.")
+    checkpoint.validate(data)
+
+SAVE_SCHEMA = Schema("sl", 2, validate_player)
+
+@SAVE_SCHEMA.step(1)
+def _add_missing_fields(data):
+    # saves from before auto-resolve (or hand-edited ones) lack some defaults
+    for key, value in DEFAULT_PLAYER.items():
+        if key not in data:
+            data[key] = copy.deepcopy(value)
+    for stat, value in DEFAULT_PLAYER['stats'].items():
+        data['stats'].setdefault(stat, value)
+
+# -----------------------------
+# Enemy definitions (data/enemies.json, data/bosses.json; see rpgcommon.content)
 # -----------------------------
-ENEMIES = [
-    {"name": "Goblin", "rank": "E", "health": 15, "attack_min": 3, "attack_max": 6, "crit": 0.1},
-    {"name": "Lesser Spider", "rank": "D", "health": 18, "attack_min": 4, "attack_max": 7, "crit": 0.1},
-    {"name": "Skeleton Warrior", "rank": "C", "health": 20, "attack_min": 4, "attack_max": 8, "crit": 0.15},
-    {"name": "Orc", "rank": "B", "health": 25, "attack_min": 5, "attack_max": 10, "crit": 0.15},
-    {"name": "Troll", "rank": "A", "health": 30, "attack_min": 6, "attack_max": 12, "crit": 0.2},
-]
+CONTENT = content.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+
+ENEMIES = CONTENT["enemies"]
 
-BOSSES = [
-    {"name": "Dungeon Boss", "rank_offset": 2, "health": 80, "attack_min": 8, "attack_max": 15, "crit": 0.2}
-]
+BOSSES = CONTENT["bosses"]
 
 ROOM_TYPES = ["monster", "treasure", "trap", "boss"]
 
@@ -64,16 +116,22 @@ def load_player():
     global player
     if os.path.exists(SAVE_FILE):
         with open(SAVE_FILE, "r") as f:
-            player = json.load(f)
+            data = json.load(f)
+        try:
+            player = SAVE_SCHEMA.current(data)
+        except SchemaError as err:
+            sys.exit(f"{SAVE_FILE} is damaged: {err}")
         print(f"Loaded player data: Level {player['level']} {player['rank']} {player['name']}")
     else:
         player = DEFAULT_PLAYER.copy()
         save_player()
         print("Created new player.")
 
+@profiled("save.player")
 def save_player():
     with open(SAVE_FILE, "w") as f:
         json.dump(player, f, indent=2)
+        metrics.save_written("sololeveling", f.tell(), len(player['inventory']))
     print("[Game Saved]")
 
 # -----------------------------
@@ -94,6 +152,7 @@ def level_up():
     player['xp_cap'] = xp_cap(player['level'])
     player['max_hp'] += 10
     player['current_hp'] = player['max_hp']
+    emit(EV.LEVEL_UP, target=player['name'], amount=player['level'])
     print(f"\n*** You leveled up to Level {player['level']}! ***")
     print(f"Max HP increased to {player['max_hp']}")
     choose_stat()
@@ -105,6 +164,9 @@ def choose_stat():
     print("2. Vitality (+10 HP)")
     print("3. Agility (+3% Hit/Dodge chance)")
     print("4. Critical (+3% Crit chance)")
+    hint = stat_plan.recommend(player['rank'], player['level'], player['stats'])
+    if hint:
+        print(f"Planner suggests {STAT_NAMES[hint[0]]} (expected clear rate at rank {player['rank']}: {hint[1]:.0%})")
     choice = input("Enter number: ").strip()
     if choice == "1":
         player['stats']['STR'] += 2
@@ -157,53 +219,211 @@ def use_item():
         print("Invalid input.")
 
 # -----------------------------
-# Combat
+# Auto-resolve (headless combat model)
 # -----------------------------
-def combat(enemy):
-    print(f"\n!!! A ({enemy['rank']}) {enemy['name']} appears !!!\n")
-    enemy_hp = enemy['health']
-    while enemy_hp > 0 and player['current_hp'] > 0:
-        print(f"Your HP: {player['current_hp']} | {enemy['name']} HP: {enemy_hp}")
-        action = input("Choose action: [attack] [use item] [run] ").strip().lower()
+def simulate_fight(rng, build, enemy):
+    """
+    Plays combat() with the 'attack' action every turn and no HP cap.
+    build: (STR, AGI, CRIT); enemy: (name, health, attack_min, attack_max, crit)
+    Returns (damage taken before the enemy fell, turns).
+    """
+    strength, agi, crit = build
+    enemy_hp = enemy[1]
+    damage_taken = 0
+    turns = 0
+    while enemy_hp > 0 and turns < 500:
+        turns += 1
+        if rng.random() < 0.85 + agi*0.01:
+            damage = rng.randint(5+strength, 10+strength)
+            if rng.random() < 0.1 + crit*0.01:
+                damage *= 2
+            enemy_hp -= damage
+        if enemy_hp > 0 and rng.random() < 0.8:
+            edamage = rng.randint(enemy[2], enemy[3])
+            if rng.random() < enemy[4]:
+                edamage *= 2
+            damage_taken += edamage
+    return damage_taken, turns
+
+outcome_table = OutcomeTable(simulate_fight)
+
+def combat_build_key():
+    return (player['stats']['STR'], player['stats']['AGI'], player['stats']['CRIT'])
+
+def enemy_key(enemy):
+    return (enemy['name'], enemy['health'], enemy['attack_min'], enemy['attack_max'], enemy['crit'])
+
+def auto_resolve(enemy):
+    """
+    Returns (enemy's remaining HP, simulated turns) after settling the fight in one
+    step, or None if auto-resolve is off or the win chance is below AUTO_RESOLVE_THRESHOLD.
+    """
+    if not player.get('auto_resolve'):
+        return None
+    dist = outcome_table.get(combat_build_key(), enemy_key(enemy))
+    if dist.win_probability(player['current_hp']) < AUTO_RESOLVE_THRESHOLD:
+        return None
+    damage_taken, turns = dist.sample(random)
+    player['current_hp'] -= damage_taken
+    emit(EV.DAMAGE_HP, source="auto-resolve", target=player['name'], amount=damage_taken, turns=turns)
+    print(f"[Auto-resolved in {turns} turns: -{damage_taken} HP]")
+    return (0 if player['current_hp'] > 0 else enemy['health']), turns
+
+# -----------------------------
+# Lookahead model (see rpgcommon.combatstate)
+# -----------------------------
+class CombatRules(Rules):
+    """
+    combat() over CombatState cells. Only 'attack' draws the enemy's reply, which
+    is a separate enemy move; 'use item' drinks the strongest potion left
+    (Shadow Stones do nothing in a fight, so the model leaves them out).
+    """
+    P_HP, E_HP, POTIONS_USED = range(HEADER, HEADER + 3)
+    size = HEADER + 3
+
+    def __init__(self, stats, max_hp, enemy, potions=()):
+        self.strength = stats['STR']
+        self.hit = 0.85 + stats['AGI']*0.01
+        self.crit = 0.1 + stats['CRIT']*0.01
+        self.max_hp = max_hp
+        self.e_health = max(1, enemy['health'])
+        self.e_min, self.e_max, self.e_crit = enemy['attack_min'], enemy['attack_max'], enemy['crit']
+        self.potions = tuple(sorted(potions, reverse=True))
+
+    def actions(self, state):
+        c = state.cells
+        if c[SIDE] == ENEMY:
+            return ("attack",)
+        if c[self.POTIONS_USED] < len(self.potions) and c[self.P_HP] < self.max_hp:
+            return ("attack", "use item", "run")
+        return ("attack", "run")
+
+    def apply(self, state, action):
+        c = state.writable()
+        if c[SIDE] == ENEMY:
+            if state.random() < 0.8:
+                edamage = state.randint(self.e_min, self.e_max)
+                if state.random() < self.e_crit:
+                    edamage *= 2
+                c[self.P_HP] -= edamage
+                if c[self.P_HP] <= 0:
+                    c[STATUS] = LOST
+            c[SIDE] = PLAYER
+            return
+        c[TURN] += 1
         if action == "attack":
-            # Player attack
-            if random.random() < 0.85 + player['stats']['AGI']*0.01:
-                damage = random.randint(5+player['stats']['STR'], 10+player['stats']['STR'])
-                if random.random() < 0.1 + player['stats']['CRIT']*0.01:
+            if state.random() < self.hit:
+                damage = state.randint(5+self.strength, 10+self.strength)
+                if state.random() < self.crit:
                     damage *= 2
-                    print("CRITICAL HIT!")
-                enemy_hp -= damage
-                print(f"You dealt {damage} damage to {enemy['name']}.")
+                c[self.E_HP] -= damage
+            if c[self.E_HP] <= 0:
+                c[STATUS] = WON
             else:
-                print("You missed!")
-            # Enemy attack
-            if enemy_hp > 0:
-                if random.random() < 0.8:
-                    edamage = random.randint(enemy['attack_min'], enemy['attack_max'])
-                    if random.random() < enemy['crit']:
-                        edamage *=2
-                        print(f"{enemy['name']} CRITICAL HIT!")
-                    player['current_hp'] -= edamage
-                    print(f"{enemy['name']} hits you for {edamage} damage!")
-                else:
-                    print(f"{enemy['name']} missed!")
+                c[SIDE] = ENEMY
         elif action == "use item":
-            use_item()
+            if c[self.POTIONS_USED] < len(self.potions):
+                c[self.P_HP] = min(self.max_hp, c[self.P_HP] + self.potions[c[self.POTIONS_USED]])
+                c[self.POTIONS_USED] += 1
         elif action == "run":
-            if random.random() < 0.5:
-                print("Escaped!")
-                return
+            if state.random() < 0.5:
+                c[STATUS] = FLED
+
+    def value(self, state):
+        c = state.cells
+        return self.outlook(c[STATUS], max(0, c[self.P_HP]) / self.max_hp, max(0, c[self.E_HP]) / self.e_health)
+
+def potion_heals():
+    return [int(item.split("+")[1].split()[0]) for item in player['inventory'] if "Health Potion" in item]
+
+def lookahead_state(enemy, enemy_hp=None, seed=None):
+    """A searchable copy of a fight against enemy (at enemy_hp, default full), player to move."""
+    rules = CombatRules(player['stats'], player['max_hp'], enemy, potion_heals())
+    hp = enemy['health'] if enemy_hp is None else enemy_hp
+    return rules.new_state([ONGOING, PLAYER, 0, 0, player['current_hp'], hp, 0], seed)
+
+# -----------------------------
+# Combat
+# -----------------------------
+def combat(enemy):
+    print(f"\n!!! A ({enemy['rank']}) {enemy['name']} appears !!!\n")
+    enemy_hp = enemy['health']
+    turns = 0
+    resolved = auto_resolve(enemy)
+    if resolved is not None:
+        enemy_hp, turns = resolved
+    commands = CommandQueue(BATCH_VERBS, player['name'])
+    try:
+        while enemy_hp > 0 and player['current_hp'] > 0:
+            print(f"Your HP: {player['current_hp']} | {enemy['name']} HP: {enemy_hp}")
+            try:
+                action = commands.read("Choose action: [attack] [use item] [run] ",
+                                       hp=player['current_hp'], max_hp=player['max_hp'], enemies=1)
+            except CommandError as err:
+                print(err)
+                continue
+            turn_t0 = profiling.start()
+            if action in ("attack", "use item", "run"):
+                turns += 1
+            if action == "attack":
+                # Player attack
+                if random.random() < 0.85 + player['stats']['AGI']*0.01:
+                    damage = random.randint(5+player['stats']['STR'], 10+player['stats']['STR'])
+                    crit = random.random() < 0.1 + player['stats']['CRIT']*0.01
+                    if crit:
+                        damage *= 2
+                        print("CRITICAL HIT!")
+                    enemy_hp -= damage
+                    emit(EV.ATTACK, source=player['name'], target=enemy['name'], amount=damage)
+                    if crit:
+                        emit(EV.CRIT, source=player['name'], target=enemy['name'], amount=damage)
+                    emit(EV.DAMAGE_HP, source=player['name'], target=enemy['name'], amount=damage)
+                    print(f"You dealt {damage} damage to {enemy['name']}.")
+                else:
+                    emit(EV.MISS, source=player['name'], target=enemy['name'])
+                    print("You missed!")
+                # Enemy attack
+                if enemy_hp > 0:
+                    if random.random() < 0.8:
+                        edamage = random.randint(enemy['attack_min'], enemy['attack_max'])
+                        crit = random.random() < enemy['crit']
+                        if crit:
+                            edamage *=2
+                            print(f"{enemy['name']} CRITICAL HIT!")
+                        player['current_hp'] -= edamage
+                        emit(EV.ATTACK, source=enemy['name'], target=player['name'], amount=edamage)
+                        if crit:
+                            emit(EV.CRIT, source=enemy['name'], target=player['name'], amount=edamage)
+                        emit(EV.DAMAGE_HP, source=enemy['name'], target=player['name'], amount=edamage)
+                        print(f"{enemy['name']} hits you for {edamage} damage!")
+                    else:
+                        emit(EV.MISS, source=enemy['name'], target=player['name'])
+                        print(f"{enemy['name']} missed!")
+            elif action == "use item":
+                use_item()
+            elif action == "run":
+                if random.random() < 0.5:
+                    print("Escaped!")
+                    metrics.fight_finished("sololeveling", turns)
+                    return
+                else:
+                    print("Failed to escape!")
             else:
-                print("Failed to escape!")
-        else:
-            print("Invalid action.")
+                print("Invalid action.")
+            profiling.stop("combat.turn", turn_t0)
+    finally:
+        commands.close()
+    metrics.fight_finished("sololeveling", turns)
     if player['current_hp'] <= 0:
+        emit(EV.DEATH, source=enemy['name'], target=player['name'], inventory_lost=len(player['inventory']))
+        metrics.DEATHS.inc("sololeveling", player['rank'])
         print("You died...")
         player['inventory'] = []
         player['current_hp'] = player['max_hp']
         save_player()
         print("You respawn at the dungeon entrance, your stats intact but inventory lost.")
         return
+    emit(EV.DEATH, source=player['name'], target=enemy['name'])
     print(f"You defeated the {enemy['name']}!")
     xp_values = {"E":5,"D":10,"C":20,"B":40,"A":80,"S":150}
     gain_xp(xp_values.get(enemy['rank'],10))
@@ -212,11 +432,11 @@ def combat(enemy):
 # -----------------------------
 # Dungeon generation
 # -----------------------------
-def generate_dungeon():
-    num_rooms = random.randint(4,10)
+def generate_dungeon(rng=random):
+    num_rooms = rng.randint(4,10)
     dungeon = []
     for _ in range(num_rooms):
-        room_type = random.choices(
+        room_type = rng.choices(
             ROOM_TYPES,
             weights=[0.6,0.2,0.1,0.1], k=1
         )[0]
@@ -226,29 +446,337 @@ def generate_dungeon():
 # -----------------------------
 # Enemy selection
 # -----------------------------
-def select_enemy():
-    possible = [e for e in ENEMIES if RANKS.index(e['rank']) <= RANKS.index(player['rank'])+2]
-    enemy = random.choice(possible)
-    # 10% chance enemy is enchanted: increase stats
-    if random.random() < 0.1:
-        enemy = enemy.copy()
-        enemy['health'] += 5
-        enemy['attack_min'] += 2
-        enemy['attack_max'] += 2
-        enemy['name'] = "Enchanted " + enemy['name']
+ENCHANTED_CHANCE = 0.1
+
+def select_enemy(rank=None, rng=random):
+    rank = rank or player['rank']
+    possible = [e for e in ENEMIES if RANKS.index(e['rank']) <= RANKS.index(rank)+2]
+    enemy = rng.choice(possible)
+    # now and then an enemy is enchanted: increase stats
+    if rng.random() < ENCHANTED_CHANCE:
+        enemy = enchant(enemy)
+    return enemy
+
+def enchant(enemy):
+    enemy = enemy.copy()
+    enemy['health'] += 5
+    enemy['attack_min'] += 2
+    enemy['attack_max'] += 2
+    enemy['name'] = "Enchanted " + enemy['name']
     return enemy
 
+# -----------------------------
+# Stat planner (see rpgcommon.statplan)
+# -----------------------------
+STAT_PICKS = {"STR": {"STR": 2}, "VIT": {"VIT": 1, "max_hp": 10}, "AGI": {"AGI": 1}, "CRIT": {"CRIT": 1}}  # choose_stat()
+STAT_NAMES = {"STR": "Strength", "VIT": "Vitality", "AGI": "Agility", "CRIT": "Critical"}
+
+def content_tier(rank):
+    """A rank's dungeon for the planner: a monster room at select_enemy()'s odds, then the boss room."""
+    possible = [e for e in ENEMIES if RANKS.index(e['rank']) <= RANKS.index(rank)+2]
+    monsters = []
+    for e in possible:
+        monsters.append(((1-ENCHANTED_CHANCE)/len(possible), enemy_key(e)))
+        monsters.append((ENCHANTED_CHANCE/len(possible), enemy_key(enchant(e))))
+    return [monsters, [(1/len(BOSSES), enemy_key(b)) for b in BOSSES]]
+
+stat_plan = statplan.StatPlan(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "stat_plan.bin"),
+    simulate_fight, STAT_PICKS,
+    start=dict(DEFAULT_PLAYER['stats'], max_hp=DEFAULT_PLAYER['max_hp']),
+    build=lambda stats: (stats['STR'], stats['AGI'], stats['CRIT']),
+    tiers={rank: content_tier(rank) for rank in RANKS},
+    weight=xp_cap, level_hp=10)
+
 # -----------------------------
 # Dungeon loop
 # -----------------------------
+TREASURE = loot.LootTable.uniform(["Health Potion +20", "Shadow Stone"])
+
+def roll_room(room, rng=random):
+    """What a room holds, rolled before the player steps in so a checkpoint can keep it."""
+    if room == "monster":
+        return {"enemy": select_enemy(rng=rng)}
+    if room == "treasure":
+        return {"loot": TREASURE.draw(rng)}
+    if room == "trap":
+        return {"damage": rng.randint(5, 15)}
+    if room == "boss":
+        boss = rng.choice(BOSSES).copy()
+        boss['rank'] = RANKS[min(RANKS.index(player['rank'])+boss['rank_offset'], len(RANKS)-1)]
+        return {"boss": boss}
+    return {}
+
+def play_room(room, contents=None):
+    if contents is None:
+        contents = roll_room(room)
+    if room == "monster":
+        combat(contents['enemy'])
+    elif room == "treasure":
+        item = contents['loot']
+        player['inventory'].append(item)
+        emit(EV.LOOT_DROP, source="treasure", target=player['name'], amount=1, item=item)
+        print(f"You found {item}!")
+        save_player()
+    elif room == "trap":
+        damage = contents['damage']
+        player['current_hp'] -= damage
+        print(f"A trap hits you for {damage} damage!")
+        if player['current_hp'] <= 0:
+            emit(EV.DEATH, source="trap", target=player['name'], inventory_lost=len(player['inventory']))
+            metrics.DEATHS.inc("sololeveling", player['rank'])
+            print("You died...")
+            player['inventory'] = []
+            player['current_hp'] = player['max_hp']
+            print("You respawn at the dungeon entrance, your stats intact but inventory lost.")
+        save_player()
+    elif room == "boss":
+        combat(contents['boss'])
+
 def start_dungeon():
-    print("\n[Dungeon generated! You enter a dark corridor...]")
-    dungeon = generate_dungeon()
-    room_count = 0
+    run = checkpoint.resume(player, "dungeon")
+    if run:
+        print(f"\n[You return to room {run['room']} of the dungeon you left...]")
+    else:
+        run = checkpoint.begin(player, "dungeon")
+        print("\n[Dungeon generated! You enter a dark corridor...]")
+    dungeon = generate_dungeon(random.Random(run['seed']))
+    room_count = max(run['room'] - 1, 0)
     while room_count < len(dungeon) and player['current_hp'] > 0:
         room = dungeon[room_count]
         room_count +=1
+        contents = checkpoint.pending(run, room_count) or roll_room(room, checkpoint.room_rng(run, room_count))
+        checkpoint.reach(run, room_count, contents)
+        save_player()
         print(f"\n--- Room {room_count} ---")
-        if room == "monster":
-            enemy = select_enemy
+        play_room(room, contents)
+    checkpoint.finish(player, "dungeon")
+    save_player()
+    print("Dungeon cleared!")
+
+# -----------------------------
+# Deep dungeon (see rpgcommon.dungeongraph)
+# -----------------------------
+DEEP_FLOORS = 400
+DEEP_ROOM_WEIGHTS = {"monster": 0.6, "treasure": 0.2, "trap": 0.1}  # bosses wait in the locked wings
+
+def start_deep_dungeon():
+    run = None
+    if player.get('deep_dungeon'):
+        try:
+            run = dungeongraph.DungeonRun.from_dict(player['deep_dungeon'], DEEP_ROOM_WEIGHTS)
+            print(f"\n[You return to floor {run.room.floor + 1} of the deep dungeon...]")
+        except (ValueError, KeyError):
+            print("Your map of the deep dungeon is unreadable. You start over.")
+    if run is None:
+        run = dungeongraph.DungeonRun.new(random.getrandbits(32), DEEP_ROOM_WEIGHTS, DEEP_FLOORS)
+        print(f"\n[A stairway leads down into a dungeon {DEEP_FLOORS} floors deep...]")
+    deaths = []
+    on_death = events.bus.subscribe(lambda e: e.target == player['name'] and deaths.append(e), [EV.DEATH])
+    try:
+        while True:
+            room = run.room
+            if not run.visited(room.id):
+                print(f"\n--- Floor {room.floor + 1}, room {room.id % dungeongraph.FLOOR_SLOTS + 1} ---")
+                if room.kind == "key":
+                    print("You find a heavy iron key. Somewhere on this floor a door now opens.")
+                    play_room("treasure")
+                elif room.kind != "corridor":
+                    play_room(room.kind)
+                if deaths:
+                    deaths.clear()
+                    run.at = dungeongraph.ENTRANCE
+                    player['deep_dungeon'] = run.to_dict()
+                    save_player()
+                    continue
+                run.visit(room.id)
+                if run.cleared:
+                    print("The deepest boss falls. The deep dungeon is cleared!")
+                    player['deep_dungeon'] = None
+                    save_player()
+                    return
+                player['deep_dungeon'] = run.to_dict()
+                save_player()
+            exits = run.exits()
+            print("Exits:")
+            for i, (label, _) in enumerate(exits, 1):
+                print(f"{i}. {label}")
+            print("0. Leave (your way through is remembered)")
+            choice = input("Go where? ").strip()
+            if choice == "0":
+                player['deep_dungeon'] = run.to_dict()
+                save_player()
+                return
+            if not (choice.isdigit() and 1 <= int(choice) <= len(exits)):
+                print("Invalid choice.")
+            elif not run.move(exits[int(choice) - 1][1]):
+                print("The door is locked. Its key lies somewhere on this floor.")
+    finally:
+        events.bus.unsubscribe(on_death)
+
+# -----------------------------
+# Offline progression
+# -----------------------------
+XP_VALUES = {"E":5,"D":10,"C":20,"B":40,"A":80,"S":150}
+OFFLINE_POTION_THRESHOLD = 0.5  # offline hunters drink a potion below this HP fraction
+
+def offline_stat_choice(state, planned=True):
+    """Stat picked on offline level-ups: the planner's pick, or choose_stat()'s default without a plan."""
+    hint = stat_plan.recommend(state['rank'], state['level'], state['stats']) if planned else None
+    return hint[0] if hint else "STR"
+
+def simulate_offline_runs(runs, rng=None):
+    """
+    Plays `runs` dungeon runs headlessly on a copy of the player.
+    Fights are sampled from the cached outcome tables instead of played turn by turn,
+    and nothing is printed or saved. Returns (new_state, report).
+    """
+    rng = rng or random.Random(random.getrandbits(64))  # follows the session seed, so replays match
+    # the plan is loaded here rather than left to warm()'s thread; a recorded or
+    # replayed session never uses it, since the table on disk may differ between the two
+    planned = not replay.active() and stat_plan.load()
+    state = json.loads(json.dumps(player))
+    stats = state['stats']
+    report = {"runs": runs, "rooms": 0, "fights": 0, "deaths": 0, "xp": 0, "levels": 0,
+              "items_found": 0, "items_lost": 0, "potions_used": 0}
+
+    def gain(amount):
+        report['xp'] += amount
+        state['xp'] += amount
+        while state['xp'] >= state['xp_cap']:
+            state['xp'] -= state['xp_cap']
+            state['level'] += 1
+            state['xp_cap'] = xp_cap(state['level'])
+            state['max_hp'] += 10
+            stat = offline_stat_choice(state, planned)
+            if stat == "VIT":
+                stats['VIT'] += 1
+                state['max_hp'] += 10
+            elif stat == "STR":
+                stats['STR'] += 2
+            else:
+                stats[stat] += 1
+            state['current_hp'] = state['max_hp']
+            report['levels'] += 1
+
+    def die():
+        report['deaths'] += 1
+        report['items_lost'] += len(state['inventory'])
+        state['inventory'] = []
+        state['current_hp'] = state['max_hp']
+
+    def drink_potion():
+        for idx, item in enumerate(state['inventory']):
+            if "Health Potion" in item:
+                heal = int(item.split("+")[1].split()[0])
+                state['inventory'].pop(idx)
+                state['current_hp'] = min(state['max_hp'], state['current_hp']+heal)
+                report['potions_used'] += 1
+                return
+
+    def fight(enemy):
+        if state['current_hp'] < state['max_hp'] * OFFLINE_POTION_THRESHOLD:
+            drink_potion()
+        report['fights'] += 1
+        dist = outcome_table.get((stats['STR'], stats['AGI'], stats['CRIT']), enemy_key(enemy))
+        damage_taken, _ = dist.sample(rng)
+        state['current_hp'] -= damage_taken
+        if state['current_hp'] <= 0:
+            die()
+        else:
+            gain(XP_VALUES.get(enemy['rank'], 10))
+
+    for _ in range(runs):
+        for room in generate_dungeon(rng):
+            report['rooms'] += 1
+            if room == "monster":
+                fight(select_enemy(state['rank'], rng))
+            elif room == "treasure":
+                state['inventory'].append(TREASURE.draw(rng))
+                report['items_found'] += 1
+            elif room == "trap":
+                state['current_hp'] -= rng.randint(5, 15)
+                if state['current_hp'] <= 0:
+                    die()
+            elif room == "boss":
+                boss = rng.choice(BOSSES).copy()
+                boss['rank'] = RANKS[min(RANKS.index(state['rank'])+boss['rank_offset'], len(RANKS)-1)]
+                fight(boss)
+    return state, report
+
+def send_offline():
+    choice = input("How many dungeon runs should your hunter take? ").strip()
+    if not choice.isdigit() or int(choice) <= 0:
+        print("Invalid number.")
+        return
+    state, report = simulate_offline_runs(int(choice))
+    player.clear()
+    player.update(state)
+    save_player()
+    print(f"Your hunter returns after {report['runs']} runs ({report['rooms']} rooms, {report['fights']} fights).")
+    print(f"XP gained: {report['xp']} | Levels gained: {report['levels']} | Deaths: {report['deaths']}")
+    print(f"Items found: {report['items_found']} | Items lost: {report['items_lost']} | Potions used: {report['potions_used']}")
+    print(f"Now Level {player['level']} with {player['current_hp']} / {player['max_hp']} HP")
+
+# -----------------------------
+# Main loop
+# -----------------------------
+def main_menu():
+    while True:
+        replay.safe_point()
+        print("\n=== Dungeon Menu ===")
+        print("1. Enter Dungeon")
+        print("2. Check Status / Inventory")
+        print("3. Use Item")
+        print("4. Save & Quit")
+        print(f"5. Auto-Resolve Easy Fights [{'ON' if player.get('auto_resolve') else 'OFF'}]")
+        print("6. Send Hunter on Offline Runs")
+        print("7. Enter Deep Dungeon")
+        choice = input("Choose an option: ").strip()
+        if choice == "1":
+            start_dungeon()
+        elif choice == "2":
+            print(f"Level {player['level']} {player['rank']} {player['name']}")
+            print(f"HP: {player['current_hp']} / {player['max_hp']}")
+            print(f"XP: {player['xp']} / {player['xp_cap']}")
+            print("Stats:", player['stats'])
+            show_inventory()
+        elif choice == "3":
+            use_item()
+        elif choice == "4":
+            save_player()
+            print("Exiting game.")
+            return
+        elif choice == "5":
+            player['auto_resolve'] = not player.get('auto_resolve', False)
+            print(f"Auto-resolve is now {'ON' if player['auto_resolve'] else 'OFF'}.")
+            save_player()
+        elif choice == "6":
+            send_offline()
+        elif choice == "7":
+            start_deep_dungeon()
+        else:
+            print("Invalid choice.")
+
+def resume(state):
+    """Picks a replayed session up at the main menu (see rpgcommon.replay)."""
+    global player
+    player = state
+    return main_menu
+
+replay.register("sololeveling", files=lambda: [SAVE_FILE], snapshot=lambda: player, resume=resume)
+
+def main():
+    output.install()
+    if "--build-stat-plan" in sys.argv:
+        stat_plan.build(jobs=os.cpu_count() or 1)
+        print(f"Stat plan written to {stat_plan.path}")
+        return
+    stat_plan.warm()
+    prologue()
+    random.seed(replay.begin())
+    load_player()
+    main_menu()
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+"""
+Puts the repo root and the three game folders on sys.path, the way each game
+finds rpgcommon when run from its own folder.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for sub in ("halorpg", "lucidusrpg", "sololevelingrpg"):
+    sys.path.insert(0, os.path.join(ROOT, sub))
+sys.path.insert(0, ROOT)
@@ -0,0 +1,121 @@
+"""Streaming aggregators: Moments, the P-square Quantile and Series bucket merging."""
+import math
+import pickle
+import random
+import statistics
+
+import pytest
+
+from rpgcommon import aggregate
+from rpgcommon.aggregate import Moments, Quantile, Series
+
+
+def test_moments_match_statistics():
+    rng = random.Random(7)
+    values = [rng.gauss(10, 3) for _ in range(1000)]
+    m = Moments()
+    for v in values:
+        m.add(v)
+    assert m.n == 1000
+    assert m.mean == pytest.approx(statistics.mean(values))
+    assert m.stdev == pytest.approx(statistics.stdev(values))
+    assert (m.min, m.max) == (min(values), max(values))
+
+
+def test_moments_of_one_value():
+    m = Moments()
+    m.add(4)
+    assert (m.mean, m.stdev, m.min, m.max) == (4, 0.0, 4, 4)
+
+
+def test_quantile_is_exact_for_short_streams():
+    q = Quantile(0.9)
+    assert math.isnan(q.value())
+    for v in (5, 1, 3):
+        q.add(v)
+    assert q.value() == 5
+    q = Quantile(0.9)
+    for v in (1, 2, 3, 4):
+        q.add(v)
+    assert q.value() == 4
+    q.add(30)  # the fifth value: still the exact answer, not the middle marker
+    assert q.value() == 30
+
+
+def test_quantile_is_exact_up_to_the_switch():
+    rng = random.Random(2)
+    values = [rng.randint(0, 1000) for _ in range(aggregate.EXACT_SAMPLES - 1)]
+    q = Quantile(0.99)
+    for v in values:
+        q.add(v)
+    exact = sorted(values)[int(0.99 * len(values))]
+    assert q.value() == exact
+    q.add(500)  # the markers take over from the order statistics
+    assert q.value() == pytest.approx(exact, abs=10)
+
+
+@pytest.mark.parametrize("p", [0.01, 0.1, 0.5, 0.9, 0.99])
+def test_quantile_estimate(p):
+    rng = random.Random(11)
+    values = list(range(10000))
+    rng.shuffle(values)
+    q = Quantile(p)
+    for v in values:
+        q.add(v)
+    assert q.value() == pytest.approx(p * 10000, abs=150)
+
+
+def test_quantile_of_a_skewed_stream():
+    rng = random.Random(3)
+    values = [rng.expovariate(1.0) for _ in range(20000)]
+    q = Quantile(0.9)
+    for v in values:
+        q.add(v)
+    exact = sorted(values)[int(0.9 * len(values))]
+    assert q.value() == pytest.approx(exact, rel=0.05)
+
+
+@pytest.mark.parametrize("p", [0, 1, -0.5, 1.5])
+def test_quantile_needs_p_inside_0_1(p):
+    with pytest.raises(ValueError):
+        Quantile(p)
+
+
+def test_series_merges_buckets_in_pairs():
+    s = Series(buckets=4)
+    for v in range(1, 11):
+        s.add(v)
+    assert s.width == 4
+    assert s.rows() == [(1, 4, 2.5), (5, 8, 6.5), (9, 10, 9.5)]
+
+
+@pytest.mark.parametrize("n", [1, 63, 64, 65, 1000, 4097])
+def test_series_rows_cover_the_stream(n):
+    s = Series()
+    for v in range(1, n + 1):
+        s.add(v)
+    rows = s.rows()
+    assert len(rows) <= s.buckets
+    assert rows[0][0] == 1 and rows[-1][1] == n
+    for (_, last, _), (first, _, _) in zip(rows, rows[1:]):
+        assert first == last + 1
+    for first, last, mean in rows:
+        assert mean == pytest.approx((first + last) / 2)  # the mean of first..last
+
+
+@pytest.mark.parametrize("buckets", [0, 1, 3])
+def test_series_needs_an_even_bucket_count(buckets):
+    with pytest.raises(ValueError):
+        Series(buckets)
+
+
+def test_aggregators_pickle():
+    m, q, s = Moments(), Quantile(0.5), Series(4)
+    for v in range(9):
+        m.add(v)
+        q.add(v)
+        s.add(v)
+    m2, q2, s2 = pickle.loads(pickle.dumps((m, q, s)))
+    assert (m2.n, m2.mean, m2.stdev) == (m.n, m.mean, m.stdev)
+    assert q2.value() == q.value()
+    assert s2.rows() == s.rows()
@@ -0,0 +1,209 @@
+"""Batched combat input: parsing, stop conditions, the queue and its interrupts."""
+import builtins
+import io
+import sys
+
+import pytest
+
+from rpgcommon import commands, events, output
+from rpgcommon.commands import MAX_REPEAT, CommandError, CommandQueue, Condition, Step, parse, parse_condition
+from rpgcommon.events import EventType as EV
+
+VERBS = {"attack": "a", "a": "a", "grenade": "g", "g": "g", "medkit": "m", "m": "m"}
+FULL = {"hp": 100, "max_hp": 100, "enemies": 1}
+
+
+@pytest.fixture
+def typed(monkeypatch):
+    """Feeds input() from a list and fails on any prompt the test did not expect."""
+    lines = []
+
+    def fake_input(prompt=""):
+        if not lines:
+            raise AssertionError(f"unexpected prompt {prompt!r}")
+        return lines.pop(0)
+
+    monkeypatch.setattr(builtins, "input", fake_input)
+    return lines
+
+
+@pytest.fixture
+def queue():
+    q = CommandQueue(VERBS, "Chief")
+    yield q
+    q.close()
+
+
+def _subscribers():
+    return len(events.bus._subscribers)
+
+
+# -------------------------
+# Parsing
+# -------------------------
+def test_parse_repeats_and_lists():
+    assert parse("attack x5", VERBS) == [Step("a", 5)]
+    assert parse("grenade, attack*3", VERBS) == [Step("g"), Step("a", 3)]
+    assert parse(" G; a ", VERBS) == [Step("g"), Step("a")]
+    assert parse("a x999", VERBS) == [Step("a", MAX_REPEAT)]
+
+
+def test_parse_until_then():
+    assert parse("attack until hp<30 then medkit", VERBS) == [
+        Step("a", MAX_REPEAT, Condition("hp", "<", 30)), Step("m")]
+    assert parse("a until hp<40% then g, m x2", VERBS) == [
+        Step("a", MAX_REPEAT, Condition("hp", "<", 40, percent=True)), Step("g"), Step("m", 2)]
+
+
+@pytest.mark.parametrize("text, message", [
+    ("dance x2", "'dance' can't be queued"),
+    ("a until mana<3", "Unknown condition 'mana<3'"),
+    ("a b", "Could not understand 'a b'"),
+    (" , ;", "Nothing to do."),
+])
+def test_parse_errors(text, message):
+    with pytest.raises(CommandError, match=message):
+        parse(text, VERBS)
+
+
+@pytest.mark.parametrize("text, state, holds", [
+    ("hp<30", {"hp": 29}, True),
+    ("hp<30", {"hp": 30}, False),
+    ("hp <= 30", {"hp": 30}, True),
+    ("shield>0", {"shield": 5}, True),
+    ("shield>=5", {"shield": 4}, False),
+    ("enemies==0", {}, True),  # a missing counter reads as 0
+    ("hp<40%", {"hp": 39, "max_hp": 100}, True),
+    ("hp<40%", {"hp": 40, "max_hp": 100}, False),
+    ("HP < 50 %", {"hp": 60, "max_hp": 200}, True),
+])
+def test_condition_holds(text, state, holds):
+    assert parse_condition(text).holds(state) is holds
+
+
+# -------------------------
+# Queue
+# -------------------------
+def test_plain_input_passes_through(typed, queue):
+    typed.extend(["Attack ", "s"])
+    assert queue.read("> ", **FULL) == "attack"  # unknown words are the game's business
+    assert queue.read("> ", **FULL) == "s"
+    assert not queue.pending and not output.batching()
+
+
+def test_batch_runs_without_prompting(typed, queue):
+    stdout = sys.stdout
+    typed.append("a x3, m")
+    assert [queue.read("> ", **FULL) for _ in range(4)] == ["a", "a", "a", "m"]
+    assert output.batching()
+    typed.append("g")
+    assert queue.read("> ", **FULL) == "g"  # the batch ran out: prompt again
+    assert not output.batching()
+    assert sys.stdout is stdout
+
+
+def test_batch_output_is_one_frame(typed, monkeypatch):
+    stream = io.StringIO()
+    writes = []
+    real_write = stream.write
+    monkeypatch.setattr(stream, "write", lambda text: writes.append(text) or real_write(text))
+    sink = output.FrameSink(stream, color=True)
+    monkeypatch.setattr(sys, "stdout", sink)
+    q = CommandQueue(VERBS, "Chief")
+    typed.append("a x3")
+    for _ in range(3):
+        q.read("> ", **FULL)
+        print("turn")
+    assert writes == []
+    q.close()
+    assert writes == ["turn\nturn\nturn\n"]
+    assert sys.stdout is sink and not sink.batch
+
+
+def test_until_stops_the_step(typed, queue):
+    typed.append("a until hp<30 then m")
+    assert queue.read("> ", hp=50, max_hp=100) == "a"
+    assert queue.read("> ", hp=40, max_hp=100) == "a"
+    assert queue.read("> ", hp=29, max_hp=100) == "m"
+    typed.append("g")
+    assert queue.read("> ", hp=29, max_hp=100) == "g"
+
+
+def test_until_already_holding_is_an_error(typed, queue):
+    stdout = sys.stdout
+    subscribers = _subscribers()
+    typed.append("attack until hp<30")
+    with pytest.raises(CommandError, match="Nothing to do"):
+        queue.read("> ", hp=20, max_hp=100)
+    assert not queue.pending and not output.batching()
+    assert sys.stdout is stdout
+    assert _subscribers() == subscribers
+    typed.append("m")
+    assert queue.read("> ", hp=20, max_hp=100) == "m"
+
+
+def test_parse_error_leaves_no_batch(typed, queue):
+    typed.append("a x2, dance")
+    with pytest.raises(CommandError):
+        queue.read("> ", **FULL)
+    assert not queue.pending and not output.batching()
+
+
+# -------------------------
+# Interrupts
+# -------------------------
+def test_low_hp_interrupts(typed, queue, capsys):
+    typed.append("a x5")
+    assert queue.read("> ", **FULL) == "a"
+    typed.append("m")
+    assert queue.read("> ", hp=25, max_hp=100, enemies=1) == "m"
+    assert "[Queue interrupted: low HP]" in capsys.readouterr().out
+
+
+def test_hp_until_overrides_low_hp(typed, queue):
+    typed.append("a until hp<10")
+    assert queue.read("> ", **FULL) == "a"
+    assert queue.read("> ", hp=20, max_hp=100, enemies=1) == "a"  # the player's own stop is lower
+
+
+def test_new_enemy_interrupts(typed, queue, capsys):
+    typed.append("a x5")
+    assert queue.read("> ", **FULL) == "a"
+    assert queue.read("> ", **FULL) == "a"
+    typed.append("g")
+    assert queue.read("> ", hp=100, max_hp=100, enemies=2) == "g"
+    assert "new enemy" in capsys.readouterr().out
+
+
+def test_crit_taken_interrupts(typed, queue, capsys):
+    typed.append("a x5")
+    assert queue.read("> ", **FULL) == "a"
+    events.bus.emit(EV.CRIT, "halo", source="Chief", target="Grunt")  # dealt, not taken
+    assert queue.read("> ", **FULL) == "a"
+    events.bus.emit(EV.CRIT, "halo", source="Grunt", target="Chief")
+    typed.append("m")
+    assert queue.read("> ", **FULL) == "m"
+    assert "critical hit taken" in capsys.readouterr().out
+
+
+def test_interrupts_can_be_turned_off(typed):
+    q = CommandQueue(VERBS, "Chief", commands.InterruptRules(low_hp=0, new_enemy=False, crit_taken=False))
+    typed.append("a x3")
+    try:
+        assert q.read("> ", **FULL) == "a"
+        events.bus.emit(EV.CRIT, "halo", source="Grunt", target="Chief")
+        assert q.read("> ", hp=1, max_hp=100, enemies=9) == "a"
+    finally:
+        q.close()
+
+
+def test_close_unsubscribes(typed):
+    subscribers = _subscribers()
+    q = CommandQueue(VERBS, "Chief")
+    typed.append("a x3")
+    q.read("> ", **FULL)
+    assert _subscribers() == subscribers + 1
+    q.close()
+    q.close()
+    assert _subscribers() == subscribers
+    assert not output.batching()
@@ -0,0 +1,119 @@
+"""Seeded dungeon graphs and the runs through them."""
+import random
+
+import pytest
+
+from rpgcommon import dungeongraph
+from rpgcommon.dungeongraph import DungeonGraph, DungeonRun, FLOOR_SLOTS
+from rpgcommon.migrate import require
+
+WEIGHTS = {"monster": 3, "treasure": 1, "trap": 1}
+
+
+def _rooms(graph):
+    for room_id in range(graph.size):
+        try:
+            yield graph.room(room_id)
+        except KeyError:
+            pass
+
+
+def _walk(run, steps, seed):
+    rng = random.Random(seed)
+    run.visit(run.at)
+    for _ in range(steps):
+        _, room_id = rng.choice(run.exits())
+        if run.move(room_id):
+            run.visit(room_id)
+
+
+def test_layout_depends_only_on_seed_and_floor():
+    rooms = list(_rooms(DungeonGraph(42, WEIGHTS, 12)))
+    # built in another order through a one-floor cache, so every floor is rebuilt more than once
+    small = DungeonGraph(42, WEIGHTS, 12, cache_floors=1)
+    for room in reversed(rooms):
+        assert small.room(room.id) == room
+    assert rooms == list(_rooms(small))
+    assert rooms != list(_rooms(DungeonGraph(43, WEIGHTS, 12)))
+
+
+def test_exits_go_both_ways():
+    graph = DungeonGraph(7, WEIGHTS, 11)
+    for room in _rooms(graph):
+        for room_id in room.exits:
+            assert room.id in graph.room(room_id).exits
+
+
+def test_boss_floors_have_a_key_and_a_locked_boss():
+    graph = DungeonGraph(7, WEIGHTS, 7)
+    for floor in range(graph.floors):
+        boss = graph.boss_room(floor)
+        assert (boss is not None) == (floor in (4, 6))
+        if boss is not None:
+            assert graph.room(boss).locked
+            assert graph.room(graph.key_room(floor)).kind == "key"
+
+
+def test_boss_wing_opens_with_the_key():
+    run = DungeonRun.new(5, WEIGHTS, 1)
+    graph = run.graph
+    boss = graph.boss_room(0)
+    run.at = next(r.id for r in _rooms(graph) if boss in r.exits)
+    assert ("Boss wing (locked)", boss) in run.exits()
+    assert not run.move(boss)
+    run.visit(graph.key_room(0))
+    assert ("Boss wing", boss) in run.exits()
+    assert run.move(boss)
+    assert not run.cleared
+    run.visit(boss)
+    assert run.cleared
+
+
+def test_inner_room_leads_back_to_its_side_room():
+    for seed in range(200):
+        graph = DungeonGraph(seed, WEIGHTS, 1)
+        inner = [r for r in _rooms(graph) if r.role == "side" and all(graph.room(e).role == "side" for e in r.exits)]
+        if inner:
+            break
+    run = DungeonRun(graph, inner[0].id)
+    back = inner[0].exits[0]
+    assert run.exits() == [("Back to the side room", back)]
+    run.at = back
+    assert ("Side room", inner[0].id) in run.exits()
+
+
+def test_move_rejects_rooms_that_are_not_next_door():
+    run = DungeonRun.new(1, WEIGHTS, 3)
+    with pytest.raises(ValueError):
+        run.move(FLOOR_SLOTS * 2)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 99])
+def test_run_round_trip(seed):
+    run = DungeonRun.new(seed, WEIGHTS, 20)
+    _walk(run, 300, seed)
+    data = run.to_dict()
+    require(data, dungeongraph.SAVE_FIELDS)
+
+    back = DungeonRun.from_dict(data, WEIGHTS)
+    assert back.at == run.at
+    assert back.rooms_visited == run.rooms_visited
+    assert [back.visited(i) for i in range(run.graph.size)] == [run.visited(i) for i in range(run.graph.size)]
+    assert back.exits() == run.exits()
+    assert back.to_dict() == data
+
+
+def test_fresh_run_round_trip():
+    data = DungeonRun.new(3, WEIGHTS, 10 ** 6).to_dict()
+    back = DungeonRun.from_dict(data, WEIGHTS)
+    assert (back.at, back.rooms_visited, back.graph.floors) == (dungeongraph.ENTRANCE, 0, 10 ** 6)
+
+
+def test_from_dict_rejects_damaged_runs():
+    data = DungeonRun.new(3, WEIGHTS, 2).to_dict()
+    with pytest.raises(ValueError):
+        DungeonRun.from_dict(dict(data, visited="not base64!"), WEIGHTS)
+    with pytest.raises(ValueError):
+        DungeonRun.from_dict(dict(data, visited="AAAA"), WEIGHTS)
+    with pytest.raises(KeyError):
+        DungeonRun.from_dict(dict(data, at=FLOOR_SLOTS * 2), WEIGHTS)
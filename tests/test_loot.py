@@ -0,0 +1,97 @@
+"""Compiled loot tables: the alias table's exact distribution and how rolls expand."""
+import random
+
+import pytest
+
+from rpgcommon import loot
+from rpgcommon.loot import AliasTable, LootTable
+from rpgcommon.migrate import SchemaError
+
+
+def _masses(table):
+    # the exact chance of each entry: column c is picked with 1/n, then c or its alias
+    mass = [0.0] * table.n
+    for c in range(table.n):
+        mass[c] += table.prob[c] / table.n
+        mass[table.alias[c]] += (1.0 - table.prob[c]) / table.n
+    return mass
+
+
+@pytest.mark.parametrize("weights", [
+    [1],
+    [1, 1, 1, 1],
+    [5, 3, 2],
+    [0.1, 10, 0, 3.5, 1e-3],
+    [1000, 1, 1, 1, 1, 1, 1, 1],
+])
+def test_alias_table_distribution_is_exact(weights):
+    table = AliasTable(weights)
+    total = sum(weights)
+    assert _masses(table) == pytest.approx([w / total for w in weights], abs=1e-12)
+
+
+def test_alias_table_never_draws_a_zero_weight():
+    table = AliasTable([0, 2, 0, 1])
+    picked = {table.index(k / 4000) for k in range(4000)}
+    assert picked == {1, 3}
+
+
+def test_alias_table_index_over_a_grid():
+    weights = [5, 3, 2]
+    table = AliasTable(weights)
+    counts = [0, 0, 0]
+    steps = 30000
+    for k in range(steps):
+        counts[table.index((k + 0.5) / steps)] += 1
+    assert [c / steps for c in counts] == pytest.approx([0.5, 0.3, 0.2], abs=1e-3)
+
+
+@pytest.mark.parametrize("weights", [[], [0, 0], [1, -1]])
+def test_alias_table_rejects_bad_weights(weights):
+    with pytest.raises(ValueError):
+        AliasTable(weights)
+
+
+def test_roll_n_drops_nothing_for_none():
+    table = LootTable([("potion", 1), (None, 1)])
+    drops = table.roll_n(2000, random.Random(1))
+    assert set(drops) == {"potion"}
+    assert 850 < len(drops) < 1150
+
+
+def test_roll_expands_tuples_nested_tables_and_guaranteed_drops():
+    gems = LootTable.uniform(["ruby"])
+    table = LootTable([(("gold", ("arrow", "arrow")), 1), (gems, 1)], guaranteed=["xp"])
+    rolls = [table.roll(random.Random(seed)) for seed in range(20)]
+    assert {tuple(r) for r in rolls} == {("xp", "gold", "arrow", "arrow"), ("xp", "ruby")}
+    assert table.draw(random.Random(0)) in (("gold", ("arrow", "arrow")), "ruby")
+
+
+def test_pity_drop_after_a_dry_streak():
+    table = LootTable([("junk", 1), ("relic", 0)], pity=("relic", 3), name="chest")
+    counts = {}
+    rolls = [table.roll(random.Random(0), counts) for _ in range(7)]
+    assert ["relic" in r for r in rolls] == [False, False, True, False, False, True, False]
+    assert counts == {"chest": 1}
+
+
+def test_pity_needs_a_name_and_a_streak():
+    with pytest.raises(ValueError):
+        LootTable([("junk", 1)], pity=("relic", 3))
+    with pytest.raises(ValueError):
+        LootTable([("junk", 1)], pity=("relic", 0), name="chest")
+
+
+def test_tally_follows_the_weights():
+    table = LootTable([("common", 8), ("rare", 2)])
+    counts = table.tally(20000, random.Random(5))
+    assert counts["common"] / 20000 == pytest.approx(0.8, abs=0.02)
+
+
+def test_validate_pity_field():
+    loot.validate({})
+    loot.validate({loot.PITY_FIELD: {"chest": 2}})
+    with pytest.raises(SchemaError):
+        loot.validate({loot.PITY_FIELD: {"chest": True}})
+    with pytest.raises(SchemaError):
+        loot.validate({loot.PITY_FIELD: [1]})
@@ -0,0 +1,175 @@
+"""Save schemas: upgrade steps, validation and the bulk migration tool."""
+import json
+import os
+import stat
+
+import pytest
+
+from rpgcommon import migrate
+from rpgcommon.migrate import Schema, SchemaError, require
+
+import game as lucidus
+import halo_text_rpg as halo
+
+
+def _schema(calls):
+    def validate(data):
+        calls.append("validate")
+        require(data, {"hp": int, "name": str})
+
+    schema = Schema("test", 3, validate)
+
+    @schema.step(1)
+    def _add_hp(data):
+        calls.append(1)
+        data["hp"] = 10
+
+    @schema.step(2)
+    def _rename(data):
+        calls.append(2)
+        data["name"] = data.pop("title")
+
+    return schema
+
+
+def test_upgrade_runs_every_step_in_order():
+    calls = []
+    data = {"title": "Jin"}
+    assert _schema(calls).upgrade(data) == 1
+    assert calls == [1, 2]
+    assert data == {"hp": 10, "name": "Jin", "version": 3}
+
+
+def test_upgrade_starts_from_the_saved_version():
+    calls = []
+    data = {"version": 2, "title": "Jin", "hp": 4}
+    assert _schema(calls).upgrade(data) == 2
+    assert calls == [2]
+    assert data == {"version": 3, "name": "Jin", "hp": 4}
+
+
+def test_current_save_passes_straight_through():
+    calls = []
+    data = {"version": 3, "name": "Jin"}  # not even valid: current saves are not re-checked on load
+    assert _schema(calls).current(data) is data
+    assert calls == []
+
+
+def test_current_validates_upgraded_saves():
+    calls = []
+    assert _schema(calls).current({"title": "Jin"})["name"] == "Jin"
+    assert calls == [1, 2, "validate"]
+    with pytest.raises(SchemaError, match="name: expected str, got int"):
+        _schema([]).current({"title": 5})
+
+
+def test_newer_save_is_refused():
+    with pytest.raises(SchemaError, match="newer than this game"):
+        _schema([]).upgrade({"version": 4})
+
+
+def test_missing_step_is_refused():
+    schema = Schema("test", 3, lambda data: None)
+    schema.step(1)(lambda data: None)
+    data = {}
+    with pytest.raises(SchemaError, match="no test upgrade from version 2"):
+        schema.upgrade(data)
+    assert data == {"version": 2}
+
+
+def test_require():
+    require({"a": 1, "b": None}, {"a": int, "b": (str, type(None))})
+    with pytest.raises(SchemaError, match="^p.a: missing$"):
+        require({}, {"a": int}, "p.")
+    with pytest.raises(SchemaError, match="b: expected str or null, got int"):
+        require({"b": 3}, {"b": (str, type(None))})
+    with pytest.raises(SchemaError, match="save: expected an object"):
+        require([], {"a": int})
+
+
+def _halo_v1():
+    weapon = halo.make_weapon_by_name("M6D Magnum").to_dict()
+    weapon["crit"] = weapon.pop("crit_bonus")
+    return {
+        "player": {"name": "Chief", "hp": 100, "max_hp": 100, "shield": 50, "max_shield": 50, "xp": 0,
+                   "level": 3, "weapons": [weapon], "current_weapon": 4},
+        "world": {"seed": "abc"},
+    }
+
+
+def test_halo_version_1_loadout_is_fixed():
+    data = halo.SAVE_SCHEMA.current(_halo_v1())
+    p = data["player"]
+    assert data["version"] == halo.SAVE_SCHEMA.version
+    assert [w["name"] for w in p["weapons"]] == ["M6D Magnum", "MA5B Assault Rifle"]
+    assert "crit" not in p["weapons"][0] and p["weapons"][0]["crit_bonus"] == halo.WEAPONS_DB["M6D Magnum"].get("crit", 0.0)
+    assert p["current_weapon"] == 0
+    assert (p["inventory"], p["pos"], p["seed"]) == ({}, 0, "")
+
+
+def test_lucidus_version_1_gets_defaults():
+    data = {"name": "Aster", "level": 4, "stats": {"STR": 9}, "equipped_armor": {}, "temp_def": 3, "extra_turn": True}
+    data = lucidus.SAVE_SCHEMA.current(data)
+    assert data["version"] == lucidus.SAVE_SCHEMA.version
+    assert data["level"] == 4 and data["stats"]["STR"] == 9
+    assert set(data["stats"]) == set(lucidus.DEFAULT_PLAYER["stats"])
+    assert set(data["equipped_armor"]) == set(lucidus.DEFAULT_PLAYER["equipped_armor"])
+    assert "temp_def" not in data and "extra_turn" not in data
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+def test_run_upgrades_in_place(tmp_path):
+    old = tmp_path / "lucidusrpg" / "player_data.json"
+    bad = tmp_path / "other" / "lucidusrpg" / "player_data.json"
+    _write(str(old), {"name": "Aster", "stats": {}, "equipped_armor": {}})
+    _write(str(bad), {"name": "Aster", "version": 9})
+
+    dry = migrate.run(str(tmp_path), workers=0, dry_run=True)
+    assert dry["status"] == {"upgraded": 1, "invalid": 1}
+    assert "version" not in json.loads(old.read_text())
+
+    summary = migrate.run(str(tmp_path), workers=0)
+    assert summary["upgraded_from"] == {"1": 1}
+    assert [p["path"] for p in summary["problems"]] == [str(bad)]
+    upgraded = json.loads(old.read_text())
+    lucidus.validate_player(upgraded)
+
+    again = migrate.run(str(tmp_path), workers=0, game="lucidus")
+    assert again["status"] == {"current": 1, "invalid": 1}
+
+
+def test_run_migrates_halo_catalog(tmp_path):
+    mgr = halo.SaveManager(str(tmp_path / "saves"))
+    current = mgr.new_game(1, "Chief")
+    old = _halo_v1()
+    old["player"].update(inventory={}, pos=3, seed="abc")  # the fields the catalog line needs
+    mgr.save_slot(2, old)  # save_slot stores what it is given; old records only come from old builds
+    first = mgr.data_file
+
+    dry = migrate.run(str(tmp_path), workers=0, dry_run=True)
+    assert dry["status"] == {"upgraded": 1} and dry["records"] == 2
+    assert halo.SaveManager(mgr.save_dir).data_file == first
+
+    summary = migrate.run(str(tmp_path), workers=0)
+    assert summary["upgraded_from"] == {"1": 1}
+    again = halo.SaveManager(mgr.save_dir)
+    assert again.data_file != first
+    assert again._read_record(2)["version"] == halo.SAVE_SCHEMA.version
+    assert again.load_slot(1) == current
+
+    assert migrate.run(str(tmp_path), workers=0)["status"] == {"current": 1}
+
+
+@pytest.mark.parametrize("mode", [0o644, 0o640])
+def test_upgrade_keeps_the_file_mode(tmp_path, mode):
+    path = tmp_path / "lucidusrpg" / "player_data.json"
+    _write(str(path), {"name": "Aster", "stats": {}, "equipped_armor": {}})
+    os.chmod(path, mode)
+    assert migrate.run(str(tmp_path), workers=0)["status"] == {"upgraded": 1}
+    assert stat.S_IMODE(os.stat(path).st_mode) == mode
+    assert json.loads(path.read_text())["version"] == lucidus.SAVE_SCHEMA.version
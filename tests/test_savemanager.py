@@ -0,0 +1,152 @@
+"""Halo's slot catalog: the journal must survive crashes and compaction without losing a save."""
+import json
+import os
+
+import pytest
+
+import halo_text_rpg as halo
+
+
+@pytest.fixture
+def saves(tmp_path):
+    return str(tmp_path / "saves")
+
+
+def _save(mgr, slot, level):
+    data = mgr.new_game(slot, f"Chief {slot}")
+    data["player"]["level"] = level
+    mgr.save_slot(slot, data)
+    return data
+
+
+def _catalog_lines(mgr):
+    with open(mgr.catalog_path) as f:
+        return f.read().splitlines()
+
+
+def test_save_and_load_round_trip(saves):
+    mgr = halo.SaveManager(saves)
+    data = _save(mgr, 2, 7)
+    assert mgr.load_slot(2) == data
+    assert mgr.load_slot(1) is None
+    assert [slot for slot, _ in mgr.list_slots()] == [2]
+    assert mgr.free_slot() == 1
+
+
+def test_reopen_sees_latest_saves(saves):
+    mgr = halo.SaveManager(saves)
+    _save(mgr, 1, 3)
+    latest = _save(mgr, 1, 4)
+    other = _save(mgr, 5, 9)
+
+    again = halo.SaveManager(saves)
+    assert again.slots == mgr.slots
+    assert again.load_slot(1) == latest
+    assert again.load_slot(5) == other
+    assert again.list_slots()[0][1]["level"] == 4
+
+
+def test_delete_survives_reopen(saves):
+    mgr = halo.SaveManager(saves)
+    _save(mgr, 1, 3)
+    _save(mgr, 2, 3)
+    mgr.delete_slot(1)
+    mgr.delete_slot(7)  # never used: no catalog line
+    assert not mgr.slot_exists(1)
+
+    again = halo.SaveManager(saves)
+    assert [slot for slot, _ in again.list_slots()] == [2]
+    assert again.load_slot(1) is None
+
+
+def test_torn_catalog_line_is_dropped(saves):
+    mgr = halo.SaveManager(saves)
+    kept = _save(mgr, 1, 3)
+    # a crash mid-append: the record reached the data file, its catalog line did not finish
+    line = _catalog_lines(mgr)[-1]
+    entry = json.loads(line)
+    entry["level"] = 99
+    with open(mgr.catalog_path, "a") as f:
+        f.write(json.dumps(entry)[:-5])
+
+    again = halo.SaveManager(saves)
+    assert again.load_slot(1) == kept
+    assert again.slots["1"]["level"] == 3
+    with open(again.catalog_path) as f:
+        assert f.read().endswith("\n")  # rewritten so the next append starts on a clean line
+
+    later = _save(again, 1, 5)
+    assert halo.SaveManager(saves).load_slot(1) == later
+
+
+def test_garbled_catalog_line_is_skipped(saves):
+    mgr = halo.SaveManager(saves)
+    kept = _save(mgr, 1, 3)
+    with open(mgr.catalog_path, "a") as f:
+        f.write("{not json\n")
+
+    again = halo.SaveManager(saves)
+    assert again.load_slot(1) == kept
+    assert all(json.loads(line) for line in _catalog_lines(again))
+
+
+def test_truncated_data_file_reads_as_missing(saves):
+    mgr = halo.SaveManager(saves)
+    _save(mgr, 1, 3)
+    with open(mgr.data_path, "r+b") as f:
+        f.truncate(10)
+    assert halo.SaveManager(saves).load_slot(1) is None
+
+
+def test_data_file_compaction(saves, monkeypatch):
+    monkeypatch.setattr(halo, "COMPACT_MIN_GARBAGE", 1)
+    mgr = halo.SaveManager(saves)
+    first = mgr.data_file
+    keep = _save(mgr, 2, 1)
+    for level in range(2, 6):
+        latest = _save(mgr, 1, level)
+
+    assert mgr.data_file != first
+    assert not os.path.exists(os.path.join(saves, first))
+    assert mgr.garbage < mgr.live
+    assert mgr.load_slot(1) == latest
+    assert mgr.load_slot(2) == keep
+
+    again = halo.SaveManager(saves)
+    assert again.data_file == mgr.data_file
+    assert again.load_slot(1) == latest
+    assert again.load_slot(2) == keep
+
+
+def test_catalog_compaction(saves):
+    mgr = halo.SaveManager(saves)
+    for level in range(100):
+        latest = _save(mgr, 1, level)
+    # superseded lines get folded away; the journal never grows past 2 * slots + 64 changes
+    assert len(_catalog_lines(mgr)) - 1 <= 2 * len(mgr.slots) + 64
+    assert halo.SaveManager(saves).load_slot(1) == latest
+
+
+def test_legacy_slots_are_imported_and_upgraded(saves):
+    os.makedirs(saves)
+    legacy = halo.SaveManager(os.path.join(saves, "scratch")).new_game(1, "Old Timer")
+    del legacy["version"]
+    weapon = legacy["player"]["weapons"][0]
+    weapon["crit"] = weapon.pop("crit_bonus")
+    del legacy["player"]["weapons"][1:]
+    with open(os.path.join(saves, "save_slot_4.json"), "w") as f:
+        json.dump(legacy, f)
+    with open(os.path.join(saves, "save_slot_6.json"), "w") as f:
+        f.write("{")
+
+    mgr = halo.SaveManager(saves)
+    assert [slot for slot, _ in mgr.list_slots()] == [4]
+    data = mgr.load_slot(4)
+    assert data["version"] == halo.SAVE_SCHEMA.version
+    assert len(data["player"]["weapons"]) == 2
+    halo.validate_save(data)
+
+    # the import runs once: a new legacy file next to an existing catalog is left alone
+    with open(os.path.join(saves, "save_slot_8.json"), "w") as f:
+        json.dump(legacy, f)
+    assert not halo.SaveManager(saves).slot_exists(8)